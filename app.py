@@ -31,6 +31,7 @@ Handles:
 - API endpoints for user data retrieveal 
 - error handling
 - Functions:
+    - create_app(config)
     - index()
     - login()
     - register()
@@ -39,35 +40,75 @@ Handles:
     - get_user()
 """
 
-from flask import Flask, jsonify, request, session, render_template, url_for, redirect
-
-from utils.db_handler import init_db, get_all_traffic_data
+from flask import (Flask, Blueprint, jsonify, request, session, render_template, url_for, redirect, Response,
+                   stream_with_context, current_app, send_file)
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+from utils import db_handler
+from utils.db_handler import ensure_db
+from utils.metrics_handler import instrument_app, render_metrics, CONTENT_TYPE
+from utils import profiling_handler, health_handler
+from utils.throttle_handler import coalesce, instrument_throttling, PROXY_HOPS
+from utils.export_handler import (stream_export, submit_export_job, get_export_job, list_export_jobs, export_file,
+                                  recover_export_jobs, ExportError, ExportBusy, FORMATS)
+from utils.log_handler import get_logger, instrument_request_ids
 from utils.stats_handler import overall_summary, summarize_city_traffic
 from utils.alert_handler import generate_alerts
 from utils.user_handler import register_user, login_user, get_user_by_email, logout_user, reset_password
 from utils.map_handler import prepare_map_data
-from utils.simulation_handler import run_simulation_step
-from utils.traffic_light_handler import get_intersection_state
+from utils.gazetteer_handler import suggest_cities, fuzzy_match_cities, resolve_city
+# NumPy-backed handlers (heatmap, simulation, signals, streams, recordings)
+# are imported inside their routes, so workers start without them
 from utils.stats_handler import summarize_city_traffic, summarize_accidents, overall_summary
 import os
-
-# set up the Flask app 
-app = Flask(__name__, static_folder='static', template_folder='templates')
-# Set secret key for session management
-app.secret_key = os.environ.get("SECRET_KEY", "supersecretkey") 
-
-
-# Initialize database
-try: # handle any init errors
-    init_db() # initialize DB tables
-    print("[INFO] Database initialized successfully.")
-except Exception as e: # catch errors and log
-    # print error message
-    print(f"[ERROR] Database init failed: {e}")
+import json
+import uuid
+
+logger = get_logger(__name__)
+
+# every route lives on this blueprint; create_app() registers it on an app
+bp = Blueprint("main", __name__)
+
+# settings create_app() applies before any config passed in
+DEFAULT_CONFIG = {
+    "SECRET_KEY": os.environ.get("SECRET_KEY", "supersecretkey"),
+    "DB_PATH": os.environ.get("DB_PATH", db_handler.DB_PATH),
+    # traffic/accident rows split into this many per-city-group files (0 = one file)
+    "DB_SHARDS": int(os.environ.get("DB_SHARDS", db_handler.DB_SHARDS)),
+    # per-route latency / status / in-flight metrics at /api/metrics
+    "METRICS": True,
+    # directory the workers share so /api/metrics sums all of them (None = this process)
+    "METRICS_DIR": os.environ.get("METRICS_DIR") or None,
+    # sampling profiler: admins flag requests, or PROFILE_SAMPLE_RATE picks them
+    "PROFILING": True,
+    # admin access: logged-in usernames, or an X-Admin-Token header
+    "ADMIN_USERS": [u for u in os.environ.get("ADMIN_USERS", "").split(",") if u],
+    "ADMIN_TOKEN": os.environ.get("ADMIN_TOKEN"),
+    # create tables on the first request (once per process); set False when
+    # the database is initialized elsewhere, e.g. before workers fork
+    "INIT_DB": True,
+    # per-client token bucket for /api/ routes (requests/s and burst; 0 = off).
+    # Limits live in process memory, so they apply per worker process
+    "RATE_LIMIT": float(os.environ.get("RATE_LIMIT", 10)),
+    "RATE_BURST": int(os.environ.get("RATE_BURST", 20)),
+    # expensive API requests running at once before new ones get 503 (0 = off)
+    "MAX_CONCURRENT": int(os.environ.get("MAX_CONCURRENT", 16)),
+    # SSE streams open at once per process (each holds a server thread; 0 = no cap)
+    # and how long one stays open before the client has to reconnect
+    "MAX_STREAMS": int(os.environ.get("MAX_STREAMS", 2)),
+    "STREAM_SECONDS": float(os.environ.get("STREAM_MAX_SECONDS", 300)),
+    # keep visitors' simulations in the database so every worker continues
+    # the same one (wsgi.py turns this on; one process can keep them in memory)
+    "SHARED_SIM_SESSIONS": os.environ.get("SHARED_SIM_SESSIONS", "0") == "1",
+    # reverse proxies in front of the app; with N > 0 the client address (and
+    # scheme) come from the X-Forwarded-* headers the last N proxies added.
+    # Keep 0 when clients connect directly, or they could pick their own address
+    "PROXY_HOPS": PROXY_HOPS,
+}
 
 
 # user authentication route
-@app.route("/register", methods=["GET", "POST"])
+@bp.route("/register", methods=["GET", "POST"])
 # A function to handle user registration
 def register():
     """Registers a new user."""
@@ -82,18 +123,18 @@ def register():
             return render_template("register.html", error="Passwords do not match")
         
         result = register_user(username, email, password)
-        print("registration result:", result)
+        logger.debug("Registration result: %s", result)
         
         if result["status"] == "success":
-            return redirect(url_for("login"))
+            return redirect(url_for("main.login"))
         else:
             # show error message on registration page
-            return render_template("register.html", error=result["message"])
+            return render_template("register.html", error=result["message"]), 503 if result.get("busy") else 200
     return render_template("register.html")
    
 
 # authentication route for user login 
-@app.route("/login", methods=["GET", "POST"])
+@bp.route("/login", methods=["GET", "POST"])
 # A function to handle user login 
 def login():
     """Logs a user in and starts a session."""
@@ -112,23 +153,27 @@ def login():
             return render_template("index.html", username=username, message="Login successful!")
         else:
             # on failure, show error message on login page
-            return render_template("login.html", error=result["message"])
+            return render_template("login.html", error=result["message"]), 503 if result.get("busy") else 200
     # for GET request, just render the index page 
     return render_template("login.html")
     
 
 # route for user logout
-@app.route("/logout", methods=["POST"])
+@bp.route("/logout", methods=["POST"])
 # A function to handle user logout
 def logout():
     """Logs out the current user."""
+    # free this visitor's simulation before clearing session data
+    if "sim_id" in session:
+        from utils.simulation_session_handler import drop_session
+        drop_session(session.pop("sim_id"), current_app.config["SHARED_SIM_SESSIONS"])
     # call logout_user function to clear session data
     logout_user(session)
-    return redirect(url_for("login"))
+    return redirect(url_for("main.login"))
    
 
 # Route for password recovery
-@app.route("/forgot_password", methods=["GET", "POST"])
+@bp.route("/forgot_password", methods=["GET", "POST"])
 # A function to handle password recovery requests
 def forgot_password():
     """ handles password recovery requests """
@@ -139,7 +184,7 @@ def forgot_password():
         # call reset_password function to handle password reset
         result = reset_password(email)
         # test result and show appropriate message
-        print("password reset result:", result)
+        logger.debug("Password reset result: %s", result)
         # return message on the forgot password page
         return render_template("forgot_password.html", message=result["message"])
     # for GET request, just render the forgot password page
@@ -147,19 +192,20 @@ def forgot_password():
     
     
 # route for traffic map
-@app.route("/map", methods=["GET"])
+@bp.route("/map", methods=["GET"])
 def map_view():
     return render_template("map.html")
 
     
 # route for fetching traffic map data (API)
-@app.route("/api/map_data", methods=["GET"])
+@bp.route("/api/map_data", methods=["GET"])
 def api_map_data():
     """ Returns structured traffic data for map. """
     try:
         city_filter = request.args.get("city", None)
         # fetch traffic data from map_handler.py
-        map_data = prepare_map_data(city_filter)
+        # concurrent requests for the same city share one computation
+        map_data = coalesce(("map_data", city_filter), prepare_map_data, city_filter)
         
         # return JSON resonse to frontend
         return jsonify ( {
@@ -168,8 +214,8 @@ def api_map_data():
             "data": map_data
         }), 200
     except Exception as e:
-        # print an error message to the console
-        print(f"Error: Map data retrieval failed: {e} ")
+        # log the error with its traceback
+        logger.exception("Map data retrieval failed: %s", e)
         return jsonify ({
             "success": False,
             "error": str(e),
@@ -177,12 +223,42 @@ def api_map_data():
         }), 500
 
 
-@app.route('/traffic_data', methods=['GET'])
+# route for accident/congestion density grids (API)
+@bp.route("/api/heatmap", methods=["GET"])
+# A function to return a heatmap grid or its changes since a version
+def api_heatmap():
+    """Returns a precomputed heatmap grid for a region and time range."""
+    from utils.heatmap_handler import get_heatmap
+    try:
+        layer = request.args.get("layer", "accidents")
+        bounds = {key: request.args.get(key, type=float)
+                  for key in ("lat_min", "lat_max", "lon_min", "lon_max")}
+        # time range accepts epoch seconds or "YYYY-MM-DD[ HH:MM:SS]" strings
+        start, end = (request.args.get(key) for key in ("start", "end"))
+        start, end = (int(v) if v and v.isdigit() else v for v in (start, end))
+        since_version = request.args.get("since_version", type=int)
+
+        heatmap = get_heatmap(layer, bounds, start, end, since_version)
+        return jsonify({"success": True, "data": heatmap}), 200
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    except Exception as e:
+        logger.exception("Heatmap retrieval failed: %s", e)
+        return jsonify({"success": False, "error": str(e), "message": "Failed to load heatmap."}), 500
+
+
+@bp.route('/traffic_data', methods=['GET'])
 def traffic_data():
     query = request.args.get('query', '').strip()
     
     if query:
         city_summary = summarize_city_traffic(query)
+        # fall back to the gazetteer's spelling for a misspelled name (strict,
+        # so an unrelated query never shows some other city's numbers)
+        if not city_summary:
+            match = resolve_city(query, strict=True)
+            if match and match["name"] != query:
+                city_summary = summarize_city_traffic(match["name"])
         accident_summary = summarize_accidents(7) # last 7 days
         overall = overall_summary()
         
@@ -203,11 +279,37 @@ def traffic_data():
             overall=overall
         )
 
-  
-  
+
+
+# route for city name autocomplete
+@bp.route("/api/cities/suggest", methods=["GET"])
+# A function to suggest city names for the search box
+def suggest_city_names():
+    """Returns city suggestions for a partial or misspelled name."""
+    query = request.args.get("q", "").strip()
+    try:
+        limit = max(1, min(int(request.args.get("limit", 10)), 50))
+    except ValueError:
+        return jsonify({"success": False, "message": "limit must be an integer."}), 400
+
+    # prefix matches first, fuzzy matches only when nothing starts with the query
+    matches = suggest_cities(query, limit)
+    match_type = "prefix"
+    if not matches:
+        matches = fuzzy_match_cities(query, limit)
+        match_type = "fuzzy"
+
+    return jsonify({
+        "success": True,
+        "query": query,
+        "match": match_type,
+        "count": len(matches),
+        "data": matches
+    }), 200
+
 
 # A route to get current logged-in user info
-@app.route("/api/user", methods=["GET"])
+@bp.route("/api/user", methods=["GET"])
 # a function to get current user infomation
 def get_current_user():
     """Gets the logged-in user's information."""
@@ -218,14 +320,14 @@ def get_current_user():
     return jsonify({"logged_in": False, "message": "No active user session."})
 
 # route for overall traffic & accident statistics
-@app.route("/api/stats/overall", methods=["GET"])
+@bp.route("/api/stats/overall", methods=["GET"])
 # A function to get overall traffic & accident statistics of the system
 def get_overall_stats():
     """Returns overall traffic & accident statistics."""
     # get excetion handling for any errors
     try:
         # call overall_summary function from stats_handler.py file
-        stats = overall_summary()
+        stats = coalesce("stats_overall", overall_summary)
         # if no stats found, return 404 error message
         if not stats:
             # get the not found message as JSON response
@@ -237,7 +339,7 @@ def get_overall_stats():
         return jsonify({"success": False, "error": str(e)}), 500
 
 # route for city-specific traffic statistics
-@app.route("/api/stats/city/<city>", methods=["GET"])
+@bp.route("/api/stats/city/<city>", methods=["GET"])
 # A function to get traffic statistics for a specific city
 def get_city_stats(city):
     """Returns traffic statistics for a specific city."""
@@ -255,49 +357,215 @@ def get_city_stats(city):
 
 
 # route for accident info page
-@app.route("/accident_info", methods=["GET"])
+@bp.route("/accident_info", methods=["GET"])
 # A function to render the Accident History & Trends page
 def accident_info():
     """Displays the Accident History & Trends page."""
     return render_template("accident_info.html")
     
 
-car_positions = [0, 150, 300] # initial car positions
-
 # route for traffic simulation page
-@app.route("/simulation")
-# A function to render the Traffic Simulation page
+@bp.route("/simulation")
+# A function to step the visitor's own traffic simulation
 def run_simulation():
-    """ Renders the Traffic Simulation page"""
-    global car_positions
-    state = run_simulation_step(car_positions)
-    car_positions = state["car_positions"]
+    """
+    Runs this visitor's simulation and returns its state.
+
+    Query parameters (all optional):
+        steps - fast-forward N fixed ticks and return summarized frames
+        every - keep one frame every N ticks in batch mode
+        seed  - run a fresh, repeatable simulation instead of the session's
+        vehicles, lanes - corridor size for seeded runs
+
+    Batch runs are limited to a work budget (vehicles x steps): about
+    0.3 s of CPU for anonymous visitors, ten times that when logged in.
+    1,200 ticks of the page's three cars take roughly 0.1 s.
+    """
+    from utils.simulation_handler import (run_seeded_batch, batch_cost, MAX_BATCH_STEPS,
+                                          ANON_BATCH_BUDGET, USER_BATCH_BUDGET)
+    from utils.simulation_session_handler import step_session, run_session_batch
+    steps = request.args.get("steps", type=int)
+    seed = request.args.get("seed", type=int)
+    every = request.args.get("every", 1, type=int)
+    vehicles = request.args.get("vehicles", type=int) if seed is not None else None
+    if steps is not None and not 0 < steps <= MAX_BATCH_STEPS:
+        return jsonify({"success": False, "message": f"steps must be between 1 and {MAX_BATCH_STEPS}."}), 400
+    if vehicles is not None and not 0 < vehicles <= 100_000:
+        return jsonify({"success": False, "message": "vehicles must be between 1 and 100000."}), 400
+
+    # cap the work one request can ask for
+    cost = batch_cost(steps or 1, vehicles)
+    budget = USER_BATCH_BUDGET if "user" in session else ANON_BATCH_BUDGET
+    if cost > budget:
+        if cost <= USER_BATCH_BUDGET:
+            return jsonify({"success": False, "message": "Log in to run simulations this large."}), 403
+        return jsonify({"success": False, "message": "Simulation too large: reduce vehicles or steps."}), 400
+
+    # seeded runs don't touch the visitor's session
+    if seed is not None:
+        lanes = request.args.get("lanes", 1, type=int)
+        lanes = max(1, min(lanes, 8))
+        return jsonify(run_seeded_batch(steps or 1, seed, vehicles, lanes, every))
+
+    # every browser session gets its own simulation in the registry
+    # (saved in the database when several workers serve the app)
+    shared = current_app.config["SHARED_SIM_SESSIONS"]
+    if "sim_id" not in session:
+        session["sim_id"] = uuid.uuid4().hex
+    if steps is not None:
+        return jsonify(run_session_batch(session["sim_id"], steps, every, shared))
+    state = step_session(session["sim_id"], shared)
     return jsonify(state)
     
-@app.route("/traffic_simulation")
+@bp.route("/traffic_simulation")
 def traffic_simulation():
     return render_template("traffic_simulation.html")
 
 
-@app.route("/traffic_light")
+@bp.route("/traffic_light")
 def traffic_light():
     return render_template("traffic_light.html")
     
-@app.route("/api/traffic_light_state")
+@bp.route("/api/traffic_light_state")
 def traffic_light_state():
-    """ Returns current traffic light state at intersection """
-    return jsonify(get_intersection_state())
+    """
+    Returns current traffic light state.
+
+    With no parameters this is the single demo intersection. Passing
+    `id` (one id or a comma-separated list) and/or a lat_min/lat_max/
+    lon_min/lon_max region returns city-grid signal states in bulk.
+    """
+    from utils.traffic_light_handler import get_intersection_state, get_network_state
+    bounds = {key: request.args.get(key, type=float)
+              for key in ("lat_min", "lat_max", "lon_min", "lon_max")}
+    raw_ids = request.args.get("id")
+    if raw_ids is None and not any(v is not None for v in bounds.values()):
+        return jsonify(get_intersection_state())
 
+    try:
+        ids = [int(i) for i in raw_ids.split(",") if i.strip()] if raw_ids else None
+        return jsonify({"success": True, "data": get_network_state(ids, bounds)}), 200
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+
+
+
+# A function to wrap an SSE generator in a streaming response
+def _event_stream(events):
+    return Response(stream_with_context(events), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+# route for pushing frames instead of polling (Server-Sent Events)
+@bp.route("/api/stream/<kind>")
+# A function to stream simulation, signal-network or intersection frames
+def stream(kind):
+    """
+    Streams frames as Server-Sent Events.
+        /api/stream/simulation      shared corridor, delta-encoded vehicles
+        /api/stream/lights          city signal network, delta-encoded
+        /api/stream/traffic_light   demo intersection, JSON on change
+    Query: rate (ticks per second), limit (stop after N events).
+    A stream ends after STREAM_SECONDS; EventSource clients reconnect.
+    """
+    from utils.stream_handler import stream_frames, stream_intersection, end_after, DEFAULT_RATE
+    rate = request.args.get("rate", DEFAULT_RATE, type=int)
+    limit = request.args.get("limit", type=int)
+    seconds = current_app.config["STREAM_SECONDS"]
+    try:
+        if kind == "traffic_light":
+            return _event_stream(end_after(stream_intersection(rate, limit), seconds))
+        return _event_stream(end_after(stream_frames(kind, rate, limit), seconds))
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+
+
+# route for recording seeded simulation runs
+@bp.route("/api/recordings", methods=["GET", "POST"])
+# A function to list recordings or record a new run
+def recordings():
+    """
+    GET lists stored recordings. POST records a fresh seeded run.
+    POST parameters: name, steps, seed, vehicles, lanes.
+    Runs share the /simulation work budget (vehicles x steps); a taken
+    name gets 409 and a full recordings quota 507.
+    """
+    from utils.recording_handler import (record_simulation, list_recordings, RecordingQuotaExceeded,
+                                         MAX_RECORD_STEPS)
+    from utils.simulation_handler import batch_cost, ANON_BATCH_BUDGET, USER_BATCH_BUDGET
+    if request.method == "GET":
+        return jsonify({"success": True, "data": list_recordings()})
+
+    params = request.get_json(silent=True) or request.values
+    try:
+        steps = int(params.get("steps", 1000))
+        vehicles = params.get("vehicles")
+        vehicles = int(vehicles) if vehicles is not None else None
+        if not 0 < steps <= MAX_RECORD_STEPS:
+            raise ValueError(f"steps must be between 1 and {MAX_RECORD_STEPS}.")
+        if vehicles is not None and not 0 < vehicles <= 100_000:
+            raise ValueError("vehicles must be between 1 and 100000.")
+
+        # cap the work one request can ask for, as /simulation does
+        cost = batch_cost(steps, vehicles)
+        budget = USER_BATCH_BUDGET if "user" in session else ANON_BATCH_BUDGET
+        if cost > budget:
+            if cost <= USER_BATCH_BUDGET:
+                return jsonify({"success": False, "error": "Log in to record simulations this large."}), 403
+            raise ValueError("Recording too large: reduce vehicles or steps.")
+
+        info = record_simulation(params.get("name") or uuid.uuid4().hex[:12], steps,
+                                 int(params.get("seed", 0)), vehicles,
+                                 max(1, min(int(params.get("lanes", 1)), 8)))
+        return jsonify({"success": True, "data": info}), 201
+    except FileExistsError as e:
+        return jsonify({"success": False, "error": str(e)}), 409
+    except RecordingQuotaExceeded as e:
+        return jsonify({"success": False, "error": str(e)}), 507
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+
+
+# route for replaying a recording from any tick
+@bp.route("/api/recordings/<name>", methods=["GET"])
+# A function to seek into a recording and return or stream frames
+def replay_recording(name):
+    """
+    Returns frames of a recording starting at `tick`.
+    Query: tick (default 0), count (default 100, max 1000), every (default 1),
+    stream=1 to receive frames as Server-Sent Events instead (default 1000,
+    max 10000). Either way one request returns at most REPLAY_MAX_VALUES
+    vehicle positions, so large recordings get fewer frames.
+    """
+    from utils.recording_handler import open_recording
+    tick = request.args.get("tick", 0, type=int)
+    every = request.args.get("every", 1, type=int)
+    try:
+        replay = open_recording(name)
+        replay.check_tick(tick)
+        if request.args.get("stream"):
+            from utils.stream_handler import end_after
+            count = replay.max_frames(max(1, min(request.args.get("count", 1000, type=int), 10_000)))
+            frames = replay.stream(tick, count, every)
+            events = (f"event: frame\ndata: {json.dumps(f)}\n\n" for f in frames)
+            return _event_stream(end_after(events, current_app.config["STREAM_SECONDS"]))
+        count = replay.max_frames(max(1, min(request.args.get("count", 100, type=int), 1000)))
+        frames = list(replay.stream(tick, count, every))
+        return jsonify({"success": True, "info": replay.info(), "frames": frames})
+    except FileNotFoundError as e:
+        return jsonify({"success": False, "error": str(e)}), 404
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
 
 
 # route for getting live alerts and notifications
-@app.route("/api/alerts", methods=["GET"])
+@bp.route("/api/alerts", methods=["GET"])
 # A function to get live alerts for traffic congestion or accident spikes
 def get_alerts():
     """Returns live alerts for traffic congestion or accident spikes."""
     try:
         # call generate_alerts function and store results in alerts variable
-        alerts = generate_alerts()
+        alerts = coalesce("alerts", generate_alerts)
         # return alerts as JSON response
         return jsonify({"success": True, "alerts": alerts}), 200
     # catch any exceptions and return '500' error message
@@ -305,30 +573,172 @@ def get_alerts():
         return jsonify({"success": False, "error": str(e)}), 500
 
 
+# route for streaming a table export
+@bp.route("/api/export/<table>", methods=["GET"])
+# A function to stream traffic or accident rows as CSV, JSONL or Parquet
+def export_table(table):
+    """
+    Streams rows in batches (constant memory, any size).
+    Query parameters: format (csv | jsonl | parquet), city, start, end.
+    """
+    fmt = request.args.get("format", "csv")
+    try:
+        chunks = stream_export(table, fmt, request.args.get("city"), request.args.get("start"),
+                               request.args.get("end"))
+    except ExportError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    mimetype, extension = FORMATS[fmt]
+    return Response(stream_with_context(chunks), mimetype=mimetype,
+                    headers={"Content-Disposition": f'attachment; filename="{table}.{extension}"'})
+
+# A function to find the export jobs a visitor may see
+def _export_owner():
+    """Returns (username, is admin); the username is None for anonymous visitors."""
+    return session.get("user"), is_admin()
+
+
+# A function to read a job the current user owns (admins see every job)
+def _own_export_job(job_id):
+    user, admin = _export_owner()
+    job = get_export_job(job_id)
+    if job is None or not (admin or (user is not None and job.get("owner") == user)):
+        return None
+    return job
+
+
+# route for background export jobs
+@bp.route("/api/exports", methods=["GET", "POST"])
+# A function to list export jobs or start a new one
+def export_jobs():
+    """
+    GET lists the user's export jobs. POST starts one in the background
+    (202), or answers 429 while the user (or the server) has too many
+    running. Logged-in users only.
+    POST parameters: table, format, city, start, end.
+    """
+    user, admin = _export_owner()
+    if user is None and not admin:
+        return jsonify({"success": False, "error": "Log in to use export jobs."}), 401
+    if request.method == "GET":
+        return jsonify({"success": True, "data": list_export_jobs(None if admin else user)})
+
+    params = request.get_json(silent=True) or request.values
+    try:
+        job = submit_export_job(params.get("table", ""), params.get("format", "csv"), params.get("city"),
+                                params.get("start"), params.get("end"), owner=user)
+    except ExportError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    except ExportBusy as e:
+        return jsonify({"success": False, "error": str(e)}), 429, {"Retry-After": "30"}
+    job["download"] = url_for("main.export_download", job_id=job["id"])
+    return jsonify({"success": True, "data": job}), 202
+
+# route for the status of one export job
+@bp.route("/api/exports/<job_id>", methods=["GET"])
+# A function to report an export job's progress
+def export_job_status(job_id):
+    """Returns the job's status (queued, running, done or failed) and bytes written."""
+    job = _own_export_job(job_id)
+    if job is None:
+        return jsonify({"success": False, "error": "Export job not found."}), 404
+    job["download"] = url_for("main.export_download", job_id=job_id)
+    return jsonify({"success": True, "data": job})
+
+# route for downloading a finished export
+@bp.route("/api/exports/<job_id>/download", methods=["GET"])
+# A function to send a finished export, with Range support for resuming
+def export_download(job_id):
+    """Serves the export file; clients resume broken downloads with a Range header."""
+    job = _own_export_job(job_id)
+    if job is None:
+        return jsonify({"success": False, "error": "Export job not found."}), 404
+    found = export_file(job_id)
+    if found is None:
+        return jsonify({"success": False, "error": f"Export is {job['status']}.", "data": job}), 409
+    path, download_name = found
+    mimetype = FORMATS[download_name.rsplit(".", 1)[1]][0]
+    return send_file(os.path.abspath(path), mimetype=mimetype, as_attachment=True,
+                     download_name=download_name, conditional=True)
+
+# A route for the liveness probe (no I/O, safe to poll every second)
+@bp.route("/api/health/live", methods=["GET"])
+# A function to report that the process is up
+def health_live():
+    """Returns 200 while the process can answer requests."""
+    return jsonify(health_handler.liveness()), 200
+
+# A route for the readiness probe (one trivial database query)
+@bp.route("/api/health/ready", methods=["GET"])
+# A function to report whether the database can serve queries
+def health_ready():
+    """Returns 200 when the database answers, 503 otherwise."""
+    report, ready = health_handler.readiness()
+    return jsonify(report), 200 if ready else 503
+
 # A route for health check of the API and database
-@app.route("/api/health", methods=["GET"])
-# A function to check the health of the API and database connection
+@bp.route("/api/health", methods=["GET"])
+# A function to report row counts, ingest lag and disk usage
 def health_check():
-    """Checks whether the database and API are functioning correctly."""
-    try:
-        # try to fetch some data from the database and store in data variable
-        data = get_all_traffic_data()
-        # if successful, return healthy status as JSON response
-        return jsonify({
-            "status": "healthy",
-            "records_in_db": len(data),
-            "message": "API and Database are operational "
-        }), 200
-    # catch any exceptions and return '500' error message and unhealthy status
-    except Exception as e:
-        # return unhealthy status as JSON response
-        return jsonify({
-            "status": "error",
-            "message": f"Health check failed: {e}"
-        }), 500
+    """Returns the cached deep health report (see health_handler)."""
+    report = health_handler.deep_health()
+    return jsonify(report), 500 if report["status"] == "error" else 200
+
+# route for Prometheus scraping
+@bp.route("/api/metrics", methods=["GET"])
+# A function to expose request and query metrics
+def metrics():
+    """
+    Returns request and query metrics in Prometheus text format, summed
+    over every worker when they share a METRICS_DIR.
+    """
+    return Response(render_metrics(current_app.config["METRICS_DIR"]), content_type=CONTENT_TYPE)
+
+# A function to check whether the caller is an admin
+def is_admin():
+    """True for ADMIN_USERS sessions or a matching X-Admin-Token header."""
+    token = current_app.config.get("ADMIN_TOKEN")
+    if token and request.headers.get("X-Admin-Token") == token:
+        return True
+    return session.get("user") in current_app.config.get("ADMIN_USERS", [])
+
+
+# route for listing and tuning request profiles (admin only)
+@bp.route("/api/profiles", methods=["GET", "POST"])
+# A function to list stored profiles or change the sampling rate
+def profiles():
+    """
+    GET lists stored flamegraph profiles (newest first).
+    POST {"sample_rate": 0.01} changes the random sampling rate at runtime,
+    for every worker (within about a second).
+    Profile a single request by adding ?profile=1 or an X-Profile: 1 header.
+    """
+    if not is_admin():
+        return jsonify({"success": False, "message": "Admin access required."}), 403
+    if request.method == "POST":
+        params = request.get_json(silent=True) or request.values
+        try:
+            profiling_handler.set_sample_rate(params.get("sample_rate", 0))
+        except (TypeError, ValueError) as e:
+            return jsonify({"success": False, "error": str(e)}), 400
+    return jsonify({"success": True, "sample_rate": profiling_handler.get_sample_rate(),
+                    "data": profiling_handler.list_profiles()})
+
+
+# route for downloading one profile (admin only)
+@bp.route("/api/profiles/<name>", methods=["GET"])
+# A function to download a folded-stack profile
+def download_profile(name):
+    """Returns a profile in folded-stack format (for flamegraph.pl / speedscope)."""
+    if not is_admin():
+        return jsonify({"success": False, "message": "Admin access required."}), 403
+    path = profiling_handler.store.path(name)
+    if path is None:
+        return jsonify({"success": False, "message": f"No profile named {name}."}), 404
+    return send_file(os.path.abspath(path), mimetype="text/plain", as_attachment=True, download_name=name)
+
 
 # route for handling 404 errors 
-@app.errorhandler(404)
+@bp.app_errorhandler(404)
 # A function to handle 404 Not Found errors 
 def page_not_found(e):
     """Custom 404 Not Found page."""
@@ -340,7 +750,7 @@ def page_not_found(e):
     }), 404
 
 # route for handling 500 internal server errors
-@app.errorhandler(500)
+@bp.app_errorhandler(500)
 # A function to handle 500 and handle server errors
 def server_error(e):
     """Custom 500 Internal Server Error page."""
@@ -351,7 +761,7 @@ def server_error(e):
     }), 500
 
 # root route for homepage rendering
-@app.route("/", methods=["GET"])
+@bp.route("/", methods=["GET"])
 # A function to render the homepage 
 def home():
     """Render the homepage as the default route."""
@@ -359,7 +769,7 @@ def home():
     return render_template("index.html", username=username)
 
 # root route for basic API status check
-@app.route("/api", methods=["GET"])
+@bp.route("/api", methods=["GET"])
 def map_info():
     """Root API route."""
     return jsonify({
@@ -377,14 +787,100 @@ def map_info():
                 "overall_stats": "/api/stats/overall",
                 "city_stats": "/api/stats/city/<city>"
             },
+            "map": {
+                "map_data": "/api/map_data",
+                "heatmap": "/api/heatmap?layer=<accidents|congestion>"
+            },
+            "cities": {
+                "suggest": "/api/cities/suggest?q=<prefix>"
+            },
+            "simulation": {
+                "recordings": "/api/recordings",
+                "replay": "/api/recordings/<name>?tick=<n>&count=<n>"
+            },
+            "exports": {
+                "stream": "/api/export/<traffic_data|accident_data>?format=<csv|jsonl|parquet>&city=&start=&end=",
+                "jobs": "/api/exports",
+                "download": "/api/exports/<job_id>/download"
+            },
             "alerts": "/api/alerts",
-            "health": "/api/health"
+            "health": "/api/health",
+            "liveness": "/api/health/live",
+            "readiness": "/api/health/ready",
+            "metrics": "/api/metrics"
         }
     })
 
+
+# A function to identify the caller for rate limiting
+def client_id():
+    """The logged-in username, or the remote address for anonymous callers."""
+    user = session.get("user")
+    return f"user:{user}" if user else request.remote_addr or "unknown"
+
+
+# A function to create the tables before the first request touches them
+def _init_db_once():
+    try: # handle any init errors
+        ensure_db() # initialize DB tables (no-op after the first call)
+    except Exception as e: # catch errors and log
+        # log error message
+        logger.exception("Database init failed: %s", e)
+
+
+# A function to build and configure the Flask app
+def create_app(config=None):
+    """
+    Creates the Flask app.
+
+    Args:
+        config (dict): Overrides for DEFAULT_CONFIG, e.g. {"DB_PATH": "test.db"}
+            or {"INIT_DB": False} when the database is set up elsewhere.
+    """
+    app = Flask(__name__, static_folder='static', template_folder='templates')
+    app.config.from_mapping(DEFAULT_CONFIG)
+    if config:
+        app.config.from_mapping(config)
+    # Set secret key for session management
+    app.secret_key = app.config["SECRET_KEY"]
+    db_handler.DB_PATH = app.config["DB_PATH"]
+    db_handler.DB_SHARDS = app.config["DB_SHARDS"]
+    # trust X-Forwarded-For/-Proto only from the configured proxies, so
+    # request.remote_addr (the rate limit key) is the real client
+    if app.config["PROXY_HOPS"] > 0:
+        hops = app.config["PROXY_HOPS"]
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=hops, x_proto=hops)
+
+    # request ids first, so every later hook and log line can use them
+    instrument_request_ids(app)
+
+    # time every request (registered early so it also covers the hooks below)
+    if app.config["METRICS"]:
+        instrument_app(app, app.config["METRICS_DIR"])
+
+    # reject over-limit and over-capacity requests before any work is done
+    instrument_throttling(app, client_id, app.config["RATE_LIMIT"], app.config["RATE_BURST"],
+                          app.config["MAX_CONCURRENT"], app.config["MAX_STREAMS"])
+
+    if app.config["PROFILING"]:
+        profiling_handler.instrument_profiling(app, is_admin)
+
+    # export jobs left queued or running by a stopped process will never finish
+    recover_export_jobs()
+
+    # Initialize database lazily, on the first request
+    if app.config["INIT_DB"]:
+        app.before_request(_init_db_once)
+
+    app.register_blueprint(bp)
+    return app
+
+
 if __name__ == "__main__":
+    # development server; use wsgi.py to serve with multiple workers
     port = int(os.environ.get("PORT", 5000))
+    debug = os.environ.get("FLASK_DEBUG", "0") == "1"
     print(" Starting Traffic & Accident Data Monitor Server...")
     print(f" Running on: http://127.0.0.1:{port}")
 
-    app.run(host="0.0.0.0", port=5002, debug=True)
\ No newline at end of file
+    create_app().run(host="0.0.0.0", port=port, debug=debug)
\ No newline at end of file
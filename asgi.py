@@ -0,0 +1,301 @@
+#
+# asgi.py
+#
+# Async entry point for the JSON API of the Traffic & Accident Data Monitor.
+#
+
+"""
+asgi.py
+----------------------------------------
+Serves the read-only JSON API as an ASGI app (uvicorn):
+
+    /api/stats/overall, /api/stats/city/<city>, /api/map_data,
+    /api/alerts, /api/health, /api/health/live, /api/health/ready,
+    /api/metrics
+
+Each request is a coroutine, so an idle or slow connection costs a few
+KB instead of a worker thread, and one process can hold thousands of
+them. The handlers themselves are the same synchronous functions the
+Flask app uses (stats_handler, map_handler, ...); they run on a bounded
+thread pool of ASYNC_DB_THREADS, which also caps how many SQLite
+connections are open at once. Requests beyond that wait on the event
+loop, not in the kernel's accept queue.
+
+The same throttle_handler rules as the Flask app apply: identical
+concurrent requests are coalesced, clients over RATE_LIMIT get 429 and
+expensive routes past MAX_CONCURRENT get an immediate 503. As there,
+the limits are per process, and behind a reverse proxy PROXY_HOPS says
+how many X-Forwarded-For entries to trust for the client address.
+
+Pages, sessions and the simulation streams stay on the Flask app
+(wsgi.py); put both behind the same proxy and route /api/* reads here.
+Responses are the same JSON, with the same status codes, as app.py.
+
+Usage:
+    python asgi.py                           # PORT, ASYNC_DB_THREADS from env
+    python asgi.py --port 8001 --db-threads 8
+    uvicorn asgi:app --port 8001             # same thing, uvicorn CLI
+
+Functions:
+    - create_asgi_app(config)
+    - serve(port, host, db_threads)
+"""
+
+import os
+import re
+import json
+import time
+import uuid
+import asyncio
+import argparse
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+
+from utils import db_handler, health_handler
+from utils.db_handler import ensure_db
+from utils.stats_handler import overall_summary, summarize_city_traffic
+from utils.alert_handler import generate_alerts
+from utils.map_handler import prepare_map_data
+from utils.metrics_handler import registry, render_metrics, start_flusher, CONTENT_TYPE
+from utils.throttle_handler import (coalesce, RateLimiter, ConcurrencyLimiter, EXPENSIVE_ROUTES, EXEMPT_ROUTES,
+                                    forwarded_client, RATE_LIMIT, RATE_BURST, MAX_CONCURRENT, PROXY_HOPS)
+from utils.log_handler import get_logger, request_id_var
+
+logger = get_logger(__name__)
+
+# -------------------------------------------------------------------
+# SERVER CONFIGURATION
+# -------------------------------------------------------------------
+PORT = int(os.environ.get("PORT", 5001))
+DB_THREADS = int(os.environ.get("ASYNC_DB_THREADS", min(32, (os.cpu_count() or 1) * 4)))
+
+DEFAULT_CONFIG = {
+    "DB_PATH": os.environ.get("DB_PATH", db_handler.DB_PATH),
+    "DB_SHARDS": int(os.environ.get("DB_SHARDS", db_handler.DB_SHARDS)),
+    "DB_THREADS": DB_THREADS,
+    "METRICS": True,
+    "METRICS_DIR": os.environ.get("METRICS_DIR") or None,
+    "INIT_DB": True,
+    "RATE_LIMIT": RATE_LIMIT,
+    "RATE_BURST": RATE_BURST,
+    "MAX_CONCURRENT": MAX_CONCURRENT,
+    "PROXY_HOPS": PROXY_HOPS,
+}
+
+
+# -------------------------------------------------------------------
+# ROUTE HANDLERS
+# Each returns (payload, status) and runs on the database thread pool.
+# -------------------------------------------------------------------
+def _overall_stats(params):
+    try:
+        stats = coalesce("stats_overall", overall_summary)
+        if not stats:
+            return {"success": False, "message": "No traffic data found."}, 404
+        return {"success": True, "data": stats}, 200
+    except Exception as e:
+        return {"success": False, "error": str(e)}, 500
+
+
+def _city_stats(params, city):
+    try:
+        stats = summarize_city_traffic(city)
+        if not stats:
+            return {"success": False, "message": f"No data found for {city}."}, 404
+        return {"success": True, "data": stats}, 200
+    except Exception as e:
+        return {"success": False, "error": str(e)}, 500
+
+
+def _map_data(params):
+    try:
+        city = params.get("city")
+        map_data = coalesce(("map_data", city), prepare_map_data, city)
+        return {"success": True, "count": len(map_data), "data": map_data}, 200
+    except Exception as e:
+        logger.exception("Map data retrieval failed: %s", e)
+        return {"success": False, "error": str(e), "message": "Failed to load map data."}, 500
+
+
+def _alerts(params):
+    try:
+        return {"success": True, "alerts": coalesce("alerts", generate_alerts)}, 200
+    except Exception as e:
+        return {"success": False, "error": str(e)}, 500
+
+
+def _health(params):
+    report = health_handler.deep_health()
+    return report, 500 if report["status"] == "error" else 200
+
+
+def _health_ready(params):
+    report, ready = health_handler.readiness()
+    return report, 200 if ready else 503
+
+
+# (route pattern, URL rule for metrics, handler); matched in order
+ROUTES = [
+    (re.compile(r"^/api/stats/overall$"), "/api/stats/overall", _overall_stats),
+    (re.compile(r"^/api/stats/city/([^/]+)$"), "/api/stats/city/<city>", _city_stats),
+    (re.compile(r"^/api/map_data$"), "/api/map_data", _map_data),
+    (re.compile(r"^/api/alerts$"), "/api/alerts", _alerts),
+    (re.compile(r"^/api/health$"), "/api/health", _health),
+    (re.compile(r"^/api/health/ready$"), "/api/health/ready", _health_ready),
+]
+
+
+# A function to send one complete JSON response
+async def _send_json(send, payload, status, request_id, retry_after=None):
+    body = json.dumps(payload, default=str).encode()
+    headers = [(b"content-type", b"application/json"),
+               (b"content-length", str(len(body)).encode()),
+               (b"x-request-id", request_id.encode())]
+    if retry_after is not None:
+        headers.append((b"retry-after", str(retry_after).encode()))
+    await send({"type": "http.response.start", "status": status, "headers": headers})
+    await send({"type": "http.response.body", "body": body})
+
+
+# A function to send one complete plain-text response
+async def _send_text(send, text, status, request_id):
+    body = text.encode()
+    headers = [(b"content-type", CONTENT_TYPE.encode()),
+               (b"content-length", str(len(body)).encode()),
+               (b"x-request-id", request_id.encode())]
+    await send({"type": "http.response.start", "status": status, "headers": headers})
+    await send({"type": "http.response.body", "body": body})
+
+
+# A function to build the ASGI app
+def create_asgi_app(config=None):
+    """
+    Creates the ASGI app.
+
+    Args:
+        config (dict): Overrides for DEFAULT_CONFIG, e.g. {"DB_PATH": "test.db"}
+            or {"DB_THREADS": 8}.
+    """
+    settings = {**DEFAULT_CONFIG, **(config or {})}
+    db_handler.DB_PATH = settings["DB_PATH"]
+    db_handler.DB_SHARDS = settings["DB_SHARDS"]
+    executor = ThreadPoolExecutor(max_workers=settings["DB_THREADS"], thread_name_prefix="asgi-db")
+    limiter = RateLimiter(settings["RATE_LIMIT"], settings["RATE_BURST"]) if settings["RATE_LIMIT"] > 0 else None
+    slots = ConcurrencyLimiter(settings["MAX_CONCURRENT"]) if settings["MAX_CONCURRENT"] > 0 else None
+
+    # A function to run a blocking call on the pool, keeping the request id for its log lines
+    async def run_blocking(func, *args):
+        context = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(executor, context.run, func, *args)
+
+    async def lifespan(receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                try:
+                    if settings["INIT_DB"]:
+                        await run_blocking(ensure_db)
+                except Exception as e:
+                    logger.exception("Database init failed: %s", e)
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                executor.shutdown(wait=False)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def app(scope, receive, send):
+        if scope["type"] == "lifespan":
+            return await lifespan(receive, send)
+        if scope["type"] != "http":
+            return
+
+        start = time.perf_counter()
+        headers = dict(scope.get("headers") or [])
+        incoming = headers.get(b"x-request-id", b"").decode("latin-1")
+        request_id = incoming[:64] if incoming else uuid.uuid4().hex
+        request_id_var.set(request_id)
+        if settings["METRICS"]:
+            start_flusher(settings["METRICS_DIR"])
+            registry.request_started()
+
+        path, method, rule, status, retry_after = scope["path"], scope["method"], "unmatched", 500, None
+        try:
+            if path == "/api/health/live":
+                # answered on the event loop: no pool slot, no I/O
+                rule = path
+                payload, status = health_handler.liveness(), 200
+            elif path == "/api/metrics":
+                # Prometheus text; summed over every worker sharing METRICS_DIR
+                rule = path
+                payload, status = await run_blocking(render_metrics, settings["METRICS_DIR"]), 200
+            else:
+                for pattern, route_rule, handler in ROUTES:
+                    match = pattern.match(path)
+                    if match:
+                        rule = route_rule
+                        break
+                else:
+                    handler = None
+
+                if handler is None:
+                    payload, status = {"success": False, "error": "Endpoint not found"}, 404
+                elif method != "GET":
+                    payload, status = {"success": False, "error": "Method not allowed"}, 405
+                else:
+                    client = forwarded_client((scope.get("client") or ("unknown",))[0],
+                                              headers.get(b"x-forwarded-for", b"").decode("latin-1"),
+                                              settings["PROXY_HOPS"])
+                    allowed, wait = (True, 0.0) if limiter is None or rule in EXEMPT_ROUTES else limiter.allow(client)
+                    guarded = slots is not None and rule in EXPENSIVE_ROUTES
+                    if not allowed:
+                        payload, status = {"success": False, "error": 429,
+                                           "message": "Too many requests. Please slow down."}, 429
+                        retry_after = max(1, round(wait))
+                    elif guarded and not slots.try_acquire():
+                        payload, status = {"success": False, "error": 503,
+                                           "message": "Server is busy. Please retry shortly."}, 503
+                        retry_after = 1
+                    else:
+                        params = {k: v[0] for k, v in parse_qs(scope.get("query_string", b"").decode()).items()}
+                        try:
+                            payload, status = await run_blocking(handler, params, *match.groups())
+                        finally:
+                            if guarded:
+                                slots.release()
+            if isinstance(payload, str):
+                await _send_text(send, payload, status, request_id)
+            else:
+                await _send_json(send, payload, status, request_id, retry_after)
+        finally:
+            if settings["METRICS"]:
+                registry.observe_request(method, rule, status, time.perf_counter() - start)
+                registry.request_finished()
+            request_id_var.set("-")
+
+    app.executor = executor
+    return app
+
+
+app = create_asgi_app()
+
+
+# A function to run the app under uvicorn
+def serve(port=PORT, host="0.0.0.0", db_threads=DB_THREADS):
+    """Starts uvicorn with a pool of `db_threads` threads for database work."""
+    try:
+        import uvicorn
+    except ImportError:
+        raise SystemExit("[ERROR] uvicorn is not installed (pip install uvicorn).")
+    asgi_app = app if db_threads == DB_THREADS else create_asgi_app({"DB_THREADS": db_threads})
+    print(f"[INFO] Serving JSON API on http://{host}:{port} with {db_threads} database threads.")
+    uvicorn.run(asgi_app, host=host, port=port, log_level="warning", access_log=False)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the async JSON API with uvicorn.")
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--db-threads", type=int, default=DB_THREADS)
+    args = parser.parse_args()
+    serve(args.port, args.host, args.db_threads)
@@ -0,0 +1,70 @@
+// Live updates over Server-Sent Events, with polling as a fallback.
+//
+// The server ends every stream after a few minutes (an "end" event, with a
+// "retry:" delay sent up front) and refuses new streams with 503 while it
+// has too many open. EventSource reconnects by itself after a normal end;
+// a refused stream is reopened here after a growing delay. Only after
+// MAX_STREAM_FAILURES failures in a row does the page poll instead, and the
+// polling stops as soon as a stream opens again.
+
+const MAX_STREAM_FAILURES = 3;
+const STREAM_RETRY_MS = 5000;
+const STREAM_RETRY_MAX_MS = 60000;
+
+// Opens `url` and calls handlers[eventName](data) for each event; calls
+// poll() every pollMs while the stream is unavailable
+function openLiveStream(url, handlers, poll, pollMs) {
+  let failures = 0;
+  let pollTimer = null;
+
+  function startPolling() {
+    if (pollTimer === null) {
+      poll();
+      pollTimer = setInterval(poll, pollMs);
+    }
+  }
+
+  function stopPolling() {
+    if (pollTimer !== null) {
+      clearInterval(pollTimer);
+      pollTimer = null;
+    }
+  }
+
+  if (!window.EventSource) {
+    startPolling();
+    return;
+  }
+
+  function connect() {
+    const source = new EventSource(url);
+
+    source.onopen = () => {
+      failures = 0;
+      stopPolling();
+    };
+
+    Object.entries(handlers).forEach(([name, handler]) => {
+      source.addEventListener(name, (event) => handler(event.data));
+    });
+
+    // a planned end: the browser reconnects after the server's retry delay
+    source.addEventListener("end", () => {
+      failures = 0;
+    });
+
+    source.onerror = () => {
+      failures += 1;
+      if (failures >= MAX_STREAM_FAILURES) {
+        startPolling();
+      }
+      // a refused stream (e.g. 503) is closed for good; reopen it ourselves
+      if (source.readyState === EventSource.CLOSED) {
+        const delay = Math.min(STREAM_RETRY_MS * 2 ** (failures - 1), STREAM_RETRY_MAX_MS);
+        setTimeout(connect, delay);
+      }
+    };
+  }
+
+  connect();
+}
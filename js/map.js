@@ -53,4 +53,31 @@ document.addEventListener("DOMContentLoaded", () => {
             Status: ${city.aqi <= 50 ? 'Good' : city.aqi <= 100 ? 'Moderate' : 'Unhealthy'}
         `);
     });
+
+    // Accident density overlay from the precomputed heatmap grid
+    const heatLayer = L.layerGroup().addTo(map);
+
+    async function loadHeatmap(layer = "accidents") {
+        try {
+            const response = await fetch(`/api/heatmap?layer=${layer}`);
+            const result = await response.json();
+            if (!result.success) return;
+
+            const grid = result.data;
+            heatLayer.clearLayers();
+            grid.cells.forEach(([row, col, value]) => {
+                const south = grid.origin.lat + row * grid.cell_size;
+                const west = grid.origin.lon + col * grid.cell_size;
+                L.rectangle([[south, west], [south + grid.cell_size, west + grid.cell_size]], {
+                    stroke: false,
+                    fillColor: "red",
+                    fillOpacity: 0.15 + 0.6 * (value / grid.max)
+                }).addTo(heatLayer);
+            });
+        } catch (error) {
+            console.error("⚠️ Error loading heatmap:", error);
+        }
+    }
+
+    loadHeatmap();
 });
\ No newline at end of file
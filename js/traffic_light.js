@@ -133,5 +133,12 @@ window.onload = () => {
   // RUN SIMULATION
   // ==========================================================
   animate();
-  setInterval(fetchTrafficLightState, 2000);
+
+  // Prefer pushed updates; poll only while the stream is unavailable
+  openLiveStream(
+    "/api/stream/traffic_light?rate=2",
+    { state: (data) => { lightState = JSON.parse(data); } },
+    fetchTrafficLightState,
+    2000
+  );
 };
\ No newline at end of file
@@ -1,148 +1,150 @@
-console.log("🚦 Traffic Flow Simulation — accidents + slowdowns active");
+console.log("🚗 Traffic Flow Simulation — live corridor");
 
 const canvas = document.getElementById("trafficCanvas");
 const ctx = canvas.getContext("2d");
 canvas.width = window.innerWidth * 0.9;
 canvas.height = window.innerHeight * 0.7;
 
-let cars = [];
-let accidentZones = [];
-
-// Function to spawn cars on lanes
-function spawnCar(lane) {
-  const yPos =
-    lane === "main"
-      ? canvas.height / 2 - 25
-      : lane === "merge"
-      ? canvas.height / 2 + 60
-      : canvas.height / 2 - 100;
-
-  cars.push({
-    x: lane === "merge" ? -80 : 50,
-    y: yPos,
-    lane,
-    color: `hsl(${Math.random() * 360}, 70%, 55%)`,
-    speed: 4,
-    merging: lane === "merge",
-    exiting: false,
+// Shared corridor sent by /api/stream/simulation (see utils/stream_handler.py)
+const STREAM_ROAD_LENGTH = 3000; // m
+const STREAM_LANES = 3;
+const KEYFRAME = 1;
+const HEADER_BYTES = 18; // <B I d I B: type, tick, time, count, light
+const LIGHT_NAMES = ["RED", "GREEN", "YELLOW"];
+
+// Stretch of road shown around the stop line, in meters
+const VIEW_BEFORE = 300;
+const VIEW_AFTER = 100;
+const CAR_LENGTH = 4.5;
+
+// Current picture: vehicle id -> { position (dm), lane }, and the light
+let road = { length: STREAM_ROAD_LENGTH, lanes: STREAM_LANES };
+let vehicles = null;
+let light = "RED";
+let framesApplied = 0;
+
+// Decode one base64 frame (header, ids, positions or changes, lanes)
+function decodeFrame(data) {
+  const raw = Uint8Array.from(atob(data), (c) => c.charCodeAt(0));
+  const view = new DataView(raw.buffer);
+  const type = view.getUint8(0);
+  const count = view.getUint32(13, true);
+  const extra = view.getUint8(17);
+
+  const ids = [];
+  const values = [];
+  const lanes = [];
+  let offset = HEADER_BYTES;
+  for (let i = 0; i < count; i++) ids.push(view.getUint32(offset + 4 * i, true));
+  offset += 4 * count;
+  for (let i = 0; i < count; i++) {
+    values.push(type === KEYFRAME ? view.getUint32(offset + 4 * i, true) : view.getInt16(offset + 2 * i, true));
+  }
+  offset += (type === KEYFRAME ? 4 : 2) * count;
+  for (let i = 0; i < count; i++) lanes.push(view.getUint8(offset + i));
+  return { type, ids, values, lanes, light: LIGHT_NAMES[extra] };
+}
+
+// Apply a keyframe (full state) or a delta (only vehicles that changed)
+function applyFrame(data) {
+  const frame = decodeFrame(data);
+  const span = STREAM_ROAD_LENGTH * 10;
+  road = { length: STREAM_ROAD_LENGTH, lanes: STREAM_LANES };
+  if (frame.type === KEYFRAME) {
+    vehicles = new Map();
+  } else if (vehicles === null) {
+    return; // wait for the next keyframe
+  }
+  frame.ids.forEach((id, i) => {
+    const previous = vehicles.get(id);
+    const position = frame.type === KEYFRAME
+      ? frame.values[i]
+      : ((previous ? previous.position : 0) + frame.values[i] + span) % span;
+    vehicles.set(id, { position, lane: frame.lanes[i] });
   });
+  light = frame.light;
+  framesApplied += 1;
+}
+
+// Polling fallback: this visitor's own simulation from /simulation
+async function fetchSimulation() {
+  const before = framesApplied;
+  try {
+    const response = await fetch("/simulation");
+    const state = await response.json();
+    if (framesApplied !== before) return; // the stream came back meanwhile
+    road = { length: 1000, lanes: 1 };
+    vehicles = new Map(state.car_positions.map((position, id) => [id, { position: position * 10, lane: 0 }]));
+    light = state.light;
+  } catch (error) {
+    console.error("⚠️ Error fetching simulation state:", error);
+  }
+}
+
+// Screen x of a road position (meters); the stop line sits at half the road
+function toScreen(meters) {
+  const stopLine = road.length / 2;
+  const offset = ((meters - stopLine + road.length * 1.5) % road.length) - road.length / 2;
+  return ((offset + VIEW_BEFORE) / (VIEW_BEFORE + VIEW_AFTER)) * canvas.width;
 }
 
 // Draw the road
 function drawRoad() {
+  const top = canvas.height / 2 - 60;
+  const laneHeight = 120 / road.lanes;
   ctx.fillStyle = "#1b1b1b";
-  ctx.fillRect(0, canvas.height / 2 - 60, canvas.width, 120);
+  ctx.fillRect(0, top, canvas.width, 120);
 
-  // Dashed center line
+  // Dashed lane lines
   ctx.strokeStyle = "yellow";
   ctx.lineWidth = 4;
-  for (let i = 0; i < canvas.width; i += 60) {
-    ctx.beginPath();
-    ctx.moveTo(i, canvas.height / 2);
-    ctx.lineTo(i + 30, canvas.height / 2);
-    ctx.stroke();
+  for (let lane = 1; lane < road.lanes; lane++) {
+    for (let i = 0; i < canvas.width; i += 60) {
+      ctx.beginPath();
+      ctx.moveTo(i, top + lane * laneHeight);
+      ctx.lineTo(i + 30, top + lane * laneHeight);
+      ctx.stroke();
+    }
   }
 
-  // Merge lane
+  // Stop line and signal
+  const x = toScreen(road.length / 2);
+  ctx.fillStyle = "white";
+  ctx.fillRect(x, top, 4, 120);
   ctx.beginPath();
-  ctx.moveTo(0, canvas.height / 2 + 120);
-  ctx.lineTo(300, canvas.height / 2);
-  ctx.lineTo(0, canvas.height / 2 + 60);
-  ctx.closePath();
+  ctx.arc(x, top - 30, 18, 0, Math.PI * 2);
+  ctx.fillStyle = light === "GREEN" ? "limegreen" : light === "YELLOW" ? "yellow" : "red";
   ctx.fill();
-
-  // Exit lane
-  ctx.beginPath();
-  ctx.moveTo(canvas.width - 300, canvas.height / 2);
-  ctx.lineTo(canvas.width, canvas.height / 2 - 120);
-  ctx.lineTo(canvas.width, canvas.height / 2 - 60);
-  ctx.closePath();
-  ctx.fill();
-}
-
-// Draw car
-function drawCar(car) {
-  ctx.fillStyle = car.color;
-  ctx.fillRect(car.x, car.y, 60, 35);
-}
-
-// Draw accident zones
-function drawAccidents() {
-  accidentZones.forEach(zone => {
-    ctx.fillStyle = "rgba(255, 0, 0, 0.6)";
-    ctx.beginPath();
-    ctx.arc(zone.x, zone.y, 50, 0, Math.PI * 2);
-    ctx.fill();
-  });
 }
 
-// Update cars
-function updateCars() {
-  cars.forEach(car => {
-    // Check if near accident
-    const nearAccident = accidentZones.some(zone => Math.abs(car.x - zone.x) < 150);
-
-    // Adjust speed
-    if (nearAccident) car.speed = 1; // slow down
-    else car.speed = Math.min(car.speed + 0.1, 4); // gradually speed back up
-
-    // Move
-    car.x += car.speed;
-
-    // Merge logic
-    if (car.merging) {
-      car.y -= 0.7;
-      if (car.y <= canvas.height / 2 - 25) {
-        car.merging = false;
-        car.lane = "main";
-      }
-    }
-
-    // Random exit logic
-    if (!car.exiting && car.lane === "main" && car.x > canvas.width - 400 && Math.random() < 0.02) {
-      car.exiting = true;
-    }
-
-    if (car.exiting) {
-      car.y -= 1;
-    }
+// Draw cars
+function drawCars() {
+  if (vehicles === null) return;
+  const top = canvas.height / 2 - 60;
+  const laneHeight = 120 / road.lanes;
+  const width = (CAR_LENGTH / (VIEW_BEFORE + VIEW_AFTER)) * canvas.width;
+  vehicles.forEach((car, id) => {
+    const x = toScreen(car.position / 10);
+    if (x < -width || x > canvas.width) return;
+    ctx.fillStyle = `hsl(${(id * 47) % 360}, 70%, 55%)`;
+    ctx.fillRect(x - width, top + car.lane * laneHeight + laneHeight * 0.2, width, laneHeight * 0.6);
   });
-
-  // Remove cars leaving screen
-  cars = cars.filter(car => car.x < canvas.width + 100 && car.y > -50);
-}
-
-// Trigger random accidents
-function triggerAccidents() {
-  if (Math.random() < 0.03 && accidentZones.length < 2) {
-    const randomCar = cars[Math.floor(Math.random() * cars.length)];
-    if (randomCar) {
-      accidentZones.push({ x: randomCar.x + 30, y: randomCar.y + 20 });
-      console.log("💥 Accident occurred at:", randomCar.x);
-
-      // Remove after 6 seconds
-      setTimeout(() => {
-        accidentZones.shift();
-      }, 6000);
-    }
-  }
 }
 
 // Animate everything
 function animate() {
   ctx.clearRect(0, 0, canvas.width, canvas.height);
   drawRoad();
-  drawAccidents();
-  updateCars();
-  cars.forEach(drawCar);
-  triggerAccidents();
+  drawCars();
   requestAnimationFrame(animate);
 }
 
-// Spawn cars every 2s
-setInterval(() => {
-  if (Math.random() < 0.7) spawnCar("main");
-  if (Math.random() < 0.4) spawnCar("merge");
-}, 2000);
+animate();
 
-animate();
\ No newline at end of file
+// Frames are pushed; poll only while the stream is unavailable
+openLiveStream(
+  "/api/stream/simulation?rate=5",
+  { keyframe: applyFrame, delta: applyFrame },
+  fetchSimulation,
+  2000
+);
@@ -0,0 +1,115 @@
+"""
+test_adaptive_signals.py
+------------------------------------
+Adaptive re-timing of a running SignalNetwork: a new plan never cuts a
+phase short, each intersection switches at its own cycle boundary, and
+the green wave still meets the platoon on the new cycle length. A failed
+congestion query is logged with its traceback and the last scores stay.
+
+Run with pytest, or directly:
+    python test_adaptive_signals.py
+"""
+
+import logging
+
+import numpy as np
+import pytest
+
+from utils import adaptive_signal_handler
+from utils.adaptive_signal_handler import AdaptiveSignalController, get_city_congestion
+from utils.traffic_light_handler import build_grid_network, GREEN, YELLOW, RED, GREEN_WAVE_SPEED, METERS_PER_DEGREE
+
+# (NS, EW) colors that may follow each other inside the cycle
+NEXT_STATE = {(GREEN, RED): (YELLOW, RED), (YELLOW, RED): (RED, GREEN),
+              (RED, GREEN): (RED, YELLOW), (RED, YELLOW): (GREEN, RED)}
+STEP = 0.05
+
+
+def _sample(network, start, end):
+    times = np.arange(start, end, STEP)
+    states = [network.states_at(t) for t in times]
+    return times, states
+
+
+@pytest.mark.parametrize("direction", ["north_south", "east_west"])
+def test_plan_change_keeps_phase_order(direction):
+    network = build_grid_network(rows=4, cols=4, green_wave=direction)
+    now = 1000.0 + 7.3
+    switched_by = network.set_plan(0, green_ns=40.0, green_ew=15.0, at=now)
+    assert now < switched_by <= now + 46.0 + 61.0
+
+    times, states = _sample(network, now - 50.0, switched_by + 70.0)
+    for i in range(network.count):
+        previous, changes_at = None, None
+        for t, (ns, ew, remaining) in zip(times, states):
+            state = (int(ns[i]), int(ew[i]))
+            if previous is not None and state != previous:
+                assert state == NEXT_STATE[previous], (i, t, previous, state)
+                # the change comes when the previous sample said it would
+                assert t == pytest.approx(changes_at, abs=STEP + 1e-6), (i, t)
+            previous, changes_at = state, t + remaining[i]
+
+
+def test_green_wave_survives_plan_change():
+    network = build_grid_network(rows=4, cols=4)
+    switched_by = network.set_plan(0, green_ns=35.0, green_ew=20.0, at=500.0)
+    cycle = network.cycle_lengths()[0]
+    arrival = (network.lat - network.lat.min()) * METERS_PER_DEGREE / GREEN_WAVE_SPEED
+    # a platoon leaving the edge at a cycle start after every intersection switched
+    depart = np.ceil(switched_by / cycle) * cycle
+    for i, t in enumerate(arrival + depart):
+        ns, _, remaining = network.states_at(t + 1e-6, np.array([i]))
+        assert ns[0] == GREEN
+        assert remaining[0] == pytest.approx(35.0, abs=1e-3)
+
+
+def test_change_during_switch_is_refused():
+    network = build_grid_network(rows=2, cols=2)
+    switched_by = network.set_plan(0, green_ns=30.0, at=100.0)
+    with pytest.raises(ValueError):
+        network.set_plan(0, green_ns=25.0, at=switched_by - 1.0)
+    network.set_plan(0, green_ns=25.0, at=switched_by)
+
+
+def test_controller_waits_for_switch():
+    network = build_grid_network(rows=3, cols=3)
+    controller = AdaptiveSignalController(network, congestion=1.0)
+    assert controller.update(0.0)
+    assert not controller.update(1.0)
+    assert controller.next_update >= network.new_from.max()
+    assert controller.update(controller.next_update)
+    assert len(controller.history) == 2
+
+
+
+class _Records(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+def test_failed_congestion_query_is_logged(monkeypatch):
+    monkeypatch.setattr(adaptive_signal_handler, "_congestion_cache", {"expires": 0.0, "scores": {"Boston": 0.4}})
+
+    def broken(hours):
+        raise RuntimeError("database is locked")
+
+    monkeypatch.setattr(adaptive_signal_handler, "get_congestion_by_city", broken)
+    handler = _Records()
+    adaptive_signal_handler.logger.addHandler(handler)
+    try:
+        assert get_city_congestion("Boston", now=100.0) == 0.4
+    finally:
+        adaptive_signal_handler.logger.removeHandler(handler)
+    record, = handler.records
+    assert record.levelno == logging.ERROR
+    # the queue handler renders the traceback before the record leaves this thread
+    assert "RuntimeError: database is locked" in record.exc_text
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(pytest.main([__file__, "-q"]))
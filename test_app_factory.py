@@ -0,0 +1,77 @@
+"""
+test_app_factory.py
+------------------------------------
+create_app() and the wsgi.py entry point: config overrides, lazy database
+setup, blueprint endpoints, and a WSGI module that is ready to fork.
+
+Run with pytest, or directly:
+    python test_app_factory.py
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+
+import pytest
+
+from app import create_app, DEFAULT_CONFIG
+from utils import db_handler
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+@pytest.fixture
+def tmp():
+    with tempfile.TemporaryDirectory() as path:
+        yield path
+
+
+def test_config_overrides_defaults(tmp):
+    app = create_app({"DB_PATH": os.path.join(tmp, "a.db"), "SECRET_KEY": "test"})
+    assert app.config["DB_PATH"] == os.path.join(tmp, "a.db")
+    assert app.secret_key == "test"
+    assert app.config["RATE_LIMIT"] == DEFAULT_CONFIG["RATE_LIMIT"]
+    assert db_handler.DB_PATH == app.config["DB_PATH"]
+
+
+def test_database_created_on_first_request(tmp):
+    path = os.path.join(tmp, "lazy.db")
+    app = create_app({"DB_PATH": path})
+    assert not os.path.exists(path)
+    assert app.test_client().get("/login").status_code == 200
+    assert os.path.exists(path)
+
+
+def test_init_db_off_leaves_database_alone(tmp):
+    path = os.path.join(tmp, "external.db")
+    app = create_app({"DB_PATH": path, "INIT_DB": False})
+    app.test_client().get("/login")
+    assert not os.path.exists(path)
+
+
+def test_pages_use_blueprint_endpoints(tmp):
+    app = create_app({"DB_PATH": os.path.join(tmp, "pages.db")})
+    client = app.test_client()
+    for page in ("/", "/login", "/register", "/forgot_password"):
+        assert client.get(page).status_code == 200, page
+    with app.test_request_context():
+        from flask import url_for
+        assert url_for("main.login") == "/login"
+
+
+def test_wsgi_module_initializes_once_before_fork(tmp):
+    # a fresh interpreter, as gunicorn --preload would import it
+    code = ("import wsgi; from utils import db_handler; "
+            "print(wsgi.app.config['INIT_DB'], wsgi.app.config['SHARED_SIM_SESSIONS'], "
+            "wsgi.app.config['MAX_STREAMS'] < wsgi.THREADS or wsgi.THREADS == 1)")
+    env = {**os.environ, "PYTHONPATH": ROOT, "DB_PATH": os.path.join(tmp, "wsgi.db"),
+           "WEB_THREADS": "4"}
+    result = subprocess.run([sys.executable, "-c", code], cwd=tmp, env=env,
+                            capture_output=True, text=True, check=True)
+    assert result.stdout.split()[-3:] == ["False", "True", "True"]
+    assert os.path.exists(os.path.join(tmp, "wsgi.db"))
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,181 @@
+"""
+test_asgi.py
+------------------------------------
+The async JSON API: the same payloads and status codes as the Flask
+routes, request ids, lifespan database setup, and the throttle_handler
+rules (429 over the rate limit, 503 past MAX_CONCURRENT).
+
+Run with pytest, or directly:
+    python test_asgi.py
+"""
+
+import asyncio
+import json
+import os
+import tempfile
+import threading
+from datetime import datetime
+
+import pytest
+
+import asgi
+from app import create_app
+from asgi import create_asgi_app
+from utils import db_handler
+
+
+@pytest.fixture
+def tmp():
+    with tempfile.TemporaryDirectory() as path:
+        yield path
+
+
+def _scope(path, method="GET", query=b"", headers=(), client="127.0.0.1"):
+    return {"type": "http", "method": method, "path": path, "query_string": query,
+            "headers": list(headers), "client": (client, 1)}
+
+
+async def _call(app, scope):
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        sent.append(message)
+
+    await app(scope, receive, send)
+    return sent[0]["status"], dict(sent[0]["headers"]), json.loads(sent[1]["body"])
+
+
+def _get(app, path, **kwargs):
+    return asyncio.run(_call(app, _scope(path, **kwargs)))
+
+
+def _seed():
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    db_handler.insert_bulk_traffic_data([
+        {"city": city, "traffic_level": level, "accidents": accidents, "avg_speed": speed,
+         "accident_type": None, "timestamp": now}
+        for city, level, accidents, speed in [("Berlin", "High", 2, 21.5), ("Berlin", "Low", 0, 48.0),
+                                              ("Paris", "Severe", 5, 9.0)]])
+
+
+def _without_jitter(payload):
+    """Drops map coordinates, which map_handler spreads out at random."""
+    if isinstance(payload.get("data"), list):
+        payload["data"] = [{k: v for k, v in row.items() if k not in ("latitude", "longitude")}
+                           for row in payload["data"]]
+    return payload
+
+
+def test_same_responses_as_flask(tmp):
+    path = os.path.join(tmp, "same.db")
+    flask_client = create_app({"DB_PATH": path, "RATE_LIMIT": 0}).test_client()
+    flask_client.get("/api/health/live")
+    db_handler.ensure_db()
+    _seed()
+    app = create_asgi_app({"DB_PATH": path, "RATE_LIMIT": 0, "METRICS": False})
+    try:
+        for url in ("/api/stats/overall", "/api/stats/city/Berlin", "/api/stats/city/Nowhere",
+                    "/api/map_data", "/api/alerts"):
+            status, _, payload = _get(app, url)
+            expected = flask_client.get(url)
+            assert status == expected.status_code, url
+            assert _without_jitter(payload) == _without_jitter(expected.get_json()), url
+        status, _, payload = _get(app, "/api/health/ready")
+        assert status == 200 and payload["status"] == flask_client.get("/api/health/ready").get_json()["status"]
+    finally:
+        app.executor.shutdown()
+
+
+def test_unknown_paths_and_methods(tmp):
+    app = create_asgi_app({"DB_PATH": os.path.join(tmp, "a.db"), "INIT_DB": False, "METRICS": False})
+    assert _get(app, "/api/nothing")[0] == 404
+    assert _get(app, "/api/alerts", method="POST")[0] == 405
+    status, _, payload = _get(app, "/api/health/live")
+    assert status == 200 and payload["status"] == "alive"
+    app.executor.shutdown()
+
+
+def test_request_ids_are_echoed_or_generated(tmp):
+    app = create_asgi_app({"DB_PATH": os.path.join(tmp, "a.db"), "INIT_DB": False, "METRICS": False})
+    _, headers, _ = _get(app, "/api/health/live", headers=[(b"x-request-id", b"req-7")])
+    assert headers[b"x-request-id"] == b"req-7"
+    _, headers, _ = _get(app, "/api/health/live")
+    assert len(headers[b"x-request-id"]) == 32
+    app.executor.shutdown()
+
+
+def test_lifespan_creates_the_database(tmp):
+    path = os.path.join(tmp, "lifespan.db")
+    app = create_asgi_app({"DB_PATH": path, "METRICS": False})
+    messages = iter([{"type": "lifespan.startup"}, {"type": "lifespan.shutdown"}])
+    sent = []
+
+    async def receive():
+        return next(messages)
+
+    async def send(message):
+        sent.append(message["type"])
+
+    asyncio.run(app({"type": "lifespan"}, receive, send))
+    assert sent == ["lifespan.startup.complete", "lifespan.shutdown.complete"]
+    assert os.path.exists(path)
+
+
+def test_rate_limit_returns_429(tmp):
+    app = create_asgi_app({"DB_PATH": os.path.join(tmp, "a.db"), "INIT_DB": False, "METRICS": False,
+                           "RATE_LIMIT": 1, "RATE_BURST": 2})
+    statuses = [_get(app, "/api/stats/city/Berlin")[0] for _ in range(3)]
+    assert statuses[2] == 429
+    status, headers, _ = _get(app, "/api/stats/city/Berlin")
+    assert status == 429 and int(headers[b"retry-after"]) >= 1
+    # another client and the exempt probes are not limited
+    assert _get(app, "/api/stats/city/Berlin", client="10.0.0.2")[0] != 429
+    assert _get(app, "/api/health/live")[0] == 200
+    app.executor.shutdown()
+
+
+def test_rate_limit_uses_forwarded_address_behind_proxies(tmp):
+    app = create_asgi_app({"DB_PATH": os.path.join(tmp, "a.db"), "INIT_DB": False, "METRICS": False,
+                           "RATE_LIMIT": 0.01, "RATE_BURST": 1, "PROXY_HOPS": 1})
+    proxy = "172.16.0.2"
+    assert _get(app, "/api/stats/city/Berlin", client=proxy,
+                headers=[(b"x-forwarded-for", b"1.1.1.1")])[0] != 429
+    assert _get(app, "/api/stats/city/Berlin", client=proxy,
+                headers=[(b"x-forwarded-for", b"6.6.6.6, 1.1.1.1")])[0] == 429
+    assert _get(app, "/api/stats/city/Berlin", client=proxy,
+                headers=[(b"x-forwarded-for", b"2.2.2.2")])[0] != 429
+    app.executor.shutdown()
+
+
+def test_busy_expensive_route_returns_503(tmp, monkeypatch):
+    entered, release = threading.Event(), threading.Event()
+
+    def slow_summary():
+        entered.set()
+        release.wait(5)
+        return {"records": 1}
+
+    monkeypatch.setattr(asgi, "overall_summary", slow_summary)
+    app = create_asgi_app({"DB_PATH": os.path.join(tmp, "a.db"), "INIT_DB": False, "METRICS": False,
+                           "RATE_LIMIT": 0, "MAX_CONCURRENT": 1})
+
+    async def scenario():
+        first = asyncio.ensure_future(_call(app, _scope("/api/stats/overall")))
+        while not entered.is_set():
+            await asyncio.sleep(0.01)
+        second = await _call(app, _scope("/api/stats/city/Berlin"))
+        release.set()
+        return await first, second
+
+    first, second = asyncio.run(scenario())
+    assert first[0] == 200
+    assert second[0] == 503 and second[1][b"retry-after"] == b"1"
+    app.executor.shutdown()
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,90 @@
+"""
+test_benchmark_runner.py
+------------------------------------
+Simulation benchmark suite: case expansion, one tiny run of every case
+(leaving the app's shared light and engine state as it found it), and
+regression detection against a saved baseline.
+
+Run with pytest, or directly:
+    python test_benchmark_runner.py
+"""
+
+import json
+import os
+import tempfile
+
+import pytest
+
+from utils import simulation_handler, traffic_light_handler
+from utils.benchmark_runner import build_cases, run_case, compare_results, main, CASES
+
+METRICS = ("steps_per_second", "p50_us", "p95_us", "p99_us", "peak_memory_kb")
+
+
+def test_build_cases_sweeps_each_axis():
+    cases = build_cases(vehicles=[10, 20], intersections=[4], steps=[3, 5])
+    keys = [c["key"] for c in cases]
+    assert len(keys) == len(set(keys))
+    assert "engine_step[vehicles=20,steps=5]" in keys
+    assert "network_states[intersections=4,steps=3]" in keys
+    # cases without a size axis run once per step count
+    assert [k for k in keys if k.startswith("get_intersection_state")] == [
+        "get_intersection_state[steps=3]", "get_intersection_state[steps=5]"]
+    assert {c["name"] for c in build_cases([10], [4], [3], only=["engine_step"])} == {"engine_step"}
+
+
+def _shared_state():
+    return (simulation_handler.current_light, simulation_handler.last_switch, simulation_handler._engine,
+            dict(traffic_light_handler.lights), traffic_light_handler.last_switch_time)
+
+
+@pytest.mark.parametrize("name", list(CASES))
+def test_every_case_runs(name):
+    case = build_cases(vehicles=[10], intersections=[9], steps=[3], only=[name])[0]
+    before = _shared_state()
+    row = run_case(case)
+    assert _shared_state() == before
+    assert row["key"] == case["key"]
+    assert row["steps_per_second"] > 0
+    assert 0 < row["p50_us"] <= row["p95_us"] <= row["p99_us"]
+    assert row["peak_memory_kb"] >= 0
+
+
+def _row(key="engine_step[vehicles=10,steps=3]", **metrics):
+    row = {"key": key, "steps_per_second": 1000.0, "p50_us": 100.0, "p95_us": 150.0,
+           "p99_us": 200.0, "peak_memory_kb": 64.0}
+    row.update(metrics)
+    return row
+
+
+def test_compare_flags_only_real_regressions():
+    baseline = {"results": [_row()]}
+    assert compare_results([_row(steps_per_second=850.0, p95_us=170.0)], baseline, 0.2) == []
+    regressions = compare_results([_row(steps_per_second=700.0, p95_us=200.0, peak_memory_kb=200.0)],
+                                  baseline, 0.2)
+    assert sorted(r["metric"] for r in regressions) == ["p95_us", "peak_memory_kb", "steps_per_second"]
+    # cases the baseline does not know are skipped
+    assert compare_results([_row(key="new[steps=3]", steps_per_second=1.0)], baseline, 0.2) == []
+
+
+def test_save_then_compare(capsys):
+    argv = ["--only", "engine_step", "--vehicles", "10", "--steps", "3"]
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "baseline.json")
+        assert main(argv + ["--save", path]) == 0
+        with open(path) as f:
+            saved = json.load(f)
+        assert [r["key"] for r in saved["results"]] == ["engine_step[vehicles=10,steps=3]"]
+        assert all(metric in saved["results"][0] for metric in METRICS)
+
+        # a baseline far faster than any machine makes the run a regression
+        saved["results"][0]["steps_per_second"] = 1e12
+        with open(path, "w") as f:
+            json.dump(saved, f)
+        assert main(argv + ["--compare", path]) == 1
+        assert "steps_per_second" in capsys.readouterr().out
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(pytest.main([__file__, "-q"]))
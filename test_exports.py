@@ -0,0 +1,183 @@
+"""
+test_exports.py
+------------------------------------
+Table exports: streamed CSV/JSONL with filters, and background export
+jobs - login, per-user visibility, the active-job limits across worker
+processes, resumable downloads, and failing jobs whose process has gone
+away even when its pid now belongs to another process.
+
+Run with pytest, or directly:
+    python test_exports.py
+"""
+
+import csv
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import pytest
+
+from app import create_app
+from utils import db_handler, export_handler
+from utils.export_handler import recover_export_jobs, ExportBusy
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+@pytest.fixture
+def app(monkeypatch):
+    with tempfile.TemporaryDirectory() as tmp:
+        monkeypatch.setattr(export_handler, "EXPORT_DIR", os.path.join(tmp, "exports"))
+        monkeypatch.setattr(export_handler, "_job_locks", {})
+        app = create_app({"DB_PATH": os.path.join(tmp, "export.db"), "RATE_LIMIT": 0, "ADMIN_USERS": ["root"]})
+        db_handler.ensure_db()
+        db_handler.insert_bulk_traffic_data([
+            {"city": city, "traffic_level": "Low", "accidents": 0, "avg_speed": 40.0 + day,
+             "accident_type": None, "timestamp": f"2025-01-0{day} 08:00:00"}
+            for day in range(1, 6) for city in ("Boston", "Denver")])
+        yield app
+
+
+def _client(app, user=None):
+    client = app.test_client()
+    if user:
+        with client.session_transaction() as session:
+            session["user"] = user
+    return client
+
+
+def _wait(client, job_id, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = client.get(f"/api/exports/{job_id}").get_json()["data"]
+        if job["status"] in ("done", "failed"):
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f"export {job_id} did not finish")
+
+
+def test_stream_csv_with_filters(app):
+    response = _client(app).get("/api/export/traffic_data?city=Boston&start=2025-01-02&end=2025-01-03")
+    assert response.status_code == 200
+    rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+    assert [row["timestamp"] for row in rows] == ["2025-01-02 08:00:00", "2025-01-03 08:00:00"]
+    assert {row["city"] for row in rows} == {"Boston"}
+
+
+def test_stream_jsonl_in_small_batches(app):
+    chunks = list(export_handler.stream_export("traffic_data", "jsonl", batch_size=3))
+    rows = [json.loads(line) for chunk in chunks for line in chunk.decode().splitlines()]
+    assert len(chunks) == 4 and len(rows) == 10
+    assert [row["timestamp"] for row in rows] == sorted(row["timestamp"] for row in rows)
+
+
+@pytest.mark.parametrize("query", ["format=xml", "start=yesterday", "end=2025-13-01"])
+def test_bad_parameters_are_400(app, query):
+    assert _client(app).get(f"/api/export/traffic_data?{query}").status_code == 400
+    assert _client(app).get("/api/export/users").status_code == 400
+
+
+def test_jobs_need_login(app):
+    client = _client(app)
+    assert client.get("/api/exports").status_code == 401
+    assert client.post("/api/exports", json={"table": "traffic_data"}).status_code == 401
+    # a job started with the admin token has no owner; that doesn't make it anyone's
+    app.config["ADMIN_TOKEN"] = "t0ken"
+    job_id = client.post("/api/exports", json={"table": "traffic_data"},
+                         headers={"X-Admin-Token": "t0ken"}).get_json()["data"]["id"]
+    assert client.get(f"/api/exports/{job_id}").status_code == 404
+
+
+def test_job_runs_and_resumes_download(app):
+    client = _client(app, "alice")
+    response = client.post("/api/exports", json={"table": "traffic_data", "format": "csv", "city": "Denver"})
+    assert response.status_code == 202
+    job = _wait(client, response.get_json()["data"]["id"])
+    assert job["status"] == "done" and job["owner"] == "alice"
+
+    full = client.get(f"/api/exports/{job['id']}/download")
+    assert full.status_code == 200
+    assert full.data.count(b"Denver") == 5
+    part = client.get(f"/api/exports/{job['id']}/download", headers={"Range": "bytes=10-"})
+    assert part.status_code == 206 and part.data == full.data[10:]
+
+
+def test_jobs_are_private_to_their_owner(app):
+    alice = _client(app, "alice")
+    job_id = alice.post("/api/exports", json={"table": "accident_data"}).get_json()["data"]["id"]
+    _wait(alice, job_id)
+
+    bob = _client(app, "bob")
+    assert bob.get("/api/exports").get_json()["data"] == []
+    assert bob.get(f"/api/exports/{job_id}").status_code == 404
+    assert bob.get(f"/api/exports/{job_id}/download").status_code == 404
+    assert [job["id"] for job in _client(app, "root").get("/api/exports").get_json()["data"]] == [job_id]
+
+
+def test_active_jobs_are_limited(app, monkeypatch):
+    # jobs stay queued: nothing runs them
+    monkeypatch.setattr(export_handler, "_run_job", lambda job: None)
+    monkeypatch.setattr(export_handler, "EXPORT_USER_JOBS", 2)
+    monkeypatch.setattr(export_handler, "EXPORT_QUEUE_LIMIT", 3)
+    alice, bob, carol = _client(app, "alice"), _client(app, "bob"), _client(app, "carol")
+    statuses = [alice.post("/api/exports", json={"table": "traffic_data"}).status_code for _ in range(3)]
+    assert statuses == [202, 202, 429]
+    assert bob.post("/api/exports", json={"table": "traffic_data"}).status_code == 202
+    response = carol.post("/api/exports", json={"table": "traffic_data"})
+    assert response.status_code == 429 and response.headers["Retry-After"] == "30"
+
+
+def test_stale_jobs_fail_at_startup(app, monkeypatch):
+    monkeypatch.setattr(export_handler, "_run_job", lambda job: None)
+    client = _client(app, "alice")
+    mine = client.post("/api/exports", json={"table": "traffic_data"}).get_json()["data"]["id"]
+    stale = client.post("/api/exports", json={"table": "traffic_data"}).get_json()["data"]["id"]
+    # the process that queued it is gone (its lock with it), and a restart
+    # handed its pid to a live process: this one
+    export_handler._job_locks.pop(stale).close()
+    job = export_handler.get_export_job(stale)
+    job.update(status="running", pid=os.getpid())
+    export_handler._save_job(job)
+    _, data_path = export_handler._job_paths(stale)
+    open(f"{data_path}.part", "wb").close()
+
+    create_app({"DB_PATH": app.config["DB_PATH"], "RATE_LIMIT": 0})
+    assert export_handler.get_export_job(stale)["status"] == "failed"
+    assert not os.path.exists(f"{data_path}.part")
+    assert not os.path.exists(export_handler._lock_path(stale))
+    # a job this process still holds is left alone
+    assert export_handler.get_export_job(mine)["status"] == "queued"
+    assert recover_export_jobs() == []
+
+
+def test_other_workers_jobs_count_until_they_exit(app, monkeypatch):
+    monkeypatch.setattr(export_handler, "EXPORT_USER_JOBS", 2)
+    # another worker queues two jobs for bob and keeps them until told to exit
+    code = ("import sys; from utils import export_handler as e; e.EXPORT_DIR = %r; "
+            "e._run_job = lambda job: None; "
+            "[e.submit_export_job('traffic_data', owner='bob') for _ in range(2)]; "
+            "print('ready', flush=True); sys.stdin.read()" % export_handler.EXPORT_DIR)
+    worker = subprocess.Popen([sys.executable, "-c", code], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                              cwd=ROOT, text=True)
+    assert worker.stdout.readline().strip() == "ready"
+    try:
+        with pytest.raises(ExportBusy):
+            export_handler.submit_export_job("traffic_data", owner="bob")
+        assert recover_export_jobs() == []
+    finally:
+        worker.stdin.close()
+        worker.wait(timeout=10)
+
+    # once it has exited, its jobs fail and free bob's slots
+    monkeypatch.setattr(export_handler, "_run_job", lambda job: None)
+    assert export_handler.submit_export_job("traffic_data", owner="bob")["status"] == "queued"
+    statuses = sorted(job["status"] for job in export_handler.list_export_jobs("bob"))
+    assert statuses == ["failed", "failed", "queued"]
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
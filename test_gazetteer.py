@@ -0,0 +1,37 @@
+"""
+test_gazetteer.py
+------------------------------------
+City lookups behind the map markers and the /traffic_data search.
+
+Coordinates must come from an exact (or near-identical) name only;
+anything else resolves to None so no marker lands on the wrong city.
+
+Run with pytest, or directly:
+    python test_gazetteer.py
+"""
+
+from utils.gazetteer_handler import resolve_city, resolve_coordinates, suggest_cities
+
+
+def test_exact_name_resolves():
+    assert resolve_city("New York", strict=True)["state"] == "NY"
+    assert resolve_coordinates("st. louis") == resolve_coordinates("Saint Louis") is not None
+
+
+def test_typo_resolves_strictly():
+    assert resolve_city("Seatle", strict=True)["name"] == "Seattle"
+
+
+def test_unrelated_names_get_no_coordinates():
+    for name in ["Unknown", "X", "Up", "Springfeld Gardens Heights"]:
+        assert resolve_coordinates(name) is None, name
+
+
+def test_loose_lookup_still_serves_search():
+    assert resolve_city("san franc")["name"] == "San Francisco"
+    assert [c["name"] for c in suggest_cities("san f", limit=1)] == ["San Francisco"]
+
+
+if __name__ == "__main__":
+    for name in ["New York", "Seatle", "Unknown", "X", "san franc"]:
+        print(f"[TEST] {name!r}: strict {resolve_coordinates(name)}, loose {(resolve_city(name) or {}).get('name')}")
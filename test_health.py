@@ -0,0 +1,142 @@
+"""
+test_health.py
+------------------------------------
+Health probes: liveness without I/O, readiness after one read-only query
+(a missing database or shard is not ready), and the deep report with
+its row counts, ingest lag, cache and single rebuilder.
+
+Run with pytest, or directly:
+    python test_health.py
+"""
+
+import os
+import sqlite3
+import tempfile
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import create_app
+from utils import db_handler, health_handler
+
+
+@pytest.fixture
+def app():
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_app({"DB_PATH": os.path.join(tmp, "health.db"), "RATE_LIMIT": 0})
+        db_handler.ensure_db()
+        health_handler._cache.update(report=None, expires=0.0)
+        yield app
+        health_handler._cache.update(report=None, expires=0.0)
+
+
+def _traffic(city, age_seconds):
+    stamp = (datetime.now() - timedelta(seconds=age_seconds)).strftime(health_handler.TIMESTAMP_FORMAT)
+    return {"city": city, "traffic_level": "Low", "accidents": 0, "avg_speed": 50.0,
+            "accident_type": None, "timestamp": stamp}
+
+
+def test_liveness_touches_no_database(app, monkeypatch):
+    monkeypatch.setattr(db_handler, "ping", lambda: pytest.fail("liveness queried the database"))
+    report = health_handler.liveness()
+    assert report["status"] == "alive"
+    assert app.test_client().get("/api/health/live").status_code == 200
+
+
+def test_readiness_follows_the_database(app, monkeypatch):
+    client = app.test_client()
+    response = client.get("/api/health/ready")
+    assert response.status_code == 200
+    assert response.get_json()["status"] == "ready"
+
+    monkeypatch.setattr(db_handler, "DB_PATH", os.path.join(app.config["DB_PATH"], "missing", "x.db"))
+    report, ready = health_handler.readiness()
+    assert not ready and report["status"] == "unavailable"
+
+
+def test_missing_shard_is_not_ready_or_created(app, monkeypatch):
+    monkeypatch.setattr(db_handler, "DB_SHARDS", 2)
+    shards = db_handler.data_paths()
+    with pytest.raises(sqlite3.Error):
+        db_handler.ping()
+    assert not any(os.path.exists(path) for path in shards)
+
+    db_handler.ensure_db()
+    db_handler.ping()
+
+
+def test_deep_report_counts_rows_and_lag(app):
+    report = health_handler.deep_health(force=True)
+    assert report["status"] == "degraded"
+    assert report["problems"] == ["no traffic data yet"]
+
+    db_handler.insert_bulk_traffic_data([_traffic("Berlin", 60), _traffic("Paris", 10)])
+    report = health_handler.deep_health(force=True)
+    assert report["status"] == "healthy"
+    assert report["records_in_db"] == 2
+    assert 5 <= report["ingest_lag_seconds"] < health_handler.MAX_INGEST_LAG
+    assert report["disk"]["db_bytes"] > 0
+
+    response = app.test_client().get("/api/health")
+    assert response.status_code == 200
+    assert response.get_json()["records_in_db"] == 2
+
+
+def test_stale_data_is_degraded(app):
+    db_handler.insert_bulk_traffic_data([_traffic("Berlin", health_handler.MAX_INGEST_LAG + 600)])
+    report = health_handler.deep_health(force=True)
+    assert report["status"] == "degraded"
+    assert report["problems"] == ["traffic data is stale"]
+
+
+def test_report_is_cached_until_it_expires(app, monkeypatch):
+    builds = []
+    monkeypatch.setattr(health_handler, "_build_report", lambda: builds.append(1) or {"status": "healthy"})
+    first = health_handler.deep_health()
+    assert health_handler.deep_health() is first
+    assert len(builds) == 1
+
+    health_handler._cache["expires"] = 0.0
+    health_handler.deep_health()
+    assert len(builds) == 2
+    health_handler.deep_health(force=True)
+    assert len(builds) == 3
+
+
+def test_callers_get_the_old_report_during_a_rebuild(app, monkeypatch):
+    old = {"status": "healthy", "generation": 1}
+    health_handler._cache.update(report=old, expires=0.0)
+    started, release = threading.Event(), threading.Event()
+
+    def slow_build():
+        started.set()
+        release.wait(5)
+        return {"status": "healthy", "generation": 2}
+
+    monkeypatch.setattr(health_handler, "_build_report", slow_build)
+    rebuilder = threading.Thread(target=health_handler.deep_health)
+    rebuilder.start()
+    assert started.wait(5)
+    try:
+        # the rebuild is still running: other callers don't wait for it
+        assert health_handler.deep_health() is old
+    finally:
+        release.set()
+        rebuilder.join()
+    assert health_handler.deep_health()["generation"] == 2
+
+
+def test_database_errors_return_500(app, monkeypatch):
+    def broken():
+        raise RuntimeError("disk I/O error")
+
+    monkeypatch.setattr(db_handler, "get_table_stats", broken)
+    response = app.test_client().get("/api/health")
+    assert response.status_code == 500
+    assert response.get_json()["status"] == "error"
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,80 @@
+"""
+test_heatmap.py
+------------------------------------
+Heatmap grids: bad time bounds are rejected, points without coordinates
+are dropped, and rows written behind this process's back (another
+worker, the importer) show up after the next change check.
+
+Run with pytest, or directly:
+    python test_heatmap.py
+"""
+
+import os
+import sqlite3
+import tempfile
+import warnings
+from contextlib import closing
+from datetime import datetime
+
+import pytest
+
+from app import create_app
+from utils import db_handler, heatmap_handler
+
+
+@pytest.fixture
+def database(monkeypatch):
+    with tempfile.TemporaryDirectory() as tmp:
+        monkeypatch.setattr(db_handler, "DB_PATH", os.path.join(tmp, "heatmap.db"))
+        monkeypatch.setattr(db_handler, "DB_SHARDS", 0)
+        monkeypatch.setattr(heatmap_handler, "HEATMAP_CHECK_SECONDS", 0)
+        db_handler.init_db()
+        heatmap_handler.rebuild_heatmaps()
+        yield db_handler.DB_PATH
+
+
+def _total(layer="accidents"):
+    return sum(value for _, _, value in heatmap_handler.get_heatmap(layer)["cells"])
+
+
+def test_listener_rows_are_binned_once(database):
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    db_handler.insert_bulk_traffic_data([{"city": "Chicago", "traffic_level": "High", "accidents": 2,
+                                          "avg_speed": 20, "accident_type": None, "timestamp": now}])
+    assert _total() == 2
+    # the change check finds nothing new, so no rebuild double counts
+    assert _total() == 2
+
+
+def test_rows_written_elsewhere_appear(database):
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    with closing(sqlite3.connect(database)) as conn, conn:
+        conn.execute("INSERT INTO accident_data (city, date, fatal, type, description) "
+                     "VALUES ('Boston', ?, 0, 'Rear-end', '')", (now[:10],))
+    assert _total() == 1
+
+
+def test_points_without_coordinates_are_dropped(database):
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    before = heatmap_handler._version
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        version = heatmap_handler.add_points("accidents", [float("nan"), 41.9], [-87.6, float("inf")], [now, now])
+    assert version == before and _total() == 0
+    heatmap_handler.add_points("accidents", [float("nan"), 41.9], [-87.6, -87.6], [now, now], [5, 3])
+    assert _total() == 3
+
+
+def test_bad_time_bounds_are_rejected(database):
+    for bounds in ({"start": "not-a-date"}, {"end": "2024-13-45"}):
+        with pytest.raises(ValueError):
+            heatmap_handler.get_heatmap("accidents", **bounds)
+
+    app = create_app({"DB_PATH": database, "INIT_DB": False, "RATE_LIMIT": 0})
+    response = app.test_client().get("/api/heatmap?start=yesterday")
+    assert response.status_code == 400
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,111 @@
+"""
+test_imports.py
+------------------------------------
+Bulk imports: time values (including impossible dates that look like
+ISO text), column mapping, rejected rows, dry runs, and resuming from
+the checkpoints of an earlier run.
+
+Run with pytest, or directly:
+    python test_imports.py
+"""
+
+import json
+import os
+import sqlite3
+import tempfile
+from contextlib import closing
+
+import pytest
+
+from utils import db_handler
+from utils.import_handler import _to_time, import_file, split_ranges
+
+
+@pytest.fixture
+def tmp(monkeypatch):
+    with tempfile.TemporaryDirectory() as path:
+        monkeypatch.setattr(db_handler, "DB_PATH", os.path.join(path, "import.db"))
+        monkeypatch.setattr(db_handler, "DB_SHARDS", 0)
+        yield path
+
+
+def _rows(table):
+    with closing(sqlite3.connect(db_handler.DB_PATH)) as conn:
+        return conn.execute(f"SELECT * FROM {table} ORDER BY id;").fetchall()
+
+
+@pytest.mark.parametrize("value, kind, expected", [
+    ("2025-01-31", "date", "2025-01-31"),
+    (" 2025-01-31 ", "date", "2025-01-31"),
+    ("2025-01-01 10:00:00", "datetime", "2025-01-01 10:00:00"),
+    ("2025-01-01T10:00:00", "datetime", "2025-01-01 10:00:00"),
+    ("2025-01-01T10:00:00.250", "datetime", "2025-01-01 10:00:00"),
+    ("2025-01-01", "datetime", "2025-01-01 00:00:00"),
+    ("03/04/2025", "date", "2025-03-04"),
+    ("2024-02-29", "date", "2024-02-29"),
+])
+def test_time_values(value, kind, expected):
+    assert _to_time(value, kind) == expected
+
+
+@pytest.mark.parametrize("value, kind", [
+    ("2025-13-01", "date"),
+    ("2025-02-30", "date"),
+    ("2025-00-10", "date"),
+    ("2025-01-01 25:00:00", "datetime"),
+    ("2025-01-01T10:61:00", "datetime"),
+    ("2025-01-01X10:00:00", "datetime"),
+    ("2025-01-01 10:00+01", "datetime"),
+    ("yesterday", "date"),
+])
+def test_invalid_time_values_are_rejected(value, kind):
+    with pytest.raises(ValueError):
+        _to_time(value, kind)
+
+
+def test_csv_import_with_mapping_and_rejects(tmp):
+    path = os.path.join(tmp, "crashes.csv")
+    with open(path, "w") as f:
+        f.write("CRASH DATE,BOROUGH,Fatal,Type\n"
+                "2025-01-02,Queens,1,rear-end\n"
+                "2025-02-30,Queens,0,side\n"          # no such day
+                "01/05/2025,Bronx,,head-on\n"
+                ",Bronx,0,side\n")                    # missing date
+    summary = import_file(path, "accident_data", mapping={"CRASH DATE": "date", "BOROUGH": "city"},
+                          workers=1, progress=False)
+    assert (summary["imported"], summary["rejected"]) == (2, 2)
+    assert any("2025-02-30" in error for error in summary["errors"])
+    assert [(row[1], row[2], row[3]) for row in _rows("accident_data")] == [
+        ("Queens", "2025-01-02", 1), ("Bronx", "2025-01-05", 0)]
+
+
+def test_jsonl_import_resumes_from_checkpoints(tmp):
+    path = os.path.join(tmp, "traffic.jsonl")
+    with open(path, "w") as f:
+        for i in range(200):
+            f.write(json.dumps({"City": f"City{i % 7}", "traffic_level": "Low", "avg_speed": "42.0",
+                                "timestamp": f"2025-01-01T10:{i % 60:02d}:00"}) + "\n")
+    chunk = os.path.getsize(path) // 4
+    assert len(split_ranges(path, chunk)) >= 4
+
+    dry = import_file(path, "traffic_data", workers=1, chunk_bytes=chunk, dry_run=True, progress=False)
+    assert dry["imported"] == 200 and not os.path.exists(db_handler.DB_PATH)
+
+    first = import_file(path, "traffic_data", workers=2, chunk_bytes=chunk, progress=False)
+    assert first["imported"] == 200 and first["rejected"] == 0
+    again = import_file(path, "traffic_data", workers=2, chunk_bytes=chunk, progress=False)
+    assert again["imported"] == 0 and again["skipped_ranges"] == again["ranges"]
+    rows = _rows("traffic_data")
+    assert len(rows) == 200
+    # ranges commit in whatever order the workers finish them
+    assert min(row[1:] for row in rows) == ("City0", "Low", 0, 42, None, "2025-01-01 10:00:00")
+
+
+def test_unknown_table_is_refused(tmp):
+    with pytest.raises(ValueError):
+        import_file(os.path.join(tmp, "x.csv"), "users")
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,88 @@
+"""
+test_light_timing.py
+------------------------------------
+Signal timing checks: next_light_state and the parameter sweep reject
+zero, negative or missing phase durations instead of dividing by zero,
+and a sweep run checks its timer once rather than on every tick.
+
+Run with pytest, or directly:
+    python test_light_timing.py
+"""
+
+import pytest
+
+from utils import simulation_handler, sweep_runner
+from utils.simulation_handler import next_light_state, validate_timer, light_timer
+from utils.sweep_runner import build_sweep, run_sweep, main
+
+
+GOOD_TIMER = {"RED": 5, "GREEN": 6, "YELLOW": 2}
+
+
+def test_default_timer_cycles():
+    assert next_light_state("RED", 0.0, light_timer["RED"] + 0.1)[0] == "GREEN"
+    assert next_light_state("GREEN", 0.0, 1.0) == ("GREEN", 0.0)
+
+
+def test_custom_timer_cycles():
+    light, last_switch = next_light_state("RED", 0.0, 5.5, GOOD_TIMER)
+    assert (light, last_switch) == ("GREEN", 5.0)
+    assert validate_timer(GOOD_TIMER) == {"RED": 5.0, "GREEN": 6.0, "YELLOW": 2.0}
+
+
+@pytest.mark.parametrize("bad", [
+    {"RED": 0, "GREEN": 0, "YELLOW": 0},
+    {"RED": 5, "GREEN": -1, "YELLOW": 2},
+    {"RED": 5, "GREEN": 6},
+    {"RED": 5, "GREEN": "soon", "YELLOW": 2},
+    {"RED": 5, "GREEN": float("nan"), "YELLOW": 2},
+    {"RED": 5, "GREEN": float("inf"), "YELLOW": 2},
+])
+def test_bad_timer_rejected(bad):
+    with pytest.raises(ValueError):
+        next_light_state("RED", 0.0, 100.0, bad)
+    with pytest.raises(ValueError):
+        build_sweep([bad], [10], [0], duration=10)
+
+
+@pytest.mark.parametrize("demands, duration", [([0], 10), ([-5], 10), ([10], 0), ([10], -1)])
+def test_bad_sweep_parameters_rejected(demands, duration):
+    with pytest.raises(ValueError):
+        build_sweep([GOOD_TIMER], demands, [0], duration=duration)
+
+
+def test_cli_reports_usage_error(capsys):
+    with pytest.raises(SystemExit) as exit_info:
+        main(["--green", "0", "--red", "0", "--yellow", "0", "--duration", "5"])
+    assert exit_info.value.code == 2
+    assert "duration must be a positive" in capsys.readouterr().err
+
+
+def test_small_sweep_runs():
+    configs = build_sweep([GOOD_TIMER], [10], [0, 1], duration=20)
+    results = run_sweep(configs, workers=1)
+    assert [row["run"] for row in results] == [0, 1]
+    assert all(row["green"] == 6.0 for row in results)
+
+
+
+def test_sweep_run_validates_its_timer_once(monkeypatch):
+    calls = []
+
+    def counting(timer):
+        calls.append(timer)
+        return validate_timer(timer)
+
+    monkeypatch.setattr(simulation_handler, "validate_timer", counting)
+    monkeypatch.setattr(sweep_runner, "validate_timer", counting)
+    config, = build_sweep([GOOD_TIMER], [10], [0], duration=20)
+    calls.clear()
+    row = sweep_runner.run_one(config)
+    assert len(calls) == 1 and row["duration"] == 20
+    with pytest.raises(ValueError):
+        sweep_runner.run_one(dict(config, timer={"RED": 5, "GREEN": 0, "YELLOW": 2}))
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,132 @@
+"""
+test_load_tester.py
+------------------------------------
+The HTTP load harness without a real server run: response parsing over
+keep-alive connections, per-route summaries, the weighted request mix,
+and baseline comparisons that flag regressions.
+
+Run with pytest, or directly:
+    python test_load_tester.py
+"""
+
+import asyncio
+import json
+import os
+import sqlite3
+import tempfile
+from collections import Counter
+from contextlib import closing
+
+import pytest
+
+from utils import db_handler
+from utils.load_tester import (run_load, summarize, mixed_paths, compare_reports, save_baseline, seed_synthetic,
+                               MIXED_ROUTES, LATENCY_SLACK_MS)
+
+# canned responses: Content-Length, chunked, and a rate-limited request
+RESPONSES = {
+    b"/length": b"HTTP/1.1 200 OK\r\nContent-Length: 5\r\n\r\nhello",
+    b"/chunked": b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n3\r\nabc\r\n2\r\nde\r\n0\r\n\r\n",
+    b"/limited": b"HTTP/1.1 429 Too Many Requests\r\nContent-Length: 0\r\n\r\n",
+    b"/missing": b"HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\n\r\n",
+    b"/broken": b"HTTP/1.1 500 Internal Server Error\r\nContent-Length: 2\r\nConnection: close\r\n\r\nno",
+}
+
+
+async def _serve(reader, writer):
+    try:
+        while True:
+            request = await reader.readuntil(b"\r\n\r\n")
+            path = request.split(b" ")[1]
+            writer.write(RESPONSES[path])
+            await writer.drain()
+            if b"Connection: close" in RESPONSES[path]:
+                break
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+def test_run_load_reads_every_response_kind():
+    async def scenario():
+        server = await asyncio.start_server(_serve, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        async with server:
+            return await run_load("127.0.0.1", port, [p.decode() for p in RESPONSES], connections=3, duration=0.3)
+
+    samples, elapsed = asyncio.run(scenario())
+    report = summarize(samples, elapsed)
+    assert {"/length", "/chunked", "/limited", "/missing", "/broken", "all"} <= set(report)
+    assert report["/length"]["errors"] == report["/chunked"]["errors"] == 0
+    assert report["/limited"]["shed"] == report["/limited"]["requests"] > 0
+    assert report["/missing"]["errors"] == 0                    # 404 is an answer, not a failure
+    assert report["/broken"]["errors"] == report["/broken"]["requests"] > 0
+    assert report["all"]["requests"] == len(samples)
+    # keep-alive: every request got a status, none failed on the socket
+    assert all(status is not None for _, status, _ in samples)
+
+
+def test_summarize_groups_cities_and_ranks_latency():
+    samples = [(f"/api/stats/city/C{i}", 200, i / 1000) for i in range(1, 101)]
+    samples.append(("/api/map_data?city=C1", None, 0.5))
+    report = summarize(samples, elapsed=2.0)
+    city = report["/api/stats/city/<city>"]
+    assert city["requests"] == 100 and city["rps"] == 50.0
+    assert (city["p50_ms"], city["p95_ms"], city["p99_ms"]) == (51.0, 95.0, 99.0)
+    assert report["/api/map_data"]["errors"] == 1
+
+
+def test_mixed_paths_follow_the_weights():
+    cities = ["Boston", "New York"]
+    paths = mixed_paths(cities, seed=1)
+    assert paths == mixed_paths(cities, seed=1)
+    assert paths != mixed_paths(cities, seed=2)
+    assert len(paths) == sum(weight for _, weight in MIXED_ROUTES) * len(cities)
+    counts = Counter(paths)
+    assert counts["/api/stats/city/New%20York"] == 3
+    assert counts["/api/alerts"] == 2 * len(cities)
+
+
+def _results(rps=100.0, p95=10.0, p99=20.0, errors=0):
+    return {10: {"/api/alerts": {"requests": 100, "shed": 0, "errors": errors, "rps": rps,
+                                 "p50_ms": 5.0, "p95_ms": p95, "p99_ms": p99}}}
+
+
+def test_compare_reports_flags_regressions():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "baseline.json")
+        save_baseline(_results(), path, {"server": "sync"})
+        with open(path) as f:
+            baseline = json.load(f)
+    assert baseline["settings"] == {"server": "sync"}
+
+    assert compare_reports(_results(), baseline) == []
+    # inside the threshold (and the absolute latency slack) is not a regression
+    assert compare_reports(_results(rps=75.0, p95=13.0 + LATENCY_SLACK_MS), baseline) == []
+    regressions = compare_reports(_results(rps=60.0, p99=30.0, errors=1), baseline)
+    assert {(r["key"], r["metric"]) for r in regressions} == {
+        ("/api/alerts @ 10", "rps"), ("/api/alerts @ 10", "p99_ms"), ("/api/alerts @ 10", "errors")}
+    assert compare_reports(_results(rps=60.0), baseline, threshold=0.5) == []
+    # routes the baseline never measured are skipped
+    assert compare_reports({100: _results()[10]}, baseline) == []
+
+
+def test_seed_synthetic_fills_the_database():
+    previous = db_handler.DB_PATH, db_handler.DB_SHARDS
+    db_handler.DB_SHARDS = 0
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "harness.db")
+            names = seed_synthetic(path, cities=2, days=1)
+            assert len(names) == 2
+            with closing(sqlite3.connect(path)) as conn:
+                cities = {city for (city,) in conn.execute("SELECT DISTINCT city FROM traffic_data;")}
+            assert cities == set(names)
+    finally:
+        db_handler.DB_PATH, db_handler.DB_SHARDS = previous
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,81 @@
+"""
+test_logging.py
+------------------------------------
+Queued JSON logging: one line per record with the request id, and a
+working writer thread in processes forked after logging started (as
+gunicorn --preload forks its workers).
+
+Run with pytest, or directly:
+    python test_logging.py
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+FORK_SCRIPT = """
+import os, sys
+from utils import log_handler
+log_handler.setup_logging(stream=open(sys.argv[1], "a", buffering=1))
+log = log_handler.get_logger("forktest")
+log.info("parent before fork")
+pids = []
+for n in range(2):
+    pid = os.fork()
+    if pid == 0:
+        log.info("child %d", n)
+        log_handler.shutdown_logging()
+        os._exit(0)
+    pids.append(pid)
+for pid in pids:
+    os.waitpid(pid, 0)
+log.info("parent after fork")
+log_handler.shutdown_logging()
+"""
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs fork()")
+def test_forked_children_write_their_logs():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "log.jsonl")
+        subprocess.run([sys.executable, "-c", FORK_SCRIPT, path], env={**os.environ, "PYTHONPATH": ROOT},
+                       check=True, timeout=30)
+        with open(path) as f:
+            messages = [json.loads(line)["message"] for line in f]
+    assert sorted(messages) == ["child 0", "child 1", "parent after fork", "parent before fork"]
+
+
+REQUEST_SCRIPT = """
+import sys
+from utils import log_handler
+log_handler.setup_logging(stream=open(sys.argv[1], "a", buffering=1))
+import app
+client = app.create_app({"DB_PATH": sys.argv[2], "RATE_LIMIT": 0}).test_client()
+response = client.get("/login", headers={"X-Request-ID": "req-42"})
+assert response.headers["X-Request-ID"] == "req-42"
+assert len(client.get("/login").headers["X-Request-ID"]) == 32
+log_handler.shutdown_logging()
+"""
+
+
+def test_lines_carry_the_request_id():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "log.jsonl")
+        subprocess.run([sys.executable, "-c", REQUEST_SCRIPT, path, os.path.join(tmp, "log.db")],
+                       env={**os.environ, "PYTHONPATH": ROOT}, check=True, timeout=30)
+        with open(path) as f:
+            lines = [json.loads(line) for line in f]
+    # the database is initialized inside the first request
+    init = [line for line in lines if line["logger"] == "utils.db_handler"]
+    assert init and init[0]["request_id"] == "req-42"
+    assert init[0]["level"] == "INFO"
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
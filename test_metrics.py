@@ -0,0 +1,156 @@
+"""
+test_metrics.py
+------------------------------------
+Prometheus metrics: histograms and counters, and the shared METRICS_DIR
+that lets /api/metrics on any worker (Flask or ASGI) report the sum over
+every worker process, folding exited workers (including one whose pid
+was reused) into retired totals that never go backwards.
+
+Run with pytest, or directly:
+    python test_metrics.py
+"""
+
+import asyncio
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+
+import pytest
+
+from app import create_app
+from asgi import create_asgi_app
+from utils.metrics_handler import MetricsRegistry, render_metrics, registry, _snapshot_name, RETIRED_FILE
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def _sample(text, name, **labels):
+    """Returns the value of one sample line, or None."""
+    wanted = ",".join(f'{k}="{v}"' for k, v in labels.items())
+    pattern = rf"^{re.escape(name)}\{{{re.escape(wanted)}\}} (\S+)$" if labels else rf"^{re.escape(name)} (\S+)$"
+    match = re.search(pattern, text, re.MULTILINE)
+    return float(match.group(1)) if match else None
+
+
+@pytest.fixture
+def tmp():
+    with tempfile.TemporaryDirectory() as path:
+        yield path
+
+
+def test_histogram_and_counters():
+    metrics = MetricsRegistry()
+    for seconds in (0.001, 0.02, 3.0):
+        metrics.observe_request("GET", "/api/x", 200, seconds)
+    metrics.observe_query("get_rows", 0.002, 7)
+    metrics.observe_query("get_rows", 0.002, 0, failed=True)
+    text = metrics.render()
+    assert _sample(text, "http_requests_total", method="GET", route="/api/x", status="200") == 3
+    assert _sample(text, "http_request_duration_seconds_bucket", method="GET", route="/api/x", le="0.025") == 2
+    assert _sample(text, "http_request_duration_seconds_bucket", method="GET", route="/api/x", le="+Inf") == 3
+    assert _sample(text, "db_query_rows_total", query="get_rows") == 7
+    assert _sample(text, "db_query_errors_total", query="get_rows") == 1
+
+
+def test_snapshots_are_summed(tmp):
+    other = MetricsRegistry()
+    other.observe_request("GET", "/api/summed", 200, 0.01)
+    other.in_flight = 4
+    # a worker that has exited: its counters stay, its in-flight requests don't
+    snapshot = {**other.snapshot(), "pid": 2 ** 22 + 12345}
+    with open(os.path.join(tmp, "metrics-dead.json"), "w") as f:
+        json.dump(snapshot, f)
+
+    registry.observe_request("GET", "/api/summed", 200, 0.01)
+    text = render_metrics(tmp)
+    assert _sample(text, "http_requests_total", method="GET", route="/api/summed", status="200") == 2
+    assert _sample(text, "http_requests_in_flight") == registry.in_flight
+    assert _sample(text, "metrics_workers") == 1
+
+
+def _write_worker(tmp, name, requests, **fields):
+    other = MetricsRegistry()
+    for _ in range(requests):
+        other.observe_request("GET", "/api/retired", 200, 0.01)
+    with open(os.path.join(tmp, name), "w") as f:
+        json.dump({**other.snapshot(), **fields}, f)
+
+
+def _retired_count(tmp):
+    return _sample(render_metrics(tmp), "http_requests_total", method="GET", route="/api/retired", status="200")
+
+
+def test_exited_workers_are_folded_once(tmp):
+    # same pid as this process but an earlier start: the pid was reused
+    _write_worker(tmp, f"metrics-{os.getpid()}-1.json", 2, start="1")
+    _write_worker(tmp, "metrics-gone.json", 3, pid=2 ** 22 + 12345, start="42")
+    assert _retired_count(tmp) == 5
+    assert sorted(os.listdir(tmp)) == sorted([RETIRED_FILE, _snapshot_name(), "metrics.lock"])
+    assert _retired_count(tmp) == 5
+
+    # the next worker to exit adds to the retired totals
+    _write_worker(tmp, "metrics-next.json", 4, pid=2 ** 22 + 12346, start="43")
+    assert _retired_count(tmp) == 9
+    assert _sample(render_metrics(tmp), "metrics_workers") == 1
+
+
+def test_folded_file_left_behind_is_not_counted_twice(tmp):
+    _write_worker(tmp, "metrics-gone.json", 3, pid=2 ** 22 + 12345, start="42")
+    assert _retired_count(tmp) == 3
+    # a crash between writing the retired totals and deleting the file
+    with open(os.path.join(tmp, RETIRED_FILE)) as f:
+        assert json.load(f)["folded"] == ["metrics-gone.json"]
+    _write_worker(tmp, "metrics-gone.json", 3, pid=2 ** 22 + 12345, start="42")
+    assert _retired_count(tmp) == 3
+    assert not os.path.exists(os.path.join(tmp, "metrics-gone.json"))
+
+
+def test_flask_workers_share_metrics(tmp):
+    # another worker process serves three requests and exits
+    code = ("import app; client = app.create_app({'DB_PATH': %r, 'METRICS_DIR': %r, 'RATE_LIMIT': 0})"
+            ".test_client(); [client.get('/api/health/live') for _ in range(3)]; "
+            "from utils.metrics_handler import flush_metrics; flush_metrics(%r)"
+            % (os.path.join(tmp, "a.db"), tmp, tmp))
+    subprocess.run([sys.executable, "-c", code], cwd=tmp, env={**os.environ, "PYTHONPATH": ROOT}, check=True)
+
+    before = _sample(registry.render(), "http_requests_total", method="GET",
+                     route="/api/health/live", status="200") or 0
+    client = create_app({"DB_PATH": os.path.join(tmp, "b.db"), "METRICS_DIR": tmp, "RATE_LIMIT": 0}).test_client()
+    client.get("/api/health/live")
+    text = client.get("/api/metrics").get_data(as_text=True)
+    assert _sample(text, "http_requests_total", method="GET", route="/api/health/live",
+                   status="200") == before + 1 + 3
+
+
+def _asgi_get(app, path):
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": "GET", "path": path, "query_string": b"", "headers": [],
+             "client": ("127.0.0.1", 1)}
+    asyncio.run(app(scope, receive, send))
+    headers = dict(sent[0]["headers"])
+    return sent[0]["status"], headers[b"content-type"].decode(), sent[1]["body"].decode()
+
+
+def test_asgi_serves_metrics(tmp):
+    app = create_asgi_app({"DB_PATH": os.path.join(tmp, "asgi.db"), "METRICS_DIR": tmp, "INIT_DB": False})
+    _asgi_get(app, "/api/health/live")
+    status, content_type, text = _asgi_get(app, "/api/metrics")
+    assert status == 200
+    assert content_type.startswith("text/plain")
+    assert _sample(text, "http_requests_total", method="GET", route="/api/health/live", status="200") >= 1
+    assert os.path.exists(os.path.join(tmp, _snapshot_name()))
+    app.executor.shutdown()
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,129 @@
+"""
+test_passwords.py
+------------------------------------
+scrypt password hashes: the stored format, verification, upgrading
+plaintext and older-work-factor rows on login, and the bounded hash pool
+that answers 503 instead of queueing without limit.
+
+Run with pytest, or directly:
+    python test_passwords.py
+"""
+
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from contextlib import closing
+
+import pytest
+
+from app import create_app
+from utils import db_handler, password_handler, user_handler
+from utils.password_handler import HashPool, HashPoolBusy, hash_password, verify_password, check_password
+from utils.user_handler import register_user, login_user
+
+
+@pytest.fixture
+def app():
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_app({"DB_PATH": os.path.join(tmp, "users.db"), "RATE_LIMIT": 0})
+        db_handler.ensure_db()
+        yield app
+
+
+def _stored(username):
+    with closing(sqlite3.connect(db_handler.DB_PATH)) as conn:
+        return conn.execute("SELECT password FROM users WHERE username = ?", (username,)).fetchone()[0]
+
+
+def _set_stored(username, value):
+    with closing(sqlite3.connect(db_handler.DB_PATH)) as conn:
+        conn.execute("UPDATE users SET password = ? WHERE username = ?", (value, username))
+        conn.commit()
+
+
+def test_hash_format_and_verify():
+    stored = hash_password("s3cret")
+    prefix, n, r, p, salt, digest = stored.split("$")
+    assert (prefix, int(n), int(r), int(p)) == ("scrypt", password_handler.SCRYPT_N,
+                                                password_handler.SCRYPT_R, password_handler.SCRYPT_P)
+    assert hash_password("s3cret") != stored          # fresh salt every time
+    assert verify_password("s3cret", stored)
+    assert not verify_password("S3cret", stored)
+    assert check_password("s3cret", stored) == (True, None)
+
+
+def test_register_stores_only_the_hash(app):
+    assert register_user("ada", "ada@example.com", "s3cret")["status"] == "success"
+    assert _stored("ada").startswith("scrypt$")
+    assert "s3cret" not in _stored("ada")
+    assert login_user("ada", "s3cret")["status"] == "success"
+    assert login_user("ada", "wrong")["message"] == "Incorrect password."
+
+
+def test_plaintext_rows_are_upgraded_on_login(app):
+    register_user("bob", "bob@example.com", "hunter2")
+    _set_stored("bob", "hunter2")
+    assert login_user("bob", "wrong")["status"] == "fail"
+    assert _stored("bob") == "hunter2"
+    assert login_user("bob", "hunter2")["status"] == "success"
+    assert _stored("bob").startswith("scrypt$")
+    assert login_user("bob", "hunter2")["status"] == "success"
+
+
+def test_older_work_factor_is_upgraded_on_login(app):
+    register_user("cy", "cy@example.com", "pw")
+    salt = os.urandom(password_handler.SALT_BYTES)
+    old = password_handler._scrypt("pw", salt, n=2 ** 10)
+    _set_stored("cy", f"scrypt$1024$8$1${password_handler._b64(salt)}${password_handler._b64(old)}")
+    assert login_user("cy", "pw")["status"] == "success"
+    assert _stored("cy").split("$")[1] == str(password_handler.SCRYPT_N)
+
+
+def test_pool_rejects_jobs_past_its_queue_limit():
+    pool = HashPool(workers=1, queue_limit=1)
+    started, release = threading.Event(), threading.Event()
+
+    def slow():
+        started.set()
+        release.wait(5)
+        return "done"
+
+    results = []
+    worker = threading.Thread(target=lambda: results.append(pool.run(slow)))
+    worker.start()
+    assert started.wait(5)
+    with pytest.raises(HashPoolBusy):
+        pool.run(lambda: "never runs")
+    release.set()
+    worker.join()
+    assert results == ["done"]
+    # the slot is freed by a done-callback, which may finish just after result()
+    deadline = time.monotonic() + 5
+    while pool.pending and time.monotonic() < deadline:
+        time.sleep(0.001)
+    assert pool.pending == 0
+    assert pool.run(lambda: "again") == "again"
+
+
+def test_busy_pool_answers_503(app, monkeypatch):
+    register_user("dee", "dee@example.com", "pw")
+
+    def busy(*args):
+        raise HashPoolBusy("password hashing queue is full")
+
+    monkeypatch.setattr(user_handler, "check_password", busy)
+    monkeypatch.setattr(user_handler, "hash_password", busy)
+    client = app.test_client()
+    response = client.post("/login", data={"username": "dee", "password": "pw"})
+    assert response.status_code == 503
+    assert user_handler.BUSY_MESSAGE.encode() in response.data.replace(b"&#39;", b"'")
+    response = client.post("/register", data={"username": "eve", "email": "eve@example.com",
+                                                "password": "pw", "confirm_password": "pw"})
+    assert response.status_code == 503
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,83 @@
+"""
+test_profiling.py
+------------------------------------
+Request profiler: admin-only access, flagged requests saved as folded
+stacks, and a sampling rate that every worker process picks up.
+
+Run with pytest, or directly:
+    python test_profiling.py
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+
+import pytest
+
+from app import create_app
+from utils import profiling_handler
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+@pytest.fixture
+def profile_dir(monkeypatch):
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = os.path.join(tmp, "profiles")
+        monkeypatch.setattr(profiling_handler, "store", profiling_handler.ProfileStore(directory))
+        monkeypatch.setattr(profiling_handler, "_settings",
+                            {"sample_rate": 0.0, "checked": None, "mtime": None})
+        monkeypatch.setattr(profiling_handler, "SAMPLE_RATE", 0.0)
+        yield directory
+
+
+@pytest.fixture
+def client(profile_dir):
+    app = create_app({"DB_PATH": os.path.join(profile_dir, "..", "profiles.db"), "RATE_LIMIT": 0,
+                      "ADMIN_USERS": ["root"]})
+    yield app.test_client()
+
+
+def test_profiles_are_admin_only(client):
+    assert client.get("/api/profiles").status_code == 403
+    assert client.post("/api/profiles", json={"sample_rate": 1}).status_code == 403
+    with client.session_transaction() as sess:
+        sess["user"] = "root"
+    assert client.get("/api/profiles").status_code == 200
+    assert client.post("/api/profiles", json={"sample_rate": 2}).status_code == 400
+
+
+def test_flagged_request_is_saved(client, profile_dir):
+    with client.session_transaction() as sess:
+        sess["user"] = "root"
+    response = client.get("/simulation?steps=2000&seed=1&vehicles=500&profile=1")
+    name = response.headers.get("X-Profile-File")
+    assert name and os.path.exists(os.path.join(profile_dir, name))
+    folded = client.get(f"/api/profiles/{name}").get_data(as_text=True)
+    assert "app.run_simulation" in folded
+
+
+def test_rate_reaches_other_workers(client, profile_dir, monkeypatch):
+    monkeypatch.setattr(profiling_handler, "RATE_CHECK_SECONDS", 0.0)
+    with client.session_transaction() as sess:
+        sess["user"] = "root"
+    assert client.post("/api/profiles", json={"sample_rate": 0.25}).get_json()["sample_rate"] == 0.25
+
+    # another worker process reads the rate this one set
+    code = ("from utils import profiling_handler as p; "
+            f"p.store = p.ProfileStore({profile_dir!r}); print(p.get_sample_rate())")
+    result = subprocess.run([sys.executable, "-c", code], env={**os.environ, "PYTHONPATH": ROOT},
+                            capture_output=True, text=True, check=True)
+    assert float(result.stdout.split()[-1]) == 0.25
+
+    # and a rate set by another worker reaches this one
+    code = (f"from utils import profiling_handler as p; p.store = p.ProfileStore({profile_dir!r}); "
+            "p.set_sample_rate(0.5)")
+    subprocess.run([sys.executable, "-c", code], env={**os.environ, "PYTHONPATH": ROOT}, check=True)
+    assert profiling_handler.get_sample_rate() == 0.5
+    assert client.get("/api/profiles").get_json()["sample_rate"] == 0.5
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
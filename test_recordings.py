@@ -0,0 +1,87 @@
+"""
+test_recordings.py
+------------------------------------
+Simulation recordings: seeking matches streaming, and /api/recordings
+caps the work, disk space and replay size of each request.
+
+Run with pytest, or directly:
+    python test_recordings.py
+"""
+
+import os
+import tempfile
+
+import pytest
+
+from app import create_app
+from utils import recording_handler
+from utils.recording_handler import record_simulation, open_recording, recording_size, RecordingQuotaExceeded
+
+
+@pytest.fixture
+def recordings_dir(monkeypatch):
+    with tempfile.TemporaryDirectory() as tmp:
+        monkeypatch.setattr(recording_handler, "RECORDINGS_DIR", os.path.join(tmp, "recordings"))
+        yield tmp
+
+
+@pytest.fixture
+def client(recordings_dir):
+    app = create_app({"DB_PATH": os.path.join(recordings_dir, "recordings.db"), "RATE_LIMIT": 0})
+    yield app.test_client()
+
+
+def test_seek_matches_stream(recordings_dir):
+    info = record_simulation("seek", 300, seed=2, vehicles=20, lanes=2)
+    assert info["frames"] == 301
+    assert info["bytes"] == recording_size(300, 20)
+    replay = open_recording("seek")
+    streamed = list(replay.stream(0))
+    for tick in (0, 63, 64, 65, 200, 300):
+        assert replay.frame(tick) == streamed[tick]
+
+
+def test_existing_name_is_not_overwritten(client):
+    assert client.post("/api/recordings", json={"name": "run", "steps": 10}).status_code == 201
+    response = client.post("/api/recordings", json={"name": "run", "steps": 20})
+    assert response.status_code == 409
+    assert open_recording("run").frames == 11
+
+
+def test_work_budget(client):
+    # 5,000 steps x 1,000 vehicles is over the anonymous budget
+    big = {"name": "big", "steps": 5000, "vehicles": 1000}
+    assert client.post("/api/recordings", json=big).status_code == 403
+    huge = {"name": "huge", "steps": 1_000_000, "vehicles": 100_000}
+    with client.session_transaction() as sess:
+        sess["user"] = "alice"
+    assert client.post("/api/recordings", json=huge).status_code == 400
+    assert client.get("/api/recordings").get_json()["data"] == []
+
+
+def test_disk_quota(client, monkeypatch):
+    monkeypatch.setattr(recording_handler, "RECORDINGS_MAX_BYTES", recording_size(100, 50) + 100)
+    assert client.post("/api/recordings", json={"name": "a", "steps": 100, "vehicles": 50}).status_code == 201
+    assert client.post("/api/recordings", json={"name": "b", "steps": 100, "vehicles": 50}).status_code == 507
+    with pytest.raises(RecordingQuotaExceeded):
+        record_simulation("c", 100, vehicles=50)
+
+
+def test_replay_frames_are_capped(client, monkeypatch):
+    record_simulation("long", 3000, vehicles=10)
+    frames = client.get("/api/recordings/long?count=5000").get_json()["frames"]
+    assert len(frames) == 1000
+
+    body = client.get("/api/recordings/long?stream=1&count=100000").get_data(as_text=True)
+    assert body.count("event: frame") == 3001   # all of it: under the 10,000 cap
+
+    # large recordings return fewer frames so a request stays bounded
+    monkeypatch.setattr(recording_handler, "REPLAY_MAX_VALUES", 100)
+    body = client.get("/api/recordings/long?stream=1").get_data(as_text=True)
+    assert body.count("event: frame") == 10
+    assert len(client.get("/api/recordings/long").get_json()["frames"]) == 10
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,185 @@
+"""
+test_sharding.py
+------------------------------------
+City shards: stable placement, merged reads in time order, and the bulk
+import, export and synthetic-data paths reading and writing the same
+shard files the app serves. Every check compares a sharded database with
+an unsharded one holding the same rows.
+
+Run with pytest, or directly:
+    python test_sharding.py
+"""
+
+import csv
+import io
+import json
+import os
+import sqlite3
+import tempfile
+from contextlib import closing
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from utils import db_handler, shard_handler
+from utils.export_handler import stream_export
+from utils.import_handler import import_file
+from utils.synthetic_generator import generate, write_to_db
+
+CITIES = ["Boston", "Denver", "Austin", "Seattle", "Miami", "Chicago", "Portland", "Atlanta"]
+SHARDS = 4
+
+
+@pytest.fixture
+def tmp(monkeypatch):
+    with tempfile.TemporaryDirectory() as path:
+        monkeypatch.setattr(db_handler, "DB_PATH", os.path.join(path, "unused.db"))
+        monkeypatch.setattr(db_handler, "DB_SHARDS", 0)
+        yield path
+
+
+def _use(path, shards):
+    db_handler.DB_PATH, db_handler.DB_SHARDS = path, shards
+    db_handler.ensure_db()
+
+
+def _traffic():
+    # timestamps interleave across cities, so shards must be merged, not joined
+    return [{"city": city, "traffic_level": "Low", "accidents": i % 3, "avg_speed": 30 + i,
+             "accident_type": None, "timestamp": f"2025-01-01 {i % 24:02d}:{(i * 7) % 60:02d}:00"}
+            for i, city in enumerate(CITIES * 6)]
+
+
+def _cities_in(path, table="traffic_data"):
+    with closing(sqlite3.connect(path)) as conn:
+        return {city for (city,) in conn.execute(f"SELECT DISTINCT city FROM {table};")}
+
+
+def _check_placement(base, table="traffic_data"):
+    """Every shard holds only its own cities, and the main file holds none."""
+    for path in shard_handler.shard_paths(base, SHARDS):
+        assert all(shard_handler.shard_for(base, SHARDS, city) == path for city in _cities_in(path, table))
+    assert _cities_in(base, table) == set()
+
+
+def test_placement_is_stable():
+    assert shard_handler.shard_index("Boston", SHARDS) == shard_handler.shard_index("boston", SHARDS)
+    assert shard_handler.shard_paths("data/db.sqlite", 2) == ["data/db.shard0.sqlite", "data/db.shard1.sqlite"]
+    assert shard_handler.shard_paths("db.db", 1) == ["db.db"]
+    rows = [(city, n) for n, city in enumerate(CITIES)]
+    groups = shard_handler.partition(rows, "db.db", SHARDS, key=0)
+    assert sorted(row for part in groups.values() for row in part) == sorted(rows)
+    assert all(shard_handler.shard_for("db.db", SHARDS, city) == path
+               for path, part in groups.items() for city, _ in part)
+
+
+def test_partition_columns_matches_partition():
+    columns = {"city": np.array(CITIES * 3), "n": np.arange(len(CITIES) * 3)}
+    records = [{"city": c, "n": n} for c, n in zip(columns["city"].tolist(), columns["n"].tolist())]
+    by_rows = shard_handler.partition(records, "db.db", SHARDS)
+    by_columns = shard_handler.partition_columns(columns, "db.db", SHARDS)
+    assert by_rows.keys() == by_columns.keys()
+    for path, part in by_columns.items():
+        assert part["n"].tolist() == [record["n"] for record in by_rows[path]]
+
+
+def test_all_traffic_is_merged_newest_first(tmp):
+    _use(os.path.join(tmp, "plain.db"), 0)
+    db_handler.insert_bulk_traffic_data(_traffic())
+    plain = db_handler.get_all_traffic_data()
+
+    _use(os.path.join(tmp, "sharded.db"), SHARDS)
+    db_handler.insert_bulk_traffic_data(_traffic())
+    sharded = db_handler.get_all_traffic_data()
+    _check_placement(db_handler.DB_PATH)
+
+    stamps = [row["timestamp"] for row in sharded]
+    assert stamps == sorted(stamps, reverse=True)
+    key = lambda row: (row["timestamp"], row["city"], row["avg_speed"])
+    assert sorted(map(key, sharded)) == sorted(map(key, plain))
+    assert db_handler.get_traffic_totals()["records"] == len(plain)
+
+
+def _export_rows(table, fmt="csv", **filters):
+    body = b"".join(stream_export(table, fmt, batch_size=5, **filters)).decode()
+    if fmt == "jsonl":
+        return [json.loads(line) for line in body.splitlines()]
+    return list(csv.DictReader(io.StringIO(body)))
+
+
+def test_export_reads_every_shard_in_time_order(tmp):
+    _use(os.path.join(tmp, "plain.db"), 0)
+    db_handler.insert_bulk_traffic_data(_traffic())
+    plain = _export_rows("traffic_data")
+
+    _use(os.path.join(tmp, "sharded.db"), SHARDS)
+    db_handler.insert_bulk_traffic_data(_traffic())
+    sharded = _export_rows("traffic_data")
+    assert len(sharded) == len(plain) == len(_traffic())
+    assert [row["timestamp"] for row in sharded] == [row["timestamp"] for row in plain]
+    assert sorted((row["timestamp"], row["city"]) for row in sharded) == \
+        sorted((row["timestamp"], row["city"]) for row in plain)
+
+    denver = _export_rows("traffic_data", "jsonl", city="Denver", start="2025-01-01 05:00")
+    assert denver and {row["city"] for row in denver} == {"Denver"}
+    assert all(row["timestamp"] >= "2025-01-01 05:00:00" for row in denver)
+    assert list(_export_rows("accident_data")) == []
+
+
+def test_import_writes_to_shards_and_resumes(tmp):
+    source = os.path.join(tmp, "traffic.jsonl")
+    with open(source, "w") as f:
+        for record in _traffic():
+            f.write(json.dumps(record) + "\n")
+    chunk = os.path.getsize(source) // 3
+
+    _use(os.path.join(tmp, "sharded.db"), SHARDS)
+    summary = import_file(source, "traffic_data", workers=1, chunk_bytes=chunk, progress=False)
+    assert summary["imported"] == len(_traffic())
+    _check_placement(db_handler.DB_PATH)
+    assert db_handler.get_traffic_totals()["records"] == len(_traffic())
+
+    # a crash after some shards committed a range: that shard loses its part
+    lost = shard_handler.shard_for(db_handler.DB_PATH, SHARDS, "Boston")
+    with closing(sqlite3.connect(lost)) as conn:
+        first = conn.execute("SELECT MIN(range_start) FROM import_checkpoints;").fetchone()[0]
+        missing = conn.execute("SELECT rows FROM import_checkpoints WHERE range_start = ?;", (first,)).fetchone()[0]
+        conn.execute("DELETE FROM import_checkpoints WHERE range_start = ?;", (first,))
+        conn.execute("DELETE FROM traffic_data WHERE id IN (SELECT id FROM traffic_data ORDER BY id LIMIT ?);",
+                     (missing,))
+        conn.commit()
+    again = import_file(source, "traffic_data", workers=1, chunk_bytes=chunk, progress=False)
+    assert again["imported"] == missing and again["skipped_ranges"] == summary["ranges"] - 1
+    assert db_handler.get_traffic_totals()["records"] == len(_traffic())
+    assert import_file(source, "traffic_data", workers=1, chunk_bytes=chunk, progress=False)["imported"] == 0
+
+
+def test_synthetic_rows_land_in_their_shards(tmp):
+    cities = (CITIES, np.linspace(0.5, 1.5, len(CITIES)))
+    start = datetime(2025, 1, 6)
+    plain = write_to_db(generate(2, cities, start, 60, seed=4), os.path.join(tmp, "plain.db"))
+    db_handler.DB_SHARDS = SHARDS
+    sharded = write_to_db(generate(2, cities, start, 60, seed=4, chunk_rows=100), os.path.join(tmp, "sharded.db"))
+    assert sharded == plain
+    _check_placement(db_handler.DB_PATH)
+    _check_placement(db_handler.DB_PATH, "accident_data")
+    assert db_handler.get_traffic_totals()["records"] == plain[0]
+    assert sum(db_handler.get_accident_counts_by_city(days=100000).values()) == plain[1]
+
+
+def test_split_database_matches_direct_writes(tmp):
+    source = os.path.join(tmp, "split.db")
+    _use(source, 0)
+    db_handler.insert_bulk_traffic_data(_traffic())
+    _use(source, SHARDS)
+    copied = shard_handler.split_database(source, source, SHARDS)
+    assert copied == {"traffic_data": len(_traffic()), "accident_data": 0}
+    for path in shard_handler.shard_paths(source, SHARDS):
+        assert all(shard_handler.shard_for(source, SHARDS, city) == path for city in _cities_in(path))
+    assert db_handler.get_traffic_totals()["records"] == len(_traffic())
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,91 @@
+"""
+test_signal_network.py
+------------------------------------
+SignalNetwork timing: phase order inside a cycle and green-wave offsets,
+including plans whose north-south and east-west greens differ, and the
+demo intersection switching once per phase under concurrent callers.
+
+Run with pytest, or directly:
+    python test_signal_network.py
+"""
+
+import threading
+
+import numpy as np
+import pytest
+
+from utils import traffic_light_handler
+from utils.traffic_light_handler import (SignalNetwork, build_grid_network, GREEN, YELLOW, RED,
+                                         GREEN_WAVE_SPEED, METERS_PER_DEGREE)
+
+
+def _grid(plan):
+    network = build_grid_network(rows=4, cols=4, green_wave=None)
+    network.set_plan(0, *plan)
+    return network
+
+
+def _travel_times(network, direction, speed=GREEN_WAVE_SPEED):
+    if direction == "north_south":
+        return (network.lat - network.lat.min()) * METERS_PER_DEGREE / speed
+    scale = METERS_PER_DEGREE * np.cos(np.radians(network.lat.mean()))
+    return (network.lon - network.lon.min()) * scale / speed
+
+
+def test_phase_order():
+    network = SignalNetwork([0.0], [0.0], plans=((30.0, 10.0, 3.0),))
+    expected = [(0, GREEN, RED), (31, YELLOW, RED), (34, RED, GREEN), (44, RED, YELLOW), (46, GREEN, RED)]
+    for t, ns, ew in expected:
+        got_ns, got_ew, _ = network.states_at(t)
+        assert (got_ns[0], got_ew[0]) == (ns, ew), t
+
+
+@pytest.mark.parametrize("plan", [(20.0, 20.0, 3.0), (30.0, 12.0, 3.0), (12.0, 35.0, 4.0)])
+@pytest.mark.parametrize("direction", ["north_south", "east_west"])
+def test_green_wave_meets_platoon(plan, direction):
+    network = _grid(plan)
+    network.coordinate_green_wave(direction)
+    arrival = _travel_times(network, direction)
+    green = network.green_ns[0] if direction == "north_south" else network.green_ew[0]
+
+    for i, t in enumerate(arrival):
+        # just after the platoon arrives the light has turned green with a full green ahead
+        ns, ew, remaining = network.states_at(t + 1e-6, np.array([i]))
+        state = ns if direction == "north_south" else ew
+        assert state[0] == GREEN, (direction, plan, i)
+        assert remaining[0] == pytest.approx(green, abs=1e-3)
+
+
+
+class _FixedClock:
+    def __init__(self, t):
+        self.t = t
+
+    def now(self):
+        return self.t
+
+
+def test_intersection_switches_once_under_concurrent_callers(monkeypatch):
+    monkeypatch.setattr(traffic_light_handler, "lights", {"north_south": "GREEN", "east_west": "RED"})
+    monkeypatch.setattr(traffic_light_handler, "last_switch_time", 0.0)
+    clock = _FixedClock(traffic_light_handler.light_durations["GREEN"] + 0.5)
+    start = threading.Barrier(16)
+    states = []
+
+    def poll():
+        start.wait()
+        for _ in range(50):
+            states.append(traffic_light_handler.get_intersection_state(clock))
+
+    threads = [threading.Thread(target=poll) for _ in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert {(state["north_south"], state["east_west"]) for state in states} == {("YELLOW", "RED")}
+    assert traffic_light_handler.last_switch_time == traffic_light_handler.light_durations["GREEN"]
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(pytest.main([__file__, "-q"]))
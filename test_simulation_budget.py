@@ -0,0 +1,59 @@
+"""
+test_simulation_budget.py
+------------------------------------
+/simulation batch runs: repeatable from a seed, and limited to a work
+budget (vehicles x steps) that is larger for logged-in users.
+
+Run with pytest, or directly:
+    python test_simulation_budget.py
+"""
+
+import os
+import tempfile
+
+import pytest
+
+from app import create_app
+from utils.simulation_handler import (run_seeded_batch, batch_cost, ANON_BATCH_BUDGET,
+                                      USER_BATCH_BUDGET)
+
+
+@pytest.fixture
+def client():
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_app({"DB_PATH": os.path.join(tmp, "budget.db"), "RATE_LIMIT": 0})
+        yield app.test_client()
+
+
+def test_seeded_runs_repeat():
+    assert run_seeded_batch(50, seed=7, vehicles=20) == run_seeded_batch(50, seed=7, vehicles=20)
+
+
+def test_small_runs_are_allowed(client):
+    response = client.get("/simulation?steps=1200&seed=1")
+    assert response.status_code == 200
+    assert len(response.get_json()["frames"]["tick"]) == 1200
+
+
+def test_anonymous_large_run_needs_login(client):
+    steps = ANON_BATCH_BUDGET // (1000 + 600) + 1
+    assert ANON_BATCH_BUDGET < batch_cost(steps, 1000) <= USER_BATCH_BUDGET
+    url = f"/simulation?steps={steps}&seed=1&vehicles=1000"
+    assert client.get(url).status_code == 403
+
+    with client.session_transaction() as sess:
+        sess["user"] = "alice"
+    assert client.get(url).status_code == 200
+
+
+def test_huge_runs_are_refused(client):
+    # the session path counts the same way
+    assert client.get("/simulation?steps=20000").status_code == 403
+    with client.session_transaction() as sess:
+        sess["user"] = "alice"
+    assert client.get("/simulation?steps=20000&seed=1&vehicles=100000").status_code == 400
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,63 @@
+"""
+test_simulation_engine.py
+------------------------------------
+SimulationEngine leader lookup: each vehicle follows the next one in its
+own lane around the ring, found from the sorted order alone.
+
+Run with pytest, or directly:
+    python test_simulation_engine.py
+"""
+
+import numpy as np
+import pytest
+
+from utils.simulation_engine import SimulationEngine, VEHICLE_LENGTH
+
+
+def _brute_force_leaders(engine):
+    leaders = []
+    for i in range(engine.count):
+        same = np.flatnonzero((engine.lane == engine.lane[i]) & (np.arange(engine.count) != i))
+        if not len(same):
+            leaders.append(i)
+            continue
+        ahead = (engine.position[same] - engine.position[i]) % engine.road_length
+        leaders.append(int(same[np.argmin(ahead)]))
+    return np.array(leaders)
+
+
+@pytest.mark.parametrize("vehicles, lanes", [(1, 1), (7, 3), (200, 4), (50, 8)])
+def test_leaders_match_brute_force(vehicles, lanes):
+    engine = SimulationEngine(num_vehicles=vehicles, num_lanes=lanes, road_length=900.0, seed=3)
+    engine.run(40)   # lane changes shuffle the order
+    order, sorted_keys = engine._sorted_keys()
+    leader, gap = engine._leaders(order)
+    assert (leader == _brute_force_leaders(engine)).all()
+
+    # agrees with the search-based lookup used for lane changes
+    lanes_of = engine.lane.astype(np.int64)
+    searched, searched_gap, _, _ = engine._neighbors(order, sorted_keys, lanes_of, engine.position)
+    alone = leader == np.arange(engine.count)
+    assert (searched[~alone] == leader[~alone]).all()
+    assert np.allclose(searched_gap[~alone], gap[~alone])
+
+
+def test_alone_in_lane_follows_nobody():
+    engine = SimulationEngine(num_vehicles=3, num_lanes=3, road_length=500.0, seed=0)
+    order, _ = engine._sorted_keys()
+    leader, gap = engine._leaders(order)
+    assert (leader == np.arange(3)).all()
+    assert np.isinf(gap).all()
+
+
+def test_gap_wraps_around_the_ring():
+    engine = SimulationEngine.from_positions([10.0, 990.0], road_length=1000.0)
+    order, _ = engine._sorted_keys()
+    leader, gap = engine._leaders(order)
+    assert leader.tolist() == [1, 0]
+    assert gap.tolist() == pytest.approx([980.0 - VEHICLE_LENGTH, 20.0 - VEHICLE_LENGTH])
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,124 @@
+"""
+test_simulation_sessions.py
+------------------------------------
+Per-visitor simulations: isolated per session, and in shared mode
+continued by whichever worker handles the next request, without holding
+the database write lock while a simulation steps.
+
+A worker is modelled by its own SimulationRegistry; swapping the module
+registry is what a request landing on another process looks like.
+
+Run with pytest, or directly:
+    python test_simulation_sessions.py
+"""
+
+import os
+import sqlite3
+import tempfile
+from contextlib import closing
+
+import pytest
+
+from app import create_app
+from utils import db_handler
+from utils import simulation_session_handler as sessions
+
+
+@pytest.fixture
+def database(monkeypatch):
+    with tempfile.TemporaryDirectory() as tmp:
+        monkeypatch.setattr(db_handler, "DB_PATH", os.path.join(tmp, "sessions.db"))
+        monkeypatch.setattr(db_handler, "DB_SHARDS", 0)
+        monkeypatch.setattr(sessions, "registry", sessions.SimulationRegistry())
+        db_handler.init_db()
+        yield db_handler.DB_PATH
+
+
+def _switch_worker(monkeypatch):
+    worker = sessions.SimulationRegistry()
+    monkeypatch.setattr(sessions, "registry", worker)
+    return worker
+
+
+def test_sessions_are_isolated(database):
+    for _ in range(3):
+        sessions.step_session("a")
+    sessions.step_session("b")
+    assert sessions.registry.get("a").clock.ticks == 3
+    assert sessions.registry.get("b").clock.ticks == 1
+
+
+def test_shared_session_continues_on_another_worker(database, monkeypatch):
+    for _ in range(4):
+        sessions.step_session("visitor", shared=True)
+    positions = sessions.registry.get("visitor").car_positions
+
+    other = _switch_worker(monkeypatch)
+    sessions.step_session("visitor", shared=True)
+    moved = other.get("visitor")
+    assert moved.clock.ticks == 5
+    assert moved.car_positions != positions
+
+    # back on the first worker: its cached copy is stale and gets reloaded
+    sessions.run_session_batch("visitor", 10, shared=True)
+    assert sessions.registry.get("visitor").clock.ticks == 15
+
+
+def _saved_version(database, session_id="visitor"):
+    with closing(sqlite3.connect(database)) as conn:
+        return conn.execute("SELECT version FROM simulation_sessions WHERE session_id = ?;",
+                            (session_id,)).fetchone()[0]
+
+
+def test_database_is_writable_while_a_session_steps(database):
+    def action(sim):
+        # a traffic insert from another connection must not wait for the step
+        with closing(sqlite3.connect(database, timeout=0)) as conn, conn:
+            conn.execute("INSERT INTO traffic_data (city, traffic_level, accidents, avg_speed, timestamp) "
+                         "VALUES ('Boston', 'Low', 0, 40, '2025-01-01 08:00:00');")
+        return sim.step()
+
+    sessions._run_shared("visitor", action)
+    sessions._run_shared("visitor", action)
+    assert _saved_version(database) == 2
+
+
+def test_losing_a_save_race_steps_the_newer_state(database):
+    sessions.step_session("visitor", shared=True)
+    seen = []
+
+    def action(sim):
+        seen.append(sim.clock.ticks)
+        if len(seen) == 1:
+            # another worker saves the session while this one is stepping it
+            with closing(sqlite3.connect(database)) as conn, conn:
+                conn.execute("UPDATE simulation_sessions SET version = version + 1;")
+        return sim.step()
+
+    sessions._run_shared("visitor", action)
+    assert seen == [1, 1]
+    assert sessions.registry.get("visitor").clock.ticks == 2
+    assert _saved_version(database) == 3
+
+
+def test_in_memory_mode_resets_across_workers(database, monkeypatch):
+    sessions.step_session("visitor")
+    _switch_worker(monkeypatch)
+    sessions.step_session("visitor")
+    assert sessions.registry.get("visitor").clock.ticks == 1
+
+
+def test_route_uses_shared_sessions(database, monkeypatch):
+    app = create_app({"DB_PATH": database, "INIT_DB": False, "SHARED_SIM_SESSIONS": True, "RATE_LIMIT": 0})
+    client = app.test_client()
+    for _ in range(3):
+        assert client.get("/simulation").status_code == 200
+    _switch_worker(monkeypatch)
+    assert client.get("/simulation?steps=2").status_code == 200
+    sim_id = next(iter(sessions.registry._sessions))
+    assert sessions.registry.get(sim_id).clock.ticks == 5
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(pytest.main([__file__, "-q"]))
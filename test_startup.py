@@ -0,0 +1,98 @@
+"""
+test_startup.py
+------------------------------------
+Import-time budget for the web app, and one-time database setup.
+
+Workers are started and stopped often, so `import app; create_app()`
+must stay cheap: no database work, no live-API client (requests) and no
+NumPy-backed handlers until a route needs them.
+
+Run with pytest, or directly for a report of the slowest imports:
+    python test_startup.py
+Set STARTUP_BUDGET_MS to change the budget (default 400 ms).
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+STARTUP_BUDGET_MS = float(os.environ.get("STARTUP_BUDGET_MS", 400))
+
+# modules that must only load on first use
+DEFERRED_MODULES = ["requests", "numpy", "utils.heatmap_handler", "utils.simulation_engine",
+                    "utils.traffic_light_handler", "utils.stream_handler", "utils.recording_handler"]
+
+STARTUP_CODE = (
+    "import sys, time; start = time.perf_counter(); import app; app.create_app(); "
+    "print(round((time.perf_counter() - start) * 1000, 1)); "
+    f"print(','.join(m for m in {DEFERRED_MODULES!r} if m in sys.modules))"
+)
+
+
+# A function to start the app in a fresh interpreter and parse -X importtime
+def measure_startup():
+    """
+    Returns (startup ms, per-module import rows, deferred modules that
+    loaded anyway, files created in the working directory).
+    """
+    with tempfile.TemporaryDirectory() as cwd:
+        env = {**os.environ, "PYTHONPATH": ROOT}
+        result = subprocess.run([sys.executable, "-X", "importtime", "-c", STARTUP_CODE],
+                                cwd=cwd, env=env, capture_output=True, text=True, check=True)
+        created = os.listdir(cwd)
+
+    # lines look like "import time:   self_us |   cumulative_us | [indent]module"
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append({"module": name.rstrip()[1:], "self_ms": int(self_us) / 1000,
+                     "cumulative_ms": int(cumulative_us) / 1000})
+
+    *_, total_ms, loaded = result.stdout.split("\n")[:-1]
+    eager = [m for m in loaded.split(",") if m]
+    return float(total_ms), rows, eager, created
+
+
+def test_import_app_within_budget():
+    total, _, eager, created = measure_startup()
+    assert not eager, f"imported at startup instead of on first use: {eager}"
+    assert not created, f"importing the app created files: {created}"
+    assert total <= STARTUP_BUDGET_MS, f"startup took {total:.0f} ms (budget {STARTUP_BUDGET_MS:.0f} ms)"
+
+
+def test_ensure_db_runs_once_per_path(monkeypatch):
+    from utils import db_handler
+    calls = []
+    real_init = db_handler.init_db
+
+    def counting_init():
+        calls.append(db_handler.DB_PATH)
+        real_init()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        monkeypatch.setattr(db_handler, "init_db", counting_init)
+        monkeypatch.setattr(db_handler, "DB_SHARDS", 0)
+        for name in ("a.db", "b.db"):
+            monkeypatch.setattr(db_handler, "DB_PATH", os.path.join(tmp, name))
+            threads = [threading.Thread(target=db_handler.ensure_db) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            db_handler.ensure_db()
+        assert calls == [os.path.join(tmp, "a.db"), os.path.join(tmp, "b.db")]
+
+
+if __name__ == "__main__":
+    total, rows, eager, created = measure_startup()
+    print(f"[TEST] import app + create_app(): {total:.1f} ms (budget {STARTUP_BUDGET_MS:.0f} ms)")
+    print(f"{'self ms':>9} {'total ms':>9}  module")
+    for row in sorted(rows, key=lambda r: r["cumulative_ms"], reverse=True)[:15]:
+        print(f"{row['self_ms']:>9.1f} {row['cumulative_ms']:>9.1f}  {row['module']}")
+    print("Loaded eagerly:", eager or "none")
+    print("Files created:", created or "none")
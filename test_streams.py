@@ -0,0 +1,89 @@
+"""
+test_streams.py
+------------------------------------
+SSE streams: each holds a server thread, so only MAX_STREAMS are open at
+once per process, and each one ends after STREAM_SECONDS. Both animation
+pages load the client that reconnects to them.
+
+Run with pytest, or directly:
+    python test_streams.py
+"""
+
+import os
+import tempfile
+
+import pytest
+
+from app import create_app
+from utils.stream_handler import end_after
+
+
+@pytest.fixture
+def client():
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_app({"DB_PATH": os.path.join(tmp, "streams.db"), "RATE_LIMIT": 0,
+                          "MAX_STREAMS": 1, "STREAM_SECONDS": 60})
+        yield app.test_client()
+
+
+def test_open_streams_are_capped(client):
+    first = client.get("/api/stream/lights?rate=20&limit=1")
+    assert first.status_code == 200
+    assert first.mimetype == "text/event-stream"
+
+    busy = client.get("/api/stream/lights?rate=20&limit=1")
+    assert busy.status_code == 503
+    assert busy.headers["Retry-After"] == "5"
+    # ordinary requests are not affected
+    assert client.get("/api/health/live").status_code == 200
+
+    # the slot is freed when the server closes the first stream
+    first.close()
+    again = client.get("/api/stream/lights?rate=20&limit=1")
+    assert again.status_code == 200
+    again.close()
+
+
+def test_refused_stream_frees_its_slot(client):
+    assert client.get("/api/stream/lights?rate=3").status_code == 400
+    response = client.get("/api/stream/lights?rate=20&limit=1")
+    assert response.status_code == 200
+    response.close()
+
+
+def test_stream_sends_retry_and_frames(client):
+    response = client.get("/api/stream/lights?rate=20&limit=2")
+    body = response.get_data(as_text=True)
+    response.close()
+    assert body.startswith("retry: ")
+    assert body.count("event: ") == 2
+
+
+def test_end_after_closes_the_stream():
+    closed = []
+
+    def events():
+        try:
+            while True:
+                yield "event: tick\ndata: 1\n\n"
+        finally:
+            closed.append(True)
+
+    out = list(end_after(events(), seconds=0))
+    assert out[0].startswith("retry: ")
+    assert out[1] == "event: tick\ndata: 1\n\n"
+    assert out[2].startswith("event: end\n")
+    assert len(out) == 3
+    assert closed == [True]
+
+
+@pytest.mark.parametrize("page, script", [("/traffic_light", "traffic_light.js"),
+                                          ("/traffic_simulation", "traffic_simulation.js")])
+def test_pages_load_the_stream_client(client, page, script):
+    html = client.get(page).get_data(as_text=True)
+    assert html.index("js/live_stream.js") < html.index(f"js/{script}")
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(pytest.main([__file__, "-q"]))
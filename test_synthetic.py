@@ -0,0 +1,127 @@
+"""
+test_synthetic.py
+------------------------------------
+Synthetic history: reproducible output, days that can be regenerated
+on their own (including the bursts running across midnight), sensible
+values, and writing the chunks to the database and to CSV.
+
+Run with pytest, or directly:
+    python test_synthetic.py
+"""
+
+import csv
+import os
+import sqlite3
+import tempfile
+from contextlib import closing
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from utils import db_handler
+from utils.synthetic_generator import (generate, generate_day, pick_cities, write_to_db, write_to_files,
+                                       _midnight_bursts, TRAFFIC_COLUMNS, ACCIDENT_COLUMNS, TRAFFIC_LEVELS)
+
+START = datetime(2025, 3, 3)
+BURST = "Multi-vehicle incident during burst"
+
+
+def _many_cities(count=300):
+    return [f"City{i}" for i in range(count)], np.linspace(0.5, 1.5, count)
+
+
+def _same(a, b, columns):
+    return all(a[name].tolist() == b[name].tolist() for name in columns)
+
+
+def _burst_intervals(traffic, accidents, steps):
+    """Returns {(city index, interval): in a burst} for every interval with accidents."""
+    flat = np.asarray(traffic["accidents"])
+    cells = np.repeat(np.arange(flat.size), flat)
+    return {(cell // steps, cell % steps): description == BURST
+            for cell, description in zip(cells.tolist(), accidents["description"].tolist())}
+
+
+def test_same_seed_same_rows():
+    cities = pick_cities(3)
+    first = generate_day(2, cities, START, 15, seed=7)
+    second = generate_day(2, cities, START, 15, seed=7)
+    other = generate_day(2, cities, START, 15, seed=8)
+    assert _same(first[0], second[0], TRAFFIC_COLUMNS) and _same(first[1], second[1], ACCIDENT_COLUMNS)
+    assert not _same(first[0], other[0], TRAFFIC_COLUMNS)
+
+
+def test_any_day_regenerates_on_its_own():
+    cities = _many_cities(50)
+    steps = 24
+    (traffic, accidents), = list(generate(4, cities, START, 60, seed=3))
+    per_day = len(cities[0]) * steps
+    accident_days = np.asarray(accidents["date"])
+    for day in range(4):
+        alone_traffic, alone_accidents = generate_day(day, cities, START, 60, seed=3)
+        sliced = {name: traffic[name][day * per_day:(day + 1) * per_day] for name in TRAFFIC_COLUMNS}
+        assert _same(alone_traffic, sliced, TRAFFIC_COLUMNS)
+        mask = accident_days == (START + timedelta(days=day)).strftime("%Y-%m-%d")
+        assert _same(alone_accidents, {name: accidents[name][mask] for name in ACCIDENT_COLUMNS}, ACCIDENT_COLUMNS)
+
+
+def test_midnight_bursts_are_shared_by_both_days():
+    cities = _many_cities()
+    steps = 24
+    before, after = _midnight_bursts(3, len(cities[0]), steps, seed=5)
+    crossing = np.flatnonzero(before)
+    assert crossing.size > 0 and np.array_equal(crossing, np.flatnonzero(after))
+    assert np.array_equal(_midnight_bursts(3, len(cities[0]), steps, seed=5)[0], before)
+
+    evening = _burst_intervals(*generate_day(2, cities, START, 60, seed=5), steps)
+    morning = _burst_intervals(*generate_day(3, cities, START, 60, seed=5), steps)
+    checked = 0
+    for city in crossing.tolist():
+        for interval in range(steps - before[city], steps):
+            if (city, interval) in evening:
+                assert evening[(city, interval)]
+                checked += 1
+        for interval in range(after[city]):
+            if (city, interval) in morning:
+                assert morning[(city, interval)]
+                checked += 1
+    assert checked > 0
+
+
+def test_values_are_in_range():
+    cities = pick_cities(5)
+    traffic, accidents = generate_day(0, cities, START, 5, seed=1)
+    assert len(traffic["city"]) == 5 * 288
+    assert set(traffic["traffic_level"].tolist()) <= set(TRAFFIC_LEVELS.tolist())
+    assert traffic["avg_speed"].min() >= 5 and traffic["avg_speed"].max() <= 75
+    assert len(accidents["city"]) == int(traffic["accidents"].sum())
+    assert set(accidents["fatal"].tolist()) <= {0, 1}
+    # weekday rush hour is busier than the small hours
+    speed = traffic["avg_speed"].reshape(5, 288)
+    assert speed[:, 17 * 12:18 * 12].mean() < speed[:, 2 * 12:3 * 12].mean()
+
+
+def test_write_to_db_and_files():
+    cities = pick_cities(2)
+    with tempfile.TemporaryDirectory() as tmp:
+        previous = db_handler.DB_PATH, db_handler.DB_SHARDS
+        db_handler.DB_SHARDS = 0
+        try:
+            totals = write_to_db(generate(2, cities, START, 60, seed=2), os.path.join(tmp, "synthetic.db"))
+            with closing(sqlite3.connect(db_handler.DB_PATH)) as conn:
+                assert conn.execute("SELECT COUNT(*) FROM traffic_data;").fetchone()[0] == totals[0] == 2 * 2 * 24
+                assert conn.execute("SELECT COUNT(*) FROM accident_data;").fetchone()[0] == totals[1]
+        finally:
+            db_handler.DB_PATH, db_handler.DB_SHARDS = previous
+
+        out = os.path.join(tmp, "files")
+        assert write_to_files(generate(2, cities, START, 60, seed=2), out) == totals
+        with open(os.path.join(out, "traffic_data.csv"), newline="") as f:
+            rows = list(csv.reader(f))
+        assert rows[0] == TRAFFIC_COLUMNS and len(rows) == totals[0] + 1
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(pytest.main([__file__, "-q"]))
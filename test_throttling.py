@@ -0,0 +1,121 @@
+"""
+test_throttling.py
+------------------------------------
+Request coalescing, the per-client token bucket, the concurrency cap,
+and which address a client is limited by behind PROXY_HOPS proxies.
+
+Run with pytest, or directly:
+    python test_throttling.py
+"""
+
+import os
+import tempfile
+import threading
+import time
+
+import pytest
+
+from app import create_app
+from utils.throttle_handler import SingleFlight, RateLimiter, ConcurrencyLimiter, forwarded_client
+
+
+@pytest.fixture
+def tmp():
+    with tempfile.TemporaryDirectory() as path:
+        yield path
+
+
+def test_single_flight_shares_one_computation():
+    flight = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    calls, results = [], []
+
+    def compute():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return "result"
+
+    leader = threading.Thread(target=lambda: results.append(flight.do("key", compute)))
+    leader.start()
+    assert started.wait(5)
+    followers = [threading.Thread(target=lambda: results.append(flight.do("key", compute))) for _ in range(3)]
+    for thread in followers:
+        thread.start()
+    time.sleep(0.05)
+    release.set()
+    for thread in [leader] + followers:
+        thread.join()
+    assert calls == [1]
+    assert results == ["result"] * 4
+    # nothing is cached once the call is over
+    assert flight.do("key", lambda: "fresh") == "fresh"
+
+
+def test_rate_limiter_buckets_per_client():
+    limiter = RateLimiter(rate=1, burst=2)
+    assert limiter.allow("a")[0] and limiter.allow("a")[0]
+    allowed, wait = limiter.allow("a")
+    assert not allowed and 0 < wait <= 1
+    assert limiter.allow("b")[0]
+
+
+def test_rate_limiter_forgets_the_idlest_clients():
+    limiter = RateLimiter(rate=1, burst=1, max_clients=2)
+    for client in ("a", "b", "c"):
+        limiter.allow(client)
+    assert list(limiter._buckets) == ["b", "c"]
+
+
+def test_concurrency_limiter_does_not_block():
+    slots = ConcurrencyLimiter(1)
+    assert slots.try_acquire()
+    assert not slots.try_acquire()
+    slots.release()
+    assert slots.try_acquire()
+
+
+@pytest.mark.parametrize("forwarded, hops, expected", [
+    ("1.1.1.1", 0, "10.0.0.1"),                    # not behind a proxy: header ignored
+    ("1.1.1.1", 1, "1.1.1.1"),
+    ("6.6.6.6, 1.1.1.1", 1, "1.1.1.1"),            # forged first entry is skipped
+    ("6.6.6.6, 1.1.1.1, 172.16.0.2", 2, "1.1.1.1"),
+    ("1.1.1.1", 2, "10.0.0.1"),                    # too few entries: not trusted
+    ("", 1, "10.0.0.1"),
+])
+def test_forwarded_client(forwarded, hops, expected):
+    assert forwarded_client("10.0.0.1", forwarded, hops) == expected
+
+
+def _burst(client, forwarded, count=3):
+    return [client.get("/api/stats/city/Nowhere", headers={"X-Forwarded-For": forwarded},
+                       environ_base={"REMOTE_ADDR": "10.0.0.1"}).status_code for _ in range(count)]
+
+
+def test_clients_behind_a_proxy_get_their_own_bucket(tmp):
+    app = create_app({"DB_PATH": os.path.join(tmp, "proxy.db"), "RATE_LIMIT": 0.01, "RATE_BURST": 2,
+                      "PROXY_HOPS": 1})
+    client = app.test_client()
+    assert _burst(client, "1.1.1.1")[-1] == 429
+    assert _burst(client, "2.2.2.2")[0] != 429
+    # a client can't escape its bucket by prepending a fake address
+    assert _burst(client, "9.9.9.9, 1.1.1.1", 1) == [429]
+
+
+def test_forwarded_header_is_ignored_without_proxy_hops(tmp):
+    app = create_app({"DB_PATH": os.path.join(tmp, "direct.db"), "RATE_LIMIT": 0.01, "RATE_BURST": 2})
+    client = app.test_client()
+    assert _burst(client, "1.1.1.1")[-1] == 429
+    # another X-Forwarded-For value is still the same socket address
+    assert _burst(client, "2.2.2.2", 1) == [429]
+
+
+def test_probes_are_never_limited(tmp):
+    app = create_app({"DB_PATH": os.path.join(tmp, "probes.db"), "RATE_LIMIT": 0.01, "RATE_BURST": 1})
+    client = app.test_client()
+    assert {client.get("/api/health/live").status_code for _ in range(5)} == {200}
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -16,9 +16,13 @@ Functions:
 
 import os, sys
 from datetime import datetime, timedelta
-sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+if __name__ == "__main__":
+    sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.db_handler import get_all_traffic_data, get_accident_counts_by_city
+from utils.log_handler import get_logger
 
-from utils.db_handler import get_all_traffic_data, get_accident_data
+logger = get_logger(__name__)
 
 
 # -------------------------------------------------------------------
@@ -31,7 +35,7 @@ def analyze_traffic_conditions(threshold=70):
     """
     data = get_all_traffic_data()
     if not data:
-        print("[WARN] No traffic data for alert analysis.")
+        logger.warning("No traffic data for alert analysis.")
         return []
 
     alerts = []
@@ -60,16 +64,12 @@ def analyze_accident_spikes(days=3, spike_threshold=3):
     Detects if accident counts exceed spike threshold over the last N days.
     Returns list of critical alerts.
     """
-    data = get_accident_data(days=days)
-    if not data:
-        print("[WARN] No accident data for alert analysis.")
+    # counted per city in SQL, on every shard at once
+    city_counts = get_accident_counts_by_city(days=days)
+    if not city_counts:
+        logger.warning("No accident data for alert analysis.")
         return []
 
-    city_counts = {}
-    for record in data:
-        city = record.get("city", "Unknown")
-        city_counts[city] = city_counts.get(city, 0) + 1
-
     alerts = []
     for city, count in city_counts.items():
         if count >= spike_threshold:
@@ -94,9 +94,9 @@ def generate_alerts():
     all_alerts = traffic_alerts + accident_alerts
 
     if not all_alerts:
-        print("[INFO] No alerts generated. System stable.")
+        logger.info("No alerts generated. System stable.")
     else:
-        print(f"[INFO] {len(all_alerts)} alerts generated.")
+        logger.info("%d alerts generated.", len(all_alerts))
 
     return all_alerts
 
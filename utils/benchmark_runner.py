@@ -0,0 +1,309 @@
+# utils/benchmark_runner.py
+"""
+benchmark_runner.py
+------------------------------------
+Performance benchmarks for the simulation code.
+
+Each benchmark case builds its inputs once, then times `steps` calls of
+one simulation path. Cases are swept over vehicle counts, intersection
+counts and step counts. For every case the report gives:
+
+    - steps per second
+    - per-step latency percentiles (p50 / p95 / p99, microseconds)
+    - peak memory allocated while stepping (tracemalloc, separate pass
+      so tracing does not slow the timed run)
+
+Results can be saved as a JSON baseline; later runs compare against it
+and flag any case whose throughput, p95 latency or peak memory got
+worse by more than the threshold (exit status 1 on regression).
+
+Usage:
+    python -m utils.benchmark_runner --save benchmarks/baseline.json
+    python -m utils.benchmark_runner --compare benchmarks/baseline.json --threshold 0.25
+    python -m utils.benchmark_runner --quick --only engine_step network_states
+
+Functions:
+    - build_cases(vehicles, intersections, steps, only)
+    - run_case(case)
+    - run_benchmarks(cases)
+    - compare_results(results, baseline, threshold)
+"""
+
+import os, sys
+import argparse
+import contextlib
+import gc
+import json
+import platform
+import time
+import tracemalloc
+import numpy as np
+if __name__ == "__main__":
+    sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils import simulation_handler, traffic_light_handler
+from utils.simulation_clock import SimulationClock
+from utils.simulation_engine import SimulationEngine
+from utils.simulation_handler import (update_car_positions, run_simulation_step, run_simulation_batch,
+                                      STEP_SECONDS)
+from utils.traffic_light_handler import get_intersection_state, build_grid_network, get_network_state
+
+# -------------------------------------------------------------------
+# BENCHMARK DEFAULTS
+# -------------------------------------------------------------------
+DEFAULT_VEHICLES = [10, 1_000, 10_000, 100_000]
+DEFAULT_INTERSECTIONS = [100, 2_500, 40_000]
+DEFAULT_STEPS = [200]
+QUICK = {"vehicles": [10, 1_000], "intersections": [100, 2_500], "steps": [50]}
+
+WARMUP_STEPS = 5
+MEMORY_STEPS = 20          # steps traced for peak memory
+DEFAULT_THRESHOLD = 0.20   # 20% worse than baseline counts as a regression
+
+
+# -------------------------------------------------------------------
+# CASES
+# Each factory takes a size and returns a zero-argument step function.
+# -------------------------------------------------------------------
+def _update_car_positions(vehicles):
+    positions = np.linspace(0, 1000, vehicles).tolist()
+    return lambda: update_car_positions(positions)
+
+
+def _run_simulation_step(vehicles):
+    state = {"car_positions": np.linspace(0, 1000, vehicles).tolist()}
+    clock = SimulationClock(dt=STEP_SECONDS, start=time.time())
+
+    def step():
+        clock.tick()
+        state.update(run_simulation_step(state["car_positions"], clock=clock))
+    return step
+
+
+def _engine_step(vehicles):
+    engine = SimulationEngine(num_vehicles=vehicles, num_lanes=4,
+                              road_length=max(1000.0, vehicles * 10.0 / 4), seed=0)
+    return lambda: engine.step(STEP_SECONDS, "GREEN")
+
+
+def _engine_batch(vehicles):
+    # one call = 10 fixed ticks through run_simulation_batch
+    engine = SimulationEngine(num_vehicles=vehicles, num_lanes=4,
+                              road_length=max(1000.0, vehicles * 10.0 / 4), seed=0)
+    clock = SimulationClock(dt=STEP_SECONDS)
+    state = {"light": "RED", "last_switch": 0.0}
+
+    def step():
+        result = run_simulation_batch(engine, clock, state["light"], state["last_switch"], 10, 10)
+        state["light"], state["last_switch"] = result["light"], result["last_switch"]
+    return step
+
+
+def _intersection_state(_):
+    clock = SimulationClock(dt=STEP_SECONDS, start=time.time())
+
+    def step():
+        clock.tick()
+        get_intersection_state(clock)
+    return step
+
+
+def _network_states(intersections):
+    side = int(np.ceil(np.sqrt(intersections)))
+    network = build_grid_network(rows=side, cols=side)
+    clock = SimulationClock(dt=STEP_SECONDS)
+    return lambda: network.states_at(clock.tick())
+
+
+def _network_state_api(intersections):
+    side = int(np.ceil(np.sqrt(intersections)))
+    network = build_grid_network(rows=side, cols=side)
+    clock = SimulationClock(dt=STEP_SECONDS)
+
+    def step():
+        clock.tick()
+        get_network_state(clock=clock, network=network)
+    return step
+
+
+# name -> (factory, size axis)
+CASES = {
+    "update_car_positions": (_update_car_positions, "vehicles"),
+    "run_simulation_step": (_run_simulation_step, "vehicles"),
+    "engine_step": (_engine_step, "vehicles"),
+    "engine_batch_10": (_engine_batch, "vehicles"),
+    "get_intersection_state": (_intersection_state, None),
+    "network_states": (_network_states, "intersections"),
+    "get_network_state": (_network_state_api, "intersections"),
+}
+
+
+# A function to expand the sweep into benchmark cases
+def build_cases(vehicles=DEFAULT_VEHICLES, intersections=DEFAULT_INTERSECTIONS,
+                steps=DEFAULT_STEPS, only=None):
+    """Returns one case dict per (benchmark, size, step count)."""
+    sizes = {"vehicles": vehicles, "intersections": intersections, None: [1]}
+    cases = []
+    for name, (_, axis) in CASES.items():
+        if only and name not in only:
+            continue
+        for size in sizes[axis]:
+            for n in steps:
+                label = f"{axis}={size}," if axis else ""
+                cases.append({"key": f"{name}[{label}steps={n}]", "name": name,
+                              "axis": axis, "size": int(size), "steps": int(n)})
+    return cases
+
+
+# A function to put the app's shared light and engine state back after a case
+@contextlib.contextmanager
+def _shared_state_restored():
+    """
+    Some cases drive the app's own shared state (the simulation light and
+    engine, the demo intersection) with fake clocks. Saves it first and
+    puts it back afterwards, so running the benchmarks in-process leaves
+    the app as it was.
+    """
+    sim = (simulation_handler.current_light, simulation_handler.last_switch, simulation_handler._engine)
+    lights = (dict(traffic_light_handler.lights), traffic_light_handler.last_switch_time)
+    # the case builds its own engine instead of stepping the app's
+    simulation_handler._engine = None
+    try:
+        yield
+    finally:
+        with simulation_handler._light_lock:
+            simulation_handler.current_light, simulation_handler.last_switch, simulation_handler._engine = sim
+        with traffic_light_handler._lights_lock:
+            traffic_light_handler.lights.update(lights[0])
+            traffic_light_handler.last_switch_time = lights[1]
+
+
+# A function to time one case and trace its memory
+def run_case(case):
+    """Runs one case; returns its throughput, latency percentiles and peak memory."""
+    factory, _ = CASES[case["name"]]
+    with _shared_state_restored():
+        step = factory(case["size"])
+        for _ in range(WARMUP_STEPS):
+            step()
+
+        gc.collect()
+        latencies = np.empty(case["steps"])
+        start = time.perf_counter()
+        for i in range(case["steps"]):
+            t0 = time.perf_counter()
+            step()
+            latencies[i] = time.perf_counter() - t0
+        elapsed = time.perf_counter() - start
+
+        tracemalloc.start()
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        for _ in range(min(MEMORY_STEPS, case["steps"])):
+            step()
+        peak = tracemalloc.get_traced_memory()[1] - base
+        tracemalloc.stop()
+
+    p50, p95, p99 = np.percentile(latencies * 1e6, [50, 95, 99])
+    return {
+        **case,
+        "steps_per_second": round(case["steps"] / elapsed, 1),
+        "p50_us": round(float(p50), 1),
+        "p95_us": round(float(p95), 1),
+        "p99_us": round(float(p99), 1),
+        "peak_memory_kb": round(max(peak, 0) / 1024, 1),
+    }
+
+
+# A function to run every case in order
+def run_benchmarks(cases, progress=True):
+    """Runs cases one after another (never in parallel, to keep timings clean)."""
+    results = []
+    for case in cases:
+        row = run_case(case)
+        results.append(row)
+        if progress:
+            print(f"{row['key']:<52} {row['steps_per_second']:>10} {row['p50_us']:>10} "
+                  f"{row['p95_us']:>10} {row['p99_us']:>10} {row['peak_memory_kb']:>10}")
+    return results
+
+
+# A function to compare results against a saved baseline
+def compare_results(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    Returns a list of regressions: cases whose steps/s dropped, or whose
+    p95 latency or peak memory grew, by more than `threshold`.
+    Cases missing from the baseline are skipped.
+    """
+    previous = {row["key"]: row for row in baseline.get("results", [])}
+    regressions = []
+    for row in results:
+        old = previous.get(row["key"])
+        if old is None:
+            continue
+        failed = {
+            "steps_per_second": row["steps_per_second"] < old["steps_per_second"] * (1 - threshold),
+            "p95_us": row["p95_us"] > old["p95_us"] * (1 + threshold),
+            # a few KB of slack so tiny cases don't flag allocator noise
+            "peak_memory_kb": row["peak_memory_kb"] > old["peak_memory_kb"] * (1 + threshold) + 16,
+        }
+        for metric, worse in failed.items():
+            if worse:
+                regressions.append({"key": row["key"], "metric": metric,
+                                    "baseline": old[metric], "current": row[metric]})
+    return regressions
+
+
+# A function to save results as a JSON baseline
+def save_baseline(results, path):
+    """Writes results plus machine info to a JSON baseline file."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    payload = {
+        "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "machine": {"python": platform.python_version(), "numpy": np.__version__,
+                    "platform": platform.platform(), "cpus": os.cpu_count()},
+        "results": results,
+    }
+    with open(path, "w") as f:
+        json.dump(payload, f, indent=2)
+    print(f"[INFO] Saved {len(results)} benchmark results to {path}.")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the traffic simulation code paths.")
+    parser.add_argument("--vehicles", type=int, nargs="+", default=None)
+    parser.add_argument("--intersections", type=int, nargs="+", default=None)
+    parser.add_argument("--steps", type=int, nargs="+", default=None, help="timed steps per case")
+    parser.add_argument("--only", nargs="+", choices=list(CASES), default=None)
+    parser.add_argument("--quick", action="store_true", help="small sizes for a fast check")
+    parser.add_argument("--save", default=None, help="write results as a JSON baseline")
+    parser.add_argument("--compare", default=None, help="JSON baseline to compare against")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    args = parser.parse_args(argv)
+
+    preset = QUICK if args.quick else {"vehicles": DEFAULT_VEHICLES, "intersections": DEFAULT_INTERSECTIONS,
+                                       "steps": DEFAULT_STEPS}
+    cases = build_cases(args.vehicles or preset["vehicles"], args.intersections or preset["intersections"],
+                        args.steps or preset["steps"], args.only)
+
+    print(f"{'case':<52} {'steps/s':>10} {'p50 us':>10} {'p95 us':>10} {'p99 us':>10} {'peak KB':>10}")
+    results = run_benchmarks(cases)
+
+    if args.save:
+        save_baseline(results, args.save)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare_results(results, baseline, args.threshold)
+        if regressions:
+            print(f"[WARNING] {len(regressions)} regression(s) beyond {args.threshold:.0%}:")
+            for r in regressions:
+                print(f"  {r['key']}: {r['metric']} {r['baseline']} -> {r['current']}")
+            return 1
+        print(f"[INFO] No regressions beyond {args.threshold:.0%} against {args.compare}.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
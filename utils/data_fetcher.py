@@ -26,7 +26,6 @@ Supports:
     
 """
 
-import requests # For real API calls 
 import random # random data generation
 import datetime # Timestamping
 
@@ -65,6 +64,7 @@ def fetch_live_traffic_data(api_key=None):
     try:
         # Example structure: replace URL and params with real API later
         params = {"key": api_key, "region": "US"}
+        import requests # only the live API needs it; imported on first use
         response = requests.get(TRAFFIC_API_URL, params=params)
         response.raise_for_status()
         return response.json()
@@ -77,6 +77,7 @@ def fetch_live_accident_data(api_key=None):
     """Fetch live accident data from an external API."""
     try:
         params = {"key": api_key, "region": "US"}
+        import requests
         response = requests.get(ACCIDENT_API_URL, params=params)
         response.raise_for_status()
         return response.json()
@@ -9,25 +9,109 @@ Includes:
     - User management
     - Traffic data
     - Accident data
+
+With DB_SHARDS > 1, traffic and accident rows live in per-city-group
+shard files next to DB_PATH (see shard_handler): inserts are split by
+city, city queries open one shard, and global queries run on every
+shard at once and merge the results. Users always stay in DB_PATH.
 """
 
 
 
 import sqlite3
+import threading
 from contextlib import closing
+from urllib.parse import quote
 import os, sys
 
 # -------------------------------------------------------------------
 # DATABASE CONFIGURATION
 # -------------------------------------------------------------------
 DB_PATH = "database.db"
-sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+DB_SHARDS = 0          # shard files for traffic/accident rows; 0 or 1 keeps them in DB_PATH
+if __name__ == "__main__":
+    sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils import shard_handler
+from utils.metrics_handler import timed_query
+from utils.log_handler import get_logger
+
+logger = get_logger(__name__)
+
+# (database path, shard count) pairs whose tables have been created in this process
+_ready_paths = set()
+_ready_lock = threading.Lock()
+
+# callbacks run after bulk inserts, e.g. to keep heatmaps up to date
+_insert_listeners = []
+
+
+# A function to register a callback for newly inserted rows
+def register_insert_listener(callback):
+    """Registers callback(table, records) to run after every bulk insert."""
+    if callback not in _insert_listeners:
+        _insert_listeners.append(callback)
+
+
+# A function to pass newly inserted rows to every listener
+def _notify_insert(table, records):
+    """Runs insert listeners; a failing listener never fails the insert."""
+    for callback in _insert_listeners:
+        try:
+            callback(table, records)
+        except Exception as e:
+            logger.error("Insert listener failed for %s: %s", table, e)
+
+
+# A function to list the database files holding traffic and accident rows
+def data_paths():
+    """The shard files, or [DB_PATH] when the database is not sharded."""
+    return shard_handler.shard_paths(DB_PATH, DB_SHARDS)
+
+
+# A function to find the database file holding one city's rows
+def city_path(city):
+    return shard_handler.shard_for(DB_PATH, DB_SHARDS, city)
+
+
+# A function to create the traffic and accident tables in one database file
+def _create_data_tables(cursor):
+    # Traffic data table
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS traffic_data (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            city TEXT NOT NULL,
+            traffic_level TEXT NOT NULL,
+            accidents INTEGER,
+            avg_speed INTEGER,
+            accident_type TEXT,
+            timestamp TEXT
+        );
+    """)
+
+    # Accident data table
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS accident_data (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            city TEXT NOT NULL,
+            date TEXT NOT NULL,
+            fatal INTEGER DEFAULT 0,
+            type TEXT,
+            description TEXT
+        );
+    """)
 
+    # Indexes for time-window and per-city aggregates
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_traffic_data_timestamp ON traffic_data (timestamp);")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_traffic_data_city ON traffic_data (city, timestamp);")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_accident_data_date ON accident_data (date);")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_accident_data_city ON accident_data (city, date);")
 
 
 # A function to initialize the database and create necessary tables
+@timed_query
 def init_db():
-    """Initialize tables for traffic, accident, and users."""
+    """Initialize tables for traffic, accident, and users (and every shard file)."""
     with closing(sqlite3.connect(DB_PATH)) as conn:
         cursor = conn.cursor()
 
@@ -40,101 +124,239 @@ def init_db():
                 password TEXT NOT NULL
             );
         """)
+        _create_data_tables(cursor)
 
-        # Traffic data table
+        # simulation state shared by every worker (simulation_session_handler)
         cursor.execute("""
-            CREATE TABLE IF NOT EXISTS traffic_data (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                city TEXT NOT NULL,
-                traffic_level TEXT NOT NULL,
-                accidents INTEGER,
-                avg_speed INTEGER,
-                accident_type TEXT,
-                timestamp TEXT
+            CREATE TABLE IF NOT EXISTS simulation_sessions (
+                session_id TEXT PRIMARY KEY,
+                version INTEGER NOT NULL,
+                state BLOB NOT NULL,
+                updated_at REAL NOT NULL
             );
         """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_simulation_sessions_updated "
+                       "ON simulation_sessions (updated_at);")
+        conn.commit()
 
-        # Accident data table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS accident_data (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                city TEXT NOT NULL,
-                date TEXT NOT NULL,
-                fatal INTEGER DEFAULT 0,
-                type TEXT,
-                description TEXT
-            );
-        """)
+    # one after another, not on the shard pool: wsgi.py runs this before forking
+    if DB_SHARDS > 1:
+        for path in data_paths():
+            with closing(sqlite3.connect(path)) as conn:
+                _create_data_tables(conn.cursor())
+                conn.commit()
+    _ready_paths.add((DB_PATH, DB_SHARDS))
+    logger.info("Database initialized successfully (%d shards).", max(DB_SHARDS, 1))
 
-        conn.commit()
-        print("[INFO] Database initialized successfully.")
+
+# A function to initialize the database on first use only
+def ensure_db():
+    """
+    Runs init_db() once per database path; later calls return at once.
+    Safe to call on every request and from many threads.
+    """
+    if (DB_PATH, DB_SHARDS) in _ready_paths:
+        return
+    with _ready_lock:
+        if (DB_PATH, DB_SHARDS) not in _ready_paths:
+            init_db()
+
+
+# A function to insert records into their shards, one transaction per shard
+def _insert_sharded(sql, records):
+    def insert(group):
+        path, rows = group
+        with closing(sqlite3.connect(path)) as conn:
+            conn.executemany(sql, rows)
+            conn.commit()
+
+    # shards are separate files, so their writes don't wait on each other
+    shard_handler.fan_out(insert, shard_handler.partition(records, DB_PATH, DB_SHARDS).items())
 
 
 # A function to insert multiple traffic records into the database
+@timed_query
 def insert_bulk_traffic_data(records):
     """Insert multiple traffic records into the database."""
     if not records:
-        print("[WARN] No traffic data to insert.")
+        logger.warning("No traffic data to insert.")
         return
-    with closing(sqlite3.connect(DB_PATH)) as conn:
-        cursor = conn.cursor()
-        cursor.executemany("""
-            INSERT INTO traffic_data (city, traffic_level, accidents, avg_speed, accident_type, timestamp)
-            VALUES (:city, :traffic_level, :accidents, :avg_speed, :accident_type, :timestamp)
-        """, records)
-        conn.commit()
-        print(f"[INFO] Inserted {len(records)} traffic records.")
+    _insert_sharded("""
+        INSERT INTO traffic_data (city, traffic_level, accidents, avg_speed, accident_type, timestamp)
+        VALUES (:city, :traffic_level, :accidents, :avg_speed, :accident_type, :timestamp)
+    """, records)
+    logger.info("Inserted %d traffic records.", len(records))
+    _notify_insert("traffic_data", records)
 
-# A function to retrieve all traffic records from the database
-def get_all_traffic_data():
-    """Retrieve all traffic records."""
-    with closing(sqlite3.connect(DB_PATH)) as conn:
+# A function to run one query on a database file and return its rows as dicts
+def _fetch_dicts(path, sql, params=()):
+    with closing(sqlite3.connect(path)) as conn:
         cursor = conn.cursor()
-        cursor.execute("SELECT * FROM traffic_data ORDER BY id DESC;")
+        cursor.execute(sql, params)
         rows = cursor.fetchall()
         columns = [col[0] for col in cursor.description]
         return [dict(zip(columns, row)) for row in rows]
 
+
+# A function to run one query on every shard at once and concatenate the rows
+def _fetch_all_shards(sql, params=()):
+    parts = shard_handler.fan_out(lambda path: _fetch_dicts(path, sql, params), data_paths())
+    return [row for part in parts for row in part]
+
+
+# A function to retrieve all traffic records from the database
+@timed_query
+def get_all_traffic_data():
+    """Retrieve all traffic records, newest first (merged across shards)."""
+    rows = _fetch_all_shards("SELECT * FROM traffic_data ORDER BY timestamp DESC, id DESC;")
+    if DB_SHARDS > 1:
+        # each shard is already in order; the stable sort merges them and keeps ties in id order
+        rows.sort(key=lambda row: row["timestamp"] or "", reverse=True)
+    return rows
+
 # A function to retrieve traffic data for a specific city
+@timed_query
 def get_city_data(city_name):
     """Retrieve traffic data filtered by city."""
-    # retrieve traffic data for the specified city from the database
-    with closing(sqlite3.connect(DB_PATH)) as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM traffic_data WHERE city = ? ORDER BY timestamp DESC;", (city_name,))
-        rows = cursor.fetchall()
-        columns = [col[0] for col in cursor.description]
-        return [dict(zip(columns, row)) for row in rows]
+    # retrieve traffic data for the specified city from its shard
+    return _fetch_dicts(city_path(city_name),
+                        "SELECT * FROM traffic_data WHERE city = ? ORDER BY timestamp DESC;", (city_name,))
+
+
+
+# A function to aggregate recent congestion per city
+@timed_query
+def get_congestion_by_city(hours=1):
+    """
+    Returns per-city congestion over the last N hours, aggregated in SQL
+    (uses the timestamp index instead of loading every row).
+    traffic_level is mapped to 1 (Low) .. 4 (Severe).
+    A city lives in one shard, so the shards' rows are simply joined.
+    """
+    return _fetch_all_shards("""
+            SELECT city,
+                   COUNT(*) AS records,
+                   AVG(avg_speed) AS avg_speed,
+                   AVG(CASE lower(traffic_level)
+                           WHEN 'low' THEN 1
+                           WHEN 'medium' THEN 2
+                           WHEN 'moderate' THEN 2
+                           WHEN 'high' THEN 3
+                           WHEN 'severe' THEN 4
+                       END) AS avg_level,
+                   SUM(accidents) AS accidents
+            FROM traffic_data
+            WHERE timestamp >= datetime('now', 'localtime', ?)
+            GROUP BY city;
+        """, (f'-{hours} hours',))
+
 
+# A function to total the traffic table without loading its rows
+@timed_query
+def get_traffic_totals():
+    """
+    Returns {records, cities, speed_sum, accident_sum} over every shard.
+    Each shard sums its own rows in SQL; the partial sums are added up
+    here (a city lives in one shard, so city counts add up too).
+    """
+    parts = _fetch_all_shards("""
+        SELECT COUNT(*) AS records,
+               COUNT(DISTINCT NULLIF(city, '')) AS cities,
+               TOTAL(avg_speed) AS speed_sum,
+               TOTAL(accidents) AS accident_sum
+        FROM traffic_data;
+    """)
+    return {key: sum(part[key] for part in parts) for key in ("records", "cities", "speed_sum", "accident_sum")}
 
 
+# A function to count recent accidents per city
+@timed_query
+def get_accident_counts_by_city(days=7):
+    """Returns {city: accidents in the past N days}, counted in SQL on every shard."""
+    counts = {}
+    for row in _fetch_all_shards("""
+        SELECT city, COUNT(*) AS accidents
+        FROM accident_data
+        WHERE date >= DATE('now', ?)
+        GROUP BY city;
+    """, (f'-{days} day',)):
+        counts[row["city"]] = counts.get(row["city"], 0) + row["accidents"]
+    return counts
+
+
+# A function to check that the database answers a trivial query
+def ping():
+    """
+    Runs SELECT 1 on every database file; raises sqlite3.Error when one is
+    unreachable. Files are opened read-only, so a missing database or
+    shard fails the check instead of being created empty.
+    """
+    for path in dict.fromkeys([DB_PATH] + data_paths()):
+        with closing(sqlite3.connect(f"file:{quote(path)}?mode=ro", uri=True, timeout=1)) as conn:
+            conn.execute("SELECT 1;").fetchone()
+
+
+# A function to read table sizes and the newest timestamps without scanning
+@timed_query
+def get_table_stats():
+    """
+    Returns approximate row counts and the newest record time per table.
+    Counts come from sqlite_sequence (ids handed out by AUTOINCREMENT, so
+    exact unless rows were deleted); newest times are index lookups.
+    Shards are read at once and their counts added up.
+    """
+    def read(path):
+        with closing(sqlite3.connect(path, timeout=1)) as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT name, seq FROM sqlite_sequence;")
+            counts = dict(cursor.fetchall())
+            newest_traffic = cursor.execute("SELECT MAX(timestamp) FROM traffic_data;").fetchone()[0]
+            newest_accident = cursor.execute("SELECT MAX(id) FROM accident_data;").fetchone()[0]
+            if newest_accident is not None:
+                newest_accident = cursor.execute("SELECT date FROM accident_data WHERE id = ?;",
+                                                 (newest_accident,)).fetchone()[0]
+        return counts, newest_traffic, newest_accident
+
+    paths = list(dict.fromkeys([DB_PATH] + data_paths()))
+    parts = shard_handler.fan_out(read, paths)
+    rows = {table: 0 for table in ("traffic_data", "accident_data", "users")}
+    for path, (counts, _, _) in zip(paths, parts):
+        for table in rows:
+            # with shards, data rows left in DB_PATH are not served, so not counted
+            if table == "users" or path in data_paths():
+                rows[table] += counts.get(table, 0)
+    newest = {
+        "traffic_data": max((p[1] for p in parts if p[1] is not None), default=None),
+        "accident_data": max((p[2] for p in parts if p[2] is not None), default=None),
+    }
+    return {"rows": rows, "newest": newest}
+
+
+@timed_query
 def insert_bulk_accident_data(records):
     """Insert multiple accident records."""
     if not records:
-        print("[WARN] No accident data to insert.")
+        logger.warning("No accident data to insert.")
         return
-    with closing(sqlite3.connect(DB_PATH)) as conn:
-        cursor = conn.cursor()
-        cursor.executemany("""
-            INSERT INTO accident_data (city, date, fatal, type, description)
-            VALUES (:city, :date, :fatal, :type, :description)
-        """, records)
-        conn.commit()
-        print(f"[INFO] Inserted {len(records)} accident records.")
+    _insert_sharded("""
+        INSERT INTO accident_data (city, date, fatal, type, description)
+        VALUES (:city, :date, :fatal, :type, :description)
+    """, records)
+    logger.info("Inserted %d accident records.", len(records))
+    _notify_insert("accident_data", records)
 
 
+@timed_query
 def get_accident_data(days=7):
     """Retrieve accident records from the past N days."""
-    with closing(sqlite3.connect(DB_PATH)) as conn:
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT * FROM accident_data
-            WHERE date >= DATE('now', ?)
-            ORDER BY date DESC;
-        """, (f'-{days} day',))
-        rows = cursor.fetchall()
-        columns = [col[0] for col in cursor.description]
-        return [dict(zip(columns, row)) for row in rows]
+    rows = _fetch_all_shards("""
+        SELECT * FROM accident_data
+        WHERE date >= DATE('now', ?)
+        ORDER BY date DESC;
+    """, (f'-{days} day',))
+    if DB_SHARDS > 1:
+        rows.sort(key=lambda row: row["date"], reverse=True)
+    return rows
 
 
 
@@ -0,0 +1,545 @@
+# utils/export_handler.py
+"""
+export_handler.py
+------------------------------------
+Exports traffic_data and accident_data as CSV, JSONL or Parquet.
+
+Rows are read from one SQLite cursor per shard (see shard_handler) in
+fixed-size batches (fetchmany(BATCH_SIZE)), in time order along the
+(city, time) / (time) indexes, so SQLite never sorts or buffers the
+result and memory stays constant whatever the size of the export. The
+shards' rows are merged into one time-ordered stream, and each batch is
+encoded and handed on (to the HTTP response, a file, or stdout) before
+the next one is read.
+
+Large exports can run as background jobs: the file is written to
+EXPORT_DIR with a small JSON status file beside it, so any worker
+process can report on it, and the finished file is served with HTTP
+Range support, so a broken download resumes where it stopped. Each
+job records its owner, and the process that queues it holds an flock
+on <id>.lock until the job finishes; the kernel drops the lock when
+that process exits, so a job whose lock can be taken can never finish
+(a restart or a crashed worker), whatever process now has its pid.
+recover_export_jobs() marks such jobs failed at startup and before
+every submit. At most EXPORT_USER_JOBS jobs per owner, and
+EXPORT_QUEUE_LIMIT in all, can be queued or running at once; past that,
+submit_export_job raises ExportBusy. The count and the new job's status
+file are written under an flock on submit.lock in EXPORT_DIR, so
+workers submitting at the same moment can't overshoot the limits.
+
+Parquet needs pyarrow (pip install pyarrow); CSV and JSONL need nothing.
+
+Usage:
+    python -m utils.export_handler traffic_data --format csv --city Boston --start 2025-01-01 > boston.csv
+    python -m utils.export_handler accident_data --format parquet --out accidents.parquet --shards 8
+
+Classes:
+    - ExportError
+    - ExportBusy
+
+Functions:
+    - iter_batches(table, city, start, end, batch_size)
+    - stream_export(table, fmt, city, start, end)
+    - write_export(table, fmt, out, city, start, end)
+    - submit_export_job(table, fmt, city, start, end, owner)
+    - get_export_job(job_id)
+    - list_export_jobs(owner)
+    - recover_export_jobs()
+"""
+
+import os
+import sys
+import io
+import csv
+import heapq
+import json
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import closing, ExitStack
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from itertools import islice
+try:
+    import fcntl
+except ImportError:   # not on Windows; job liveness then falls back to the pid
+    fcntl = None
+if __name__ == "__main__":
+    sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils import db_handler
+from utils.log_handler import get_logger
+
+logger = get_logger(__name__)
+
+# -------------------------------------------------------------------
+# EXPORT SETTINGS
+# -------------------------------------------------------------------
+BATCH_SIZE = int(os.environ.get("EXPORT_BATCH_SIZE", 5_000))
+EXPORT_DIR = os.environ.get("EXPORT_DIR", "exports")
+EXPORT_WORKERS = int(os.environ.get("EXPORT_WORKERS", 2))
+EXPORT_TTL = float(os.environ.get("EXPORT_TTL", 24 * 3600))   # seconds a finished job is kept
+EXPORT_USER_JOBS = int(os.environ.get("EXPORT_USER_JOBS", 2))                      # active jobs per owner
+EXPORT_QUEUE_LIMIT = int(os.environ.get("EXPORT_QUEUE_LIMIT", EXPORT_WORKERS * 4))  # active jobs in all
+
+# table -> (time column, time format) for the start/end filters
+EXPORT_TABLES = {
+    "traffic_data": ("timestamp", "%Y-%m-%d %H:%M:%S"),
+    "accident_data": ("date", "%Y-%m-%d"),
+}
+FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "jsonl": ("application/x-ndjson", "jsonl"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+JOB_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+
+class ExportError(ValueError):
+    """Raised for a bad table, format or filter value."""
+
+
+class ExportBusy(Exception):
+    """Raised when too many export jobs are queued or running; retry later."""
+
+
+# A function to turn a date / datetime string into the table's stored format
+def _parse_time(value, time_format, name):
+    if not value:
+        return None
+    for pattern in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%dT%H:%M", "%Y-%m-%d"):
+        try:
+            parsed = datetime.strptime(value, pattern)
+        except ValueError:
+            continue
+        if name == "end" and pattern == "%Y-%m-%d":
+            # a bare end date includes that whole day
+            parsed = parsed.replace(hour=23, minute=59, second=59)
+        return parsed.strftime(time_format)
+    raise ExportError(f"{name} must be a date (YYYY-MM-DD) or datetime (YYYY-MM-DD HH:MM:SS).")
+
+
+# A function to check the export parameters and build the query
+def _build_query(table, city=None, start=None, end=None):
+    if table not in EXPORT_TABLES:
+        raise ExportError(f"table must be one of: {', '.join(EXPORT_TABLES)}.")
+    time_column, time_format = EXPORT_TABLES[table]
+    conditions, params = [], []
+    if city:
+        conditions.append("city = ?")
+        params.append(city)
+    start, end = _parse_time(start, time_format, "start"), _parse_time(end, time_format, "end")
+    if start:
+        conditions.append(f"{time_column} >= ?")
+        params.append(start)
+    if end:
+        conditions.append(f"{time_column} <= ?")
+        params.append(end)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    # index order ((city,) time, rowid): no sort step, rows come straight off the index
+    return f"SELECT * FROM {table} {where} ORDER BY {time_column}, id;", params
+
+
+# A function to read one cursor in fixed-size batches, a row at a time
+def _cursor_rows(cursor, batch_size):
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            return
+        yield from rows
+
+
+# A function to read an export from the shard cursors in fixed-size batches
+def iter_batches(table, city=None, start=None, end=None, batch_size=BATCH_SIZE):
+    """
+    Yields (columns, rows) with at most batch_size rows at a time; an
+    empty result still yields (columns, []) once, so headers get written.
+    A city is read from its own shard. Otherwise every shard is read in
+    time order at once and the rows are merged, so the export stays in
+    time order with one batch per shard in memory.
+    """
+    query, params = _build_query(table, city, start, end)
+    paths = [db_handler.city_path(city)] if city else db_handler.data_paths()
+    with ExitStack() as stack:
+        cursors = [stack.enter_context(closing(sqlite3.connect(path))).execute(query, params) for path in paths]
+        columns = [col[0] for col in cursors[0].description]
+        if len(cursors) == 1:
+            rows = _cursor_rows(cursors[0], batch_size)
+        else:
+            at, row_id = columns.index(EXPORT_TABLES[table][0]), columns.index("id")
+            rows = heapq.merge(*(_cursor_rows(cursor, batch_size) for cursor in cursors),
+                               key=lambda row: (row[at] or "", row[row_id]))
+        batch = list(islice(rows, batch_size))
+        yield columns, batch
+        while batch:
+            batch = list(islice(rows, batch_size))
+            if batch:
+                yield columns, batch
+
+
+# -------------------------------------------------------------------
+# ENCODERS
+# Each takes the batches and yields encoded bytes, one chunk per batch.
+# Parquet also needs the declared column types for a fixed schema.
+# -------------------------------------------------------------------
+def _encode_csv(batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    header = False
+    for columns, rows in batches:
+        if not header:
+            writer.writerow(columns)
+            header = True
+        writer.writerows(rows)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def _encode_jsonl(batches):
+    for columns, rows in batches:
+        yield "".join(json.dumps(dict(zip(columns, row))) + "\n" for row in rows).encode("utf-8")
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that hands its bytes on instead of keeping them."""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+# A function to read the declared column types of a table (the same in every shard)
+def _column_types(table):
+    with closing(sqlite3.connect(db_handler.data_paths()[0])) as conn:
+        return {name: declared.upper() for _, name, declared, *_ in conn.execute(f"PRAGMA table_info({table});")}
+
+
+def _encode_parquet(batches, types):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ExportError("Parquet export needs pyarrow (pip install pyarrow).")
+
+    # schema from the declared SQLite types, so every row group matches
+    # (and an export with no rows is still a valid, empty file)
+    schema = pa.schema([(name, pa.int64() if "INT" in declared else
+                         pa.float64() if declared in ("REAL", "FLOAT", "DOUBLE") else pa.string())
+                        for name, declared in types.items()])
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema)
+    try:
+        for _, rows in batches:
+            arrays = []
+            for i, field in enumerate(schema):
+                values = [row[i] for row in rows]
+                if pa.types.is_string(field.type):
+                    values = [None if v is None else str(v) for v in values]
+                arrays.append(pa.array(values, type=field.type))
+            # one row group per batch; the footer is written on close
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+ENCODERS = {"csv": _encode_csv, "jsonl": _encode_jsonl}
+
+
+# A function to stream an export as encoded chunks
+def stream_export(table, fmt="csv", city=None, start=None, end=None, batch_size=BATCH_SIZE):
+    """
+    Checks the parameters, then returns a generator of byte chunks (one
+    per batch). Raises ExportError before any row is read.
+    """
+    if fmt not in FORMATS:
+        raise ExportError(f"format must be one of: {', '.join(FORMATS)}.")
+    _build_query(table, city, start, end)
+    if fmt == "parquet":
+        try:
+            import pyarrow  # noqa: F401 (fail now, not halfway through a response)
+        except ImportError:
+            raise ExportError("Parquet export needs pyarrow (pip install pyarrow).")
+    batches = iter_batches(table, city, start, end, batch_size)
+    if fmt == "parquet":
+        return _encode_parquet(batches, _column_types(table))
+    return ENCODERS[fmt](batches)
+
+
+# A function to write an export to a file object
+def write_export(table, fmt, out, city=None, start=None, end=None, batch_size=BATCH_SIZE, progress=None):
+    """Writes the export to the binary file `out`; returns bytes written."""
+    written = 0
+    for chunk in stream_export(table, fmt, city, start, end, batch_size):
+        out.write(chunk)
+        written += len(chunk)
+        if progress:
+            progress(written)
+    return written
+
+
+# -------------------------------------------------------------------
+# BACKGROUND JOBS
+# -------------------------------------------------------------------
+ACTIVE_STATUSES = ("queued", "running")
+
+_executor = None
+_executor_lock = threading.Lock()
+_submit_lock = threading.Lock()
+
+# locked files of the jobs this process has queued or is running, by id
+_job_locks = {}
+
+
+def _job_paths(job_id):
+    return os.path.join(EXPORT_DIR, f"{job_id}.json"), os.path.join(EXPORT_DIR, job_id)
+
+
+def _lock_path(name):
+    return os.path.join(EXPORT_DIR, f"{name}.lock")
+
+
+# A function to take an exclusive flock on a file in EXPORT_DIR
+def _take_lock(path, wait=False):
+    """Returns the open, locked file, or None when another process holds the lock."""
+    f = open(path, "a")
+    if fcntl is not None:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX if wait else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            f.close()
+            return None
+    return f
+
+
+# A function to let go of a job's lock once it has finished
+def _release_job(job_id):
+    lock = _job_locks.pop(job_id, None)
+    if lock is not None:
+        try:
+            os.remove(lock.name)
+        except FileNotFoundError:
+            pass
+        lock.close()
+
+
+# A function to save a job's status next to its file
+def _save_job(job):
+    status_path, _ = _job_paths(job["id"])
+    tmp = f"{status_path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(job, f)
+    os.replace(tmp, status_path)
+
+
+# A function to run one export job to a file
+def _run_job(job):
+    _, data_path = _job_paths(job["id"])
+    try:
+        job.update(status="running", started_at=time.time())
+        _save_job(job)
+        last_saved = [time.monotonic()]
+
+        def progress(written):
+            job["bytes"] = written
+            if time.monotonic() - last_saved[0] > 1:
+                last_saved[0] = time.monotonic()
+                _save_job(job)
+
+        try:
+            with open(f"{data_path}.part", "wb") as out:
+                write_export(job["table"], job["format"], out, job["city"], job["start"], job["end"],
+                             progress=progress)
+            os.replace(f"{data_path}.part", data_path)
+            job.update(status="done", bytes=os.path.getsize(data_path), finished_at=time.time())
+            logger.info("Export %s finished: %d bytes.", job["id"], job["bytes"])
+        except Exception as e:
+            logger.exception("Export %s failed: %s", job["id"], e)
+            job.update(status="failed", error=str(e), finished_at=time.time())
+            if os.path.exists(f"{data_path}.part"):
+                os.remove(f"{data_path}.part")
+        _save_job(job)
+    finally:
+        # the status is final (or unwritable); the next recovery decides either way
+        _release_job(job["id"])
+
+
+# A function to delete jobs older than EXPORT_TTL
+def _prune_jobs():
+    now = time.time()
+    for job in list_export_jobs():
+        if job["status"] in ("done", "failed") and now - job.get("finished_at", now) > EXPORT_TTL:
+            for path in (*_job_paths(job["id"]), _lock_path(job["id"])):
+                if os.path.exists(path):
+                    os.remove(path)
+
+
+# A function to check whether a process is still running
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+# A function to check whether the process that queued a job still holds it
+def _job_alive(job):
+    """
+    True while some process holds the job's lock. A pid alone can't tell:
+    after a restart the same low pids come back for other processes.
+    """
+    if job["id"] in _job_locks:
+        return True
+    if fcntl is None:
+        return bool(job.get("pid")) and _alive(job["pid"])
+    probe = _take_lock(_lock_path(job["id"]))
+    if probe is None:
+        return True
+    probe.close()
+    return False
+
+
+# A function to start an export in the background
+def submit_export_job(table, fmt="csv", city=None, start=None, end=None, owner=None):
+    """
+    Queues an export on the export pool and returns its job record.
+    Raises ExportBusy when `owner` already has EXPORT_USER_JOBS active
+    jobs, or EXPORT_QUEUE_LIMIT jobs are active in all.
+    """
+    global _executor
+    stream_export(table, fmt, city, start, end)     # validate before queueing
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    _prune_jobs()
+    with _submit_lock, closing(_take_lock(_lock_path("submit"), wait=True)):
+        # status files are shared, so this counts the jobs of every worker;
+        # jobs of processes that are gone no longer count
+        recover_export_jobs()
+        active = [job for job in list_export_jobs() if job["status"] in ACTIVE_STATUSES]
+        if len(active) >= EXPORT_QUEUE_LIMIT:
+            raise ExportBusy("Too many exports are running. Please try again later.")
+        if sum(job.get("owner") == owner for job in active) >= EXPORT_USER_JOBS:
+            raise ExportBusy(f"You already have {EXPORT_USER_JOBS} exports running. "
+                             f"Wait for one to finish.")
+        job = {"id": uuid.uuid4().hex, "table": table, "format": fmt, "city": city, "start": start, "end": end,
+               "owner": owner, "pid": os.getpid(), "status": "queued", "bytes": 0, "created_at": time.time()}
+        # locked before the status file exists, so no other worker sees it unlocked
+        _job_locks[job["id"]] = _take_lock(_lock_path(job["id"]))
+        _save_job(job)
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=EXPORT_WORKERS, thread_name_prefix="export")
+    _executor.submit(_run_job, dict(job))
+    return job
+
+
+# A function to read a job's status
+def get_export_job(job_id):
+    """Returns the job record, or None for an unknown id."""
+    if not JOB_ID_PATTERN.match(job_id):
+        return None
+    status_path, _ = _job_paths(job_id)
+    try:
+        with open(status_path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+# A function to find the finished file of a job
+def export_file(job_id):
+    """Returns (path, download name) of a finished export, or None."""
+    job = get_export_job(job_id)
+    if job is None or job["status"] != "done":
+        return None
+    _, data_path = _job_paths(job_id)
+    return data_path, f"{job['table']}-{job_id[:8]}.{FORMATS[job['format']][1]}"
+
+
+# A function to list every known job, newest first
+def list_export_jobs(owner=None):
+    """Returns the job records in EXPORT_DIR (only `owner`'s, if given), newest first."""
+    if not os.path.isdir(EXPORT_DIR):
+        return []
+    jobs = [get_export_job(name[:-5]) for name in os.listdir(EXPORT_DIR) if name.endswith(".json")]
+    jobs = [job for job in jobs if job and (owner is None or job.get("owner") == owner)]
+    return sorted(jobs, key=lambda job: job["created_at"], reverse=True)
+
+
+# A function to fail the jobs whose process has gone away
+def recover_export_jobs():
+    """
+    Marks queued or running jobs failed when no process holds their lock
+    any more (their threads died with the process that queued them), and
+    removes their partial and lock files. Returns the ids of the jobs it
+    failed.
+    """
+    failed = []
+    for job in list_export_jobs():
+        if job["status"] not in ACTIVE_STATUSES or _job_alive(job):
+            continue
+        _, data_path = _job_paths(job["id"])
+        for path in (f"{data_path}.part", _lock_path(job["id"])):
+            if os.path.exists(path):
+                os.remove(path)
+        job.update(status="failed", error="Interrupted by a server restart.", finished_at=time.time())
+        _save_job(job)
+        failed.append(job["id"])
+    if failed:
+        logger.warning("Marked %d interrupted export jobs failed.", len(failed))
+    return failed
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Export traffic or accident data.")
+    parser.add_argument("table", choices=list(EXPORT_TABLES))
+    parser.add_argument("--format", choices=list(FORMATS), default="csv")
+    parser.add_argument("--city")
+    parser.add_argument("--start", help="YYYY-MM-DD or 'YYYY-MM-DD HH:MM:SS'")
+    parser.add_argument("--end", help="YYYY-MM-DD or 'YYYY-MM-DD HH:MM:SS'")
+    parser.add_argument("--out", default="-", help="output file (default: stdout)")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--db", default=db_handler.DB_PATH)
+    parser.add_argument("--shards", type=int, default=int(os.environ.get("DB_SHARDS", db_handler.DB_SHARDS)),
+                        help="shard files next to --db (as served with DB_SHARDS)")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        raise SystemExit(f"[ERROR] Database not found: {args.db}")
+    db_handler.DB_PATH, db_handler.DB_SHARDS = args.db, args.shards
+    started = time.perf_counter()
+    try:
+        if args.out == "-":
+            written = write_export(args.table, args.format, sys.stdout.buffer, args.city, args.start, args.end,
+                                   args.batch_size)
+        else:
+            with open(args.out, "wb") as out:
+                written = write_export(args.table, args.format, out, args.city, args.start, args.end,
+                                       args.batch_size)
+    except ExportError as e:
+        raise SystemExit(f"[ERROR] {e}")
+    print(f"[INFO] Wrote {written} bytes in {time.perf_counter() - started:.1f} s.", file=sys.stderr)
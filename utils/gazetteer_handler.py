@@ -0,0 +1,286 @@
+# utils/gazetteer_handler.py
+"""
+gazetteer_handler.py
+------------------------------------
+Local city gazetteer for search, autocomplete and coordinate lookup.
+
+Loads the bundled U.S. city list (data/us_cities.csv) once into a
+sorted-array index of normalized names. Prefix lookups are two binary
+searches into that array, and fuzzy lookups use a small bigram index
+so a typo like "Seatle" still finds "Seattle".
+
+Functions:
+    - normalize_name(name)
+    - load_gazetteer(path)
+    - suggest_cities(query, limit)
+    - fuzzy_match_cities(query, limit)
+    - resolve_city(name, strict)
+    - resolve_coordinates(name)
+"""
+
+import os, sys
+import csv
+import heapq
+import unicodedata
+from bisect import bisect_left, bisect_right
+from functools import lru_cache
+if __name__ == "__main__":
+    sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from utils.log_handler import get_logger
+
+logger = get_logger(__name__)
+
+# -------------------------------------------------------------------
+# GAZETTEER CONFIGURATION
+# -------------------------------------------------------------------
+GAZETTEER_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'data', 'us_cities.csv'))
+
+# word-level aliases applied during normalization so both spellings match
+NAME_ALIASES = {"saint": "st", "fort": "ft", "mount": "mt"}
+
+# common names that differ from the GeoNames spelling as a whole
+CITY_ALIASES = {"new york": "new york city", "nyc": "new york city"}
+
+# minimum bigram similarity (Dice coefficient) for a fuzzy match
+FUZZY_THRESHOLD = 0.5
+
+# stricter rules for resolving a stored name to one place (map markers):
+# only near-identical spellings of names at least this long count
+STRICT_FUZZY_THRESHOLD = 0.85
+STRICT_MIN_LENGTH = 4
+
+# loaded index, built on first use
+_gazetteer = None
+
+
+# A function to normalize a city name for indexing and lookups
+def normalize_name(name):
+    """
+    Lowercases, strips accents and punctuation, and collapses spaces.
+    "St. Louis" and "Saint Louis" both become "st louis".
+    """
+    if not name:
+        return ""
+    text = unicodedata.normalize("NFKD", str(name))
+    text = "".join(ch for ch in text if not unicodedata.combining(ch)).casefold()
+    text = "".join(ch if ch.isalnum() else " " for ch in text)
+    words = [NAME_ALIASES.get(word, word) for word in text.split()]
+    return " ".join(words)
+
+
+# A function to split a normalized name into padded bigrams
+def _bigrams(key):
+    """Returns the set of character bigrams for a normalized key."""
+    padded = f" {key} "
+    return {padded[i:i + 2] for i in range(len(padded) - 1)}
+
+
+# A function to load the city file into a sorted-array index
+def load_gazetteer(path=GAZETTEER_PATH):
+    """
+    Reads the gazetteer CSV and builds the lookup index.
+
+    Returns a dictionary with:
+        records  - list of city dicts (name, state, latitude, longitude, population)
+        keys     - sorted list of normalized names
+        ids      - record index for each entry in keys
+        bigrams  - bigram -> list of record indexes (for fuzzy matching)
+        sizes    - bigram count of each record's normalized name
+    """
+    records = []
+    with open(path, newline="", encoding="utf-8") as f:
+        rows = csv.DictReader(line for line in f if not line.startswith("#"))
+        for row in rows:
+            records.append({
+                "name": row["name"],
+                "state": row["state"],
+                "latitude": float(row["latitude"]),
+                "longitude": float(row["longitude"]),
+                "population": int(row["population"] or 0),
+            })
+
+    # sort (key, record id) pairs so prefix lookups are a binary search
+    entries = sorted((normalize_name(rec["name"]), i) for i, rec in enumerate(records))
+    keys = [key for key, _ in entries]
+    ids = [i for _, i in entries]
+
+    bigrams = {}
+    sizes = [0] * len(records)
+    for key, i in entries:
+        grams = _bigrams(key)
+        sizes[i] = len(grams)
+        for gram in grams:
+            bigrams.setdefault(gram, []).append(i)
+
+    logger.info("Gazetteer loaded with %d cities.", len(records))
+    return {"records": records, "keys": keys, "ids": ids, "bigrams": bigrams, "sizes": sizes}
+
+
+# A function to get the loaded gazetteer, loading it on first use
+def get_gazetteer():
+    """Returns the shared gazetteer index."""
+    global _gazetteer
+    if _gazetteer is None:
+        _gazetteer = load_gazetteer()
+    return _gazetteer
+
+
+# A function to split "City, ST" queries into name and state parts
+def _split_state(query):
+    """Returns (normalized name, state code or None) for a search query."""
+    name, _, state = str(query).partition(",")
+    state = state.strip().upper() or None
+    return normalize_name(name), state
+
+
+# A function to format a record for API responses
+def _to_result(record):
+    """Returns a copy of a gazetteer record safe to hand to callers."""
+    return dict(record)
+
+
+# A function to autocomplete city names from a prefix
+def suggest_cities(query, limit=10):
+    """
+    Returns up to `limit` cities whose normalized name starts with the
+    query, most populous first. Accepts "City, ST" to filter by state.
+    """
+    prefix, state = _split_state(query)
+    if not prefix:
+        return []
+    return [_to_result(rec) for rec in _suggest(prefix, state, limit)]
+
+
+@lru_cache(maxsize=4096)
+def _suggest(prefix, state, limit):
+    """Cached prefix lookup over the sorted key array."""
+    gaz = get_gazetteer()
+    keys, ids, records = gaz["keys"], gaz["ids"], gaz["records"]
+
+    # every key starting with prefix sits in keys[lo:hi]
+    lo = bisect_left(keys, prefix)
+    hi = bisect_left(keys, prefix + "\uffff", lo)
+
+    matches = (ids[i] for i in range(lo, hi))
+    if state:
+        matches = (i for i in matches if records[i]["state"] == state)
+    top = heapq.nlargest(limit, matches, key=lambda i: records[i]["population"])
+    return tuple(records[i] for i in top)
+
+
+# A function to find cities with names similar to a misspelled query
+def fuzzy_match_cities(query, limit=5):
+    """
+    Returns up to `limit` cities whose names are close to the query,
+    ranked by bigram similarity and then population.
+    """
+    key, state = _split_state(query)
+    if not key:
+        return []
+    return [_to_result(rec) for rec in _fuzzy(key, state, limit)]
+
+
+@lru_cache(maxsize=4096)
+def _fuzzy(key, state, limit):
+    """Cached bigram-overlap search."""
+    gaz = get_gazetteer()
+    records, postings, sizes = gaz["records"], gaz["bigrams"], gaz["sizes"]
+    query_grams = _bigrams(key)
+
+    # count shared bigrams per candidate using the postings lists
+    overlap = {}
+    for gram in query_grams:
+        for i in postings.get(gram, ()):
+            overlap[i] = overlap.get(i, 0) + 1
+
+    scored = []
+    for i, shared in overlap.items():
+        rec = records[i]
+        if state and rec["state"] != state:
+            continue
+        score = 2.0 * shared / (len(query_grams) + sizes[i])
+        if score >= FUZZY_THRESHOLD:
+            scored.append((score, rec["population"], i))
+
+    top = heapq.nlargest(limit, scored)
+    return tuple(records[i] for _, _, i in top)
+
+
+# A function to resolve a free-text city name to one gazetteer entry
+def resolve_city(name, strict=False):
+    """
+    Returns the best gazetteer record for a city name, or None.
+    Tries an exact normalized match, then a prefix match, then fuzzy.
+    When several cities share a name the most populous one wins.
+
+    With strict=True only an exact match or a near-identical spelling
+    (a typo in a name of STRICT_MIN_LENGTH+ characters) is accepted, so
+    names like "Unknown" or "X" resolve to None instead of to whichever
+    city happens to start with or resemble them.
+    """
+    record = _resolve(*_split_state(name), strict)
+    return _to_result(record) if record else None
+
+
+@lru_cache(maxsize=4096)
+def _resolve(key, state, strict=False):
+    """Cached lookup behind resolve_city()."""
+    if not key:
+        return None
+    key = CITY_ALIASES.get(key, key)
+
+    gaz = get_gazetteer()
+    keys, ids, records = gaz["keys"], gaz["ids"], gaz["records"]
+
+    # exact matches are a contiguous run in the sorted array
+    lo = bisect_left(keys, key)
+    hi = bisect_right(keys, key, lo)
+    exact = [records[ids[i]] for i in range(lo, hi)]
+    if state:
+        exact = [rec for rec in exact if rec["state"] == state]
+    if exact:
+        return max(exact, key=lambda rec: rec["population"])
+
+    if strict:
+        if len(key) < STRICT_MIN_LENGTH:
+            return None
+        query_grams = _bigrams(key)
+        for rec in _fuzzy(key, state, 1):
+            rec_grams = _bigrams(normalize_name(rec["name"]))
+            score = 2.0 * len(query_grams & rec_grams) / (len(query_grams) + len(rec_grams))
+            if score >= STRICT_FUZZY_THRESHOLD:
+                return rec
+        return None
+
+    for candidates in (_suggest(key, state, 1), _fuzzy(key, state, 1)):
+        if candidates:
+            return candidates[0]
+    return None
+
+
+# A function to look up coordinates for a city name
+def resolve_coordinates(name):
+    """
+    Returns (latitude, longitude) for a city name, or None if unknown.
+    Uses a strict match, so an unplaceable name gets no marker rather
+    than one at the wrong city.
+    """
+    record = resolve_city(name, strict=True)
+    if not record:
+        return None
+    return record["latitude"], record["longitude"]
+
+
+if __name__ == "__main__":
+    import time
+
+    print("[TEST] Loading gazetteer...")
+    get_gazetteer()
+
+    for q in ["san f", "springfield, il", "st louis", "Seatle", "new york"]:
+        start = time.perf_counter()
+        found = suggest_cities(q) or fuzzy_match_cities(q)
+        elapsed = (time.perf_counter() - start) * 1000
+        print(f"{q!r}: {[c['name'] + ', ' + c['state'] for c in found[:5]]} ({elapsed:.3f} ms)")
+
+    print("New York ->", resolve_coordinates("New York"))
@@ -0,0 +1,150 @@
+# utils/health_handler.py
+"""
+health_handler.py
+------------------------------------
+Health probes for load balancers and operators.
+
+Three levels, from cheapest to most detailed:
+    - liveness:  the process answers; no I/O at all
+    - readiness: the database answers SELECT 1
+    - deep:      row counts, ingest lag and disk usage, cached for
+                 HEALTH_CACHE_SECONDS so frequent callers share one report
+
+Row counts come from SQLite metadata (sqlite_sequence) and the newest
+timestamps from index lookups, so even the deep report never scans a
+table. Only one thread rebuilds an expired report; the others keep
+serving the previous one until it is ready.
+
+Functions:
+    - liveness()
+    - readiness()
+    - deep_health(force)
+"""
+
+import os
+import shutil
+import sys
+import threading
+import time
+from datetime import datetime
+if __name__ == "__main__":
+    sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils import db_handler
+from utils.log_handler import get_logger
+
+logger = get_logger(__name__)
+
+# -------------------------------------------------------------------
+# HEALTH SETTINGS
+# -------------------------------------------------------------------
+HEALTH_CACHE_SECONDS = float(os.environ.get("HEALTH_CACHE_SECONDS", 10))
+MAX_INGEST_LAG = float(os.environ.get("MAX_INGEST_LAG", 3600))      # seconds before "degraded"
+MIN_FREE_DISK = int(os.environ.get("MIN_FREE_DISK", 100 * 1024 * 1024))   # bytes
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+STARTED = time.time()
+
+_cache = {"report": None, "expires": 0.0}
+_refresh_lock = threading.Lock()
+
+
+# A function to report that the process is up
+def liveness():
+    """Returns a constant-time status; touches neither disk nor database."""
+    return {"status": "alive", "uptime_seconds": round(time.time() - STARTED, 1)}
+
+
+# A function to check that the database can serve queries
+def readiness():
+    """Returns (report, ready) after one trivial query."""
+    start = time.perf_counter()
+    try:
+        db_handler.ping()
+    except Exception as e:
+        logger.warning("Readiness check failed: %s", e)
+        return {"status": "unavailable", "message": f"Database not reachable: {e}"}, False
+    return {"status": "ready", "db_ms": round((time.perf_counter() - start) * 1000, 2)}, True
+
+
+# A function to work out seconds since the newest traffic record
+def _ingest_lag(newest):
+    if not newest:
+        return None
+    try:
+        newest = datetime.strptime(newest, TIMESTAMP_FORMAT)
+    except ValueError:
+        return None
+    return round((datetime.now() - newest).total_seconds(), 1)
+
+
+# A function to measure the database files and the free space around them
+def _disk_usage(path):
+    db_bytes = sum(os.path.getsize(file + suffix)
+                   for file in dict.fromkeys([path] + db_handler.data_paths())
+                   for suffix in ("", "-wal", "-journal") if os.path.exists(file + suffix))
+    disk = shutil.disk_usage(os.path.dirname(os.path.abspath(path)))
+    return {"db_bytes": db_bytes, "free_bytes": disk.free, "total_bytes": disk.total}
+
+
+# A function to build the full health report
+def _build_report():
+    path = db_handler.DB_PATH
+    try:
+        stats = db_handler.get_table_stats()
+    except Exception as e:
+        logger.warning("Deep health check failed: %s", e)
+        return {"status": "error", "message": f"Health check failed: {e}"}
+
+    lag = _ingest_lag(stats["newest"]["traffic_data"])
+    disk = _disk_usage(path)
+    problems = []
+    if lag is None or lag > MAX_INGEST_LAG:
+        problems.append("traffic data is stale" if lag is not None else "no traffic data yet")
+    if disk["free_bytes"] < MIN_FREE_DISK:
+        problems.append("low disk space")
+
+    return {
+        "status": "degraded" if problems else "healthy",
+        "problems": problems,
+        "records_in_db": stats["rows"]["traffic_data"],
+        "rows": stats["rows"],
+        "newest": stats["newest"],
+        "ingest_lag_seconds": lag,
+        "disk": disk,
+        "generated_at": datetime.now().strftime(TIMESTAMP_FORMAT),
+    }
+
+
+# A function to return the cached deep report, rebuilding it when expired
+def deep_health(force=False):
+    """
+    Returns the deep health report, at most HEALTH_CACHE_SECONDS old.
+    While one thread rebuilds it, concurrent callers get the previous
+    report instead of queueing behind the rebuild.
+    """
+    now = time.monotonic()
+    report = _cache["report"]
+    if report is not None and now < _cache["expires"] and not force:
+        return report
+    if not _refresh_lock.acquire(blocking=report is None or force):
+        return report
+    try:
+        if force or _cache["report"] is None or time.monotonic() >= _cache["expires"]:
+            _cache["report"] = _build_report()
+            _cache["expires"] = time.monotonic() + HEALTH_CACHE_SECONDS
+        return _cache["report"]
+    finally:
+        _refresh_lock.release()
+
+
+if __name__ == "__main__":
+    db_handler.ensure_db()
+    print("[TEST] liveness:", liveness())
+    print("[TEST] readiness:", readiness())
+    print("[TEST] deep:", deep_health())
+    n = 10_000
+    start = time.perf_counter()
+    for _ in range(n):
+        deep_health()
+    print(f"[TEST] cached deep_health: {(time.perf_counter() - start) / n * 1e6:.2f} us/call")
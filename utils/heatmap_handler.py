@@ -0,0 +1,384 @@
+# utils/heatmap_handler.py
+"""
+heatmap_handler.py
+------------------------------------
+Precomputed accident and congestion density grids for the map page.
+
+Points are binned into a fixed lat/lon grid, one uint16 grid per layer
+per time bucket. Grids are built once from the database and then updated
+incrementally whenever db_handler inserts new rows, so a map request only
+sums a few small arrays instead of re-reading the raw tables.
+
+Every update bumps a version number and keeps a sparse delta, which lets
+clients ask for "what changed since version N" instead of the full grid.
+
+Rows written elsewhere (another worker, the bulk importer, the synthetic
+generator) never reach this process's insert listener, so at most every
+HEATMAP_CHECK_SECONDS a read compares the tables' row counts with the
+rows the grids account for, and rebuilds the grids when they differ.
+
+Layers:
+    - accidents   traffic_data.accidents counts + one per accident_data row
+    - congestion  traffic_level weight per traffic_data row
+
+Functions:
+    - add_points(layer, lats, lons, timestamps, weights)
+    - ingest_records(table, records)
+    - rebuild_heatmaps()
+    - get_heatmap(layer, bounds, start, end, since_version)
+"""
+
+import os, sys
+import sqlite3
+import threading
+import time
+from collections import deque
+from contextlib import closing
+from datetime import datetime, timedelta
+import numpy as np
+if __name__ == "__main__":
+    sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils import db_handler
+from utils.db_handler import register_insert_listener
+from utils.gazetteer_handler import resolve_coordinates
+from utils.log_handler import get_logger
+
+logger = get_logger(__name__)
+
+# -------------------------------------------------------------------
+# GRID CONFIGURATION
+# -------------------------------------------------------------------
+LAYERS = ("accidents", "congestion")
+
+# continental U.S. bounds and cell size in degrees
+GRID_BOUNDS = {"lat_min": 24.0, "lat_max": 50.0, "lon_min": -125.0, "lon_max": -66.0}
+CELL_SIZE = 0.25
+GRID_ROWS = int(round((GRID_BOUNDS["lat_max"] - GRID_BOUNDS["lat_min"]) / CELL_SIZE))
+GRID_COLS = int(round((GRID_BOUNDS["lon_max"] - GRID_BOUNDS["lon_min"]) / CELL_SIZE))
+GRID_CELLS = GRID_ROWS * GRID_COLS
+
+# one grid per hour, keeping the most recent week
+BUCKET_SECONDS = 3600
+MAX_BUCKETS = 24 * 7
+
+# number of sparse deltas kept for diff queries
+MAX_DELTAS = 2048
+
+# cell counts saturate instead of wrapping around
+MAX_CELL_VALUE = np.iinfo(np.uint16).max
+
+CONGESTION_WEIGHTS = {"low": 1, "medium": 2, "moderate": 2, "high": 3, "severe": 4}
+
+# seconds between checks for rows this process did not insert itself
+HEATMAP_CHECK_SECONDS = float(os.environ.get("HEATMAP_CHECK_SECONDS", 30))
+
+# bucket id -> flat uint16 grid, per layer
+_grids = {layer: {} for layer in LAYERS}
+# (version, layer, bucket, cells, applied counts) for each update
+_deltas = deque(maxlen=MAX_DELTAS)
+_version = 0
+_loaded = False
+_lock = threading.RLock()
+# {table: row count} the grids account for, and when it was last compared
+_expected_rows = None
+_checked_at = 0.0
+
+
+# A function to convert timestamp strings or numbers to epoch seconds
+def _to_epoch(values):
+    """
+    Converts timestamps ("YYYY-MM-DD[ HH:MM:SS]" strings, datetimes or
+    epoch numbers) to an int64 array. Unparseable values become -1.
+    """
+    values = list(values)
+    try:
+        parsed = np.array(values, dtype="datetime64[s]")
+        epochs = parsed.astype(np.int64)
+        epochs[np.isnat(parsed)] = -1
+        return epochs
+    except (ValueError, TypeError):
+        pass
+
+    epochs = np.full(len(values), -1, dtype=np.int64)
+    for i, value in enumerate(values):
+        try:
+            epochs[i] = np.datetime64(value, "s").astype(np.int64)
+        except (ValueError, TypeError):
+            continue
+    return epochs
+
+
+# A function to bin points into the per-bucket grids of one layer
+def add_points(layer, lats, lons, timestamps, weights=None):
+    """
+    Adds weighted points to a heatmap layer.
+
+    Args:
+        layer (str): "accidents" or "congestion".
+        lats, lons: Point coordinates (array-like).
+        timestamps: Timestamp strings, datetimes or epoch seconds.
+        weights: Per-point weights, defaults to 1.
+
+    Returns:
+        The new heatmap version, or the current one if nothing was added.
+    """
+    global _version
+    if layer not in _grids:
+        raise ValueError(f"Unknown heatmap layer: {layer}")
+
+    lats = np.asarray(lats, dtype=np.float64)
+    lons = np.asarray(lons, dtype=np.float64)
+    epochs = np.asarray(timestamps, dtype=np.int64) if np.asarray(timestamps).dtype.kind in "iu" else _to_epoch(timestamps)
+    weights = np.ones(len(lats), dtype=np.int64) if weights is None else np.asarray(weights, dtype=np.int64)
+
+    # cities without coordinates come through as NaN; drop them before the integer cast
+    finite = np.isfinite(lats) & np.isfinite(lons)
+    if not finite.all():
+        lats, lons, epochs, weights = lats[finite], lons[finite], epochs[finite], weights[finite]
+
+    rows = np.floor((lats - GRID_BOUNDS["lat_min"]) / CELL_SIZE).astype(np.int64)
+    cols = np.floor((lons - GRID_BOUNDS["lon_min"]) / CELL_SIZE).astype(np.int64)
+    valid = (rows >= 0) & (rows < GRID_ROWS) & (cols >= 0) & (cols < GRID_COLS) & (epochs >= 0) & (weights > 0)
+    if not valid.any():
+        return _version
+
+    # one combined key per (bucket, cell) so a single bincount sums everything
+    buckets = epochs[valid] // BUCKET_SECONDS
+    keys = buckets * GRID_CELLS + rows[valid] * GRID_COLS + cols[valid]
+    unique_keys, inverse = np.unique(keys, return_inverse=True)
+    sums = np.bincount(inverse, weights=weights[valid]).astype(np.int64)
+
+    # unique keys are sorted, so each bucket is one contiguous run
+    key_buckets = unique_keys // GRID_CELLS
+    bucket_ids, starts = np.unique(key_buckets, return_index=True)
+    ends = np.append(starts[1:], len(unique_keys))
+
+    with _lock:
+        _version += 1
+        grids = _grids[layer]
+        for bucket, lo, hi in zip(bucket_ids.tolist(), starts, ends):
+            cells = (unique_keys[lo:hi] % GRID_CELLS).astype(np.int32)
+            grid = grids.get(bucket)
+            if grid is None:
+                grid = grids[bucket] = np.zeros(GRID_CELLS, dtype=np.uint16)
+            before = grid[cells].astype(np.int64)
+            after = np.minimum(before + sums[lo:hi], MAX_CELL_VALUE)
+            grid[cells] = after
+            _deltas.append((_version, layer, bucket, cells, (after - before).astype(np.uint16)))
+
+        # drop the oldest buckets once the retention window is full
+        while len(grids) > MAX_BUCKETS:
+            del grids[min(grids)]
+        return _version
+
+
+# A function to look up coordinates for a batch of records
+def _record_coordinates(records):
+    """Returns lat/lon arrays for records, using the gazetteer by city."""
+    lats = np.full(len(records), np.nan)
+    lons = np.full(len(records), np.nan)
+    city_coords = {}
+    for i, record in enumerate(records):
+        if record.get("latitude") is not None and record.get("longitude") is not None:
+            lats[i], lons[i] = record["latitude"], record["longitude"]
+            continue
+        city = record.get("city")
+        if city not in city_coords:
+            city_coords[city] = resolve_coordinates(city) if city else None
+        if city_coords[city]:
+            lats[i], lons[i] = city_coords[city]
+    return lats, lons
+
+
+# A function to update the heatmaps from newly inserted database rows
+def ingest_records(table, records):
+    """
+    Bins inserted traffic_data or accident_data rows into the heatmaps.
+    Registered as a db_handler insert listener.
+    """
+    if not records:
+        return _version
+    lats, lons = _record_coordinates(records)
+
+    if table == "traffic_data":
+        timestamps = _to_epoch(r.get("timestamp") for r in records)
+        accidents = [int(r.get("accidents") or 0) for r in records]
+        levels = [CONGESTION_WEIGHTS.get(str(r.get("traffic_level", "")).lower(), 0) for r in records]
+        add_points("accidents", lats, lons, timestamps, accidents)
+        return add_points("congestion", lats, lons, timestamps, levels)
+
+    if table == "accident_data":
+        timestamps = _to_epoch(r.get("date") for r in records)
+        return add_points("accidents", lats, lons, timestamps)
+
+    return _version
+
+
+# A function to read the row counts of the binned tables (None if unreadable)
+def _row_counts():
+    try:
+        rows = db_handler.get_table_stats()["rows"]
+    except Exception:
+        return None
+    return {table: rows[table] for table in ("traffic_data", "accident_data")}
+
+
+# A function to bin rows this process inserted, keeping the expected counts in step
+def _on_insert(table, records):
+    with _lock:
+        if _expected_rows is not None and table in _expected_rows:
+            _expected_rows[table] += len(records)
+        return ingest_records(table, records)
+
+
+# A function to rebuild every grid from the database
+def rebuild_heatmaps():
+    """Clears the grids and re-bins the retention window from the database."""
+    global _loaded, _expected_rows, _checked_at
+    cutoff = (datetime.now() - timedelta(seconds=BUCKET_SECONDS * MAX_BUCKETS)).strftime("%Y-%m-%d %H:%M:%S")
+
+    with _lock:
+        for grids in _grids.values():
+            grids.clear()
+        _deltas.clear()
+        _expected_rows = _row_counts()
+        _checked_at = time.monotonic()
+
+        queries = (
+            ("traffic_data", "SELECT city, traffic_level, accidents, timestamp FROM traffic_data WHERE timestamp >= ?"),
+            ("accident_data", "SELECT city, date FROM accident_data WHERE date >= ?"),
+        )
+        for path in db_handler.data_paths():
+            with closing(sqlite3.connect(path)) as conn:
+                conn.row_factory = sqlite3.Row
+                for table, sql in queries:
+                    try:
+                        cursor = conn.execute(sql, (cutoff[:10] if table == "accident_data" else cutoff,))
+                    except sqlite3.OperationalError as e:
+                        logger.warning("Heatmap rebuild skipped %s: %s", table, e)
+                        continue
+                    # bin in fixed-size chunks so large tables never load at once
+                    while True:
+                        rows = cursor.fetchmany(5000)
+                        if not rows:
+                            break
+                        ingest_records(table, [dict(row) for row in rows])
+
+        _loaded = True
+        logger.info("Heatmaps rebuilt at version %d.", _version)
+
+
+# A function to build the grids on first use and rebuild them when the data changed
+def _ensure_current():
+    global _checked_at
+    if _loaded and time.monotonic() - _checked_at < HEATMAP_CHECK_SECONDS:
+        return
+    with _lock:
+        if not _loaded:
+            rebuild_heatmaps()
+        elif time.monotonic() - _checked_at >= HEATMAP_CHECK_SECONDS:
+            _checked_at = time.monotonic()
+            counts = _row_counts()
+            if counts is None or counts != _expected_rows:
+                rebuild_heatmaps()
+
+
+# A function to turn a start/end bound into a bucket id (None when unset)
+def _to_bucket(name, value):
+    if value is None or value == "":
+        return None
+    epoch = int(_to_epoch([value])[0])
+    if epoch < 0:
+        raise ValueError(f"Invalid {name} time: {value!r}")
+    return epoch // BUCKET_SECONDS
+
+
+# A function to convert a lat/lon box to grid row/col slices
+def _region_slices(bounds):
+    """Returns (row slice, col slice) for a bounds dict, clipped to the grid."""
+    bounds = {**GRID_BOUNDS, **{k: v for k, v in (bounds or {}).items() if v is not None}}
+    r0 = int(np.floor((bounds["lat_min"] - GRID_BOUNDS["lat_min"]) / CELL_SIZE))
+    r1 = int(np.ceil((bounds["lat_max"] - GRID_BOUNDS["lat_min"]) / CELL_SIZE))
+    c0 = int(np.floor((bounds["lon_min"] - GRID_BOUNDS["lon_min"]) / CELL_SIZE))
+    c1 = int(np.ceil((bounds["lon_max"] - GRID_BOUNDS["lon_min"]) / CELL_SIZE))
+    return slice(max(r0, 0), min(max(r1, 0), GRID_ROWS)), slice(max(c0, 0), min(max(c1, 0), GRID_COLS))
+
+
+# A function to return a heatmap grid or its changes since a version
+def get_heatmap(layer="accidents", bounds=None, start=None, end=None, since_version=None):
+    """
+    Returns the summed grid for a region and time range.
+
+    Args:
+        layer (str): "accidents" or "congestion".
+        bounds (dict): Optional lat_min/lat_max/lon_min/lon_max.
+        start, end: Optional time range (timestamp strings or epoch seconds);
+            an unparseable value raises ValueError.
+        since_version (int): When given, only the counts added after that
+            version are returned ("diff" mode). Falls back to the full grid
+            if that version is older than the retained deltas.
+
+    Returns:
+        dict with the grid geometry and sparse [row, col, value] cells.
+    """
+    if layer not in _grids:
+        raise ValueError(f"Unknown heatmap layer: {layer}")
+    rows, cols = _region_slices(bounds)
+    b0, b1 = (_to_bucket(name, value) for name, value in (("start", start), ("end", end)))
+    _ensure_current()
+
+    def in_range(bucket):
+        return (b0 is None or bucket >= b0) and (b1 is None or bucket <= b1)
+
+    with _lock:
+        version = _version
+        oldest = _deltas[0][0] if _deltas else version + 1
+        mode = "diff" if since_version is not None and since_version >= oldest - 1 else "full"
+        total = np.zeros(GRID_CELLS, dtype=np.uint32)
+
+        if mode == "full":
+            for bucket, grid in _grids[layer].items():
+                if in_range(bucket):
+                    total += grid
+        else:
+            for delta_version, delta_layer, bucket, cells, counts in _deltas:
+                if delta_version > since_version and delta_layer == layer and in_range(bucket):
+                    np.add.at(total, cells, counts)
+
+    region = total.reshape(GRID_ROWS, GRID_COLS)[rows, cols]
+    nz_rows, nz_cols = np.nonzero(region)
+    values = region[nz_rows, nz_cols]
+
+    return {
+        "layer": layer,
+        "mode": mode,
+        "version": version,
+        "since_version": since_version if mode == "diff" else None,
+        "cell_size": CELL_SIZE,
+        "origin": {"lat": GRID_BOUNDS["lat_min"], "lon": GRID_BOUNDS["lon_min"]},
+        "shape": [GRID_ROWS, GRID_COLS],
+        "max": int(values.max()) if len(values) else 0,
+        "cells": np.column_stack((nz_rows + rows.start, nz_cols + cols.start, values)).tolist(),
+    }
+
+
+# keep the grids current as new rows are inserted
+register_insert_listener(_on_insert)
+
+
+if __name__ == "__main__":
+    import time
+    from utils.data_fetcher import get_traffic_data
+
+    print("[TEST] Binning mock traffic data...")
+    rebuild_heatmaps()
+    data = get_traffic_data(use_mock=True, num_records=100000)
+    start = time.perf_counter()
+    version = ingest_records("traffic_data", data)
+    print(f"Ingested {len(data)} rows in {(time.perf_counter() - start) * 1000:.1f} ms (version {version})")
+
+    start = time.perf_counter()
+    grid = get_heatmap("congestion")
+    print(f"Full grid: {len(grid['cells'])} cells, max {grid['max']} ({(time.perf_counter() - start) * 1000:.2f} ms)")
+    print("Diff since latest:", len(get_heatmap("congestion", since_version=version)["cells"]), "cells")
@@ -0,0 +1,340 @@
+# utils/import_handler.py
+"""
+import_handler.py
+------------------------------------
+Bulk importer for large CSV / JSONL dumps into traffic_data or
+accident_data.
+
+    1. The file is split into byte ranges of about --chunk-bytes, each
+       ending on a line break.
+    2. A process pool parses and validates the ranges in parallel:
+       source columns are renamed with --map (others are matched to
+       table columns case-insensitively), values are converted to
+       the table's types (ints, "YYYY-MM-DD HH:MM:SS" / "YYYY-MM-DD"),
+       and rows missing a required field are rejected.
+    3. This process is the only writer (SQLite allows one at a time). It
+       splits each range's rows by city shard (shard_handler.partition;
+       one part when the database is not sharded) and inserts every part
+       with executemany in a single transaction, together with a
+       checkpoint row in that shard's import_checkpoints. A crashed or
+       interrupted import rerun with the same arguments skips every
+       range all shards have committed, finishes the shards a range is
+       missing from, and never imports a row twice.
+
+--dry-run parses and validates everything but writes nothing.
+
+Ranges are cut at line breaks, so a quoted CSV field containing a line
+break can be split across two ranges; use --chunk-bytes 0 (one range,
+no parallelism) for such files.
+
+Usage:
+    python -m utils.import_handler crashes_2019.csv --table accident_data \\
+        --map "CRASH DATE=date" --map "BOROUGH=city" --map "NUMBER OF PERSONS KILLED=fatal"
+    python -m utils.import_handler traffic.jsonl --table traffic_data --workers 4 --dry-run
+    python -m utils.import_handler traffic.jsonl --table traffic_data --db database.db --shards 8
+
+Functions:
+    - split_ranges(path, chunk_bytes)
+    - parse_range(task)
+    - import_file(path, table, fmt, mapping, workers, chunk_bytes, dry_run)
+"""
+
+import os
+import sys
+import csv
+import io
+import json
+import sqlite3
+import time
+from datetime import date, datetime
+from functools import lru_cache
+from multiprocessing import Pool
+if __name__ == "__main__":
+    sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils import db_handler, shard_handler
+from utils.log_handler import get_logger
+
+logger = get_logger(__name__)
+
+# -------------------------------------------------------------------
+# IMPORT SETTINGS
+# -------------------------------------------------------------------
+CHUNK_BYTES = 16 * 1024 * 1024
+WORKERS = os.cpu_count() or 1
+MAX_ERROR_SAMPLES = 5
+WRITER_CACHE_KB = 256 * 1024       # page cache of the writer connection (index updates)
+
+# table -> [(column, type, required, default)]; type is int, str, "datetime" or "date"
+TABLE_SCHEMAS = {
+    "traffic_data": [
+        ("city", str, True, None),
+        ("traffic_level", str, True, None),
+        ("accidents", int, False, 0),
+        ("avg_speed", int, False, None),
+        ("accident_type", str, False, None),
+        ("timestamp", "datetime", True, None),
+    ],
+    "accident_data": [
+        ("city", str, True, None),
+        ("date", "date", True, None),
+        ("fatal", int, False, 0),
+        ("type", str, False, None),
+        ("description", str, False, None),
+    ],
+}
+TIME_INPUT_FORMATS = ("%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%dT%H:%M:%S.%f", "%Y-%m-%d %H:%M",
+                      "%Y-%m-%d", "%m/%d/%Y %H:%M:%S", "%m/%d/%Y %H:%M", "%m/%d/%Y")
+
+
+# A function to check that a value is exactly the ISO text of a real date or time
+def _is_iso(value, kind):
+    # fromisoformat is C code, so this keeps the fast path fast; the round
+    # trip also rejects other forms it accepts (week dates, time zones, ...)
+    try:
+        if kind == "date":
+            return date.fromisoformat(value).isoformat() == value
+        return datetime.fromisoformat(value).isoformat(" ") == value
+    except ValueError:
+        return False
+
+
+# A function to convert a time value to the stored text format
+@lru_cache(maxsize=1 << 16)
+def _to_time(value, kind):
+    """Cached: dumps repeat the same dates (and often timestamps) many times."""
+    value = value.strip()
+    out_format = "%Y-%m-%d %H:%M:%S" if kind == "datetime" else "%Y-%m-%d"
+    # fast path: already ISO, only the separator may differ. The value must
+    # still be a real date and time (no month 13, February 30 or 25:00)
+    if len(value) == (19 if kind == "datetime" else 10) and value[4] == "-" and value[7] == "-":
+        iso = f"{value[:10]} {value[11:]}" if kind == "datetime" and value[10] in " T" else value
+        if _is_iso(iso, kind):
+            return iso
+    for pattern in TIME_INPUT_FORMATS:
+        try:
+            return datetime.strptime(value, pattern).strftime(out_format)
+        except ValueError:
+            continue
+    raise ValueError(f"unrecognized {kind} {value!r}")
+
+
+# A function to convert one mapped record to a row tuple
+def _convert(record, schema):
+    row = []
+    for column, kind, required, default in schema:
+        value = record.get(column)
+        if value is None or value == "":
+            if required:
+                raise ValueError(f"missing {column}")
+            row.append(default)
+        elif kind is int:
+            row.append(int(float(value)) if isinstance(value, str) and "." in value else int(value))
+        elif kind is str:
+            row.append(str(value).strip())
+        else:
+            row.append(_to_time(str(value), kind))
+    return tuple(row)
+
+
+# A function to split a file into byte ranges that end on line breaks
+def split_ranges(path, chunk_bytes=CHUNK_BYTES, skip_header=False):
+    """Returns [(start, end)] covering the file (after the header line, if any)."""
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        start = len(f.readline()) if skip_header else 0
+        if chunk_bytes <= 0:
+            return [(start, size)] if start < size else []
+        ranges = []
+        while start < size:
+            f.seek(min(start + chunk_bytes, size))
+            f.readline()                      # move on to the next line break
+            end = min(f.tell(), size)
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+# A function to read a CSV header into mapped column names
+def read_header(path):
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        return next(csv.reader(f), [])
+
+
+# A function to parse and validate one byte range (runs in a pool worker)
+def parse_range(task):
+    """
+    task: (path, fmt, start, end, header, mapping, table).
+    Returns (start, end, rows, rejected, error samples).
+    """
+    path, fmt, start, end, header, mapping, table = task
+    schema = TABLE_SCHEMAS[table]
+    with open(path, "rb") as f:
+        f.seek(start)
+        text = f.read(end - start).decode("utf-8", errors="replace")
+    if start == 0:
+        text = text.lstrip("\ufeff")
+
+    if fmt == "csv":
+        columns = [_column_name(name, mapping) for name in header]
+        records = (dict(zip(columns, values)) for values in csv.reader(io.StringIO(text, newline="")) if values)
+    else:
+        records = (_mapped(json.loads(line), mapping) for line in text.splitlines() if line.strip())
+
+    rows, rejected, errors = [], 0, []
+    while True:
+        try:
+            record = next(records)
+            rows.append(_convert(record, schema))
+        except StopIteration:
+            break
+        except (ValueError, TypeError, AttributeError) as e:
+            rejected += 1
+            if len(errors) < MAX_ERROR_SAMPLES:
+                errors.append(str(e))
+    return start, end, rows, rejected, errors
+
+
+def _column_name(name, mapping):
+    # --map wins; otherwise match table columns case-insensitively
+    return mapping.get(name) or name.strip().lower()
+
+
+def _mapped(record, mapping):
+    return {_column_name(key, mapping): value for key, value in record.items()}
+
+
+# -------------------------------------------------------------------
+# CHECKPOINTS (committed in the same transaction as the rows)
+# -------------------------------------------------------------------
+def _ensure_checkpoints(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS import_checkpoints (
+            source TEXT NOT NULL,
+            range_start INTEGER NOT NULL,
+            range_end INTEGER NOT NULL,
+            rows INTEGER NOT NULL,
+            imported_at TEXT DEFAULT (datetime('now', 'localtime')),
+            PRIMARY KEY (source, range_start)
+        );
+    """)
+
+
+def _source_key(path, table, chunk_bytes):
+    # a changed file, table or split size starts a fresh import
+    stat = os.stat(path)
+    return f"{os.path.abspath(path)}|{stat.st_size}|{int(stat.st_mtime)}|{table}|{chunk_bytes}"
+
+
+# A function to import one file
+def import_file(path, table, fmt=None, mapping=None, workers=WORKERS, chunk_bytes=CHUNK_BYTES,
+                dry_run=False, progress=True):
+    """
+    Imports a CSV or JSONL file into `table`; returns a summary dict with
+    rows imported / rejected / skipped (already checkpointed) and rows/s.
+    """
+    if table not in TABLE_SCHEMAS:
+        raise ValueError(f"table must be one of: {', '.join(TABLE_SCHEMAS)}.")
+    fmt = fmt or ("jsonl" if path.endswith((".jsonl", ".ndjson", ".json")) else "csv")
+    mapping = mapping or {}
+    header = read_header(path) if fmt == "csv" else None
+    ranges = split_ranges(path, chunk_bytes, skip_header=fmt == "csv")
+    columns = [column for column, *_ in TABLE_SCHEMAS[table]]
+    insert = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))});"
+    source = _source_key(path, table, chunk_bytes)
+
+    summary = {"file": path, "table": table, "ranges": len(ranges), "imported": 0, "rejected": 0,
+               "skipped_ranges": 0, "dry_run": dry_run, "errors": []}
+    started = time.perf_counter()
+    conns = {}
+    try:
+        if not dry_run:
+            db_handler.ensure_db()
+            # one writer connection per shard; each keeps its own checkpoints
+            for target in db_handler.data_paths():
+                conn = conns[target] = sqlite3.connect(target)
+                conn.execute(f"PRAGMA cache_size = -{WRITER_CACHE_KB // len(db_handler.data_paths())};")
+                _ensure_checkpoints(conn)
+                conn.commit()
+            done = {target: {start for (start,) in conn.execute(
+                        "SELECT range_start FROM import_checkpoints WHERE source = ?;", (source,))}
+                    for target, conn in conns.items()}
+            # a range is finished once every shard has committed its part
+            finished = set.intersection(*done.values())
+            summary["skipped_ranges"] = sum(1 for start, _ in ranges if start in finished)
+            ranges = [(start, end) for start, end in ranges if start not in finished]
+
+        tasks = [(path, fmt, start, end, header, mapping, table) for start, end in ranges]
+        pool = Pool(workers) if workers > 1 and len(tasks) > 1 else None
+        try:
+            results = pool.imap_unordered(parse_range, tasks) if pool else map(parse_range, tasks)
+            for n, (start, end, rows, rejected, errors) in enumerate(results, 1):
+                imported = len(rows)
+                if conns:
+                    groups = shard_handler.partition(rows, db_handler.DB_PATH, db_handler.DB_SHARDS,
+                                                     key=columns.index("city"))
+                    imported = 0
+                    for target, conn in conns.items():
+                        if start in done[target]:
+                            continue     # this shard's part was committed by an earlier run
+                        part = groups.get(target, [])
+                        with conn:   # rows and checkpoint commit (or roll back) together
+                            conn.executemany(insert, part)
+                            conn.execute("INSERT INTO import_checkpoints (source, range_start, range_end, rows) "
+                                         "VALUES (?, ?, ?, ?);", (source, start, end, len(part)))
+                        imported += len(part)
+                summary["imported"] += imported
+                summary["rejected"] += rejected
+                summary["errors"].extend(errors[:MAX_ERROR_SAMPLES - len(summary["errors"])])
+                if progress:
+                    elapsed = time.perf_counter() - started
+                    print(f"[INFO] range {n}/{len(tasks)}: {summary['imported']:,} rows, "
+                          f"{summary['imported'] / elapsed:,.0f} rows/s", file=sys.stderr)
+        finally:
+            if pool is not None:
+                pool.terminate()
+    finally:
+        for conn in conns.values():
+            conn.close()
+
+    elapsed = time.perf_counter() - started
+    summary["seconds"] = round(elapsed, 2)
+    summary["rows_per_second"] = round(summary["imported"] / elapsed) if elapsed else 0
+    logger.info("Imported %d rows into %s (%d rejected) in %.1f s.", summary["imported"], table,
+                summary["rejected"], elapsed)
+    return summary
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Bulk import CSV / JSONL files into the database.")
+    parser.add_argument("files", nargs="+")
+    parser.add_argument("--table", required=True, choices=list(TABLE_SCHEMAS))
+    parser.add_argument("--format", choices=["csv", "jsonl"], help="default: from the file extension")
+    parser.add_argument("--map", action="append", default=[], metavar="SOURCE=COLUMN",
+                        help="rename a source column (repeatable)")
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--chunk-bytes", type=int, default=CHUNK_BYTES, help="0 = one range per file")
+    parser.add_argument("--db", default=db_handler.DB_PATH)
+    parser.add_argument("--shards", type=int, default=int(os.environ.get("DB_SHARDS", db_handler.DB_SHARDS)),
+                        help="shard files next to --db (as served with DB_SHARDS)")
+    parser.add_argument("--dry-run", action="store_true", help="parse and validate only")
+    args = parser.parse_args()
+
+    mapping = {}
+    for item in args.map:
+        source, _, column = item.rpartition("=")
+        if not source:
+            raise SystemExit(f"[ERROR] --map needs SOURCE=COLUMN, got {item!r}")
+        mapping[source] = column
+    db_handler.DB_PATH, db_handler.DB_SHARDS = args.db, args.shards
+
+    for path in args.files:
+        summary = import_file(path, args.table, args.format, mapping, args.workers, args.chunk_bytes, args.dry_run)
+        print(f"{path}: {summary['imported']:,} rows {'validated' if args.dry_run else 'imported'}, "
+              f"{summary['rejected']:,} rejected, {summary['skipped_ranges']} ranges already done, "
+              f"{summary['seconds']} s ({summary['rows_per_second']:,} rows/s, "
+              f"{summary['rows_per_second'] * 60 / 1e6:.1f}M rows/min)")
+        for error in summary["errors"]:
+            print(f"  rejected: {error}")
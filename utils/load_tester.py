@@ -0,0 +1,413 @@
+# utils/load_tester.py
+"""
+load_tester.py
+------------------------------------
+HTTP load test for the JSON API, sync (wsgi.py) vs async (asgi.py).
+
+The client is plain asyncio: `connections` keep-alive sockets, each
+sending GET requests back to back over a list of routes for `duration`
+seconds. For every route the report gives:
+
+    - requests, shed (429/503 from rate limiting or load shedding),
+      errors (other 4xx/5xx except 404, or socket failures) and requests/s
+    - latency percentiles (p50 / p95 / p99, milliseconds)
+
+With --compare the script seeds a temporary database with mock
+traffic, starts both servers on it and runs the same load against each
+at every concurrency level, so the two can be read side by side.
+
+With --harness it seeds a temporary database with the synthetic
+generator (--cities x --days of readings), starts one server on it and
+drives a weighted mix of map, alert, stats, /traffic_data and health
+requests (MIXED_ROUTES). Results can be saved as a JSON baseline; later
+runs compare against it and fail (exit status 1) when a route's
+throughput dropped, its p95/p99 latency grew by more than the
+threshold, or it started returning errors.
+
+Usage:
+    python -m utils.load_tester --url http://127.0.0.1:5000 --connections 50
+    python -m utils.load_tester --compare --connections 10 100 1000 --duration 10
+    python -m utils.load_tester --harness --cities 50 --days 14 --save benchmarks/http_baseline.json
+    python -m utils.load_tester --harness --cities 50 --days 14 --baseline benchmarks/http_baseline.json
+
+Functions:
+    - run_load(host, port, paths, connections, duration)
+    - summarize(samples, elapsed)
+    - compare_servers(levels, duration, records)
+    - mixed_paths(cities, routes)
+    - run_harness(server, levels, duration, cities, days)
+    - compare_reports(results, baseline, threshold)
+"""
+
+import os, sys
+import argparse
+import asyncio
+import json
+import platform
+import random
+import subprocess
+import tempfile
+import time
+import urllib.request
+from urllib.parse import quote, urlsplit
+if __name__ == "__main__":
+    sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# -------------------------------------------------------------------
+# LOAD TEST DEFAULTS
+# -------------------------------------------------------------------
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+DEFAULT_PATHS = ["/api/stats/overall", "/api/stats/city/Boston", "/api/map_data?city=Boston",
+                 "/api/alerts", "/api/health"]
+DEFAULT_LEVELS = [10, 100, 1000]
+DEFAULT_DURATION = 10.0
+DEFAULT_RECORDS = 5_000
+REQUEST_TIMEOUT = 30.0
+SYNC_PORT, ASYNC_PORT = 5101, 5102
+SHED_STATUSES = (429, 503)
+
+# harness: weighted request mix; {city} is filled in from the seeded cities
+MIXED_ROUTES = [
+    ("/api/map_data?city={city}", 3),
+    ("/api/map_data", 1),
+    ("/api/alerts", 2),
+    ("/api/stats/overall", 2),
+    ("/api/stats/city/{city}", 3),
+    ("/traffic_data?query={city}", 1),
+    ("/traffic_data", 1),
+    ("/api/health", 1),
+]
+HARNESS_LEVELS = [10, 100]
+HARNESS_CITIES = 20
+HARNESS_DAYS = 7
+HARNESS_PORT = 5103
+DEFAULT_THRESHOLD = 0.3
+LATENCY_SLACK_MS = 2.0      # absolute slack so sub-millisecond routes don't flag jitter
+
+
+# A function to read one HTTP/1.1 response (Content-Length or chunked)
+async def _read_response(reader):
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError("server closed the connection")
+    status = int(status_line.split()[1])
+    length, chunked, close = None, False, False
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        name, value = name.strip().lower(), value.strip().lower()
+        if name == "content-length":
+            length = int(value)
+        elif name == "transfer-encoding" and "chunked" in value:
+            chunked = True
+        elif name == "connection" and value == "close":
+            close = True
+    if chunked:
+        while True:
+            size = int((await reader.readline()).split(b";")[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    elif length is not None:
+        await reader.readexactly(length)
+    else:
+        await reader.read()
+        close = True
+    return status, close
+
+
+# A function to keep one connection busy until the deadline
+async def _worker(host, port, paths, offset, deadline, samples):
+    reader = writer = None
+    i = offset
+    while time.perf_counter() < deadline:
+        path = paths[i % len(paths)]
+        i += 1
+        start = time.perf_counter()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(host, port)
+            writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}:{port}\r\n\r\n".encode())
+            await writer.drain()
+            status, close = await asyncio.wait_for(_read_response(reader), REQUEST_TIMEOUT)
+        except (OSError, ConnectionError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError):
+            status, close = None, True
+            await asyncio.sleep(0.01)
+        samples.append((path, status, time.perf_counter() - start))
+        if close and writer is not None:
+            writer.close()
+            reader = writer = None
+    if writer is not None:
+        writer.close()
+
+
+# A function to run `connections` concurrent clients for `duration` seconds
+async def run_load(host, port, paths=DEFAULT_PATHS, connections=10, duration=DEFAULT_DURATION):
+    """Returns (samples, elapsed); samples are (path, status or None, seconds)."""
+    samples = []
+    start = time.perf_counter()
+    deadline = start + duration
+    await asyncio.gather(*(_worker(host, port, paths, n, deadline, samples) for n in range(connections)))
+    return samples, time.perf_counter() - start
+
+
+# A function to pick the p-th percentile from sorted values
+def _percentile(values, p):
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+# A function to map a request path to the route it exercises
+def _route(path):
+    path = path.split("?")[0]
+    if path.startswith("/api/stats/city/"):
+        return "/api/stats/city/<city>"
+    return path
+
+
+# A function to turn raw samples into per-route throughput and latency
+def summarize(samples, elapsed):
+    """Returns {route: {requests, shed, errors, rps, p50_ms, p95_ms, p99_ms}} plus an "all" row."""
+    groups = {}
+    for path, status, seconds in samples:
+        groups.setdefault(_route(path), []).append((status, seconds))
+        groups.setdefault("all", []).append((status, seconds))
+    report = {}
+    for route, rows in groups.items():
+        latencies = sorted(seconds * 1000 for _, seconds in rows)
+        report[route] = {
+            "requests": len(rows),
+            "shed": sum(1 for status, _ in rows if status in SHED_STATUSES),
+            "errors": sum(1 for status, _ in rows
+                          if status is None or (status >= 400 and status != 404 and status not in SHED_STATUSES)),
+            "rps": round(len(rows) / elapsed, 1),
+            "p50_ms": round(_percentile(latencies, 50), 2),
+            "p95_ms": round(_percentile(latencies, 95), 2),
+            "p99_ms": round(_percentile(latencies, 99), 2),
+        }
+    return report
+
+
+# A function to print one report as a table
+def print_report(title, report):
+    print(f"\n{title}")
+    print(f"{'route':<28}{'requests':>10}{'shed':>8}{'errors':>8}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for route in sorted(report, key=lambda r: (r == "all", r)):
+        row = report[route]
+        print(f"{route:<28}{row['requests']:>10}{row['shed']:>8}{row['errors']:>8}{row['rps']:>10.1f}"
+              f"{row['p50_ms']:>10.2f}{row['p95_ms']:>10.2f}{row['p99_ms']:>10.2f}")
+
+
+# A function to fill a database with mock traffic for the test
+def seed_database(path, records=DEFAULT_RECORDS):
+    """Creates the tables at `path` and inserts `records` mock traffic rows."""
+    from utils import db_handler
+    from utils.data_fetcher import generate_mock_traffic_data
+
+    db_handler.DB_PATH = path
+    db_handler.init_db()
+    for start in range(0, records, 1000):
+        db_handler.insert_bulk_traffic_data(generate_mock_traffic_data(min(1000, records - start)))
+
+
+# A function to start a server and wait until its liveness probe answers
+def _start_server(command, port, env):
+    process = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"server exited early: {' '.join(command)}")
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/api/health/live", timeout=1).read()
+            return process
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"server did not start: {' '.join(command)}")
+
+
+# A function to load-test the sync and async servers on the same data
+def compare_servers(levels=DEFAULT_LEVELS, duration=DEFAULT_DURATION, records=DEFAULT_RECORDS, paths=DEFAULT_PATHS):
+    """Returns {server: {connections: report}} for wsgi.py and asgi.py."""
+    from utils.log_handler import setup_logging
+
+    setup_logging("WARNING")
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "loadtest.db")
+        seed_database(db_path, records)
+        # every client connects from 127.0.0.1, so per-client rate limits are off
+        env = {**os.environ, "DB_PATH": db_path, "LOG_LEVEL": "WARNING", "RATE_LIMIT": "0"}
+        servers = {
+            "sync (wsgi.py)": ([sys.executable, "wsgi.py", "--port", str(SYNC_PORT)], SYNC_PORT),
+            "async (asgi.py)": ([sys.executable, "asgi.py", "--port", str(ASYNC_PORT)], ASYNC_PORT),
+        }
+        for name, (command, port) in servers.items():
+            process = _start_server(command, port, env)
+            try:
+                results[name] = {}
+                for connections in levels:
+                    samples, elapsed = asyncio.run(run_load("127.0.0.1", port, paths, connections, duration))
+                    results[name][connections] = summarize(samples, elapsed)
+                    print_report(f"{name}, {connections} connections, {elapsed:.1f} s",
+                                 results[name][connections])
+            finally:
+                process.terminate()
+                process.wait(timeout=10)
+    return results
+
+
+# A function to fill a database with synthetic traffic and accidents
+def seed_synthetic(path, cities=HARNESS_CITIES, days=HARNESS_DAYS, seed=0):
+    """Writes `days` of readings for the `cities` largest cities to `path`; returns the city names."""
+    from utils.synthetic_generator import pick_cities, generate, write_to_db
+
+    picked = pick_cities(cities)
+    write_to_db(generate(days, picked, seed=seed), path)
+    return list(picked[0])
+
+
+# A function to build the request mix for a set of cities
+def mixed_paths(cities, routes=MIXED_ROUTES, seed=0):
+    """
+    Returns a shuffled list of paths where each route appears in
+    proportion to its weight; {city} routes rotate through `cities`.
+    """
+    paths = []
+    for template, weight in routes:
+        for n in range(weight * len(cities)):
+            paths.append(template.format(city=quote(cities[n % len(cities)])))
+    random.Random(seed).shuffle(paths)
+    return paths
+
+
+# A function to seed a database, start one server on it and run the mixed load
+def run_harness(server="sync", levels=HARNESS_LEVELS, duration=DEFAULT_DURATION,
+                cities=HARNESS_CITIES, days=HARNESS_DAYS, seed=0):
+    """Returns {connections: report} for wsgi.py ("sync") or asgi.py ("async")."""
+    from utils.log_handler import setup_logging
+
+    setup_logging("WARNING")
+    script = {"sync": "wsgi.py", "async": "asgi.py"}[server]
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "harness.db")
+        start = time.perf_counter()
+        names = seed_synthetic(db_path, cities, days, seed)
+        print(f"[INFO] Seeded {len(names)} cities x {days} days in {time.perf_counter() - start:.1f} s.")
+        paths = mixed_paths(names, seed=seed)
+        if server == "async":
+            # asgi.py serves only the JSON API
+            paths = [p for p in paths if p.startswith("/api/")]
+        env = {**os.environ, "DB_PATH": db_path, "LOG_LEVEL": "WARNING", "RATE_LIMIT": "0"}
+        process = _start_server([sys.executable, script, "--port", str(HARNESS_PORT)], HARNESS_PORT, env)
+        try:
+            # one untimed request per route so first-request work (imports, caches) stays out of the numbers
+            for path in {_route(p): p for p in paths}.values():
+                try:
+                    urllib.request.urlopen(f"http://127.0.0.1:{HARNESS_PORT}{path}", timeout=REQUEST_TIMEOUT).read()
+                except OSError:
+                    pass
+            for connections in levels:
+                samples, elapsed = asyncio.run(run_load("127.0.0.1", HARNESS_PORT, paths, connections, duration))
+                results[connections] = summarize(samples, elapsed)
+                print_report(f"{script}, {connections} connections, {elapsed:.1f} s", results[connections])
+        finally:
+            process.terminate()
+            process.wait(timeout=10)
+    return results
+
+
+# A function to flatten harness results into baseline rows
+def _rows(results):
+    return {f"{route} @ {connections}": row
+            for connections, report in results.items() for route, row in report.items()}
+
+
+# A function to compare harness results against a saved baseline
+def compare_reports(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    Returns a list of regressions: routes whose requests/s dropped, or
+    whose p95/p99 latency grew, by more than `threshold`, and routes
+    with errors where the baseline had none. Routes missing from the
+    baseline are skipped.
+    """
+    previous = baseline.get("results", {})
+    regressions = []
+    for key, row in _rows(results).items():
+        old = previous.get(key)
+        if old is None:
+            continue
+        failed = {
+            "rps": row["rps"] < old["rps"] * (1 - threshold),
+            "p95_ms": row["p95_ms"] > old["p95_ms"] * (1 + threshold) + LATENCY_SLACK_MS,
+            "p99_ms": row["p99_ms"] > old["p99_ms"] * (1 + threshold) + LATENCY_SLACK_MS,
+            "errors": row["errors"] > 0 and old["errors"] == 0,
+        }
+        for metric, worse in failed.items():
+            if worse:
+                regressions.append({"key": key, "metric": metric, "baseline": old[metric], "current": row[metric]})
+    return regressions
+
+
+# A function to save harness results as a JSON baseline
+def save_baseline(results, path, settings):
+    """Writes results, the run settings and machine info to a JSON baseline file."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    payload = {
+        "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "settings": settings,
+        "machine": {"python": platform.python_version(), "platform": platform.platform(),
+                    "cpus": os.cpu_count()},
+        "results": _rows(results),
+    }
+    with open(path, "w") as f:
+        json.dump(payload, f, indent=2)
+    print(f"[INFO] Saved {len(payload['results'])} route results to {path}.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load-test the JSON API.")
+    parser.add_argument("--url", default="http://127.0.0.1:5000", help="server to test (ignored with --compare)")
+    parser.add_argument("--compare", action="store_true", help="seed a temp DB and compare wsgi.py with asgi.py")
+    parser.add_argument("--harness", action="store_true", help="seed synthetic data and run the mixed request load")
+    parser.add_argument("--server", choices=["sync", "async"], default="sync", help="server used with --harness")
+    parser.add_argument("--connections", type=int, nargs="+", default=None)
+    parser.add_argument("--duration", type=float, default=DEFAULT_DURATION, help="seconds per run")
+    parser.add_argument("--records", type=int, default=DEFAULT_RECORDS, help="mock rows seeded with --compare")
+    parser.add_argument("--paths", nargs="+", default=DEFAULT_PATHS)
+    parser.add_argument("--cities", type=int, default=HARNESS_CITIES, help="cities seeded with --harness")
+    parser.add_argument("--days", type=int, default=HARNESS_DAYS, help="days of readings seeded with --harness")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save", default=None, help="write --harness results as a JSON baseline")
+    parser.add_argument("--baseline", default=None, help="JSON baseline to compare --harness results against")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    args = parser.parse_args()
+
+    if args.harness:
+        levels = args.connections or HARNESS_LEVELS
+        results = run_harness(args.server, levels, args.duration, args.cities, args.days, args.seed)
+        if args.save:
+            save_baseline(results, args.save, {"server": args.server, "cities": args.cities, "days": args.days,
+                                               "duration": args.duration, "seed": args.seed})
+        if args.baseline:
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+            regressions = compare_reports(results, baseline, args.threshold)
+            if regressions:
+                print(f"[FAIL] {len(regressions)} regression(s) beyond {args.threshold:.0%}:")
+                for r in regressions:
+                    print(f"  {r['key']}: {r['metric']} {r['baseline']} -> {r['current']}")
+                sys.exit(1)
+            print(f"[PASS] No regressions beyond {args.threshold:.0%} against {args.baseline}.")
+    elif args.compare:
+        compare_servers(args.connections or DEFAULT_LEVELS, args.duration, args.records, args.paths)
+    else:
+        target = urlsplit(args.url)
+        for connections in args.connections or DEFAULT_LEVELS:
+            samples, elapsed = asyncio.run(run_load(target.hostname, target.port or 80, args.paths,
+                                                    connections, args.duration))
+            print_report(f"{args.url}, {connections} connections, {elapsed:.1f} s", summarize(samples, elapsed))
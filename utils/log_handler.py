@@ -0,0 +1,183 @@
+# utils/log_handler.py
+"""
+log_handler.py
+------------------------------------
+Structured, non-blocking logging for request paths.
+
+Handlers log through get_logger(__name__) with %-style arguments
+(logger.info("Prepared %d records", n)), so a message below the active
+level is dropped before any string is built. Records that pass the level
+check go onto an in-memory queue; a single background QueueListener
+thread formats them as JSON lines and writes them to stdout. Request
+threads never wait on stdout.
+
+Each JSON line carries the id of the request it came from (the
+X-Request-ID header, or a generated id echoed back in that header).
+
+Threads do not survive fork(), so a process forked after logging
+started (a gunicorn worker under --preload) starts its own queue and
+writer thread right after the fork; records the parent had not written
+yet stay with the parent.
+
+Example line:
+    {"ts": "2026-01-05T10:00:00.123", "level": "INFO", "logger": "utils.map_handler",
+     "request_id": "3f2a...", "message": "Prepared 42 records for map rendering."}
+
+Functions:
+    - get_logger(name)
+    - setup_logging(level, stream)
+    - shutdown_logging()
+    - instrument_request_ids(app)
+"""
+
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+import uuid
+
+# -------------------------------------------------------------------
+# LOGGING SETTINGS
+# -------------------------------------------------------------------
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+LOGGER_ROOT = "traffic"
+
+# id of the request being handled on this thread (or "-" outside requests)
+request_id_var = contextvars.ContextVar("request_id", default="-")
+
+_listener = None
+_queue_handler = None
+_setup_lock = threading.Lock()
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats a record as one JSON line (runs on the writer thread)."""
+
+    def format(self, record):
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(record.created)) + f".{int(record.msecs):03d}",
+            "level": record.levelname,
+            "logger": record.name[len(LOGGER_ROOT) + 1:] or record.name,
+            "request_id": getattr(record, "request_id", "-"),
+            "message": record.getMessage(),
+        }
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    Queues the record itself instead of a pre-formatted copy, so the
+    message is only built on the writer thread. Tracebacks are rendered
+    here because the exception is gone once the request moves on.
+    """
+
+    def prepare(self, record):
+        record.request_id = request_id_var.get()
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+# A function to start the queue handler and background writer
+def setup_logging(level=None, stream=None):
+    """
+    Routes every get_logger() logger through the queue to one writer
+    thread. Safe to call more than once; later calls only change level.
+    """
+    global _listener, _queue_handler
+    root = logging.getLogger(LOGGER_ROOT)
+    root.setLevel(level or LOG_LEVEL)
+    with _setup_lock:
+        if _listener is not None:
+            return root
+        records = queue.SimpleQueue()
+        writer = logging.StreamHandler(stream or sys.stdout)
+        writer.setFormatter(JsonFormatter())
+        _queue_handler = _DeferredQueueHandler(records)
+        root.addHandler(_queue_handler)
+        root.propagate = False
+        _listener = logging.handlers.QueueListener(records, writer, respect_handler_level=True)
+        _listener.start()
+        # flush what is still queued when the process exits
+        atexit.register(shutdown_logging)
+    return root
+
+
+# A function to flush the queue and stop the writer thread
+def shutdown_logging():
+    """Writes every queued record, then stops the background writer."""
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+
+# A function to give a forked child its own queue and writer thread
+def _restart_after_fork():
+    global _listener, _setup_lock
+    _setup_lock = threading.Lock()
+    if _listener is None:
+        return
+    records = queue.SimpleQueue()
+    _queue_handler.queue = records
+    _listener = logging.handlers.QueueListener(records, *_listener.handlers, respect_handler_level=True)
+    _listener.start()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_restart_after_fork)
+
+
+# A function to get a logger that writes through the queue
+def get_logger(name):
+    """Returns the logger for a module (pass __name__)."""
+    if _listener is None:
+        setup_logging()
+    return logging.getLogger(f"{LOGGER_ROOT}.{name}")
+
+
+# A function to tag every request with an id for its log lines
+def instrument_request_ids(app):
+    """Sets the request id from X-Request-ID (or a new one) and echoes it back."""
+    from flask import request
+
+    @app.before_request
+    def _set_request_id():
+        incoming = request.headers.get("X-Request-ID", "")
+        request_id_var.set(incoming[:64] if incoming else uuid.uuid4().hex)
+
+    @app.after_request
+    def _echo_request_id(response):
+        response.headers["X-Request-ID"] = request_id_var.get()
+        return response
+
+    @app.teardown_request
+    def _clear_request_id(exc):
+        request_id_var.set("-")
+
+    return app
+
+
+if __name__ == "__main__":
+    log = get_logger("example")
+    n = 100_000
+    start = time.perf_counter()
+    for i in range(n):
+        log.debug("Dropped before formatting: %s", i)
+    skipped = (time.perf_counter() - start) / n * 1e6
+    start = time.perf_counter()
+    for i in range(n):
+        log.info("Prepared %d records for map rendering.", i)
+    queued = (time.perf_counter() - start) / n * 1e6
+    shutdown_logging()
+    print(f"[TEST] below level: {skipped:.2f} us/call, queued: {queued:.2f} us/call", file=sys.stderr)
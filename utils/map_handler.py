@@ -18,28 +18,19 @@ support:
     - prepare_map_data()
 """
 import os, sys
-sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+if __name__ == "__main__":
+    sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 import random
 from utils.db_handler import get_all_traffic_data, get_city_data
 from utils.data_fetcher import get_traffic_data
 from utils.db_handler import init_db, insert_bulk_traffic_data
 from utils.data_fetcher import get_traffic_data
+from utils.gazetteer_handler import resolve_coordinates
+from utils.log_handler import get_logger
 
+logger = get_logger(__name__)
 
 
-# dictionary of cities
-CITY_COORDS = {
-    "San Francisco": (37.7749, -122.4194),
-    "Los Angeles": (34.0522, -118.2437),
-    "New York": (40.7128, -74.0060),
-    "Chicago": (41.8781, -87.6298),
-    "Seattle": (47.6062, -122.3321),
-    "Houston": (29.7604, -95.3698),
-    "Dallas": (32.7767, -96.7970),
-    "Miami": (25.7617, -80.1918),
-    "Boston": (42.3601, -71.0589),
-}
-
 # Levels for traffic intensity
 TRAFFIC_LEVELS = ["Low", "Medium", "High"]
 
@@ -53,7 +44,8 @@ def attach_coordinates(data):
 
     for record in data:
         city = record.get("city", "Unknown")
-        base_coords = CITY_COORDS.get(city)
+        # look up city coordinates in the gazetteer
+        base_coords = resolve_coordinates(city)
 
         # Assign coordinates
         if base_coords:
@@ -73,7 +65,7 @@ def attach_coordinates(data):
 
         processed.append(record)
 
-    print(f"[INFO] Processed {len(processed)} map points with coordinates.")
+    logger.debug("Processed %d map points with coordinates.", len(processed))
     return processed
 
 
@@ -84,22 +76,22 @@ def prepare_map_data(city_filter=None):
     """
     try:
         if city_filter:
-            print(f"[INFO] Loading traffic data for city: {city_filter}")
+            logger.debug("Loading traffic data for city: %s", city_filter)
             raw_data = get_city_data(city_filter)
         else:
-            print("[INFO] Loading all traffic data for map view.")
+            logger.debug("Loading all traffic data for map view.")
             raw_data = get_all_traffic_data()
 
         if not raw_data:
-            print("[WARNING] No traffic data found. Returning empty list.")
+            logger.warning("No traffic data found. Returning empty list.")
             return []
 
         map_data = attach_coordinates(raw_data)
-        print(f"[INFO] Prepared {len(map_data)} records for map rendering.")
+        logger.info("Prepared %d records for map rendering.", len(map_data))
         return map_data
 
     except Exception as e:
-        print(f"[ERROR] Failed to prepare map data: {e}")
+        logger.exception("Failed to prepare map data: %s", e)
         return []
 
 
@@ -0,0 +1,453 @@
+# utils/metrics_handler.py
+"""
+metrics_handler.py
+------------------------------------
+Request and query metrics in Prometheus text format.
+
+Records, per route (the URL rule, e.g. /api/stats/city/<city>, so
+cardinality stays bounded):
+    - a latency histogram
+    - response counts by status code
+    - requests currently in flight
+
+and, per db_handler function wrapped with @timed_query:
+    - a latency histogram
+    - rows returned and errors raised
+
+Updates are a bisect plus a few integer adds under one lock, a few
+microseconds per request, so the middleware can stay on in production.
+Uses only the standard library; db_handler imports this module.
+
+Every process keeps its own registry. With several workers, give them a
+shared METRICS_DIR: a thread in each worker writes its registry there as
+metrics-<pid>-<start>.json every METRICS_FLUSH_SECONDS (when it changed),
+and /api/metrics on any worker sums every file, so a scrape sees the
+whole server. <start> is the process start time from /proc, so a new
+worker that gets a dead worker's pid writes a file of its own. Files of
+workers that have exited are folded into metrics-retired.json (under a
+file lock) and deleted: their counters are kept, so totals never go
+backwards, and their in-flight counts are dropped. Other workers'
+figures are as of their last write.
+
+Functions:
+    - timed_query(func)
+    - instrument_app(app, directory)
+    - flush_metrics(directory)
+    - start_flusher(directory)
+    - render_metrics(directory)
+"""
+
+import os
+import contextlib
+import functools
+import json
+import threading
+import time
+from bisect import bisect_left
+try:
+    import fcntl
+except ImportError:   # not on Windows; folding is then unlocked
+    fcntl = None
+
+# -------------------------------------------------------------------
+# BUCKETS (seconds)
+# -------------------------------------------------------------------
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# directory shared by worker processes (None = report this process only)
+METRICS_DIR = os.environ.get("METRICS_DIR") or None
+METRICS_FLUSH_SECONDS = 1.0
+RETIRED_FILE = "metrics-retired.json"
+LOCK_FILE = "metrics.lock"
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram (bucket counts, sum, count)."""
+
+    __slots__ = ("buckets", "counts", "total", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)   # last slot is +Inf
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def merge(self, counts, total, count):
+        self.counts = [a + b for a, b in zip(self.counts, counts)]
+        self.total += total
+        self.count += count
+
+    def lines(self, name, labels):
+        """Yields Prometheus sample lines for this histogram."""
+        running = 0
+        for bound, n in zip(self.buckets + (float("inf"),), self.counts):
+            running += n
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            yield f'{name}_bucket{{{labels},le="{le}"}} {running}'
+        yield f"{name}_sum{{{labels}}} {self.total:.6f}"
+        yield f"{name}_count{{{labels}}} {self.count}"
+
+
+class MetricsRegistry:
+    """All counters and histograms, guarded by a single lock."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = time.time()
+        self.workers = 1
+        self.in_flight = 0
+        self.requests = {}        # (method, route) -> Histogram
+        self.statuses = {}        # (method, route, status) -> count
+        self.queries = {}         # query -> Histogram
+        self.query_rows = {}      # query -> rows returned
+        self.query_errors = {}    # query -> errors raised
+
+    def request_started(self):
+        with self._lock:
+            self.in_flight += 1
+
+    def request_finished(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def observe_request(self, method, route, status, seconds):
+        key = (method, route)
+        with self._lock:
+            histogram = self.requests.get(key)
+            if histogram is None:
+                histogram = self.requests[key] = Histogram(REQUEST_BUCKETS)
+            histogram.observe(seconds)
+            status_key = (method, route, status)
+            self.statuses[status_key] = self.statuses.get(status_key, 0) + 1
+
+    def observe_query(self, query, seconds, rows, failed=False):
+        with self._lock:
+            histogram = self.queries.get(query)
+            if histogram is None:
+                histogram = self.queries[query] = Histogram(QUERY_BUCKETS)
+            histogram.observe(seconds)
+            self.query_rows[query] = self.query_rows.get(query, 0) + rows
+            if failed:
+                self.query_errors[query] = self.query_errors.get(query, 0) + 1
+
+    def snapshot(self):
+        """Returns the registry as plain JSON-ready data."""
+        with self._lock:
+            return {
+                "pid": os.getpid(),
+                "start": _process_start(os.getpid()),
+                "started": self.started,
+                "in_flight": self.in_flight,
+                "requests": [[m, r, h.counts, h.total, h.count] for (m, r), h in self.requests.items()],
+                "statuses": [[m, r, status, n] for (m, r, status), n in self.statuses.items()],
+                "queries": [[q, h.counts, h.total, h.count] for q, h in self.queries.items()],
+                "query_rows": dict(self.query_rows),
+                "query_errors": dict(self.query_errors),
+            }
+
+    def merge(self, snapshot, alive=True):
+        """Adds a snapshot's counts into this registry (in-flight only if its process is alive)."""
+        with self._lock:
+            self.started = min(self.started, snapshot["started"])
+            if alive:
+                self.in_flight += snapshot["in_flight"]
+            for method, route, counts, total, count in snapshot["requests"]:
+                histogram = self.requests.setdefault((method, route), Histogram(REQUEST_BUCKETS))
+                histogram.merge(counts, total, count)
+            for method, route, status, n in snapshot["statuses"]:
+                key = (method, route, status)
+                self.statuses[key] = self.statuses.get(key, 0) + n
+            for query, counts, total, count in snapshot["queries"]:
+                self.queries.setdefault(query, Histogram(QUERY_BUCKETS)).merge(counts, total, count)
+            for query, n in snapshot["query_rows"].items():
+                self.query_rows[query] = self.query_rows.get(query, 0) + n
+            for query, n in snapshot["query_errors"].items():
+                self.query_errors[query] = self.query_errors.get(query, 0) + n
+
+    def render(self):
+        """Returns every metric in Prometheus text exposition format."""
+        with self._lock:
+            lines = [
+                "# HELP http_requests_in_flight Requests currently being handled.",
+                "# TYPE http_requests_in_flight gauge",
+                f"http_requests_in_flight {self.in_flight}",
+                "# HELP http_requests_total Responses by route and status code.",
+                "# TYPE http_requests_total counter",
+            ]
+            for (method, route, status), n in sorted(self.statuses.items()):
+                lines.append(f'http_requests_total{{method="{method}",route="{_escape(route)}",status="{status}"}} {n}')
+
+            lines += ["# HELP http_request_duration_seconds Request latency by route.",
+                      "# TYPE http_request_duration_seconds histogram"]
+            for (method, route), histogram in sorted(self.requests.items()):
+                lines.extend(histogram.lines("http_request_duration_seconds",
+                                             f'method="{method}",route="{_escape(route)}"'))
+
+            lines += ["# HELP db_query_duration_seconds db_handler call latency.",
+                      "# TYPE db_query_duration_seconds histogram"]
+            for query, histogram in sorted(self.queries.items()):
+                lines.extend(histogram.lines("db_query_duration_seconds", f'query="{query}"'))
+
+            lines += ["# HELP db_query_rows_total Rows returned by db_handler calls.",
+                      "# TYPE db_query_rows_total counter"]
+            lines += [f'db_query_rows_total{{query="{q}"}} {n}' for q, n in sorted(self.query_rows.items())]
+
+            lines += ["# HELP db_query_errors_total db_handler calls that raised.",
+                      "# TYPE db_query_errors_total counter"]
+            lines += [f'db_query_errors_total{{query="{q}"}} {n}' for q, n in sorted(self.query_errors.items())]
+
+            lines += ["# HELP process_start_time_seconds Start time of the process since the epoch.",
+                      "# TYPE process_start_time_seconds gauge",
+                      f"process_start_time_seconds {self.started:.3f}",
+                      "# HELP metrics_workers Processes whose metrics are included.",
+                      "# TYPE metrics_workers gauge",
+                      f"metrics_workers {self.workers}"]
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"')
+
+
+# A function to read when a process started (clock ticks since boot), or None without /proc
+def _process_start(pid):
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            # the command name may contain spaces; fields after it are fixed
+            return f.read().rsplit(")", 1)[1].split()[19]
+    except (OSError, IndexError):
+        return None
+
+
+# A function to check whether the process that wrote a snapshot still runs
+def _alive(pid, start=None):
+    """A reused pid belongs to a process with a different start time."""
+    if start is not None:
+        return _process_start(pid) == start
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+# shared registry for the whole process (each worker reports its own)
+registry = MetricsRegistry()
+
+
+# A decorator to time a db_handler function and count the rows it returns
+def timed_query(func):
+    """Records latency, rows returned (for list results) and errors."""
+    name = func.__name__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            result = func(*args, **kwargs)
+        except Exception:
+            registry.observe_query(name, time.perf_counter() - start, 0, failed=True)
+            raise
+        rows = len(result) if isinstance(result, list) else 0
+        registry.observe_query(name, time.perf_counter() - start, rows)
+        return result
+
+    return wrapper
+
+
+# A function to write this process's metrics where other workers can read them
+def flush_metrics(directory=None):
+    """Writes the registry to `directory`/metrics-<pid>.json (atomically)."""
+    directory = directory or METRICS_DIR
+    if not directory:
+        return
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, _snapshot_name())
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(registry.snapshot(), f)
+    os.replace(f"{path}.tmp", path)
+
+
+# process that runs the flush thread (a forked worker starts its own)
+_flusher_pid = None
+_flusher_lock = threading.Lock()
+
+
+def _flush_loop(directory):
+    last = None
+    while True:
+        time.sleep(METRICS_FLUSH_SECONDS)
+        snapshot = registry.snapshot()
+        if snapshot == last or not os.path.isdir(directory):
+            continue
+        try:
+            flush_metrics(directory)
+            last = snapshot
+        except OSError:
+            pass   # metrics must never fail the worker; retried next time
+
+
+# A function to write this process's metrics to `directory` in the background
+def start_flusher(directory=None):
+    """Starts the flush thread for this process once; cheap to call per request."""
+    global _flusher_pid
+    directory = directory or METRICS_DIR
+    if not directory or _flusher_pid == os.getpid():
+        return
+    with _flusher_lock:
+        if _flusher_pid != os.getpid():
+            _flusher_pid = os.getpid()
+            threading.Thread(target=_flush_loop, args=(directory,), name="metrics-flush", daemon=True).start()
+
+
+# A function to add request metrics to a Flask app
+def instrument_app(app, directory=None):
+    """
+    Registers hooks that time every request and track in-flight count.
+    With a `directory`, the registry is also written there for the
+    other workers (see flush_metrics).
+    """
+    directory = directory or METRICS_DIR
+    from flask import g, request
+
+    @app.before_request
+    def _start_timer():
+        start_flusher(directory)
+        g.metrics_start = time.perf_counter()
+        g.metrics_in_flight = True
+        registry.request_started()
+
+    @app.after_request
+    def _record_request(response):
+        start = g.pop("metrics_start", None)
+        if start is not None:
+            # the URL rule, not the raw path, so /api/stats/city/<city> is one series
+            route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+            registry.observe_request(request.method, route, response.status_code,
+                                     time.perf_counter() - start)
+        return response
+
+    @app.teardown_request
+    def _finish_request(exc):
+        if g.pop("metrics_in_flight", False):
+            registry.request_finished()
+
+    return app
+
+
+# A function to name this process's snapshot file
+def _snapshot_name():
+    pid = os.getpid()
+    return f"metrics-{pid}-{_process_start(pid) or 0}.json"
+
+
+# A function to load a JSON snapshot, or None if it is missing or half written
+def _load(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+# A function to hold the directory's lock while folding and reading snapshots
+@contextlib.contextmanager
+def _directory_lock(directory):
+    with open(os.path.join(directory, LOCK_FILE), "a") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        yield
+
+
+# A function to fold the snapshots of exited workers into the retired totals
+def _retire_dead(directory, names):
+    """
+    Adds dead workers' snapshots to metrics-retired.json and deletes them;
+    returns the live snapshots. Caller holds the directory lock.
+    The retired file lists the files it already holds, so a crash between
+    writing it and deleting them can't count them twice.
+    """
+    retired_path = os.path.join(directory, RETIRED_FILE)
+    retired = _load(retired_path)
+    # names of files already folded in, for those still waiting to be deleted
+    folded = set(retired.pop("folded", [])) & set(names) if retired else set()
+    total = MetricsRegistry()
+    if retired:
+        total.merge(retired, alive=False)
+
+    live, dead = [], []
+    for name in names:
+        if name in folded:
+            dead.append(name)
+            continue
+        snapshot = _load(os.path.join(directory, name))
+        if snapshot is None:
+            continue   # written by a worker that is being replaced
+        if _alive(snapshot["pid"], snapshot.get("start")):
+            live.append(snapshot)
+        else:
+            total.merge(snapshot, alive=False)
+            folded.add(name)
+            dead.append(name)
+
+    if dead:
+        snapshot = {**total.snapshot(), "pid": None, "start": None, "in_flight": 0, "folded": sorted(folded)}
+        with open(f"{retired_path}.tmp", "w") as f:
+            json.dump(snapshot, f)
+        os.replace(f"{retired_path}.tmp", retired_path)
+        for name in dead:
+            try:
+                os.remove(os.path.join(directory, name))
+            except FileNotFoundError:
+                pass
+    return live, (total.snapshot() if retired or dead else None)
+
+
+# A function to render the shared registry
+def render_metrics(directory=None):
+    """
+    Returns metrics in Prometheus text format: this process's, or with a
+    `directory` the sum over every worker that wrote there, including the
+    retired totals of workers that have exited.
+    """
+    directory = directory or METRICS_DIR
+    if not directory:
+        return registry.render()
+    flush_metrics(directory)
+    names = sorted(name for name in os.listdir(directory)
+                   if name.startswith("metrics-") and name.endswith(".json") and name != RETIRED_FILE)
+    with _directory_lock(directory):
+        live, retired = _retire_dead(directory, names)
+
+    total = MetricsRegistry()
+    total.started, total.workers = time.time(), len(live)
+    if retired is not None:
+        total.merge(retired, alive=False)
+    for snapshot in live:
+        total.merge(snapshot)
+    return total.render()
+
+
+if __name__ == "__main__":
+    print("[TEST] Overhead of recording one request and one query...")
+    n = 200_000
+    start = time.perf_counter()
+    for i in range(n):
+        registry.observe_request("GET", "/api/map_data", 200, (i % 100) / 1000)
+    per_request = (time.perf_counter() - start) / n * 1e6
+    start = time.perf_counter()
+    for i in range(n):
+        registry.observe_query("get_all_traffic_data", (i % 100) / 10000, 50)
+    per_query = (time.perf_counter() - start) / n * 1e6
+    print(f"  observe_request: {per_request:.2f} us, observe_query: {per_query:.2f} us")
+    print(render_metrics()[:600])
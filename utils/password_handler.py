@@ -0,0 +1,195 @@
+# utils/password_handler.py
+"""
+password_handler.py
+------------------------------------
+Password hashing for user accounts.
+
+Passwords are stored as scrypt hashes (hashlib, no extra dependency):
+
+    scrypt$<n>$<r>$<p>$<salt b64>$<hash b64>
+
+At the default work factor (n=2**14, r=8, p=1: 16 MB, ~50 ms on one
+core) a hash is too slow to run on request threads at login-storm
+rates, so every hash and verify goes through a small, bounded worker
+pool. hashlib.scrypt releases the GIL, so data requests keep running
+while it works. When more than HASH_QUEUE_LIMIT jobs are waiting or
+running, new ones fail at once with HashPoolBusy; login answers "try
+again" rather than letting the queue (and every request behind it) grow.
+
+Accounts created before hashing still hold plaintext. They are checked
+the old way once, and rehashed on that successful login (the same goes
+for hashes made with an older work factor).
+
+Classes:
+    - HashPool
+    - HashPoolBusy
+
+Functions:
+    - hash_password(password)
+    - verify_password(password, stored)
+    - check_password(password, stored)
+"""
+
+import os
+import sys
+import base64
+import hashlib
+import hmac
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+if __name__ == "__main__":
+    sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# -------------------------------------------------------------------
+# HASH SETTINGS
+# -------------------------------------------------------------------
+SCRYPT_N = 2 ** 14
+SCRYPT_R = 8
+SCRYPT_P = 1
+SALT_BYTES = 16
+HASH_BYTES = 32
+HASH_PREFIX = "scrypt"
+
+HASH_WORKERS = int(os.environ.get("HASH_WORKERS", os.cpu_count() or 1))
+HASH_QUEUE_LIMIT = int(os.environ.get("HASH_QUEUE_LIMIT", HASH_WORKERS * 8))   # jobs waiting or running
+HASH_TIMEOUT = float(os.environ.get("HASH_TIMEOUT", 10))                     # seconds a caller waits
+
+
+class HashPoolBusy(Exception):
+    """Raised when the hash queue is full; the caller should retry later."""
+
+
+class HashPool:
+    """Thread pool for password hashing with a hard limit on queued jobs."""
+
+    def __init__(self, workers=HASH_WORKERS, queue_limit=HASH_QUEUE_LIMIT):
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self._executor = None
+        self._lock = threading.Lock()
+        self._pending = 0
+
+    def run(self, func, *args, timeout=HASH_TIMEOUT):
+        """Runs func(*args) on the pool and returns its result, or raises HashPoolBusy."""
+        with self._lock:
+            if self._pending >= self.queue_limit:
+                raise HashPoolBusy("password hashing queue is full")
+            self._pending += 1
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="hash")
+        try:
+            future = self._executor.submit(func, *args)
+        except Exception:
+            self._release()
+            raise
+        future.add_done_callback(lambda _: self._release())
+        return future.result(timeout=timeout)
+
+    def _release(self):
+        with self._lock:
+            self._pending -= 1
+
+    @property
+    def pending(self):
+        return self._pending
+
+
+# shared by every request in this process
+pool = HashPool()
+
+
+def _b64(data):
+    return base64.b64encode(data).decode("ascii")
+
+
+# A function to hash a password with a fresh salt (runs on the calling thread)
+def _scrypt(password, salt, n=SCRYPT_N, r=SCRYPT_R, p=SCRYPT_P):
+    return hashlib.scrypt(password.encode("utf-8"), salt=salt, n=n, r=r, p=p,
+                          maxmem=128 * n * r * p + 1024 * 1024, dklen=HASH_BYTES)
+
+
+def _hash(password):
+    salt = os.urandom(SALT_BYTES)
+    digest = _scrypt(password, salt)
+    return f"{HASH_PREFIX}${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}${_b64(salt)}${_b64(digest)}"
+
+
+# A function to check a password against a stored value (runs on the calling thread)
+def _check(password, stored):
+    """Returns (matches, new hash to store or None)."""
+    if not stored.startswith(HASH_PREFIX + "$"):
+        # legacy plaintext row: compare, then upgrade it
+        matches = hmac.compare_digest(password.encode("utf-8"), stored.encode("utf-8"))
+        return matches, _hash(password) if matches else None
+
+    _, n, r, p, salt, digest = stored.split("$")
+    n, r, p = int(n), int(r), int(p)
+    matches = hmac.compare_digest(_scrypt(password, base64.b64decode(salt), n, r, p), base64.b64decode(digest))
+    outdated = (n, r, p) != (SCRYPT_N, SCRYPT_R, SCRYPT_P)
+    return matches, _hash(password) if matches and outdated else None
+
+
+# A function to hash a new password on the hash pool
+def hash_password(password):
+    """Returns the string to store for `password`. Raises HashPoolBusy when saturated."""
+    return pool.run(_hash, password)
+
+
+# A function to check a password on the hash pool
+def check_password(password, stored):
+    """
+    Returns (matches, upgraded) where `upgraded` is a new hash to save
+    when the stored value was plaintext or used an older work factor.
+    Raises HashPoolBusy when saturated.
+    """
+    return pool.run(_check, password, stored)
+
+
+# A function to check a password, ignoring upgrades
+def verify_password(password, stored):
+    """True when `password` matches the stored hash (or legacy plaintext)."""
+    return check_password(password, stored)[0]
+
+
+if __name__ == "__main__":
+    import argparse
+    import tempfile
+    from utils import db_handler
+    from utils.user_handler import register_user, login_user
+
+    parser = argparse.ArgumentParser(description="Benchmark login throughput at the current work factor.")
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 8, 64])
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    _hash("correct horse battery staple")
+    print(f"[TEST] scrypt n={SCRYPT_N} r={SCRYPT_R} p={SCRYPT_P}: {(time.perf_counter() - start) * 1000:.1f} ms per hash, "
+          f"{128 * SCRYPT_N * SCRYPT_R // 2**20} MB; pool {pool.workers} workers, queue limit {pool.queue_limit}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_handler.DB_PATH = os.path.join(tmp, "bench.db")
+        db_handler.init_db()
+        for i in range(20):
+            register_user(f"user{i}", f"user{i}@example.com", "secret")
+
+        for clients in args.clients:
+            latencies, outcomes = [], {"success": 0, "busy": 0, "fail": 0}
+
+            def attempt(i):
+                t = time.perf_counter()
+                result = login_user(f"user{i % 20}", "secret")
+                latencies.append(time.perf_counter() - t)
+                outcomes["busy" if result.get("busy") else result["status"]] += 1
+
+            start = time.perf_counter()
+            with ThreadPoolExecutor(clients) as callers:
+                list(callers.map(attempt, range(args.logins)))
+            elapsed = time.perf_counter() - start
+            latencies.sort()
+            p50 = latencies[len(latencies) // 2] * 1000
+            p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000
+            print(f"[TEST] {clients:>3} clients: {outcomes['success'] / elapsed:6.1f} logins/s, "
+                  f"p50 {p50:7.1f} ms, p99 {p99:7.1f} ms, ok {outcomes['success']}, busy {outcomes['busy']}, "
+                  f"failed {outcomes['fail']}")
@@ -0,0 +1,275 @@
+# utils/profiling_handler.py
+"""
+profiling_handler.py
+------------------------------------
+Opt-in sampling profiler for slow requests.
+
+A request is profiled when:
+    - an admin asks for it (X-Profile: 1 header or ?profile=1), or
+    - it is picked at random at the current sample rate (0 = off)
+
+While a profiled request runs, one background thread samples its stack
+every SAMPLE_INTERVAL seconds through sys._current_frames(). Frames are
+kept from the first project frame (app.py / utils/) down, so stacks read
+view -> prepare_map_data / generate_alerts / stats_handler -> db_handler.
+Nothing is traced between samples, so unprofiled requests pay only a
+flag check.
+
+Each profile is written in folded-stack format ("a;b;c <count>" per
+line), which flamegraph.pl, speedscope and inferno read directly, to a
+bounded ring in PROFILE_DIR: past MAX_PROFILES files the oldest go.
+The sample rate can be changed at runtime (set_sample_rate), no restart.
+It is stored in PROFILE_DIR/sample_rate, which every worker re-reads at
+most once per RATE_CHECK_SECONDS, so a change reaches all workers within
+about a second. The stored rate outlives restarts and takes precedence
+over PROFILE_SAMPLE_RATE until it is changed again.
+
+Classes:
+    - StackSampler
+    - ProfileStore
+
+Functions:
+    - instrument_profiling(app, is_admin)
+    - set_sample_rate(rate)
+    - get_sample_rate()
+    - list_profiles()
+"""
+
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+if __name__ == "__main__":
+    sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# -------------------------------------------------------------------
+# PROFILER SETTINGS
+# -------------------------------------------------------------------
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "profiles")
+MAX_PROFILES = int(os.environ.get("MAX_PROFILES", 50))
+SAMPLE_INTERVAL = 0.002                     # seconds between stack samples
+SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", 0))   # share of requests
+RATE_FILE = "sample_rate"                   # in PROFILE_DIR, shared by every worker
+RATE_CHECK_SECONDS = 1.0                    # how often a worker re-reads it
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+NAME_PATTERN = re.compile(r"^[A-Za-z0-9_.-]+\.folded$")
+
+
+class StackSampler:
+    """Samples the stacks of registered threads from one background thread."""
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        self._targets = {}          # thread id -> Counter of folded stacks
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def start(self, thread_id):
+        """Starts collecting samples for a thread."""
+        with self._lock:
+            self._targets[thread_id] = Counter()
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def stop(self, thread_id):
+        """Stops sampling a thread and returns its folded-stack counts."""
+        with self._lock:
+            return self._targets.pop(thread_id, Counter())
+
+    def _run(self):
+        own = threading.get_ident()
+        while True:
+            with self._lock:
+                if not self._targets:
+                    # cleared under the lock so a start() right after still wakes us
+                    self._wake.clear()
+                else:
+                    frames = sys._current_frames()
+                    for thread_id, counts in self._targets.items():
+                        frame = frames.get(thread_id)
+                        if frame is not None and thread_id != own:
+                            stack = _fold(frame)
+                            if stack:
+                                counts[stack] += 1
+                    del frames
+            if not self._wake.is_set():
+                # idle until the next profiled request
+                self._wake.wait()
+                continue
+            time.sleep(self.interval)
+
+
+# A function to turn a frame chain into one folded-stack line
+def _fold(frame):
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        module = os.path.splitext(os.path.basename(code.co_filename))[0]
+        names.append((code.co_filename, f"{module}.{code.co_name}"))
+        frame = frame.f_back
+    names.reverse()
+    # drop the server/Flask frames above the first project frame
+    for i, (filename, _) in enumerate(names):
+        if filename.startswith(PROJECT_ROOT) and "site-packages" not in filename:
+            return ";".join(name for _, name in names[i:])
+    return None
+
+
+class ProfileStore:
+    """Bounded on-disk ring of folded-stack profiles."""
+
+    def __init__(self, directory=PROFILE_DIR, limit=MAX_PROFILES):
+        self.directory = directory
+        self.limit = limit
+        self._lock = threading.Lock()
+
+    def save(self, counts, route, elapsed):
+        """Writes one profile and trims the ring; returns the file name."""
+        slug = re.sub(r"[^A-Za-z0-9]+", "_", route).strip("_") or "root"
+        stamp = time.time()
+        name = (f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(stamp))}.{int(stamp * 1000) % 1000:03d}"
+                f"-{slug}-{int(elapsed * 1000)}ms.folded")
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(os.path.join(self.directory, name), "w") as f:
+                for stack, count in counts.most_common():
+                    f.write(f"{stack} {count}\n")
+            files = sorted(n for n in os.listdir(self.directory) if n.endswith(".folded"))
+            for old in files[:max(0, len(files) - self.limit)]:
+                os.remove(os.path.join(self.directory, old))
+        return name
+
+    def list(self):
+        """Returns stored profiles, newest first."""
+        if not os.path.isdir(self.directory):
+            return []
+        files = sorted((n for n in os.listdir(self.directory) if n.endswith(".folded")), reverse=True)
+        return [{"name": n, "bytes": os.path.getsize(os.path.join(self.directory, n))} for n in files]
+
+    def path(self, name):
+        """Returns the file path of a stored profile, or None."""
+        if not NAME_PATTERN.match(name):
+            return None
+        path = os.path.join(self.directory, name)
+        return path if os.path.exists(path) else None
+
+
+sampler = StackSampler()
+store = ProfileStore()
+_settings = {"sample_rate": SAMPLE_RATE, "checked": None, "mtime": None}
+
+
+# A function to check a sampling rate
+def _valid_rate(rate):
+    rate = float(rate)
+    if not 0 <= rate <= 1:
+        raise ValueError("sample_rate must be between 0 and 1.")
+    return rate
+
+
+# A function to change the random sampling rate at runtime, for every worker
+def set_sample_rate(rate):
+    """Sets the share of requests profiled at random (0..1) in every worker."""
+    rate = _valid_rate(rate)
+    os.makedirs(store.directory, exist_ok=True)
+    path = os.path.join(store.directory, RATE_FILE)
+    with open(f"{path}.{os.getpid()}.tmp", "w") as f:
+        f.write(repr(rate))
+    os.replace(f"{path}.{os.getpid()}.tmp", path)
+    _settings.update(sample_rate=rate, mtime=os.stat(path).st_mtime_ns, checked=time.monotonic())
+    return rate
+
+
+# A function to get the sampling rate, re-reading the shared file when due
+def get_sample_rate():
+    """Returns the current sampling rate; reads PROFILE_DIR at most once per RATE_CHECK_SECONDS."""
+    now = time.monotonic()
+    checked = _settings["checked"]
+    if checked is not None and now - checked < RATE_CHECK_SECONDS:
+        return _settings["sample_rate"]
+    _settings["checked"] = now
+    path = os.path.join(store.directory, RATE_FILE)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+        if mtime != _settings["mtime"]:
+            with open(path) as f:
+                _settings["sample_rate"] = _valid_rate(f.read())
+            _settings["mtime"] = mtime
+    except FileNotFoundError:
+        _settings["sample_rate"], _settings["mtime"] = SAMPLE_RATE, None
+    except (OSError, ValueError):
+        pass   # keep the last good rate
+    return _settings["sample_rate"]
+
+
+# A function to list stored profiles
+def list_profiles():
+    """Returns name and size of every stored profile, newest first."""
+    return store.list()
+
+
+# A function to add the profiling hooks to a Flask app
+def instrument_profiling(app, is_admin):
+    """
+    Profiles flagged requests from admins, plus a random sample of all
+    requests. `is_admin()` is called (inside the request) only when a
+    request asks to be profiled.
+    """
+    from flask import g, request
+
+    @app.before_request
+    def _start_profile():
+        flagged = request.headers.get("X-Profile") == "1" or request.args.get("profile") == "1"
+        if flagged and not is_admin():
+            flagged = False
+        rate = get_sample_rate()
+        if flagged or (rate and random.random() < rate):
+            g.profile = (threading.get_ident(), time.perf_counter(), flagged)
+            sampler.start(g.profile[0])
+
+    @app.after_request
+    def _save_profile(response):
+        profile = g.pop("profile", None)
+        if profile is None:
+            return response
+        thread_id, start, flagged = profile
+        counts = sampler.stop(thread_id)
+        route = request.url_rule.rule if request.url_rule is not None else request.path
+        if counts:
+            name = store.save(counts, route, time.perf_counter() - start)
+            if flagged:
+                response.headers["X-Profile-File"] = name
+        return response
+
+    @app.teardown_request
+    def _drop_profile(exc):
+        # a request that failed before after_request still stops sampling
+        profile = g.pop("profile", None)
+        if profile is not None:
+            sampler.stop(profile[0])
+
+    return app
+
+
+if __name__ == "__main__":
+    from utils.stats_handler import overall_summary
+    from utils.alert_handler import generate_alerts
+
+    print("[TEST] Sampling generate_alerts + overall_summary for 50 calls...")
+    sampler.start(threading.get_ident())
+    start = time.perf_counter()
+    for _ in range(50):
+        generate_alerts()
+        overall_summary()
+    counts = sampler.stop(threading.get_ident())
+    name = store.save(counts, "/test", time.perf_counter() - start)
+    print(f"  {sum(counts.values())} samples, {len(counts)} distinct stacks -> {PROFILE_DIR}/{name}")
+    for stack, count in counts.most_common(5):
+        print(f"  {count:>5}  {stack}")
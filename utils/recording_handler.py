@@ -0,0 +1,367 @@
+# utils/recording_handler.py
+"""
+recording_handler.py
+------------------------------------
+Compact recording and seekable replay of simulation runs.
+
+A recording is one binary file: a fixed header followed by one record
+per tick. Every KEYFRAME_EVERY-th record is a keyframe with absolute
+vehicle positions; the records between are deltas. Vehicle count is
+fixed for a run, so every keyframe and every delta has a known size and
+the byte offset of any tick is plain arithmetic - no index to load.
+
+File layout (little-endian):
+
+    header    <8s H I I d d Q   magic, version, vehicles, keyframe_every,
+                                dt, road_length, frames (0 until closed)
+    record    <d I B            time, throughput, light code (R=0 G=1 Y=2)
+    keyframe  position_dm uint32[vehicles], lane uint8[vehicles]
+    delta     position change int16[vehicles] (dm), lane uint8[vehicles]
+
+Deltas are taken against the previously *recorded* positions, so
+quantization error never accumulates between keyframes.
+
+SimulationReplay reads a file through a memory map: seeking to a tick
+touches one keyframe plus at most KEYFRAME_EVERY - 1 deltas, and long
+runs never have to fit in RAM.
+
+Recordings are never overwritten (a taken name raises FileExistsError),
+and all of them together stay under RECORDINGS_MAX_BYTES: a run whose
+file would not fit raises RecordingQuotaExceeded before it starts. Each
+process counts the files on disk plus its own runs in progress, so runs
+started at the same moment in different workers can each still fit.
+
+Classes:
+    - SimulationRecorder
+    - SimulationReplay
+
+Functions:
+    - recording_size(steps, vehicles, keyframe_every)
+    - record_simulation(name, steps, seed, vehicles, lanes)
+    - open_recording(name)
+    - list_recordings()
+"""
+
+import os, sys
+import re
+import struct
+import threading
+import numpy as np
+if __name__ == "__main__":
+    sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.simulation_clock import SimulationClock
+from utils.simulation_engine import SimulationEngine
+from utils.simulation_handler import next_light_state, ROAD_LENGTH, STEP_SECONDS, DEFAULT_CAR_POSITIONS
+
+# -------------------------------------------------------------------
+# RECORDING SETTINGS
+# -------------------------------------------------------------------
+RECORDINGS_DIR = "recordings"
+KEYFRAME_EVERY = 64           # ticks between keyframes
+MAX_RECORD_STEPS = 1_000_000
+RECORDINGS_MAX_BYTES = int(os.environ.get("RECORDINGS_MAX_BYTES", 2 * 1024 ** 3))  # all recordings together
+REPLAY_MAX_VALUES = 5_000_000  # vehicle positions one replay request may return
+
+MAGIC = b"TRAFREC\0"
+VERSION = 1
+HEADER = struct.Struct("<8sHIIddQ")
+RECORD = struct.Struct("<dIB")
+FRAMES_OFFSET = HEADER.size - 8   # where the frame count lives in the header
+
+LIGHT_CODE = {"RED": 0, "GREEN": 1, "YELLOW": 2}
+LIGHT_NAME = {code: name for name, code in LIGHT_CODE.items()}
+NAME_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+# bytes reserved by this process's recordings in progress
+_reserved = {}
+_reserved_lock = threading.Lock()
+
+
+class RecordingQuotaExceeded(Exception):
+    """Raised when a new recording would push the recordings past RECORDINGS_MAX_BYTES."""
+
+
+# A function to map a recording name to its file
+def recording_path(name):
+    """Returns the file path for a recording name (letters, digits, - and _)."""
+    if not NAME_PATTERN.match(name or ""):
+        raise ValueError("Recording names may only use letters, digits, '-' and '_'.")
+    return os.path.join(RECORDINGS_DIR, f"{name}.rec")
+
+
+class SimulationRecorder:
+    """
+    Appends one frame per tick of an engine to a recording file.
+
+    Args:
+        path (str): Output file (must not exist yet).
+        engine (SimulationEngine): Engine whose vehicles are recorded.
+        dt (float): Simulated seconds per tick, stored for replay.
+        keyframe_every (int): Ticks between keyframes.
+    """
+
+    def __init__(self, path, engine, dt=STEP_SECONDS, keyframe_every=KEYFRAME_EVERY):
+        self.path = path
+        self.count = engine.count
+        self.keyframe_every = max(1, int(keyframe_every))
+        self.span = int(round(engine.road_length * 10))
+        self.frames = 0
+        self._last = None
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._file = open(path, "xb")
+        self._file.write(HEADER.pack(MAGIC, VERSION, self.count, self.keyframe_every,
+                                     float(dt), engine.road_length, 0))
+
+    def record(self, engine, time, light):
+        """Writes the engine's current state as the next frame."""
+        position = np.round(engine.position * 10).astype(np.int64) % self.span
+        lane = engine.lane.astype(np.uint8)
+        head = RECORD.pack(time, engine.throughput, LIGHT_CODE[light])
+
+        if self.frames % self.keyframe_every == 0:
+            self._file.write(head + position.astype("<u4").tobytes() + lane.tobytes())
+            self._last = position
+        else:
+            # signed change, wrapped around the ring so it stays small
+            change = (position - self._last + self.span // 2) % self.span - self.span // 2
+            change = np.clip(change, -32768, 32767)
+            self._file.write(head + change.astype("<i2").tobytes() + lane.tobytes())
+            self._last = (self._last + change) % self.span
+        self.frames += 1
+
+    def close(self):
+        """Stores the final frame count in the header and closes the file."""
+        if self._file.closed:
+            return
+        self._file.seek(FRAMES_OFFSET)
+        self._file.write(struct.pack("<Q", self.frames))
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class SimulationReplay:
+    """
+    Random-access reader for a recording file (memory-mapped).
+
+    Args:
+        path (str): Recording file written by SimulationRecorder.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._map = np.memmap(path, dtype=np.uint8, mode="r")
+        magic, version, count, keyframe_every, dt, road_length, frames = HEADER.unpack_from(self._map)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a simulation recording.")
+        self.count = count
+        self.keyframe_every = keyframe_every
+        self.dt = dt
+        self.road_length = road_length
+        self.span = int(round(road_length * 10))
+
+        self.key_size = RECORD.size + 5 * count
+        self.delta_size = RECORD.size + 3 * count
+        self.group_size = self.key_size + (keyframe_every - 1) * self.delta_size
+
+        # a run that never closed still replays up to its last whole frame
+        if not frames:
+            body = len(self._map) - HEADER.size
+            groups, rest = divmod(body, self.group_size)
+            frames = groups * keyframe_every
+            if rest >= self.key_size:
+                frames += 1 + (rest - self.key_size) // self.delta_size
+        self.frames = frames
+
+    def __len__(self):
+        return self.frames
+
+    def _offset(self, tick):
+        group, index = divmod(tick, self.keyframe_every)
+        offset = HEADER.size + group * self.group_size
+        if index:
+            offset += self.key_size + (index - 1) * self.delta_size
+        return offset
+
+    def _header(self, tick):
+        time, throughput, light = RECORD.unpack_from(self._map, self._offset(tick))
+        return {"tick": tick, "time": round(time, 3), "throughput": throughput, "light": LIGHT_NAME[light]}
+
+    def _lane(self, tick, width):
+        start = self._offset(tick) + RECORD.size + width * self.count
+        return self._map[start:start + self.count]
+
+    def _seek(self, tick):
+        # nearest keyframe at or before tick, then every delta up to it at once
+        key = tick - tick % self.keyframe_every
+        start = self._offset(key) + RECORD.size
+        position = np.frombuffer(self._map, dtype="<u4", count=self.count, offset=start).astype(np.int64)
+        if tick > key:
+            deltas = np.ndarray((tick - key, self.count), dtype="<i2", buffer=self._map,
+                                offset=self._offset(key + 1) + RECORD.size,
+                                strides=(self.delta_size, 2))
+            position = (position + deltas.sum(axis=0, dtype=np.int64)) % self.span
+        return position
+
+    def check_tick(self, tick):
+        """Raises ValueError if tick is outside the recording."""
+        if not 0 <= tick < self.frames:
+            raise ValueError(f"tick must be between 0 and {self.frames - 1}.")
+
+    def _frame(self, tick, position):
+        width = 4 if tick % self.keyframe_every == 0 else 2
+        frame = self._header(tick)
+        frame["positions"] = np.round(position / 10, 1).tolist()
+        frame["lanes"] = self._lane(tick, width).tolist()
+        return frame
+
+    def frame(self, tick):
+        """Returns one frame (header fields, positions in m, lanes)."""
+        self.check_tick(tick)
+        return self._frame(tick, self._seek(tick))
+
+    def stream(self, start=0, count=None, every=1):
+        """
+        Yields frames from `start`, one every `every` ticks, `count` frames
+        at most. Seeks once, then applies deltas in order.
+        """
+        self.check_tick(start)
+        every = max(1, int(every))
+        position, sent = self._seek(start), 0
+        for tick in range(start, self.frames):
+            if tick > start:
+                if tick % self.keyframe_every == 0:
+                    position = self._seek(tick)
+                else:
+                    offset = self._offset(tick) + RECORD.size
+                    change = np.frombuffer(self._map, dtype="<i2", count=self.count, offset=offset)
+                    position = (position + change) % self.span
+            if (tick - start) % every == 0:
+                yield self._frame(tick, position)
+                sent += 1
+                if count is not None and sent >= count:
+                    return
+
+    def max_frames(self, limit):
+        """Caps a frame count at `limit` and at REPLAY_MAX_VALUES positions."""
+        return max(1, min(int(limit), REPLAY_MAX_VALUES // max(self.count, 1)))
+
+    def info(self):
+        """Returns the recording's metadata."""
+        return {
+            "frames": self.frames,
+            "vehicles": self.count,
+            "keyframe_every": self.keyframe_every,
+            "dt": self.dt,
+            "road_length": self.road_length,
+            "duration": round(max(self.frames - 1, 0) * self.dt, 3),
+            "bytes": len(self._map),
+        }
+
+
+# A function to compute the file size of a recording before it is made
+def recording_size(steps, vehicles=None, keyframe_every=KEYFRAME_EVERY):
+    """Bytes of a recording of tick 0 plus `steps` ticks."""
+    count = len(DEFAULT_CAR_POSITIONS) if vehicles is None else int(vehicles)
+    frames = int(steps) + 1
+    keyframes = -(-frames // keyframe_every)
+    return (HEADER.size + frames * RECORD.size
+            + keyframes * 5 * count + (frames - keyframes) * 3 * count)
+
+
+# A function to count the bytes all recordings use or have reserved
+def _used_bytes():
+    on_disk = sum(r["bytes"] for r in list_recordings())
+    # a run in progress counts at its final size, not its size so far
+    for path, size in _reserved.items():
+        if os.path.exists(path):
+            on_disk += size - os.path.getsize(path)
+    return on_disk
+
+
+# A function to run a seeded simulation and record every tick
+def record_simulation(name, steps, seed=0, vehicles=None, lanes=1, keyframe_every=KEYFRAME_EVERY):
+    """
+    Runs a fresh seeded simulation (same setup as run_seeded_batch) and
+    records tick 0 plus `steps` ticks. Returns the recording's info.
+    Raises FileExistsError if the name is taken and RecordingQuotaExceeded
+    if the file would not fit under RECORDINGS_MAX_BYTES.
+    """
+    steps = max(1, min(int(steps), MAX_RECORD_STEPS))
+    path = recording_path(name)
+    size = recording_size(steps, vehicles, keyframe_every)
+    with _reserved_lock:
+        if os.path.exists(path) or path in _reserved:
+            raise FileExistsError(f"A recording named {name} already exists.")
+        if _used_bytes() + size > RECORDINGS_MAX_BYTES:
+            raise RecordingQuotaExceeded(
+                f"Recording needs {size / 1e6:.1f} MB but the recordings quota "
+                f"({RECORDINGS_MAX_BYTES / 1e6:.0f} MB) is nearly full.")
+        _reserved[path] = size
+    try:
+        return _record(name, path, steps, seed, vehicles, lanes, keyframe_every)
+    finally:
+        with _reserved_lock:
+            del _reserved[path]
+
+
+def _record(name, path, steps, seed, vehicles, lanes, keyframe_every):
+    if vehicles is None:
+        engine = SimulationEngine.from_positions(DEFAULT_CAR_POSITIONS, road_length=ROAD_LENGTH, seed=seed)
+    else:
+        road_length = max(ROAD_LENGTH, vehicles * 25.0 / max(lanes, 1))
+        engine = SimulationEngine(num_vehicles=vehicles, num_lanes=lanes, road_length=road_length, seed=seed)
+    clock = SimulationClock(dt=STEP_SECONDS)
+    light, last_switch = "RED", clock.now()
+
+    with SimulationRecorder(path, engine, clock.dt, keyframe_every) as recorder:
+        recorder.record(engine, clock.now(), light)
+        for _ in range(steps):
+            light, last_switch = next_light_state(light, last_switch, clock.tick())
+            engine.step(clock.dt, light)
+            recorder.record(engine, clock.now(), light)
+    return {"name": name, **SimulationReplay(path).info()}
+
+
+# A function to open a recording by name
+def open_recording(name):
+    """Returns a SimulationReplay for a stored recording."""
+    path = recording_path(name)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"No recording named {name}.")
+    return SimulationReplay(path)
+
+
+# A function to list stored recordings
+def list_recordings():
+    """Returns name and size of every stored recording."""
+    if not os.path.isdir(RECORDINGS_DIR):
+        return []
+    return [{"name": f[:-4], "bytes": os.path.getsize(os.path.join(RECORDINGS_DIR, f))}
+            for f in sorted(os.listdir(RECORDINGS_DIR)) if f.endswith(".rec")]
+
+
+if __name__ == "__main__":
+    import time
+
+    print("[TEST] Recording 20,000 ticks of 1,000 vehicles...")
+    start = time.perf_counter()
+    if os.path.exists(recording_path("example")):
+        os.remove(recording_path("example"))
+    info = record_simulation("example", 20_000, seed=1, vehicles=1000, lanes=3)
+    print(f"  {info['frames']} frames, {info['bytes'] / 1e6:.1f} MB in {time.perf_counter() - start:.2f}s")
+
+    replay = open_recording("example")
+    for tick in (0, 12_345, 19_999):
+        start = time.perf_counter()
+        frame = replay.frame(tick)
+        print(f"  seek to tick {tick}: {(time.perf_counter() - start) * 1000:.2f} ms, "
+              f"light {frame['light']}, first car at {frame['positions'][0]} m")
+    start = time.perf_counter()
+    frames = list(replay.stream(5_000, count=1_000))
+    print(f"  streamed {len(frames)} frames in {(time.perf_counter() - start) * 1000:.1f} ms")
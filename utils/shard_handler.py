@@ -0,0 +1,202 @@
+# utils/shard_handler.py
+"""
+shard_handler.py
+------------------------------------
+Splits traffic_data and accident_data across several SQLite files so
+writers for different cities stop queueing on one database lock.
+
+Each city belongs to one shard, picked by a stable hash of its name, so
+a group of cities shares a file next to the main database:
+
+    database.db            users (and the unsharded tables)
+    database.shard0.db     traffic/accident rows for one group of cities
+    database.shard1.db     ...
+
+City queries open only their own shard. Global queries run on every
+shard at once on a small thread pool, and their partial results are
+merged by the caller (db_handler). With a shard count of 0 or 1,
+everything stays in the main database, as before.
+
+Changing the shard count moves cities to other shards. Split an existing
+database again with the command below (shards are filled from the source
+file's rows; the source file is left as it is):
+
+    python -m utils.shard_handler --db database.db --shards 8
+
+Functions:
+    - shard_index(city, count)
+    - shard_paths(base, count)
+    - shard_for(base, count, city)
+    - partition(records, base, count)
+    - partition_columns(columns, base, count)
+    - fan_out(func, items)
+    - split_database(source, base, count)
+"""
+
+import os, sys
+import contextvars
+import sqlite3
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+if __name__ == "__main__":
+    sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# -------------------------------------------------------------------
+# SHARD SETTINGS
+# -------------------------------------------------------------------
+SHARD_WORKERS = int(os.environ.get("SHARD_WORKERS", 8))   # shards queried at once
+SHARDED_TABLES = ("traffic_data", "accident_data")
+SPLIT_BATCH_ROWS = 50_000
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+# A function to drop the pool in a forked child (its threads stay in the parent)
+def _reset_after_fork():
+    global _executor, _executor_lock
+    _executor = None
+    _executor_lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+# A function to pick the shard a city belongs to
+def shard_index(city, count):
+    """Stable shard number for `city` (the same in every process and run)."""
+    return zlib.crc32((city or "").casefold().encode("utf-8")) % count
+
+
+# A function to list the database files holding sharded rows
+def shard_paths(base, count):
+    """Returns the shard files for `base`, or [base] when not sharded."""
+    if count <= 1:
+        return [base]
+    root, ext = os.path.splitext(base)
+    return [f"{root}.shard{n}{ext or '.db'}" for n in range(count)]
+
+
+# A function to find the database file holding one city's rows
+def shard_for(base, count, city):
+    return shard_paths(base, count)[shard_index(city, count) if count > 1 else 0]
+
+
+# A function to group records by the shard they belong to
+def partition(records, base, count, key="city"):
+    """Returns {path: [records]} for every shard that gets at least one record."""
+    paths = shard_paths(base, count)
+    if len(paths) == 1:
+        return {paths[0]: list(records)}
+    groups = {}
+    for record in records:
+        groups.setdefault(paths[shard_index(record[key], count)], []).append(record)
+    return groups
+
+
+# A function to group column arrays by the shard each row belongs to
+def partition_columns(columns, base, count, key="city"):
+    """
+    partition() for a dict of equal-length NumPy column arrays: returns
+    {path: columns} holding only that shard's rows, in their original order.
+    """
+    paths = shard_paths(base, count)
+    if len(paths) == 1:
+        return {paths[0]: columns}
+    import numpy as np
+
+    # one hash per distinct city, not per row
+    names, inverse = np.unique(columns[key], return_inverse=True)
+    shards = np.array([shard_index(name, count) for name in names.tolist()], dtype=np.int64)[inverse]
+    return {paths[n]: {name: values[shards == n] for name, values in columns.items()}
+            for n in np.unique(shards).tolist()}
+
+
+# A function to run func(item) for every item at once, in item order
+def fan_out(func, items):
+    """
+    Returns [func(item) for item in items], run concurrently on the shard
+    pool (a single item runs on the calling thread). Each call keeps the
+    caller's context, so log lines carry the request id. The first
+    exception raised is re-raised once every call has finished.
+    """
+    global _executor
+    items = list(items)
+    if len(items) <= 1:
+        return [func(item) for item in items]
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=SHARD_WORKERS, thread_name_prefix="shard")
+    futures = [_executor.submit(contextvars.copy_context().run, func, item) for item in items]
+    errors = [f.exception() for f in futures]
+    for error in errors:
+        if error is not None:
+            raise error
+    return [f.result() for f in futures]
+
+
+# A function to copy the sharded tables of one database into shard files
+def split_database(source, base, count, progress=None):
+    """
+    Reads traffic_data and accident_data from `source` in batches and
+    appends each row to its city's shard of `base` (ids are reassigned).
+    The shard files must already have their tables (db_handler.init_db).
+    Returns {table: rows copied}.
+    """
+    paths = shard_paths(base, count)
+    copied = {}
+    with closing(sqlite3.connect(source)) as src:
+        targets = [sqlite3.connect(path) for path in paths]
+        try:
+            for table in SHARDED_TABLES:
+                cursor = src.execute(f"SELECT * FROM {table} ORDER BY id;")
+                columns = [col[0] for col in cursor.description if col[0] != "id"]
+                city = columns.index("city")
+                insert = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))});"
+                copied[table] = 0
+                while True:
+                    rows = cursor.fetchmany(SPLIT_BATCH_ROWS)
+                    if not rows:
+                        break
+                    groups = {}
+                    for row in rows:
+                        row = row[1:]
+                        groups.setdefault(shard_index(row[city], count) if count > 1 else 0, []).append(row)
+                    for n, group in groups.items():
+                        with targets[n]:
+                            targets[n].executemany(insert, group)
+                    copied[table] += len(rows)
+                    if progress:
+                        progress(table, copied[table])
+        finally:
+            for conn in targets:
+                conn.close()
+    return copied
+
+
+if __name__ == "__main__":
+    import argparse
+    from utils import db_handler
+
+    parser = argparse.ArgumentParser(description="Split a database's traffic and accident rows into city shards.")
+    parser.add_argument("--db", default=db_handler.DB_PATH, help="main database (rows are read from it)")
+    parser.add_argument("--shards", type=int, required=True)
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        raise SystemExit(f"[ERROR] Database not found: {args.db}")
+    if args.shards <= 1:
+        raise SystemExit("[ERROR] --shards must be 2 or more.")
+    db_handler.DB_PATH, db_handler.DB_SHARDS = args.db, args.shards
+    existing = [path for path in shard_paths(args.db, args.shards) if os.path.exists(path)]
+    if existing:
+        raise SystemExit(f"[ERROR] Shard files already exist: {', '.join(existing)}")
+
+    db_handler.init_db()
+    totals = split_database(args.db, args.db, args.shards,
+                            progress=lambda table, rows: print(f"[INFO] {table}: {rows} rows copied"))
+    print(f"[INFO] Copied {totals} into {args.shards} shards of {args.db}. "
+          f"Serve with DB_SHARDS={args.shards}.")
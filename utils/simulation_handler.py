@@ -5,43 +5,128 @@ simulation_handler.py
 Handles car movement, traffic light logic, and flow updates for the
 Traffic Flow Simulation page.
 
+Vehicle dynamics are delegated to the vectorized SimulationEngine
+(simulation_engine.py); run_simulation_step() is a thin wrapper over it.
+
+Time comes from an injectable clock (simulation_clock.py): real time by
+default, or a fixed-timestep SimulationClock for repeatable batch runs.
+
 Functions:
-    - get_traffic_light_state()
+    - validate_timer(timer)
+    - next_light_state(light, last_switch, now)
+    - get_traffic_light_state(clock)
     - update_car_positions()
     - run_simulation_step()
+    - run_simulation_batch(engine, clock, light, last_switch, steps)
+    - run_seeded_batch(steps, seed)
+    - batch_cost(steps, vehicles)
 """
 
+import os, sys
 import random
+import threading
 import time
+import numpy as np
+if __name__ == "__main__":
+    sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.simulation_engine import SimulationEngine
+from utils.simulation_clock import SimulationClock, wall_clock
+from utils.log_handler import get_logger
+
+logger = get_logger(__name__)
 
 # ligght cycle and timing definitions 
 light_cycle = ["RED", "GREEN", "YELLOW"]
 light_timer = {"RED": 5, "GREEN": 6, "YELLOW": 2}
 current_light = "RED"
 last_switch = time.time()
+# guards current_light/last_switch when several threads read the light
+_light_lock = threading.Lock()
+
+# speed multiplier per light color for update_car_positions()
+light_speed_factor = {"GREEN": 1.0, "YELLOW": 0.5, "RED": 0.0}
+
+# road length and step size of the engine behind run_simulation_step()
+ROAD_LENGTH = 1000.0
+STEP_SECONDS = 0.5
+DEFAULT_CAR_POSITIONS = [0, 150, 300]
+_engine = None
+
+# batch mode limits and one-letter light codes for compact frames
+MAX_BATCH_STEPS = 20_000
+# work allowed per batch request, in vehicle-steps (see batch_cost); about
+# 0.1 us per vehicle-step here, so roughly 0.3 s anonymous and 3 s signed in
+ANON_BATCH_BUDGET = int(os.environ.get("ANON_BATCH_BUDGET", 3_000_000))
+USER_BATCH_BUDGET = int(os.environ.get("USER_BATCH_BUDGET", 30_000_000))
+# fixed per-step cost (light update, frame bookkeeping) in vehicles' worth
+STEP_OVERHEAD_VEHICLES = 600
+LIGHT_CODES = {"RED": "R", "GREEN": "G", "YELLOW": "Y"}
+
+# A function to check a light timing table
+def validate_timer(timer):
+    """
+    Returns `timer` as {"RED": s, "GREEN": s, "YELLOW": s} floats.
+    Raises ValueError when a phase is missing, not a number, or not a
+    positive, finite duration (a zero cycle would never advance).
+    """
+    checked = {}
+    for phase in light_cycle:
+        try:
+            seconds = float(timer[phase])
+        except (KeyError, TypeError, ValueError):
+            raise ValueError(f"{phase} duration is missing or not a number") from None
+        if not 0 < seconds < float("inf"):
+            raise ValueError(f"{phase} duration must be a positive number of seconds, got {timer[phase]!r}")
+        checked[phase] = seconds
+    return checked
+
+
+# A function to advance a light from its last switch time to now
+def next_light_state(light, last_switch, now, timer=None, checked=False):
+    """
+    Returns (light, last_switch) after advancing to `now`.
+    Steps through as many phases as have elapsed, so a long gap (or a
+    batch run) lands on the same phase a continuous run would.
+    Used for both the shared light and per-session lights; `timer`
+    overrides the light_timer durations (e.g. in parameter sweeps) and
+    must pass validate_timer(); a bad one raises ValueError. Pass
+    checked=True for a timer validate_timer() already returned, so a
+    loop calling this every tick doesn't validate it again each time.
+    """
+    if timer is None:
+        timer = light_timer
+    elif not checked:
+        timer = validate_timer(timer)
+    elapsed = now - last_switch
+    # skip whole cycles in one go instead of looping through them
+    cycle = sum(timer.values())
+    if elapsed >= cycle:
+        last_switch += (elapsed // cycle) * cycle
+    # If the current light duration has passed, move to the next
+    while now - last_switch >= timer[light]:
+        last_switch += timer[light]
+        # find the next light in the cycle
+        current_index = light_cycle.index(light)
+        light = light_cycle[(current_index + 1) % len(light_cycle)]
+    return light, last_switch
 
 # A function to get the current traffic light state
-def get_traffic_light_state():
+def get_traffic_light_state(clock=None):
     """
     Returns the current traffic light color based on time elapsed.
     Automatically switches between RED -> GREEN -> YELLOW -> RED.
+    Reads time from `clock` (real time by default).
     """
     # global variables to track current light and last switch time
     global current_light, last_switch
-    now = time.time()
-    elapsed = now - last_switch
-
-    # If the current light duration has passed, move to the next
-    if elapsed >= light_timer[current_light]:
-        # find the next light in the cycle
-        current_index = light_cycle.index(current_light)
-        # get the next light in the cycle
-        next_light = light_cycle[(current_index + 1) % len(light_cycle)]
-        # update global variables for current light and last switch time
-        current_light = next_light
-        last_switch = now
-        # print light change for debugging
-        print(f"🚦 Light changed to {current_light}")
+    now = (clock or wall_clock).now()
+    with _light_lock:
+        previous = current_light
+        current_light, last_switch = next_light_state(current_light, last_switch, now)
+    if current_light != previous:
+        # log light change for debugging
+        logger.debug("Light changed to %s", current_light)
     # return the current light color
     return current_light
 
@@ -60,36 +145,119 @@ def update_car_positions(car_positions, speed=2):
     
     # get current traffic light state
     light = get_traffic_light_state()
-    # list to hold updated car positions in an empty list
-    updated_positions = []
-    # iterate through each car position and update based on light
-    for pos in car_positions:
-        # if light is green, 
-        if light == "GREEN":
-            new_pos = pos + speed  # Move forward
-        # if light is yellow,
-        elif light == "YELLOW":
-            new_pos = pos + (speed * 0.5)  # Slow down
-        else:
-            new_pos = pos  # Stop on RED light
-        # append new position to updated positions list
-        updated_positions.append(new_pos)
+    # move every car at once: full speed on green, half on yellow, stop on red
+    positions = np.asarray(car_positions, dtype=np.float64)
+    updated_positions = positions + speed * light_speed_factor[light]
     # return the updated car positions
-    return updated_positions
+    return updated_positions.tolist()
 
 # A function to run one step of the traffic simulation
-def run_simulation_step(car_positions):
+def run_simulation_step(car_positions, engine=None, light=None, clock=None):
     """
     Simulates one step of traffic movement.
     Returns updated car positions + light state.
+
+    Cars are advanced by a SimulationEngine (IDM car following), so they
+    accelerate, queue behind each other and stop at the signal's stop line.
+    Pass `engine` (and its own `light` color) to step a specific engine
+    instead of the shared one.
+    """
+    global _engine
+    if light is None:
+        light = get_traffic_light_state(clock)
+    if engine is None:
+        # rebuild the shared engine if the caller's car count changed
+        if _engine is None or _engine.count != len(car_positions):
+            _engine = SimulationEngine.from_positions(car_positions, road_length=ROAD_LENGTH)
+        engine = _engine
+
+    # the caller's positions are authoritative; speeds carry over in the engine
+    engine.position = np.asarray(car_positions, dtype=np.float64) % engine.road_length
+    engine.step(STEP_SECONDS, light)
+    return {
+        "light": light,
+        "car_positions": np.round(engine.position, 2).tolist()
+    }
+
+
+# A function to advance an engine many fixed ticks in one call
+def run_simulation_batch(engine, clock, light, last_switch, steps, frame_every=1):
+    """
+    Runs `steps` fixed-timestep ticks and returns summarized frames.
+
+    Args:
+        engine (SimulationEngine): Engine to advance.
+        clock (SimulationClock): Fixed-timestep clock; ticked once per step.
+        light, last_switch: Light state at the start of the batch.
+        steps (int): Number of ticks to run (capped at MAX_BATCH_STEPS).
+        frame_every (int): Keep one frame every N ticks.
+
+    Returns:
+        dict with the final light state and column-oriented frames; the
+        light column is a string with one letter (R/G/Y) per frame.
     """
-    # update car positions based on current light state
-    new_positions = update_car_positions(car_positions)
+    steps = max(0, min(int(steps), MAX_BATCH_STEPS))
+    frame_every = max(1, int(frame_every))
+    frames = {"tick": [], "average_speed": [], "stopped": [], "queue_length": [], "throughput": []}
+    codes = []
+
+    for i in range(steps):
+        now = clock.tick()
+        light, last_switch = next_light_state(light, last_switch, now)
+        engine.step(clock.dt, light)
+
+        if (i + 1) % frame_every == 0 or i == steps - 1:
+            summary = engine.summary()
+            frames["tick"].append(clock.ticks)
+            frames["average_speed"].append(round(summary["average_speed"], 2))
+            frames["stopped"].append(summary["stopped"])
+            frames["queue_length"].append(summary["queue_length"])
+            frames["throughput"].append(summary["throughput"])
+            codes.append(LIGHT_CODES[light])
+
+    frames["light"] = "".join(codes)
     return {
-        "light": get_traffic_light_state(),
-        "car_positions": new_positions
+        "light": light,
+        "last_switch": last_switch,
+        "time": clock.now(),
+        "dt": clock.dt,
+        "steps": steps,
+        "frame_every": frame_every,
+        "frames": frames,
     }
 
+# A function to estimate the work of a batch run
+def batch_cost(steps, vehicles=None):
+    """
+    Returns the cost of `steps` ticks of `vehicles` cars (default: the
+    page's three) in vehicle-steps, counting the fixed per-step work.
+    1,200 ticks of three cars cost ~0.7M and take ~0.1 s.
+    """
+    vehicles = len(DEFAULT_CAR_POSITIONS) if vehicles is None else vehicles
+    return int(steps) * (int(vehicles) + STEP_OVERHEAD_VEHICLES)
+
+
+# A function to run a fresh, repeatable batch simulation from a seed
+def run_seeded_batch(steps, seed=0, vehicles=None, lanes=1, frame_every=1):
+    """
+    Runs a new simulation on a fixed clock starting at t=0.
+    The same arguments always give the same frames.
+
+    With `vehicles` unset it uses the page's default three cars; otherwise
+    it spreads `vehicles` cars over `lanes` lanes of a longer corridor.
+    """
+    if vehicles is None:
+        engine = SimulationEngine.from_positions(DEFAULT_CAR_POSITIONS, road_length=ROAD_LENGTH, seed=seed)
+    else:
+        road_length = max(ROAD_LENGTH, vehicles * 25.0 / max(lanes, 1))
+        engine = SimulationEngine(num_vehicles=vehicles, num_lanes=lanes, road_length=road_length, seed=seed)
+    clock = SimulationClock(dt=STEP_SECONDS)
+    result = run_simulation_batch(engine, clock, "RED", clock.now(), steps, frame_every)
+    result["seed"] = seed
+    result["summary"] = engine.summary()
+    if vehicles is None:
+        result["car_positions"] = np.round(engine.position, 2).tolist()
+    return result
 
 
 if __name__ == "__main__":
@@ -0,0 +1,337 @@
+# utils/simulation_session_handler.py
+"""
+simulation_session_handler.py
+------------------------------------
+Per-visitor simulation state for the Traffic Flow Simulation page.
+
+Each browser session gets its own SimulationSession (engine, car
+positions, traffic light and fixed-timestep clock), so visitors never
+step each other's simulation. Sessions live in an LRU registry that:
+
+    - locks each session while it is stepped (safe across threads)
+    - evicts sessions idle for longer than IDLE_TIMEOUT
+    - evicts least recently used sessions past MAX_SESSIONS or
+      MEMORY_CAP_BYTES of engine state
+
+The registry is per process. Under a multi-worker server a visitor's
+requests land on different workers, so wsgi.py turns on shared mode
+(shared=True below, app config SHARED_SIM_SESSIONS): each step then
+reads the session's latest saved state (unless this worker's cached
+copy is already current), steps it and saves it back with a versioned
+single-row UPDATE, so every worker continues the same simulation and
+the database write lock is never held while a simulation steps. A
+worker that loses the race to another worker steps the newer state.
+Saved sessions idle for longer than IDLE_TIMEOUT are deleted.
+
+Classes:
+    - SimulationSession
+    - SimulationRegistry
+
+Functions:
+    - step_session(session_id, shared)
+    - run_session_batch(session_id, steps, frame_every, shared)
+    - drop_session(session_id, shared)
+    - registry_stats()
+"""
+
+import os, sys
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import closing
+if __name__ == "__main__":
+    sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.simulation_engine import SimulationEngine
+from utils.simulation_clock import SimulationClock
+from utils.simulation_handler import (run_simulation_step, run_simulation_batch, next_light_state,
+                                      ROAD_LENGTH, STEP_SECONDS, DEFAULT_CAR_POSITIONS)
+
+# -------------------------------------------------------------------
+# REGISTRY LIMITS
+# -------------------------------------------------------------------
+IDLE_TIMEOUT = 15 * 60               # seconds without a step before eviction
+MAX_SESSIONS = 10_000
+MEMORY_CAP_BYTES = 256 * 1024 * 1024  # estimated memory across all sessions
+
+# rough per-session cost of the Python objects around the engine arrays
+SESSION_OVERHEAD_BYTES = 4096
+
+# shared mode: seconds a worker keeps retrying a session other workers
+# keep saving first, and between deletes of idle saved sessions
+SHARED_LOCK_TIMEOUT = 10
+SHARED_CLEANUP_SECONDS = 60
+
+
+class SimulationSession:
+    """
+    One visitor's simulation: engine, car positions and light state.
+    Simulated time comes from a fixed-timestep clock, so each step moves
+    the simulation STEP_SECONDS forward however often the page polls.
+    `last_access` is wall-clock time and only drives eviction.
+    """
+
+    def __init__(self, session_id, car_positions=None, now=None):
+        now = time.time() if now is None else now
+        self.session_id = session_id
+        self.car_positions = list(car_positions or DEFAULT_CAR_POSITIONS)
+        self.engine = SimulationEngine.from_positions(self.car_positions, road_length=ROAD_LENGTH)
+        self.clock = SimulationClock(dt=STEP_SECONDS)
+        self.light = "RED"
+        self.last_switch = self.clock.now()
+        self.last_access = now
+        self.lock = threading.Lock()
+        # version of the saved copy this object matches (shared mode)
+        self.version = 0
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    @property
+    def nbytes(self):
+        """Approximate memory held by this session."""
+        engine = self.engine
+        arrays = (engine.position, engine.velocity, engine.lane, engine.acceleration, engine._order)
+        return SESSION_OVERHEAD_BYTES + sum(a.nbytes for a in arrays)
+
+    def step(self, now=None):
+        """Advances this session's light and cars by one simulation step."""
+        now = time.time() if now is None else now
+        with self.lock:
+            self.light, self.last_switch = next_light_state(self.light, self.last_switch, self.clock.tick())
+            state = run_simulation_step(self.car_positions, engine=self.engine, light=self.light)
+            self.car_positions = state["car_positions"]
+            self.last_access = now
+            return state
+
+    def run(self, steps, frame_every=1, now=None):
+        """Fast-forwards this session by `steps` ticks; returns summarized frames."""
+        now = time.time() if now is None else now
+        with self.lock:
+            result = run_simulation_batch(self.engine, self.clock, self.light, self.last_switch,
+                                          steps, frame_every)
+            self.light, self.last_switch = result["light"], result["last_switch"]
+            self.car_positions = [round(float(p), 2) for p in self.engine.position]
+            self.last_access = now
+            result["car_positions"] = self.car_positions
+            return result
+
+
+class SimulationRegistry:
+    """Thread-safe LRU map of session id -> SimulationSession."""
+
+    def __init__(self, idle_timeout=IDLE_TIMEOUT, max_sessions=MAX_SESSIONS,
+                 memory_cap=MEMORY_CAP_BYTES):
+        self.idle_timeout = idle_timeout
+        self.max_sessions = max_sessions
+        self.memory_cap = memory_cap
+        self._sessions = OrderedDict()
+        self._bytes = 0
+        self._evicted = 0
+        self._lock = threading.Lock()
+
+    def get(self, session_id, create=True, now=None):
+        """
+        Returns the session for session_id, creating it if needed.
+        Marks the session as most recently used.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            self._evict_idle(now)
+            sim = self._sessions.get(session_id)
+            if sim is not None:
+                self._sessions.move_to_end(session_id)
+                sim.last_access = now
+                return sim
+            if not create:
+                return None
+
+            sim = SimulationSession(session_id, now=now)
+            self._sessions[session_id] = sim
+            self._bytes += sim.nbytes
+            self._evict_over_limit(keep=session_id)
+            return sim
+
+    def step(self, session_id, now=None):
+        """Steps one session's simulation and returns its new state."""
+        return self.get(session_id, now=now).step(now)
+
+    def put(self, session_id, sim):
+        """Stores `sim` as the session's state (e.g. loaded from another worker); returns it."""
+        with self._lock:
+            self._remove(session_id)
+            self._sessions[session_id] = sim
+            self._bytes += sim.nbytes
+            self._evict_over_limit(keep=session_id)
+            return sim
+
+    def drop(self, session_id):
+        """Removes a session; returns True if it existed."""
+        with self._lock:
+            return self._remove(session_id)
+
+    def evict(self, now=None):
+        """Evicts idle and over-limit sessions; returns how many were removed."""
+        now = time.time() if now is None else now
+        with self._lock:
+            before = self._evicted
+            self._evict_idle(now)
+            self._evict_over_limit()
+            return self._evicted - before
+
+    def stats(self):
+        """Returns counts and memory use for monitoring."""
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "memory_bytes": self._bytes,
+                "memory_cap_bytes": self.memory_cap,
+                "evicted": self._evicted,
+            }
+
+    # caller must hold self._lock for the helpers below
+    def _remove(self, session_id):
+        sim = self._sessions.pop(session_id, None)
+        if sim is None:
+            return False
+        self._bytes -= sim.nbytes
+        return True
+
+    def _evict_idle(self, now):
+        # the least recently used sessions sit at the front
+        while self._sessions:
+            session_id, sim = next(iter(self._sessions.items()))
+            if now - sim.last_access < self.idle_timeout:
+                break
+            self._remove(session_id)
+            self._evicted += 1
+
+    def _evict_over_limit(self, keep=None):
+        while self._sessions and (len(self._sessions) > self.max_sessions or self._bytes > self.memory_cap):
+            session_id = next(iter(self._sessions))
+            if session_id == keep:
+                break
+            self._remove(session_id)
+            self._evicted += 1
+
+
+# shared registry used by the Flask routes
+registry = SimulationRegistry()
+_last_cleanup = 0.0
+
+# one session's shared steps run one at a time within a worker
+_shared_locks = [threading.Lock() for _ in range(256)]
+
+
+# A function to pick the in-process lock for a session's shared steps
+def _shared_lock(session_id):
+    return _shared_locks[hash(session_id) % len(_shared_locks)]
+
+
+# A function to run an action on a session whose state lives in the database
+def _run_shared(session_id, action):
+    """
+    Runs action(sim) on the session's latest saved state and saves the
+    result with the next version number. The state is read without a
+    lock, and the save is one UPDATE that only applies while the saved
+    version is still the one that was read, so the database write lock
+    is held for that single row write. If another worker saved first,
+    its newer state is loaded and the action runs again on it.
+    """
+    global _last_cleanup
+    from utils import db_handler
+
+    db_handler.ensure_db()
+    deadline = time.monotonic() + SHARED_LOCK_TIMEOUT
+    with _shared_lock(session_id), closing(sqlite3.connect(db_handler.DB_PATH, timeout=SHARED_LOCK_TIMEOUT,
+                                                           isolation_level=None)) as conn:
+        while True:
+            row = conn.execute("SELECT version, state FROM simulation_sessions WHERE session_id = ?;",
+                               (session_id,)).fetchone()
+            saved = row[0] if row else 0
+            sim = registry.get(session_id)
+            if row is not None and saved != sim.version:
+                # rows are only ever written by this function, never from user input
+                sim = registry.put(session_id, pickle.loads(row[1]))
+            try:
+                result = action(sim)
+            except BaseException:
+                # the cached copy may be ahead of the saved one now; reload next time
+                sim.version = -1
+                raise
+
+            sim.version = saved + 1
+            now = time.time()
+            if row is None:
+                cursor = conn.execute("INSERT OR IGNORE INTO simulation_sessions "
+                                      "(session_id, version, state, updated_at) VALUES (?, ?, ?, ?);",
+                                      (session_id, sim.version, pickle.dumps(sim), now))
+            else:
+                cursor = conn.execute("UPDATE simulation_sessions SET version = ?, state = ?, updated_at = ? "
+                                      "WHERE session_id = ? AND version = ?;",
+                                      (sim.version, pickle.dumps(sim), now, session_id, saved))
+            if cursor.rowcount == 1:
+                break
+            # another worker saved this session in between: step its newer state instead
+            sim.version = -1
+            if time.monotonic() >= deadline:
+                raise TimeoutError(f"Simulation session {session_id} kept changing on other workers.")
+
+        if now - _last_cleanup >= SHARED_CLEANUP_SECONDS:
+            _last_cleanup = now
+            conn.execute("DELETE FROM simulation_sessions WHERE updated_at < ?;", (now - IDLE_TIMEOUT,))
+    return result
+
+
+# A function to step the simulation that belongs to a session
+def step_session(session_id, shared=False):
+    """Runs one simulation step for a session and returns its state."""
+    if shared:
+        return _run_shared(session_id, lambda sim: sim.step())
+    return registry.step(session_id)
+
+
+# A function to fast-forward the simulation that belongs to a session
+def run_session_batch(session_id, steps, frame_every=1, shared=False):
+    """Runs `steps` ticks of a session's simulation in one call."""
+    if shared:
+        return _run_shared(session_id, lambda sim: sim.run(steps, frame_every))
+    return registry.get(session_id).run(steps, frame_every)
+
+
+# A function to discard a session's simulation
+def drop_session(session_id, shared=False):
+    """Frees a session's simulation state (e.g. on logout)."""
+    if shared:
+        from utils import db_handler
+
+        with closing(sqlite3.connect(db_handler.DB_PATH, timeout=SHARED_LOCK_TIMEOUT)) as conn, conn:
+            conn.execute("DELETE FROM simulation_sessions WHERE session_id = ?;", (session_id,))
+    return registry.drop(session_id)
+
+
+# A function to report registry size for monitoring
+def registry_stats():
+    """Returns session count, memory use and eviction count."""
+    return registry.stats()
+
+
+if __name__ == "__main__":
+    from concurrent.futures import ThreadPoolExecutor
+
+    print("[TEST] Stepping 1,000 sessions from 8 threads...")
+    ids = [f"session-{i}" for i in range(1000)]
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        for _ in range(5):
+            list(pool.map(step_session, ids))
+    print(registry_stats())
+    print("Evicted after idle timeout:", registry.evict(now=time.time() + IDLE_TIMEOUT + 1))
+    print(registry_stats())
@@ -26,9 +26,13 @@ Functions:
 import statistics
 from datetime import datetime
 import os, sys
-sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+if __name__ == "__main__":
+    sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.db_handler import get_city_data, get_accident_data, get_traffic_totals
+from utils.log_handler import get_logger
 
-from utils.db_handler import get_all_traffic_data, get_city_data, get_accident_data
+logger = get_logger(__name__)
 
 # A function to summarize traffic stats for a specific city
 def summarize_city_traffic(city_name):
@@ -38,7 +42,7 @@ def summarize_city_traffic(city_name):
     # if no data is found, print warning message and return None stating
     # no traffic data for the city
     if not data:
-        print(f"[WARN] No traffic data for {city_name}")
+        logger.warning("No traffic data for %s", city_name)
         return None
     # compute total records, average speed, and average accidents
     total_records = len(data)
@@ -60,7 +64,7 @@ def summarize_accidents(days=7):
     data = get_accident_data(days=days)
     
     if not data:
-        print("[WARN] No accident data available.")
+        logger.warning("No accident data available.")
         return None
     # get the length of data and store in total variable
     total = len(data)
@@ -108,26 +112,22 @@ def compute_trend_over_time(days=30):
 # A function to provide overall summary of traffic data
 def overall_summary():
     """Return overall summary of traffic data."""
-    # get all traffic data from db handler and store in traffic_data variable
-    traffic_data = get_all_traffic_data()
+    # sums are computed in SQL per shard, at the same time, and added up
+    # by get_traffic_totals, so no traffic rows are loaded here
+    totals = get_traffic_totals()
     # if no traffic data found, print warning message and return None
-    if not traffic_data:
-        print("[WARN] No traffic data found.")
+    if not totals["records"]:
+        logger.warning("No traffic data found.")
         return None
 
-    total_records = len(traffic_data)
-    cities = {t["city"] for t in traffic_data if t.get("city")}
-    avg_speed = round(statistics.mean([t.get("avg_speed", 0) for t in traffic_data]), 2)
-    avg_accidents = round(statistics.mean([t.get("accidents", 0) for t in traffic_data]), 2)
-
+    total_records = totals["records"]
     return {
         "total_records": total_records,
-        "unique_cities": len(cities),
-        "average_speed": avg_speed,
-        "average_accidents": avg_accidents
+        "unique_cities": totals["cities"],
+        "average_speed": round(totals["speed_sum"] / total_records, 2),
+        "average_accidents": round(totals["accident_sum"] / total_records, 2)
     }
 
-
 if __name__ == "__main__":
     print("[TEST] Running statistics analysis...")
     print(summarize_city_traffic("San Francisco"))
@@ -0,0 +1,321 @@
+# utils/stream_handler.py
+"""
+stream_handler.py
+------------------------------------
+Push-based streaming of simulation and traffic-light frames over
+Server-Sent Events (SSE).
+
+One FrameBroadcaster per stream (kind + tick rate) runs in a background
+thread: it advances its source once per tick, encodes the frame once, and
+every connected viewer reads the shared result. Viewers first get a
+keyframe (full state) and then deltas with only what changed; a viewer
+that falls behind gets a fresh keyframe instead of a backlog.
+
+Frame encoding (little-endian, sent base64 in the SSE "data" field):
+
+    header   <B I d I B   kind (1 = keyframe, 2 = delta), tick, time,
+                          count, extra (simulation: light code R=0 G=1 Y=2)
+    simulation keyframe   ids uint32[count], position_dm uint32[count], lane uint8[count]
+    simulation delta      ids uint32[count], position change int16[count] (dm), lane uint8[count]
+    lights keyframe/delta ids uint32[count], code uint8[count] (north_south * 3 + east_west)
+
+Classes:
+    - SimulationSource
+    - SignalSource
+    - FrameBroadcaster
+
+Every stream holds a server thread while it is open, so the app caps
+how many are open (throttle_handler) and end_after() closes each one
+after STREAM_MAX_SECONDS; EventSource clients then reconnect by
+themselves, which also spreads them over the workers again.
+
+Functions:
+    - get_broadcaster(kind, rate)
+    - stream_frames(kind, rate, limit)
+    - stream_intersection(rate, limit)
+    - end_after(events, seconds)
+"""
+
+import os, sys
+import base64
+import json
+import struct
+import threading
+import time
+import numpy as np
+if __name__ == "__main__":
+    sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.simulation_clock import SimulationClock, wall_clock
+from utils.simulation_engine import SimulationEngine
+from utils.simulation_handler import next_light_state
+from utils.traffic_light_handler import get_network, get_intersection_state
+
+# -------------------------------------------------------------------
+# STREAM CONFIGURATION
+# -------------------------------------------------------------------
+ALLOWED_RATES = (1, 2, 5, 10, 20)  # ticks per second
+DEFAULT_RATE = 5
+HEARTBEAT_SECONDS = 15            # comment line so proxies keep the stream open
+IDLE_STOP_SECONDS = 30            # stop a broadcaster this long after its last viewer
+STREAM_MAX_SECONDS = float(os.environ.get("STREAM_MAX_SECONDS", 300))  # one stream's lifetime
+RECONNECT_MS = 5000               # EventSource retry delay after a stream ends
+
+# shared corridor that the simulation stream shows
+STREAM_VEHICLES = 300
+STREAM_LANES = 3
+STREAM_ROAD_LENGTH = 3000.0
+
+KEYFRAME, DELTA = 1, 2
+HEADER = struct.Struct("<BIdIB")
+LIGHT_CODE = {"RED": 0, "GREEN": 1, "YELLOW": 2}
+
+
+# A function to format one SSE event
+def _sse(event, data):
+    return f"event: {event}\ndata: {data}\n\n"
+
+
+# A function to pack a header and column arrays into base64
+def _pack(kind, tick, t, extra, columns):
+    count = len(columns[0]) if columns else 0
+    payload = HEADER.pack(kind, tick, t, count, extra) + b"".join(c.tobytes() for c in columns)
+    return base64.b64encode(payload).decode("ascii")
+
+
+class SimulationSource:
+    """Shared corridor simulation on a fixed-timestep clock."""
+
+    def __init__(self, rate, vehicles=STREAM_VEHICLES, lanes=STREAM_LANES, seed=0):
+        self.engine = SimulationEngine(num_vehicles=vehicles, num_lanes=lanes,
+                                       road_length=STREAM_ROAD_LENGTH, seed=seed)
+        self.clock = SimulationClock(dt=1.0 / rate)
+        self.light, self.last_switch = "RED", self.clock.now()
+        self.ids = np.arange(vehicles, dtype=np.uint32)
+        self.prev = None
+
+    def advance(self):
+        """Steps the corridor; returns (keyframe, delta) encoded frames."""
+        now = self.clock.tick()
+        self.light, self.last_switch = next_light_state(self.light, self.last_switch, now)
+        self.engine.step(self.clock.dt, self.light)
+
+        pos = np.round(self.engine.position * 10).astype(np.uint32)
+        lane = self.engine.lane.astype(np.uint8)
+        tick, extra = self.clock.ticks, LIGHT_CODE[self.light]
+        key = _pack(KEYFRAME, tick, now, extra, [self.ids, pos, lane])
+
+        if self.prev is None:
+            delta = key
+        else:
+            prev_pos, prev_lane = self.prev
+            # signed change, wrapped around the ring so it stays small
+            span = int(STREAM_ROAD_LENGTH * 10)
+            change = (pos.astype(np.int64) - prev_pos + span // 2) % span - span // 2
+            changed = np.flatnonzero((change != 0) | (lane != prev_lane))
+            delta = _pack(DELTA, tick, now, extra, [
+                self.ids[changed],
+                np.clip(change[changed], -32768, 32767).astype(np.int16),
+                lane[changed],
+            ])
+        self.prev = (pos, lane)
+        return key, delta
+
+
+class SignalSource:
+    """City signal network states in real time."""
+
+    def __init__(self, rate):
+        self.network = get_network()
+        self.ids = self.network.ids.astype(np.uint32)
+        self.tick = 0
+        self.prev = None
+
+    def advance(self):
+        now = wall_clock.now()
+        ns, ew, _ = self.network.states_at(now)
+        code = (ns * 3 + ew).astype(np.uint8)
+        self.tick += 1
+        key = _pack(KEYFRAME, self.tick, now, 0, [self.ids, code])
+        if self.prev is None:
+            delta = key
+        else:
+            changed = np.flatnonzero(code != self.prev)
+            delta = _pack(DELTA, self.tick, now, 0, [self.ids[changed], code[changed]])
+        self.prev = code
+        return key, delta
+
+
+SOURCES = {"simulation": SimulationSource, "lights": SignalSource}
+
+
+class FrameBroadcaster:
+    """Advances one source at a fixed rate and fans frames out to viewers."""
+
+    def __init__(self, kind, rate):
+        self.kind = kind
+        self.rate = rate
+        self.source = SOURCES[kind](rate)
+        self.seq = 0
+        self.key = None
+        self.delta = None
+        self.viewers = 0
+        self.last_viewer = time.monotonic()
+        self.running = True
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name=f"stream-{kind}-{rate}", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        interval = 1.0 / self.rate
+        next_tick = time.monotonic()
+        while True:
+            key, delta = self.source.advance()
+            with self._cond:
+                self.seq += 1
+                self.key, self.delta = key, delta
+                self._cond.notify_all()
+                idle = self.viewers == 0 and time.monotonic() - self.last_viewer > IDLE_STOP_SECONDS
+                if idle:
+                    self.running = False
+            if idle:
+                _forget(self)
+                return
+            next_tick += interval
+            time.sleep(max(0.0, next_tick - time.monotonic()))
+
+    def subscribe(self, limit=None):
+        """Yields SSE events: one keyframe, then deltas (or a keyframe on lag)."""
+        with self._cond:
+            self.viewers += 1
+        try:
+            sent, last = 0, 0
+            while limit is None or sent < limit:
+                with self._cond:
+                    self._cond.wait_for(lambda: self.seq > last or not self.running,
+                                        timeout=HEARTBEAT_SECONDS)
+                    if not self.running:
+                        return
+                    if self.seq == last:
+                        frame = None
+                    elif last and self.seq == last + 1:
+                        frame = ("delta", self.delta)
+                    else:
+                        frame = ("keyframe", self.key)
+                    last = self.seq
+                if frame is None:
+                    yield ": heartbeat\n\n"
+                    continue
+                yield _sse(*frame)
+                sent += 1
+        finally:
+            with self._cond:
+                self.viewers -= 1
+                self.last_viewer = time.monotonic()
+
+
+# running broadcasters keyed by (kind, rate)
+_broadcasters = {}
+_broadcasters_lock = threading.Lock()
+
+
+def _forget(broadcaster):
+    with _broadcasters_lock:
+        if _broadcasters.get((broadcaster.kind, broadcaster.rate)) is broadcaster:
+            del _broadcasters[(broadcaster.kind, broadcaster.rate)]
+
+
+# A function to get (or start) the broadcaster for a stream
+def get_broadcaster(kind, rate=DEFAULT_RATE):
+    """Returns the running broadcaster for kind/rate, starting it if needed."""
+    if kind not in SOURCES:
+        raise ValueError(f"Unknown stream: {kind}")
+    if rate not in ALLOWED_RATES:
+        raise ValueError(f"rate must be one of {ALLOWED_RATES}")
+    with _broadcasters_lock:
+        broadcaster = _broadcasters.get((kind, rate))
+        if broadcaster is None or not broadcaster.running:
+            broadcaster = _broadcasters[(kind, rate)] = FrameBroadcaster(kind, rate)
+        return broadcaster
+
+
+# A function to stream encoded frames to one viewer
+def stream_frames(kind, rate=DEFAULT_RATE, limit=None):
+    """Returns an SSE event generator for a simulation or lights stream."""
+    broadcaster = get_broadcaster(kind, rate)
+    return broadcaster.subscribe(limit)
+
+
+# A function to stream the demo intersection when its lights change
+def stream_intersection(rate=DEFAULT_RATE, limit=None):
+    """
+    Yields the demo intersection state as JSON, only when it changes.
+    Small enough that each viewer can poll the shared state itself.
+    """
+    if rate not in ALLOWED_RATES:
+        raise ValueError(f"rate must be one of {ALLOWED_RATES}")
+
+    def events():
+        previous, sent, quiet = None, 0, 0.0
+        while limit is None or sent < limit:
+            state = get_intersection_state()
+            current = (state["north_south"], state["east_west"])
+            if current != previous:
+                previous, quiet = current, 0.0
+                yield _sse("state", json.dumps(state))
+                sent += 1
+            elif quiet >= HEARTBEAT_SECONDS:
+                quiet = 0.0
+                yield ": heartbeat\n\n"
+            time.sleep(1.0 / rate)
+            quiet += 1.0 / rate
+
+    return events()
+
+
+# A function to end a stream once it has been open long enough
+def end_after(events, seconds=STREAM_MAX_SECONDS):
+    """
+    Passes SSE events through for about `seconds` (checked after each
+    event; heartbeats come at least every HEARTBEAT_SECONDS), then sends
+    an "end" event and stops. Closing the stream also closes `events`.
+    """
+    deadline = time.monotonic() + seconds
+    try:
+        yield f"retry: {RECONNECT_MS}\n\n"
+        for event in events:
+            yield event
+            if time.monotonic() >= deadline:
+                yield _sse("end", json.dumps({"reason": "max_seconds", "seconds": seconds}))
+                return
+    finally:
+        close = getattr(events, "close", None)
+        if close is not None:
+            close()
+
+
+# A function to decode a frame (used by tests and Python clients)
+def decode_frame(data, kind="simulation"):
+    """Decodes a base64 frame back into header fields and NumPy columns."""
+    raw = base64.b64decode(data)
+    frame_type, tick, t, count, extra = HEADER.unpack_from(raw)
+    offset = HEADER.size
+    if kind == "simulation":
+        second = np.uint32 if frame_type == KEYFRAME else np.int16
+        dtypes = [np.uint32, second, np.uint8]
+    else:
+        dtypes = [np.uint32, np.uint8]
+    columns = []
+    for dtype in dtypes:
+        column = np.frombuffer(raw, dtype=dtype, count=count, offset=offset)
+        offset += column.nbytes
+        columns.append(column)
+    return {"type": frame_type, "tick": tick, "time": t, "extra": extra, "columns": columns}
+
+
+if __name__ == "__main__":
+    print("[TEST] Streaming 5 simulation frames at 10 ticks/s...")
+    for event in stream_frames("simulation", rate=10, limit=5):
+        name, data = event.split("\n")[0][7:], event.split("\n")[1][6:]
+        frame = decode_frame(data)
+        print(f"{name:>8}: tick {frame['tick']}, {len(frame['columns'][0])} vehicles, {len(data)} bytes")
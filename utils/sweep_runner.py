@@ -0,0 +1,181 @@
+# utils/sweep_runner.py
+"""
+sweep_runner.py
+------------------------------------
+Headless parameter sweeps for the traffic simulation.
+
+Builds every combination of signal timings, demand levels and seeds,
+fans the runs out across a process pool (one worker per core by
+default), and collects throughput, delay and queue-length metrics per
+run into a results table.
+
+Each run uses a fixed-timestep SimulationClock, so the same parameters
+and seed always give the same metrics.
+
+Usage:
+    python -m utils.sweep_runner --green 20 30 --red 20 30 --yellow 3 \\
+        --demand 100 200 --seeds 0 1 2 --duration 600 --out sweep.csv
+
+Functions:
+    - build_sweep(timings, demands, seeds)
+    - run_one(config)
+    - run_sweep(configs, workers)
+    - write_results(results, path)
+"""
+
+import os, sys
+import argparse
+import csv
+import itertools
+import time
+from concurrent.futures import ProcessPoolExecutor
+if __name__ == "__main__":
+    sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.simulation_clock import SimulationClock
+from utils.simulation_engine import SimulationEngine
+from utils.simulation_handler import next_light_state, validate_timer, STEP_SECONDS
+
+# -------------------------------------------------------------------
+# SWEEP DEFAULTS
+# -------------------------------------------------------------------
+SWEEP_ROAD_LENGTH = 2000.0  # m
+SWEEP_LANES = 2
+SWEEP_DURATION = 600.0      # simulated seconds per run
+
+RESULT_COLUMNS = [
+    "run", "green", "yellow", "red", "demand", "seed", "duration",
+    "throughput", "throughput_per_hour", "average_delay", "mean_queue", "max_queue",
+    "average_speed", "elapsed_ms",
+]
+
+
+# A function to expand parameter lists into one config per run
+def build_sweep(timings, demands, seeds, duration=SWEEP_DURATION):
+    """
+    Returns the cross product of timings x demands x seeds as run configs.
+
+    Args:
+        timings: Iterable of {"RED": s, "GREEN": s, "YELLOW": s} dicts.
+        demands: Vehicle counts on the sweep corridor.
+        seeds: Random seeds.
+
+    Raises ValueError for a non-positive phase duration, demand or run
+    duration, before any run starts.
+    """
+    timings = [validate_timer(timer) for timer in timings]
+    if any(int(demand) <= 0 for demand in demands):
+        raise ValueError("demand must be at least one vehicle")
+    if not float(duration) > 0:
+        raise ValueError("duration must be a positive number of seconds")
+    configs = []
+    for i, (timer, demand, seed) in enumerate(itertools.product(timings, demands, seeds)):
+        configs.append({"run": i, "timer": timer, "demand": int(demand),
+                        "seed": int(seed), "duration": float(duration)})
+    return configs
+
+
+# A function to run one simulation and measure it
+def run_one(config):
+    """Runs a single sweep configuration and returns its metrics row."""
+    start = time.perf_counter()
+    # build_sweep already validated it; checking once here covers hand-made configs
+    timer = validate_timer(config["timer"])
+    engine = SimulationEngine(num_vehicles=config["demand"], num_lanes=SWEEP_LANES,
+                              road_length=SWEEP_ROAD_LENGTH, seed=config["seed"])
+    clock = SimulationClock(dt=STEP_SECONDS)
+    light, last_switch = "RED", clock.now()
+
+    steps = int(config["duration"] / clock.dt)
+    queue_total, queue_max = 0, 0
+    for _ in range(steps):
+        light, last_switch = next_light_state(light, last_switch, clock.tick(), timer, checked=True)
+        engine.step(clock.dt, light)
+        queue = engine.queue_length()
+        queue_total += queue
+        queue_max = max(queue_max, queue)
+
+    duration = steps * clock.dt
+    return {
+        "run": config["run"],
+        "green": timer["GREEN"],
+        "yellow": timer["YELLOW"],
+        "red": timer["RED"],
+        "demand": config["demand"],
+        "seed": config["seed"],
+        "duration": duration,
+        "throughput": engine.throughput,
+        "throughput_per_hour": round(engine.throughput * 3600 / duration, 1) if duration else 0.0,
+        "average_delay": round(engine.total_delay / max(engine.count, 1), 2),
+        "mean_queue": round(queue_total / max(steps, 1), 2),
+        "max_queue": queue_max,
+        "average_speed": round(float(engine.velocity.mean()), 2) if engine.count else 0.0,
+        "elapsed_ms": round((time.perf_counter() - start) * 1000, 1),
+    }
+
+
+# A function to run every configuration across a process pool
+def run_sweep(configs, workers=None):
+    """
+    Runs configs in parallel and returns result rows in run order.
+    workers=1 runs in-process (useful for profiling and as a baseline).
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        return [run_one(c) for c in configs]
+
+    # a few runs per task keeps pickling overhead low without starving workers
+    chunksize = max(1, len(configs) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(run_one, configs, chunksize=chunksize))
+    return sorted(results, key=lambda row: row["run"])
+
+
+# A function to save the results table as CSV
+def write_results(results, path):
+    """Writes result rows to a CSV file."""
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=RESULT_COLUMNS)
+        writer.writeheader()
+        writer.writerows(results)
+    print(f"[INFO] Wrote {len(results)} sweep results to {path}.")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a parallel simulation parameter sweep.")
+    parser.add_argument("--green", type=float, nargs="+", default=[6.0])
+    parser.add_argument("--red", type=float, nargs="+", default=[5.0])
+    parser.add_argument("--yellow", type=float, nargs="+", default=[2.0])
+    parser.add_argument("--demand", type=int, nargs="+", default=[100], help="vehicles on the corridor")
+    parser.add_argument("--seeds", type=int, nargs="+", default=[0])
+    parser.add_argument("--duration", type=float, default=SWEEP_DURATION, help="simulated seconds per run")
+    parser.add_argument("--workers", type=int, default=None, help="default: one per CPU core")
+    parser.add_argument("--out", default=None, help="CSV file for the results table")
+    args = parser.parse_args(argv)
+
+    timings = [{"GREEN": g, "RED": r, "YELLOW": y}
+               for g, r, y in itertools.product(args.green, args.red, args.yellow)]
+    try:
+        configs = build_sweep(timings, args.demand, args.seeds, args.duration)
+    except ValueError as e:
+        parser.error(str(e))
+    workers = args.workers or os.cpu_count() or 1
+
+    print(f"[INFO] Running {len(configs)} simulations on {workers} workers...")
+    start = time.perf_counter()
+    results = run_sweep(configs, workers)
+    elapsed = time.perf_counter() - start
+
+    print(f"{'green':>6} {'red':>5} {'demand':>6} {'seed':>4} {'thru/h':>8} {'delay':>8} {'queue':>6}")
+    for row in results:
+        print(f"{row['green']:>6} {row['red']:>5} {row['demand']:>6} {row['seed']:>4} "
+              f"{row['throughput_per_hour']:>8} {row['average_delay']:>8} {row['mean_queue']:>6}")
+    print(f"[INFO] {len(results)} runs in {elapsed:.2f}s ({len(results) / elapsed:.1f} runs/s).")
+
+    if args.out:
+        write_results(results, args.out)
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,349 @@
+# utils/synthetic_generator.py
+"""
+synthetic_generator.py
+------------------------------------
+Seeded, vectorized generator of realistic traffic and accident history,
+for reproducing production-scale load locally.
+
+One traffic_data row per city per interval (default 5 minutes):
+    - congestion follows a daily curve with morning and evening rush
+      hours on weekdays and a softer midday hump at weekends, scaled per
+      city (bigger cities are busier) plus noise
+    - traffic_level is binned from congestion; avg_speed falls with it
+    - accidents are Poisson, more likely in heavy traffic, and come in
+      bursts: a burst (pile-up, storm) multiplies the rate for a random
+      stretch of intervals
+and one accident_data row per accident, with a type and a fatality
+drawn from per-type rates (higher at speed).
+
+Every day is generated from its own generator, seeded by (seed, day),
+with NumPy operations over all cities and intervals at once, so any day
+can be regenerated on its own. Bursts that run across midnight are drawn
+separately for each midnight, from a generator seeded by (seed, midnight),
+and both days on either side apply the same ones; a burst that starts
+during a day ends by midnight. Output goes straight to the database
+(each city's rows to its shard) or to CSV / Parquet files, a chunk at a
+time, so memory stays flat however many rows are made.
+
+Usage:
+    python -m utils.synthetic_generator --rows 50000000 --cities 500 --out synthetic/ --format parquet
+    python -m utils.synthetic_generator --days 30 --cities 20 --db database.db --seed 7
+    python -m utils.synthetic_generator --days 30 --cities 200 --db database.db --shards 8
+
+Functions:
+    - pick_cities(count)
+    - generate_day(day, cities, start, interval_minutes, seed)
+    - generate(days, cities, start, interval_minutes, seed)
+    - write_to_db(chunks, path)
+    - write_to_files(chunks, out_dir, fmt)
+"""
+
+import os, sys
+import csv
+import sqlite3
+import time
+from contextlib import closing
+from datetime import date, datetime, timedelta
+import numpy as np
+if __name__ == "__main__":
+    sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils import db_handler, shard_handler
+from utils.log_handler import get_logger
+
+logger = get_logger(__name__)
+
+# -------------------------------------------------------------------
+# GENERATOR SETTINGS
+# -------------------------------------------------------------------
+DEFAULT_CITIES = ["San Francisco", "Los Angeles", "New York", "Chicago", "Seattle"]
+TRAFFIC_LEVELS = np.array(["Low", "Moderate", "High", "Severe"])
+LEVEL_BOUNDS = [0.3, 0.55, 0.8]                # congestion index cut points between levels
+
+ACCIDENT_TYPES = np.array(["Rear-end", "Side-impact", "Head-on", "Rollover"])
+TYPE_SHARES = [0.55, 0.3, 0.1, 0.05]
+FATALITY_RATES = np.array([0.002, 0.01, 0.05, 0.03])   # per accident, at 30 mph; doubles by ~65 mph
+
+ACCIDENTS_PER_DAY = 6.0            # per city of median size, outside bursts
+BURST_START_PER_DAY = 0.3          # chance per city per day that a burst starts
+BURST_MEAN_INTERVALS = 6           # mean burst length (geometric)
+BURST_MULTIPLIER = 6.0             # accident rate inside a burst
+NIGHT_CONGESTION = 0.1             # typical congestion index around midnight
+BURST_STREAM = 1                   # seed suffix of the midnight burst generators
+
+CHUNK_ROWS = 1_000_000             # rows buffered before each write
+
+TRAFFIC_COLUMNS = ["city", "traffic_level", "accidents", "avg_speed", "accident_type", "timestamp"]
+ACCIDENT_COLUMNS = ["city", "date", "fatal", "type", "description"]
+
+
+# A function to pick cities and their relative size
+def pick_cities(count=len(DEFAULT_CITIES)):
+    """
+    Returns (names, scale): the `count` most populous gazetteer cities
+    (the five mock-data cities when count <= 5) and a size factor of
+    about 0.5 (small) .. 1.5 (largest).
+    """
+    if count <= len(DEFAULT_CITIES):
+        names = DEFAULT_CITIES[:count]
+        population = np.linspace(8e6, 7e5, len(DEFAULT_CITIES))[:count]
+    else:
+        from utils.gazetteer_handler import load_gazetteer
+        seen, names, population = set(), [], []
+        for record in sorted(load_gazetteer()["records"], key=lambda r: -r["population"]):
+            if record["name"] not in seen:
+                seen.add(record["name"])
+                names.append(record["name"])
+                population.append(record["population"])
+            if len(names) == count:
+                break
+        population = np.array(population, dtype=float)
+    logp = np.log(population)
+    spread = max(logp.max() - logp.min(), 1e-9)
+    return list(names), 0.5 + (logp - logp.min()) / spread
+
+
+# A function to build the congestion curve of one day (intervals,)
+def _daily_curve(hours, weekday):
+    if weekday < 5:
+        rush = 0.55 * np.exp(-((hours - 8.0) / 1.2) ** 2) + 0.65 * np.exp(-((hours - 17.5) / 1.6) ** 2)
+        midday = 0.25 * np.exp(-((hours - 13.0) / 3.0) ** 2)
+    else:
+        rush = np.zeros_like(hours)
+        midday = 0.45 * np.exp(-((hours - 14.0) / 3.5) ** 2)
+    night = 0.08 + 0.04 * np.cos((hours - 3.0) / 24 * 2 * np.pi + np.pi)
+    return night + rush + midday
+
+
+# A function to draw the bursts running across one midnight
+def _midnight_bursts(boundary, n_cities, steps, seed=0):
+    """
+    Returns (before, after): per city, the intervals a burst covers just
+    before and just after the midnight that starts day `boundary` (0 for
+    none). Seeded by (seed, boundary) alone, so the days on both sides
+    draw the same bursts without generating each other.
+    """
+    rng = np.random.default_rng([seed, boundary, BURST_STREAM])
+    # a burst is running at midnight about as often as its start rate x mean length
+    chance = min(1.0, BURST_START_PER_DAY / steps * (0.5 + NIGHT_CONGESTION) * BURST_MEAN_INTERVALS)
+    crossing = rng.random(n_cities) < chance
+    before = np.minimum(rng.geometric(1 / BURST_MEAN_INTERVALS, n_cities), steps)
+    after = np.minimum(rng.geometric(1 / BURST_MEAN_INTERVALS, n_cities), steps)
+    return np.where(crossing, before, 0), np.where(crossing, after, 0)
+
+
+# A function to generate one day for every city
+def generate_day(day, cities, start, interval_minutes=5, seed=0):
+    """
+    Returns (traffic, accidents) as dicts of NumPy column arrays for day
+    number `day` after `start`. The result depends only on the arguments,
+    not on the days generated before it.
+    """
+    names, scale = cities
+    rng = np.random.default_rng([seed, day])
+    n_cities = len(names)
+    steps = 24 * 60 // interval_minutes
+    current = start + timedelta(days=day)
+    hours = np.arange(steps) * interval_minutes / 60.0
+
+    # congestion index: city size x daily curve x day-to-day mood, plus noise
+    mood = rng.normal(1.0, 0.08, size=(n_cities, 1))
+    congestion = scale[:, None] * _daily_curve(hours, current.weekday())[None, :] * mood
+    congestion = np.clip(congestion + rng.normal(0, 0.05, size=(n_cities, steps)), 0.0, 1.0)
+
+    level = np.searchsorted(LEVEL_BOUNDS, congestion)
+    free_flow = rng.uniform(45, 70, size=(n_cities, 1))
+    speed = np.clip(free_flow * (1 - 0.75 * congestion) + rng.normal(0, 3, size=(n_cities, steps)), 5, 75)
+
+    # bursts: start times plus geometric lengths; a running max of the end
+    # index tells every later interval whether a burst still covers it.
+    # Bursts over this day's two midnights come from their own generators
+    starts = rng.random((n_cities, steps)) < BURST_START_PER_DAY / steps * (0.5 + congestion)
+    ends = np.where(starts, np.arange(steps)[None, :] + rng.geometric(1 / BURST_MEAN_INTERVALS, (n_cities, steps)), -1)
+    _, carried_in = _midnight_bursts(day, n_cities, steps, seed)
+    carried_out, _ = _midnight_bursts(day + 1, n_cities, steps, seed)
+    ends = np.maximum(np.maximum.accumulate(ends, axis=1), carried_in[:, None])
+    in_burst = ((np.arange(steps)[None, :] < ends) |
+                (np.arange(steps)[None, :] >= steps - carried_out[:, None]))
+
+    rate = ACCIDENTS_PER_DAY / steps * scale[:, None] * (0.3 + 1.4 * congestion)
+    accidents = rng.poisson(rate * np.where(in_burst, BURST_MULTIPLIER, 1.0))
+    main_type = rng.choice(len(ACCIDENT_TYPES), size=(n_cities, steps), p=TYPE_SHARES)
+
+    stamps = np.array([(current + timedelta(minutes=int(m))).strftime("%Y-%m-%d %H:%M:%S")
+                       for m in np.arange(steps) * interval_minutes])
+    city_names = np.array(names)
+    traffic = {
+        "city": np.repeat(city_names, steps),
+        "traffic_level": TRAFFIC_LEVELS[level].ravel(),
+        "accidents": accidents.ravel(),
+        "avg_speed": speed.round().astype(np.int64).ravel(),
+        "accident_type": np.where(accidents > 0, ACCIDENT_TYPES[main_type], None).ravel(),
+        "timestamp": np.tile(stamps, n_cities),
+    }
+
+    # one accident_data row per accident
+    flat = accidents.ravel()
+    cells = np.repeat(np.arange(flat.size), flat)
+    kinds = rng.choice(len(ACCIDENT_TYPES), size=cells.size, p=TYPE_SHARES)
+    fatal = rng.random(cells.size) < FATALITY_RATES[kinds] * speed.ravel()[cells] / 30.0
+    accident_rows = {
+        "city": np.repeat(city_names, steps)[cells],
+        "date": np.full(cells.size, current.strftime("%Y-%m-%d")),
+        "fatal": fatal.astype(np.int64),
+        "type": ACCIDENT_TYPES[kinds],
+        "description": np.where(in_burst.ravel()[cells], "Multi-vehicle incident during burst",
+                                "Single incident"),
+    }
+    return traffic, accident_rows
+
+
+# A function to generate many days, buffered into chunks of about CHUNK_ROWS
+def generate(days, cities, start=None, interval_minutes=5, seed=0, chunk_rows=CHUNK_ROWS):
+    """Yields (traffic, accidents) column dicts, each about chunk_rows traffic rows."""
+    start = start or date.today() - timedelta(days=days)
+    start = datetime(start.year, start.month, start.day)
+    buffered = []
+    for day in range(days):
+        buffered.append(generate_day(day, cities, start, interval_minutes, seed))
+        if sum(len(t["city"]) for t, _ in buffered) >= chunk_rows or day == days - 1:
+            yield ({k: np.concatenate([t[k] for t, _ in buffered]) for k in TRAFFIC_COLUMNS},
+                   {k: np.concatenate([a[k] for _, a in buffered]) for k in ACCIDENT_COLUMNS})
+            buffered = []
+
+
+def _rows(columns, names):
+    # NumPy scalars -> Python values for sqlite3 / csv
+    return zip(*(columns[name].tolist() for name in names))
+
+
+# A function to insert generated chunks into the database
+def write_to_db(chunks, path=None, progress=None):
+    """
+    Inserts every chunk, split by city shard (shard_handler), with one
+    transaction per shard and chunk; returns (traffic rows, accident rows).
+    """
+    if path:
+        db_handler.DB_PATH = path
+    db_handler.ensure_db()
+    paths = db_handler.data_paths()
+    totals = [0, 0]
+    conns = {target: sqlite3.connect(target) for target in paths}
+    try:
+        for conn in conns.values():
+            conn.execute(f"PRAGMA cache_size = -{262144 // len(paths)};")
+        for traffic, accidents in chunks:
+            traffic_parts = shard_handler.partition_columns(traffic, db_handler.DB_PATH, db_handler.DB_SHARDS)
+            accident_parts = shard_handler.partition_columns(accidents, db_handler.DB_PATH, db_handler.DB_SHARDS)
+            for target, conn in conns.items():
+                with conn:
+                    if target in traffic_parts:
+                        conn.executemany(f"INSERT INTO traffic_data ({', '.join(TRAFFIC_COLUMNS)}) "
+                                         f"VALUES (?, ?, ?, ?, ?, ?);", _rows(traffic_parts[target], TRAFFIC_COLUMNS))
+                    if target in accident_parts:
+                        conn.executemany(f"INSERT INTO accident_data ({', '.join(ACCIDENT_COLUMNS)}) "
+                                         f"VALUES (?, ?, ?, ?, ?);", _rows(accident_parts[target], ACCIDENT_COLUMNS))
+            totals[0] += len(traffic["city"])
+            totals[1] += len(accidents["city"])
+            if progress:
+                progress(*totals)
+    finally:
+        for conn in conns.values():
+            conn.close()
+    return tuple(totals)
+
+
+# A function to write generated chunks as CSV or Parquet files
+def write_to_files(chunks, out_dir, fmt="csv", progress=None):
+    """
+    Writes traffic_data.<fmt> and accident_data.<fmt> in out_dir (CSV
+    appended per chunk; Parquet one row group per chunk, needs pyarrow).
+    Returns (traffic rows, accident rows).
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    paths = {table: os.path.join(out_dir, f"{table}.{fmt}") for table in ("traffic_data", "accident_data")}
+    columns = {"traffic_data": TRAFFIC_COLUMNS, "accident_data": ACCIDENT_COLUMNS}
+    totals = [0, 0]
+    if fmt == "parquet":
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise SystemExit("[ERROR] Parquet output needs pyarrow (pip install pyarrow).")
+        writers = {}
+        try:
+            for chunk in chunks:
+                for table, data in zip(paths, chunk):
+                    batch = pa.table({name: pa.array(data[name].tolist() if data[name].dtype == object else data[name])
+                                      for name in columns[table]})
+                    if table not in writers:
+                        writers[table] = pq.ParquetWriter(paths[table], batch.schema)
+                    writers[table].write_table(batch.cast(writers[table].schema))
+                totals[0] += len(chunk[0]["city"])
+                totals[1] += len(chunk[1]["city"])
+                if progress:
+                    progress(*totals)
+        finally:
+            for writer in writers.values():
+                writer.close()
+        return tuple(totals)
+
+    files = {table: open(path, "w", newline="") for table, path in paths.items()}
+    try:
+        writers = {table: csv.writer(f) for table, f in files.items()}
+        for table, writer in writers.items():
+            writer.writerow(columns[table])
+        for chunk in chunks:
+            for table, data in zip(paths, chunk):
+                writers[table].writerows(_rows(data, columns[table]))
+            totals[0] += len(chunk[0]["city"])
+            totals[1] += len(chunk[1]["city"])
+            if progress:
+                progress(*totals)
+    finally:
+        for f in files.values():
+            f.close()
+    return tuple(totals)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Generate synthetic traffic and accident history.")
+    parser.add_argument("--cities", type=int, default=len(DEFAULT_CITIES), help="most populous N cities")
+    parser.add_argument("--days", type=int, help="days of history (default: enough for --rows)")
+    parser.add_argument("--rows", type=int, default=1_000_000, help="approximate traffic rows when --days is not set")
+    parser.add_argument("--interval", type=int, default=5, help="minutes between readings")
+    parser.add_argument("--start", help="first day, YYYY-MM-DD (default: --days before today)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--db", help="insert into this database")
+    parser.add_argument("--shards", type=int, default=int(os.environ.get("DB_SHARDS", db_handler.DB_SHARDS)),
+                        help="shard files next to --db (as served with DB_SHARDS)")
+    parser.add_argument("--out", help="write files to this directory instead")
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv")
+    args = parser.parse_args()
+
+    if 24 * 60 % args.interval:
+        raise SystemExit("[ERROR] --interval must divide a day (e.g. 1, 5, 15, 60).")
+    if not args.db and not args.out:
+        raise SystemExit("[ERROR] Pass --db PATH or --out DIR.")
+    cities = pick_cities(args.cities)
+    per_day = len(cities[0]) * (24 * 60 // args.interval)
+    days = args.days or max(1, -(-args.rows // per_day))
+    start = datetime.strptime(args.start, "%Y-%m-%d").date() if args.start else None
+    began = time.perf_counter()
+
+    def report(traffic_rows, accident_rows):
+        elapsed = time.perf_counter() - began
+        print(f"[INFO] {traffic_rows:,} traffic rows, {accident_rows:,} accident rows, "
+              f"{traffic_rows / elapsed:,.0f} rows/s", file=sys.stderr)
+
+    chunks = generate(days, cities, start, args.interval, args.seed)
+    if args.out:
+        totals = write_to_files(chunks, args.out, args.format, report)
+    else:
+        db_handler.DB_SHARDS = args.shards
+        totals = write_to_db(chunks, args.db, report)
+    elapsed = time.perf_counter() - began
+    print(f"Generated {totals[0]:,} traffic rows and {totals[1]:,} accident rows for {len(cities[0])} cities "
+          f"over {days} days in {elapsed:.1f} s ({totals[0] / elapsed * 60 / 1e6:.1f}M rows/min).")
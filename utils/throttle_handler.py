@@ -0,0 +1,260 @@
+# utils/throttle_handler.py
+"""
+throttle_handler.py
+------------------------------------
+Keeps the expensive endpoints (/api/alerts, /api/stats/overall,
+/api/map_data, ...) fast during bursts, e.g. when every dashboard
+refreshes at the same moment.
+
+Four tools, cheapest first:
+    - SingleFlight: concurrent calls with the same key share one
+      computation; the first caller runs it, the rest wait for its result
+    - RateLimiter: a token bucket per client (user or IP address);
+      a client over its rate gets 429 with Retry-After
+    - ConcurrencyLimiter: at most `limit` expensive requests run at once;
+      the next one gets 503 straight away instead of queueing
+    - stream slots: each open SSE stream holds a server thread for its
+      whole life, so at most `max_streams` are open at once per process
+
+All of them keep their state in process memory, so every limit applies
+per worker process: behind N workers a client can make up to N times
+RATE_LIMIT requests per second, spread over the workers, and each
+worker sheds load on its own. Size RATE_LIMIT and MAX_CONCURRENT per
+worker.
+
+Clients are told apart by username or IP address. Behind a reverse
+proxy the socket address is the proxy's, so set PROXY_HOPS to the
+number of proxies in front of the app; the client address is then taken
+from that many entries back in X-Forwarded-For (see forwarded_client).
+Leave it at 0 when clients connect directly: the header is then ignored,
+since anyone can send it.
+
+Classes:
+    - SingleFlight
+    - RateLimiter
+    - ConcurrencyLimiter
+
+Functions:
+    - coalesce(key, func, *args)
+    - forwarded_client(remote, forwarded_for, hops)
+    - instrument_throttling(app, client_id)
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# -------------------------------------------------------------------
+# THROTTLE SETTINGS
+# -------------------------------------------------------------------
+RATE_LIMIT = float(os.environ.get("RATE_LIMIT", 10))        # requests per second per client, per process
+RATE_BURST = int(os.environ.get("RATE_BURST", 20))          # bucket size
+MAX_CONCURRENT = int(os.environ.get("MAX_CONCURRENT", 16))  # expensive requests in flight per process
+MAX_STREAMS = int(os.environ.get("MAX_STREAMS", 2))         # SSE streams open at once per process
+MAX_CLIENTS = 10_000                                        # buckets kept before the idlest go
+PROXY_HOPS = int(os.environ.get("PROXY_HOPS", 0))           # trusted reverse proxies in front of the app
+
+# URL rules guarded by the concurrency cap (and rate limited)
+EXPENSIVE_ROUTES = {"/api/alerts", "/api/stats/overall", "/api/stats/city/<city>",
+                    "/api/map_data", "/api/heatmap"}
+# URL rules that are never limited, so probes and scrapes always answer
+EXEMPT_ROUTES = {"/api/health", "/api/health/live", "/api/health/ready", "/api/metrics"}
+# URL rules that answer with an SSE stream (the second only with ?stream=1)
+STREAM_ROUTES = {"/api/stream/<kind>"}
+STREAM_QUERY_ROUTES = {"/api/recordings/<name>"}
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Runs one computation per key at a time and shares its result."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, func, *args):
+        """Returns func(*args); callers arriving while it runs get the same result."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func(*args)
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            # later callers start a fresh computation (results are not cached)
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+
+class RateLimiter:
+    """Token bucket per client: `rate` tokens per second, up to `burst`."""
+
+    def __init__(self, rate=RATE_LIMIT, burst=RATE_BURST, max_clients=MAX_CLIENTS):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()   # client -> (tokens, last refill)
+
+    def allow(self, client):
+        """Takes one token; returns (allowed, seconds until the next token)."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._buckets.pop(client, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[client] = (tokens, now)
+            if len(self._buckets) > self.max_clients:
+                # least recently seen client; a full bucket again by now
+                self._buckets.popitem(last=False)
+        return allowed, 0.0 if allowed else (1 - tokens) / self.rate
+
+
+class ConcurrencyLimiter:
+    """Non-blocking cap on requests in flight."""
+
+    def __init__(self, limit=MAX_CONCURRENT):
+        self.limit = limit
+        self._slots = threading.BoundedSemaphore(limit)
+
+    def try_acquire(self):
+        return self._slots.acquire(blocking=False)
+
+    def release(self):
+        self._slots.release()
+
+
+# shared by every request in this process
+single_flight = SingleFlight()
+
+
+# A function to run a computation once for all concurrent identical requests
+def coalesce(key, func, *args):
+    """Shorthand for single_flight.do(key, func, *args)."""
+    return single_flight.do(key, func, *args)
+
+
+# A function to find the client address behind a known number of proxies
+def forwarded_client(remote, forwarded_for, hops=PROXY_HOPS):
+    """
+    Returns the address `hops` entries from the right of X-Forwarded-For
+    (each trusted proxy appends the address it saw), the same one
+    werkzeug's ProxyFix(x_for=hops) picks. With hops 0, or a header
+    shorter than that, returns `remote`.
+    """
+    if hops > 0 and forwarded_for:
+        values = [value.strip() for value in forwarded_for.split(",")]
+        if len(values) >= hops:
+            return values[-hops]
+    return remote
+
+
+# A function to add rate limiting and load shedding to a Flask app
+def instrument_throttling(app, client_id, rate=RATE_LIMIT, burst=RATE_BURST, max_concurrent=MAX_CONCURRENT,
+                          max_streams=MAX_STREAMS):
+    """
+    Rate limits every /api/ route except EXEMPT_ROUTES per client_id()
+    (429), sheds EXPENSIVE_ROUTES beyond `max_concurrent` (503), and
+    refuses a stream beyond `max_streams` open ones (503). A stream's slot
+    is held until the server closes its response.
+    A rate of 0 or a cap of 0 turns that check off.
+    """
+    from flask import g, jsonify, request
+
+    limiter = RateLimiter(rate, burst) if rate > 0 else None
+    slots = ConcurrencyLimiter(max_concurrent) if max_concurrent > 0 else None
+    streams = ConcurrencyLimiter(max_streams) if max_streams > 0 else None
+
+    @app.before_request
+    def _throttle():
+        rule = request.url_rule.rule if request.url_rule is not None else None
+        if rule is None or not rule.startswith("/api/") or rule in EXEMPT_ROUTES:
+            return None
+        if limiter is not None:
+            allowed, wait = limiter.allow(client_id())
+            if not allowed:
+                response = jsonify({"success": False, "error": 429,
+                                    "message": "Too many requests. Please slow down."})
+                response.status_code = 429
+                response.headers["Retry-After"] = str(max(1, round(wait)))
+                return response
+        if slots is not None and rule in EXPENSIVE_ROUTES:
+            if not slots.try_acquire():
+                response = jsonify({"success": False, "error": 503,
+                                    "message": "Server is busy. Please retry shortly."})
+                response.status_code = 503
+                response.headers["Retry-After"] = "1"
+                return response
+            g.throttle_slot = True
+        if streams is not None and (rule in STREAM_ROUTES or
+                                    (rule in STREAM_QUERY_ROUTES and request.args.get("stream"))):
+            if not streams.try_acquire():
+                response = jsonify({"success": False, "error": 503,
+                                    "message": "Too many open streams. Please retry shortly."})
+                response.status_code = 503
+                response.headers["Retry-After"] = "5"
+                return response
+            g.stream_slot = True
+        return None
+
+    @app.after_request
+    def _hold_stream_slot(response):
+        if g.pop("stream_slot", False):
+            if response.mimetype == "text/event-stream":
+                # the body is sent after this request ends; free the slot when it closes
+                response.call_on_close(streams.release)
+            else:
+                streams.release()
+        return response
+
+    @app.teardown_request
+    def _release_slot(exc):
+        if g.pop("throttle_slot", False):
+            slots.release()
+        if g.pop("stream_slot", False):
+            streams.release()
+
+    return app
+
+
+if __name__ == "__main__":
+    from concurrent.futures import ThreadPoolExecutor
+
+    calls = []
+
+    def slow_summary():
+        calls.append(1)
+        time.sleep(0.2)
+        return {"total": 42}
+
+    print("[TEST] 50 concurrent identical requests through coalesce()...")
+    with ThreadPoolExecutor(50) as pool:
+        results = list(pool.map(lambda _: coalesce("overall", slow_summary), range(50)))
+    print(f"  computations: {len(calls)}, results shared: {results.count({'total': 42})}")
+
+    limiter = RateLimiter(rate=5, burst=10)
+    allowed = sum(limiter.allow("10.0.0.1")[0] for _ in range(100))
+    print(f"[TEST] token bucket (rate 5/s, burst 10): {allowed} of 100 back-to-back requests allowed")
@@ -6,14 +6,36 @@ Simulates an intersection traffic light system.
 Controls lights for north-south and east-west lanes,
 so cars stop or go accordingly.
 
+Time is read from an injectable clock (real time by default), so the
+same cycle can be driven by a fixed-timestep SimulationClock.
+
+For a whole city grid, SignalNetwork stores phase timing plans and
+offsets for thousands of intersections in NumPy arrays and computes every
+intersection's state at a given time in one vectorized step. Offsets can
+be coordinated into a green wave along either direction.
+
 Functions:
-    - get_intersection_state()
-    - update_lights()
-    - get_light_color(direction)
+    - get_intersection_state(clock)
+    - update_lights(clock)
+    - get_light_color(direction, clock)
     - run_intersection_cycle()
+    - build_grid_network(rows, cols, spacing, center)
+    - get_network()
+    - get_network_state(ids, bounds, clock)
 """
 
+import os, sys
+import threading
 import time
+import numpy as np
+if __name__ == "__main__":
+    sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.simulation_clock import wall_clock
+from utils.adaptive_signal_handler import AdaptiveSignalController
+from utils.log_handler import get_logger
+
+logger = get_logger(__name__)
 
 
 lights = {
@@ -31,19 +53,37 @@ light_durations = {
 # Track when the light last changed
 last_switch_time = time.time()
 
+# stream threads, request threads and the ASGI pool all advance the lights
+_lights_lock = threading.Lock()
+
 
-def update_lights():
+def update_lights(clock=None):
     """
     Automatically updates both light directions based on timing.
     The two lights always have opposite states.
+    Catches up through every phase that elapsed since the last update.
     """
-    global lights, last_switch_time
-    now = time.time()
+    now = (clock or wall_clock).now()
+    with _lights_lock:
+        _advance_lights(now)
+
+
+# A function to switch the lights through every elapsed phase (caller holds _lights_lock)
+def _advance_lights(now):
+    global last_switch_time
     elapsed = now - last_switch_time
 
-    current_main = lights["north_south"]
+    # a full NS cycle is GREEN -> YELLOW -> RED; skip whole cycles at once
+    cycle = sum(light_durations.values())
+    if elapsed >= cycle:
+        last_switch_time += (elapsed // cycle) * cycle
+
+    changed = False
+    while now - last_switch_time >= light_durations[lights["north_south"]]:
+        current_main = lights["north_south"]
+        last_switch_time += light_durations[current_main]
+        changed = True
 
-    if elapsed >= light_durations[current_main]:
         # Change north-south → next color
         if current_main == "GREEN":
             lights["north_south"] = "YELLOW"
@@ -55,20 +95,22 @@ def update_lights():
             lights["north_south"] = "GREEN"
             lights["east_west"] = "RED"
 
-        last_switch_time = now
-        print(f"🚦 Lights updated: NS={lights['north_south']}, EW={lights['east_west']}")
+    if changed:
+        logger.debug("Lights updated: NS=%s, EW=%s", lights["north_south"], lights["east_west"])
 
 
 
-def get_light_color(direction):
+def get_light_color(direction, clock=None):
     """
     Returns current color for a given direction (north_south or east_west).
     """
-    update_lights()
-    return lights.get(direction, "RED")
+    now = (clock or wall_clock).now()
+    with _lights_lock:
+        _advance_lights(now)
+        return lights.get(direction, "RED")
 
 
-def get_intersection_state():
+def get_intersection_state(clock=None):
     """
     Returns full intersection light state.
     Example:
@@ -78,15 +120,286 @@ def get_intersection_state():
         "timestamp": 1705273200.0
     }
     """
-    update_lights()
+    now = (clock or wall_clock).now()
+    with _lights_lock:
+        _advance_lights(now)
+        return {
+            "north_south": lights["north_south"],
+            "east_west": lights["east_west"],
+            "timestamp": now
+        }
+
+
+
+# -------------------------------------------------------------------
+# SIGNAL NETWORK
+# -------------------------------------------------------------------
+# color codes used by the network arrays
+RED, GREEN, YELLOW = 0, 1, 2
+COLOR_NAMES = ("RED", "GREEN", "YELLOW")
+COLOR_LETTERS = np.array(list("RGY"))
+
+METERS_PER_DEGREE = 111_320.0
+
+# default city grid: 40 x 50 intersections, 200 m apart, around San Francisco
+DEFAULT_GRID = {"rows": 40, "cols": 50, "spacing": 200.0, "center": (37.7749, -122.4194)}
+GREEN_WAVE_SPEED = 13.4  # m/s (about 30 mph)
+
+
+class SignalNetwork:
+    """
+    Timing plans and offsets for many intersections, stored as arrays.
+
+    Each intersection runs the cycle
+        NS GREEN -> NS YELLOW -> EW GREEN -> EW YELLOW
+    shifted by its offset. Timing comes from a plan table, so many
+    intersections can share one plan and a plan change is one array write.
+
+    A plan changed while the network runs (set_plan(..., at=now)) never
+    cuts a phase short: each intersection finishes its current cycle on
+    the old timing, holds NS green until its first cycle start on the new
+    timing, and only then follows the new plan.
+
+    Args:
+        lat, lon: Intersection coordinates.
+        plan_ids: Index into the plan table for each intersection.
+        plans: Sequence of (green_ns, green_ew, yellow) tuples in seconds.
+        offsets: Cycle offset per intersection in seconds.
+    """
+
+    def __init__(self, lat, lon, plan_ids=None, plans=((20.0, 20.0, 3.0),), offsets=None):
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.lon = np.asarray(lon, dtype=np.float64)
+        count = len(self.lat)
+        self.ids = np.arange(count, dtype=np.int32)
+        self.plan_ids = np.zeros(count, dtype=np.int16) if plan_ids is None else np.asarray(plan_ids, dtype=np.int16)
+        plans = np.asarray(plans, dtype=np.float64).reshape(-1, 3)
+        self.green_ns = plans[:, 0].copy()
+        self.green_ew = plans[:, 1].copy()
+        self.yellow = plans[:, 2].copy()
+        self.offsets = np.zeros(count) if offsets is None else np.asarray(offsets, dtype=np.float64)
+        self.wave = None   # (direction, speed) of the coordinated green wave
+        # plan changes in progress: old timing until hold_from, NS green
+        # until new_from, then the current plan and offset
+        self.hold_from = np.full(count, -np.inf)
+        self.new_from = np.full(count, -np.inf)
+        self.prev_timing = np.zeros((3, count))
+        self.prev_offsets = self.offsets.copy()
+
+    @property
+    def count(self):
+        return len(self.ids)
+
+    def cycle_lengths(self):
+        """Cycle length per plan."""
+        return self.green_ns + self.green_ew + 2 * self.yellow
+
+    def set_plan(self, plan_id, green_ns=None, green_ew=None, yellow=None, at=None):
+        """
+        Updates one timing plan; every intersection using it follows, and
+        a coordinated green wave is recomputed for the new cycle length.
+
+        Without `at` the change applies at once (while building a network).
+        With `at` (the current time) each intersection switches at its own
+        next cycle boundary, as described above. Returns the time by which
+        every intersection of the plan runs the new timing.
+        Raises ValueError if the previous change has not finished by `at`.
+        """
+        members = np.flatnonzero(self.plan_ids == plan_id)
+        if at is not None:
+            if np.any(self.new_from[members] > at):
+                raise ValueError(f"Plan {plan_id} is still switching to its previous timing.")
+            old_cycle = self.cycle_lengths()[plan_id]
+            old_offsets = self.offsets[members]
+            # next start of a cycle under the old timing (now, if one starts now)
+            boundary = at + (old_offsets - at) % old_cycle
+            self.prev_timing[:, members] = np.array([[self.green_ns[plan_id]], [self.green_ew[plan_id]],
+                                                     [self.yellow[plan_id]]])
+            self.prev_offsets[members] = old_offsets
+
+        if green_ns is not None:
+            self.green_ns[plan_id] = green_ns
+        if green_ew is not None:
+            self.green_ew[plan_id] = green_ew
+        if yellow is not None:
+            self.yellow[plan_id] = yellow
+
+        cycle = self.cycle_lengths()[plan_id]
+        if self.wave is not None:
+            self.offsets[members] = self._wave_offsets(*self.wave)[members]
+        else:
+            self.offsets[members] %= cycle
+        if at is None:
+            return None
+        self.hold_from[members] = boundary
+        # first start of a cycle under the new timing, at or after the boundary
+        self.new_from[members] = boundary + (self.offsets[members] - boundary) % cycle
+        return float(self.new_from[members].max()) if len(members) else at
+
+    def coordinate_green_wave(self, direction="north_south", speed=GREEN_WAVE_SPEED):
+        """
+        Sets offsets so NS (or EW) greens start as a platoon travelling at
+        `speed` arrives: offset = travel time from the network edge.
+        """
+        self.wave = (direction, speed)
+        self.offsets = self._wave_offsets(direction, speed)
+
+    def _wave_offsets(self, direction, speed):
+        if direction == "north_south":
+            distance = (self.lat - self.lat.min()) * METERS_PER_DEGREE
+        else:
+            scale = METERS_PER_DEGREE * np.cos(np.radians(self.lat.mean()))
+            distance = (self.lon - self.lon.min()) * scale
+            # EW turns green (green_ns + yellow) into the cycle, so shift the
+            # cycle start back by that much for EW green to meet the platoon
+            distance = distance - (self.green_ns + self.yellow)[self.plan_ids] * speed
+        return (distance / speed) % self.cycle_lengths()[self.plan_ids]
+
+    def states_at(self, t, index=None):
+        """
+        Computes signal states for all (or the selected) intersections.
+
+        Args:
+            t (float): Time in seconds (same clock the offsets refer to).
+            index: Optional array of intersection indexes.
+
+        Returns:
+            (north_south codes, east_west codes, seconds until next change)
+        """
+        if index is None:
+            plan, offsets, new_from = self.plan_ids, self.offsets, self.new_from
+        else:
+            index = np.asarray(index)
+            plan, offsets, new_from = self.plan_ids[index], self.offsets[index], self.new_from[index]
+        g_ns, g_ew, y = self.green_ns[plan], self.green_ew[plan], self.yellow[plan]
+        ns, ew, remaining = _phases(t - offsets, g_ns, g_ew, y)
+
+        # intersections still finishing an old cycle or holding for the new one
+        switching = np.flatnonzero(t < new_from)
+        if len(switching):
+            where = switching if index is None else index[switching]
+            old = t < self.hold_from[where]
+            hold = switching[~old]
+            ns[hold], ew[hold] = GREEN, RED
+            remaining[hold] = self.new_from[where[~old]] - t + g_ns[hold]
+            if old.any():
+                g_ns0, g_ew0, y0 = self.prev_timing[:, where[old]]
+                ns[switching[old]], ew[switching[old]], remaining[switching[old]] = _phases(
+                    t - self.prev_offsets[where[old]], g_ns0, g_ew0, y0)
+        return ns, ew, remaining
+
+    def select(self, ids=None, bounds=None):
+        """Returns intersection indexes for explicit ids and/or a lat/lon box."""
+        mask = np.ones(self.count, dtype=bool)
+        if ids is not None:
+            ids = np.asarray(ids, dtype=np.int64)
+            if ids.size and (ids.min() < 0 or ids.max() >= self.count):
+                raise ValueError(f"Intersection ids must be between 0 and {self.count - 1}.")
+            mask[:] = False
+            mask[ids] = True
+        if bounds:
+            if bounds.get("lat_min") is not None:
+                mask &= self.lat >= bounds["lat_min"]
+            if bounds.get("lat_max") is not None:
+                mask &= self.lat <= bounds["lat_max"]
+            if bounds.get("lon_min") is not None:
+                mask &= self.lon >= bounds["lon_min"]
+            if bounds.get("lon_max") is not None:
+                mask &= self.lon <= bounds["lon_max"]
+        return np.flatnonzero(mask)
+
+
+# A function to compute signal colors from each intersection's time since its offset
+def _phases(elapsed, g_ns, g_ew, y):
+    """Returns (NS codes, EW codes, seconds until next change) for the cycle position."""
+    cycle = g_ns + g_ew + 2 * y
+
+    # position inside the cycle and the end time of each phase
+    tc = elapsed % cycle
+    end_ns_green = g_ns
+    end_ns_yellow = g_ns + y
+    end_ew_green = end_ns_yellow + g_ew
+
+    ns = np.full(len(tc), RED, dtype=np.uint8)
+    ew = np.full(len(tc), RED, dtype=np.uint8)
+    ns[tc < end_ns_green] = GREEN
+    ns[(tc >= end_ns_green) & (tc < end_ns_yellow)] = YELLOW
+    ew[(tc >= end_ns_yellow) & (tc < end_ew_green)] = GREEN
+    ew[tc >= end_ew_green] = YELLOW
+
+    boundaries = np.stack([end_ns_green, end_ns_yellow, end_ew_green, cycle])
+    remaining = np.where(boundaries > tc, boundaries - tc, np.inf).min(axis=0)
+    return ns, ew, remaining
+
+
+# A function to lay out a rectangular city grid of signals
+def build_grid_network(rows=DEFAULT_GRID["rows"], cols=DEFAULT_GRID["cols"],
+                       spacing=DEFAULT_GRID["spacing"], center=DEFAULT_GRID["center"],
+                       green_wave="north_south"):
+    """
+    Builds a rows x cols grid of intersections `spacing` meters apart,
+    centered on `center`, with a coordinated green wave.
+    Intersection id = row * cols + col.
+    """
+    lat0, lon0 = center
+    dlat = spacing / METERS_PER_DEGREE
+    dlon = spacing / (METERS_PER_DEGREE * np.cos(np.radians(lat0)))
+    row, col = np.divmod(np.arange(rows * cols), cols)
+    lat = lat0 + (row - (rows - 1) / 2) * dlat
+    lon = lon0 + (col - (cols - 1) / 2) * dlon
+
+    network = SignalNetwork(lat, lon)
+    if green_wave:
+        network.coordinate_green_wave(green_wave)
+    return network
+
+
+# shared network behind the bulk API, built on first use
+_network = None
+_network_lock = threading.Lock()
+
+# re-time the shared network from traffic_data congestion every cycle
+ADAPTIVE_SIGNALS = True
+_controller = None
+
+
+# A function to get the shared city signal network
+def get_network():
+    """Returns the shared SignalNetwork, building the default grid if needed."""
+    global _network, _controller
+    if _network is None:
+        with _network_lock:
+            if _network is None:
+                _controller = AdaptiveSignalController(build_grid_network())
+                _network = _controller.network
+    return _network
+
+
+# A function to get signal states for many intersections at once
+def get_network_state(ids=None, bounds=None, clock=None, network=None):
+    """
+    Returns signal states for the selected intersections in bulk.
+    Colors are strings with one letter (R/G/Y) per intersection, in the
+    same order as "ids".
+    """
+    network = network or get_network()
+    now = (clock or wall_clock).now()
+    index = network.select(ids, bounds)
+    # a plan change rewrites the timing arrays; read them under the same lock
+    with _network_lock:
+        if ADAPTIVE_SIGNALS and _controller is not None and network is _controller.network:
+            _controller.update(now)
+        ns, ew, remaining = network.states_at(now, index)
     return {
-        "north_south": lights["north_south"],
-        "east_west": lights["east_west"],
-        "timestamp": time.time()
+        "timestamp": now,
+        "count": int(len(index)),
+        "ids": network.ids[index].tolist(),
+        "north_south": "".join(COLOR_LETTERS[ns]),
+        "east_west": "".join(COLOR_LETTERS[ew]),
+        "seconds_to_change": np.round(remaining, 1).tolist(),
     }
 
 
-
 def run_intersection_cycle(cycles=5):
     """
     Runs multiple light cycles to test timing.
@@ -99,4 +412,10 @@ def run_intersection_cycle(cycles=5):
 
 
 if __name__ == "__main__":
+    network = build_grid_network(rows=100, cols=100)
+    start = time.perf_counter()
+    ns, ew, _ = network.states_at(time.time())
+    elapsed = (time.perf_counter() - start) * 1000
+    print(f"{network.count} intersections computed in {elapsed:.2f} ms "
+          f"(NS green: {int((ns == GREEN).sum())}, EW green: {int((ew == GREEN).sum())})")
     run_intersection_cycle(25)
\ No newline at end of file
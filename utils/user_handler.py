@@ -18,15 +18,22 @@ import sqlite3
 from contextlib import closing
 
 
-sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+if __name__ == "__main__":
+    sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from utils.db_handler import DB_PATH 
+from utils import db_handler
+from utils.log_handler import get_logger
+from utils.password_handler import hash_password, check_password, HashPoolBusy
+
+logger = get_logger(__name__)
+
+BUSY_MESSAGE = "Too many sign-ins right now. Please try again in a moment."
 
 
 def register_user(username, email, password):
     """Registers a new user into the database."""
     try:
-        with closing(sqlite3.connect(DB_PATH)) as conn:
+        with closing(sqlite3.connect(db_handler.DB_PATH)) as conn:
             cursor = conn.cursor()
 
             # Check if email already exists
@@ -34,17 +41,21 @@ def register_user(username, email, password):
             if cursor.fetchone():
                 return {"status": "fail", "message": "Username or email already taken."}
 
+            # only the scrypt hash is stored, never the password itself
             cursor.execute("""
                 INSERT INTO users (username, email, password)
                 VALUES (?, ?, ?)
-            """, (username, email, password))
+            """, (username, email, hash_password(password)))
             conn.commit()
 
-        print(f"[INFO] User '{username}' registered successfully.")
+        logger.info("User '%s' registered successfully.", username)
         return {"status": "success", "message": f"User {username} registered successfully."}
 
+    except HashPoolBusy:
+        logger.warning("Registration of '%s' rejected: hash queue full.", username)
+        return {"status": "fail", "busy": True, "message": BUSY_MESSAGE}
     except Exception as e:
-        print(f"[ERROR] Registration failed: {e}")
+        logger.error("Registration failed: %s", e)
         return {"status": "fail", "message": f"Registration failed: {e}"}
 
 
@@ -52,7 +63,7 @@ def register_user(username, email, password):
 def login_user(username, password):
     """Authenticates a user by checking their email and password."""
     try:
-        with closing(sqlite3.connect(DB_PATH)) as conn:
+        with closing(sqlite3.connect(db_handler.DB_PATH)) as conn:
             cursor = conn.cursor()
             cursor.execute("""
                 SELECT username, password FROM users
@@ -65,21 +76,31 @@ def login_user(username, password):
 
             stored_username, stored_password = result
 
-            if password == stored_password:
-                print(f"[INFO] User '{stored_username}' logged in successfully.")
-                return {"status": "success", "username": stored_username}
-            else:
+            matches, upgraded = check_password(password, stored_password)
+            if not matches:
                 return {"status": "fail", "message": "Incorrect password."}
 
+            if upgraded:
+                # plaintext or older work factor: store the new hash
+                cursor.execute("UPDATE users SET password = ? WHERE username = ? AND password = ?",
+                               (upgraded, stored_username, stored_password))
+                conn.commit()
+                logger.info("Upgraded password hash for '%s'.", stored_username)
+            logger.info("User '%s' logged in successfully.", stored_username)
+            return {"status": "success", "username": stored_username}
+
+    except HashPoolBusy:
+        logger.warning("Login of '%s' rejected: hash queue full.", username)
+        return {"status": "fail", "busy": True, "message": BUSY_MESSAGE}
     except Exception as e:
-        print(f"[ERROR] Login failed: {e}")
+        logger.error("Login failed: %s", e)
         return {"status": "fail", "message": f"Login failed: {e}"}
 
 
 def get_user_by_email(email):
     """Fetches a user's record using their email address."""
     try:
-        with closing(sqlite3.connect(DB_PATH)) as conn:
+        with closing(sqlite3.connect(db_handler.DB_PATH)) as conn:
             cursor = conn.cursor()
             cursor.execute("""
                 SELECT id, username, email FROM users WHERE email = ?
@@ -91,7 +112,7 @@ def get_user_by_email(email):
             return None
 
     except Exception as e:
-        print(f"[ERROR] Failed to fetch user by email: {e}")
+        logger.error("Failed to fetch user by email: %s", e)
         return None
 
 
@@ -101,17 +122,17 @@ def logout_user(session):
     """
     try:
         session.pop('user', None)
-        print("[INFO] User logged out successfully.")
+        logger.info("User logged out successfully.")
         return {"status": "success", "message": "User logged out successfully."}
     except Exception as e:
-        print(f"Error: logout failed: {e}")
+        logger.error("Logout failed: %s", e)
         return {"status": "fail", "message": f"logout failed: {e}"}
 
 
 def reset_password(email):
     """ Resets users password given their email address. """
     try:
-        with closing(sqlite3.connect(DB_PATH)) as conn:
+        with closing(sqlite3.connect(db_handler.DB_PATH)) as conn:
             cursor = conn.cursor()
             # check if email exists
             cursor.execute("SELECT id FROM users WHERE email = ?", (email,))
@@ -120,10 +141,10 @@ def reset_password(email):
             if not user:
                 return {"status": "fail", "message": "Email not found. "}
             
-            print(f"[INFO] Password reset link sent to {email} (simulated).")
+            logger.info("Password reset link sent to %s (simulated).", email)
             return {"status": "success", "message": f"Password reset link sent to email."}
     except Exception as e:
-        print(f"[Error] password reset failed: try again {e}")
+        logger.error("Password reset failed: %s", e)
         return {"status": "fail", "message": f"password reset failed: {e}"}
     
     
@@ -0,0 +1,101 @@
+#
+# wsgi.py
+#
+# Production entry point for the Traffic & Accident Data Monitor.
+#
+
+"""
+wsgi.py
+----------------------------------------
+Serves the app with a multi-worker WSGI server (gunicorn).
+
+The database is initialized once, here in the parent process, before
+the workers fork; the app is then built with INIT_DB off. No SQLite
+connection is left open in the parent - every worker opens its own
+connections per request - so workers never share a connection.
+
+Usage:
+    python wsgi.py                          # PORT, WEB_WORKERS, WEB_THREADS from env
+    python wsgi.py --workers 8 --threads 4 --port 8000
+    gunicorn --preload -w 8 --threads 4 wsgi:app   # same thing, gunicorn CLI
+
+Defaults: one worker per CPU core, 4 threads per worker, port 5000.
+
+Streams are not cheap here: an open SSE stream holds one worker thread
+until it ends. MAX_STREAMS (default: half the threads) caps the open
+streams per worker so the other threads keep serving ordinary requests,
+and STREAM_MAX_SECONDS ends each stream so clients reconnect, possibly
+to another worker.
+
+Rate limits and the MAX_CONCURRENT cap are kept per worker, so a client
+can reach WEB_WORKERS times RATE_LIMIT in total. Behind nginx or a load
+balancer, set PROXY_HOPS to the number of proxies so clients are told
+apart by their X-Forwarded-For address instead of the proxy's.
+"""
+
+import os
+import argparse
+import tempfile
+
+from app import create_app
+from utils.db_handler import ensure_db
+
+# -------------------------------------------------------------------
+# SERVER CONFIGURATION
+# -------------------------------------------------------------------
+WORKERS = int(os.environ.get("WEB_WORKERS", os.cpu_count() or 1))
+THREADS = int(os.environ.get("WEB_THREADS", 4))
+PORT = int(os.environ.get("PORT", 5000))
+TIMEOUT = int(os.environ.get("WEB_TIMEOUT", 60))
+STREAMS = int(os.environ.get("MAX_STREAMS", max(1, THREADS // 2)))
+# workers write their metrics here so /api/metrics on any of them covers all
+METRICS_DIR = os.environ.get("METRICS_DIR") or tempfile.mkdtemp(prefix="traffic-metrics-")
+
+# runs once per import; with --preload that is once, before the fork.
+# Workers don't share memory, so simulation sessions live in the database.
+app = create_app({"INIT_DB": False, "SHARED_SIM_SESSIONS": True, "MAX_STREAMS": STREAMS,
+                  "METRICS_DIR": METRICS_DIR})
+ensure_db()
+
+
+# A function to run the app under gunicorn with the given worker counts
+def serve(workers=WORKERS, threads=THREADS, port=PORT, host="0.0.0.0"):
+    """Starts gunicorn with `workers` processes of `threads` threads each."""
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        raise SystemExit("[ERROR] gunicorn is not installed (pip install gunicorn).")
+    if threads <= STREAMS:
+        print(f"[WARN] MAX_STREAMS={STREAMS} streams can take all {threads} threads of a worker; "
+              f"set MAX_STREAMS below --threads.")
+
+    class Server(BaseApplication):
+        def load_config(self):
+            options = {
+                "bind": f"{host}:{port}",
+                "workers": workers,
+                "threads": threads,
+                # gthread: a stream ties up one thread, not the whole process
+                "worker_class": "gthread" if threads > 1 else "sync",
+                "preload_app": True,
+                "timeout": TIMEOUT,
+                "accesslog": "-",
+            }
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return app
+
+    print(f"[INFO] Serving on http://{host}:{port} with {workers} workers x {threads} threads.")
+    Server().run()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the app with a multi-worker WSGI server.")
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--threads", type=int, default=THREADS)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--host", default="0.0.0.0")
+    args = parser.parse_args()
+    serve(args.workers, args.threads, args.port, args.host)